@@ -19,8 +19,11 @@ import time
 from dataclasses import dataclass, field
 from typing import Dict, List, Any, Optional, Tuple, Set
 from enum import Enum
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, deque
 from scene_symbolization_mechanism import EOCATR_Tuple, SymbolicAction, SymbolicObjectCategory
+from turn_profiler import profiled
+from rule_dedup_index import RuleDedupIndex
+from rule_match_index import RuleMatchIndex
 
 
 class RuleType(Enum):
@@ -356,12 +359,15 @@ class BloomingAndPruningModel:
         self.config = config or self._default_config()
         
         # 规律存储
-        self.candidate_rules: Dict[str, CandidateRule] = {}  # 候选规律
+        self.rule_matcher = RuleMatchIndex()  # 候选规律的匹配网络，用于 validation_phase
+        self.candidate_rules: Dict[str, CandidateRule] = self.rule_matcher.track({})  # 候选规律
         self.validated_rules: Dict[str, CandidateRule] = {}  # 已验证规律
         self.pruned_rules: Dict[str, CandidateRule] = {}     # 已剪枝规律
         
         # === 新增：规律去重和质量控制 ===
         self.rule_fingerprints: Set[str] = set()  # 规律指纹集合，用于快速去重
+        self.rule_index = RuleDedupIndex()  # 候选/已验证规律的内容桶和分块索引，用于去重
+        self.pattern_experiences: Dict[str, deque] = {}  # 增量怒放：各模式组最近的经验
         self.rule_similarity_threshold = 0.95  # 相似度阈值（降低误判）
         self.min_quality_threshold = 0.01  # 最低质量阈值（极度降低）
         self.rule_merge_history: List[Tuple[str, str, float]] = []  # 合并历史
@@ -652,6 +658,10 @@ class BloomingAndPruningModel:
             'min_quality_threshold': 0.01,            # 非常低的质量阈值
             'enable_single_experience_rules': True,   # 允许单经验规律
             'force_rule_generation': False,           # 不强制生成
+            
+            # 增量怒放（新增）：只为新经验涉及的模式组生成规律，只用新经验验证
+            'incremental_blooming': False,
+            'incremental_pattern_window': 20,         # 每个模式组保留的最近经验数
         }
     def _initialize_pattern_templates(self) -> Dict[RuleType, List[str]]:
         """初始化模式模板"""
@@ -702,6 +712,7 @@ class BloomingAndPruningModel:
         """怒放阶段的别名方法"""
         return self.blooming_phase(eocar_experiences)
     
+    @profiled("ilai.bmp.blooming")
     def blooming_phase(self, eocar_experiences: List[EOCATR_Tuple]) -> List[CandidateRule]:
         """
         怒放阶段：基于经验生成候选规律
@@ -720,6 +731,7 @@ class BloomingAndPruningModel:
                 return []
             
             new_rules = []
+            self.rule_index.sync(self.candidate_rules, self.validated_rules)
             
             # 🔧 预处理：分离工具使用和常规经验
             tool_usage_experiences = [exp for exp in eocar_experiences if exp.is_tool_usage()]
@@ -809,6 +821,7 @@ class BloomingAndPruningModel:
                     # 🔥 使用内容指纹进行去重跟踪
                     content_fingerprint = self._generate_content_fingerprint(rule)
                     self.rule_fingerprints.add(content_fingerprint)
+                    self.rule_index.add(rule)
                     self.total_rules_generated += 1
                 
                 # 记录生成历史
@@ -1175,10 +1188,9 @@ class BloomingAndPruningModel:
                     self.logger.log(f"🔥 发现重复规律内容: {rule.pattern[:30]}...")
                 return True
             
-            # 检查与现有规律的相似度
-            all_existing_rules = list(self.candidate_rules.values()) + list(self.validated_rules.values())
-            for existing_rule in all_existing_rules:
-                if self._is_content_identical(rule, existing_rule):
+            # 检查与现有规律的内容是否相同：只需比较同一内容桶中的规律
+            for existing_rule in self.rule_index.content_matches(rule):
+                if self._is_pooled_rule(existing_rule) and self._is_content_identical(rule, existing_rule):
                     if self.logger:
                         self.logger.log(f"🔥 发现内容相同的规律: {rule.pattern[:30]}...")
                     return True
@@ -1195,8 +1207,8 @@ class BloomingAndPruningModel:
             if self.logger:
                 self.logger.log(f"🔥 DUPLICATE CHECK: 检查规律 rule_id={rule.rule_id[:8]}...")
             
-            # 生成当前规律的指纹
-            current_fingerprint = self._generate_rule_fingerprint(rule)
+            # 生成当前规律的内容指纹(_generate_rule_fingerprint 包含 rule_id，无法发现重复)
+            current_fingerprint = self._generate_content_fingerprint(rule)
             if self.logger:
                 self.logger.log(f"🔥 DUPLICATE CHECK: 当前指纹={current_fingerprint[:8]}...")
             
@@ -1210,20 +1222,22 @@ class BloomingAndPruningModel:
                 self.logger.log(f"🔥 DUPLICATE CHECK: 指纹检查通过，开始详细相似度检查...")
                 self.logger.log(f"🔥 DUPLICATE CHECK: 现有候选规律数={len(self.candidate_rules)}, 已验证规律数={len(self.validated_rules)}")
             
-            # 详细相似度检查
-            all_existing_rules = list(self.candidate_rules.values()) + list(self.validated_rules.values())
-            for i, existing_rule in enumerate(all_existing_rules):
+            # 详细相似度检查：只比较同类型、条件字段重叠度足够高的分块中的规律
+            min_key_overlap = self._min_condition_key_overlap(self.rule_similarity_threshold)
+            compared = 0
+            for existing_rule in self.rule_index.similarity_candidates(rule, min_key_overlap):
+                if not self._is_pooled_rule(existing_rule):
+                    continue
+                compared += 1
                 similarity = self._calculate_rule_similarity(rule, existing_rule)
-                if self.logger:
-                    self.logger.log(f"🔥 DUPLICATE CHECK: 与现有规律{i+1} 相似度={similarity:.3f}, 阈值={self.rule_similarity_threshold}")
-                
                 if similarity > self.rule_similarity_threshold:
                     if self.logger:
-                        self.logger.log(f"🔥 DUPLICATE CHECK: 相似度过高! 认定为重复")
+                        self.logger.log(f"🔥 DUPLICATE CHECK: 与规律{existing_rule.rule_id[:8]}相似度={similarity:.3f} > "
+                                        f"阈值{self.rule_similarity_threshold}，认定为重复")
                     return True
             
             if self.logger:
-                self.logger.log(f"🔥 DUPLICATE CHECK: 所有检查通过，非重复规律")
+                self.logger.log(f"🔥 DUPLICATE CHECK: 所有检查通过，非重复规律(比较了{compared}条同分块规律)")
             return False
             
         except Exception as e:
@@ -1283,6 +1297,11 @@ class BloomingAndPruningModel:
                 self.logger.log(f"生成内容指纹失败: {str(e)}")
             return f"content_error_{int(time.time() * 1000000)}"
     
+    def _is_pooled_rule(self, rule: CandidateRule) -> bool:
+        """规律对象仍在候选或已验证规律池中(去重索引只在每轮开始时与规律池对齐)"""
+        return (self.candidate_rules.get(rule.rule_id) is rule or
+                self.validated_rules.get(rule.rule_id) is rule)
+    
     def _is_content_identical(self, rule1: CandidateRule, rule2: CandidateRule) -> bool:
         """检查两个规律的内容是否完全相同"""
         try:
@@ -1328,6 +1347,14 @@ class BloomingAndPruningModel:
                 self.logger.log(f"相似度计算失败: {str(e)}")
             return 0.0
     
+    def _min_condition_key_overlap(self, threshold: float) -> float:
+        """
+        规律相似度可能超过 threshold 所需的最低条件字段重叠度。
+        条件相似度 = (键重叠度 + 值相似度) / 2 <= (键重叠度 + 1) / 2，预测和模式相似度 <= 1，
+        所以 _calculate_rule_similarity <= 0.2 * 键重叠度 + 0.8
+        """
+        return (threshold - 0.8) / 0.2 - 1e-9
+    
     def _calculate_dict_similarity(self, dict1: Dict, dict2: Dict) -> float:
         """计算两个字典的相似度"""
         if not dict1 and not dict2:
@@ -2032,6 +2059,7 @@ class BloomingAndPruningModel:
         except Exception:
             return None
     
+    @profiled("ilai.bmp.pruning")
     def pruning_phase(self) -> List[str]:
         """剪枝阶段：移除低质量或过时的规律"""
         try:
@@ -2330,8 +2358,8 @@ class BloomingAndPruningModel:
             if self.logger:
                 self.logger.log(f"📊 BMP验证阶段开始: {len(new_experiences)}个新经验, {len(self.candidate_rules)}个候选规律")
             
-            # 对每个候选规律进行验证
-            for rule_id, rule in list(self.candidate_rules.items()):
+            # 只验证可能适用于新经验的候选规律(其余规律的 total_applicable 为 0，验证不改变它们)
+            for rule_id, rule in self._validation_candidates(new_experiences):
                 try:
                     # 使用新经验验证规律
                     validation_result = self._validate_rule_with_experiences(rule, new_experiences)
@@ -2373,6 +2401,23 @@ class BloomingAndPruningModel:
                 self.logger.log(f"❌ BMP验证阶段异常: {str(e)}")
             return []
 
+    def _validation_candidates(self, experiences: List[EOCATR_Tuple]) -> List[Tuple[str, CandidateRule]]:
+        """
+        经规律匹配网络查找可能被 experiences 验证的候选规律(按规律池顺序)：
+        通过等值条件的规律，加上 _validate_rule_with_experiences 中 action / environment 弱匹配的规律
+        """
+        matcher = self.rule_matcher
+        self.candidate_rules = matcher.track(self.candidate_rules)
+        try:
+            keys = set()
+            for exp in experiences:
+                keys.update(matcher.match(exp))
+                keys.update(matcher.match_loose(getattr(exp.action, 'value', None),
+                                                getattr(exp.environment, 'value', None)))
+        except Exception:
+            return list(self.candidate_rules.items())  # 经验缺少字段等：逐条验证
+        return [(rule_id, self.candidate_rules[rule_id]) for rule_id in matcher.sort_keys(keys)]
+
     def _auto_promotion_check(self) -> List[str]:
         """基于重复出现与置信度的自动晋升为正式规律"""
         promoted: List[str] = []
@@ -2863,18 +2908,21 @@ class BloomingAndPruningModel:
                 loaded_validated = self._deserialize_rules(load_data.get('validated_rules', {}))
                 
                 merged_count = 0
+                self.rule_index.sync(self.candidate_rules, self.validated_rules)
                 # 合并候选规律
                 for rule_id, rule in loaded_candidate.items():
                     if not self._is_duplicate_rule(rule):
                         self.candidate_rules[rule_id] = rule
-                        self.rule_fingerprints.add(self._generate_rule_fingerprint(rule))
+                        self.rule_fingerprints.add(self._generate_content_fingerprint(rule))
+                        self.rule_index.add(rule)
                         merged_count += 1
                 
                 # 合并已验证规律
                 for rule_id, rule in loaded_validated.items():
                     if not self._is_duplicate_rule(rule):
                         self.validated_rules[rule_id] = rule
-                        self.rule_fingerprints.add(self._generate_rule_fingerprint(rule))
+                        self.rule_fingerprints.add(self._generate_content_fingerprint(rule))
+                        self.rule_index.add(rule)
                         merged_count += 1
                 
                 if self.logger:
@@ -2892,7 +2940,7 @@ class BloomingAndPruningModel:
                 self.rule_fingerprints.clear()
                 all_rules = list(self.candidate_rules.values()) + list(self.validated_rules.values())
                 for rule in all_rules:
-                    self.rule_fingerprints.add(self._generate_rule_fingerprint(rule))
+                    self.rule_fingerprints.add(self._generate_content_fingerprint(rule))
             
             if self.logger:
                 self.logger.log(f"规律已从文件加载: {filepath}")
@@ -3312,6 +3360,7 @@ class BloomingAndPruningModel:
         return stats
 
     # === 新增：process_experience方法（兼容main.py调用）===
+    @profiled("ilai.bmp.process_experience")
     def process_experience(self, experience, historical_experiences=None):
         """
         处理单个经验，生成并验证规律
@@ -3334,6 +3383,9 @@ class BloomingAndPruningModel:
                     self.logger.log(f"⚠️ 经验格式不正确，跳过处理")
                 return []
             
+            if self.config.get('incremental_blooming', False):
+                return self._process_experience_incrementally(experience, historical_experiences)
+            
             # 准备经验列表
             experiences_to_process = [experience]
             if historical_experiences:
@@ -3366,6 +3418,84 @@ class BloomingAndPruningModel:
             if self.logger:
                 self.logger.log(f"❌ BMP经验处理失败: {str(e)}")
             return []
+    
+    def _process_experience_incrementally(self, experience, historical_experiences=None) -> List[CandidateRule]:
+        """
+        增量模式的 process_experience：每条经验只处理一次，开销不随历史窗口增长
+        
+        - 历史经验只在模式组为空时(首次调用)用于初始化各模式组，不再重复怒放和验证
+        - 先用新经验验证已有规律，再只为新经验涉及的模式组生成规律
+        """
+        if historical_experiences and not self.pattern_experiences:
+            for hist_exp in historical_experiences[-self.config.get('incremental_pattern_window', 20):]:
+                self.record_experience_patterns(hist_exp)
+        
+        validated_rule_ids = self.validation_phase([experience])
+        if self.logger and validated_rule_ids:
+            self.logger.log(f"✅ 验证阶段通过{len(validated_rule_ids)}个规律")
+        
+        new_candidate_rules = self.incremental_blooming(experience)
+        
+        pruned_rule_ids = self.pruning_phase()
+        if self.logger and pruned_rule_ids:
+            self.logger.log(f"✂️ 剪枝阶段移除{len(pruned_rule_ids)}个规律")
+        
+        if self.logger:
+            self.logger.log(f"🌸 BMP增量处理完成: 生成{len(new_candidate_rules)}个候选规律")
+        return new_candidate_rules
+    
+    def _experience_pattern_keys(self, experience) -> List[str]:
+        """经验所属的模式组键(与 _group_experiences_by_pattern 的分组一致)"""
+        keys = list(self._group_experiences_by_pattern([experience]))
+        if experience.is_tool_usage():
+            # 工具比较组需要同一目标的至少2条工具经验，单条经验分组时不会出现
+            obj_val = experience.object_category.value if experience.object_category and hasattr(experience.object_category, 'value') else 'unknown'
+            keys.append(f"TOOL_COMPARISON_TARGET_{obj_val}")
+        return keys
+    
+    def record_experience_patterns(self, experience) -> List[str]:
+        """把经验加入其所属的各模式组(每组只保留最近的 incremental_pattern_window 条)，返回模式组键"""
+        window = self.config.get('incremental_pattern_window', 20)
+        keys = self._experience_pattern_keys(experience)
+        for key in keys:
+            group = self.pattern_experiences.get(key)
+            if group is None:
+                group = self.pattern_experiences[key] = deque(maxlen=window)
+            group.append(experience)
+        return keys
+    
+    @profiled("ilai.bmp.incremental_blooming")
+    def incremental_blooming(self, experience) -> List[CandidateRule]:
+        """
+        增量怒放：新经验加入所属模式组后，只为这些模式组重新生成规律。
+        其他模式组的经验没有变化，重新生成只会得到被去重拒绝的相同规律。
+        """
+        try:
+            self.rule_index.sync(self.candidate_rules, self.validated_rules)
+            new_rules = []
+            for pattern_key in self.record_experience_patterns(experience):
+                group_experiences = list(self.pattern_experiences[pattern_key])
+                if pattern_key.startswith("TOOL_COMPARISON_") and len(group_experiences) < 2:
+                    continue
+                for rule in self._generate_rules_for_pattern(pattern_key, group_experiences):
+                    if self._is_obvious_duplicate_simple(rule):
+                        continue
+                    self.candidate_rules[rule.rule_id] = rule
+                    self.rule_fingerprints.add(self._generate_content_fingerprint(rule))
+                    self.rule_index.add(rule)
+                    self.total_rules_generated += 1
+                    new_rules.append(rule)
+            
+            if new_rules:
+                self.rule_generation_history.append((time.time(), len(new_rules)))
+            if self.logger:
+                self.logger.log(f"🌸 增量怒放: {len(self.pattern_experiences)}个模式组，新增{len(new_rules)}个候选规律")
+            return new_rules
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"❌ 增量怒放失败: {str(e)}")
+            return []
+    
     def _filter_relevant_experiences_for_blooming(self, experiences: List[EOCATR_Tuple], max_experiences: int = 50) -> List[EOCATR_Tuple]:
         """过滤相关经验以提高怒放效率"""
         if len(experiences) <= max_experiences:
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+checkpoint_service.py
+异步、去重的模型检查点服务
+
+原先每 5 天 Game 会对每个存活玩家同步调用 save_model()，所有玩家的写盘都阻塞当前回合。
+CheckpointService 在主线程只做两件事：比较各对象的版本号(没有变化的直接跳过)，
+并复制一份权重快照；真正的写盘在后台线程完成，先写临时文件再 os.replace 原子替换，
+中途退出也不会留下半个模型文件。
+
+玩家通过 checkpoint_items() 提供 {文件名: 对象}。对象需要支持 save(path)，
+提供 snapshot() 的对象(NumpyMLP、ReplayBuffer)在后台写入，其余对象(如 Keras 模型)
+在主线程写入但同样去重、原子替换。
+
+指定 archive_path 时，所有快照合并写入每局一个 .npz 归档，而不是每个玩家各自的文件。
+
+写入失败(包括后台线程中的失败)通过构造时传入的游戏日志对象(提供 log(message)，如 main.Logger)报告。
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+ARCHIVE_SEPARATOR = "::"  # 归档中的键: "<文件名>::<数组名>"
+
+
+def fingerprint(obj) -> Any:
+    """对象内容的指纹：优先使用 version 计数器，否则对权重做哈希"""
+    version = getattr(obj, "version", None)
+    if version is not None:
+        return ("version", id(obj), version)
+    if hasattr(obj, "get_weights"):
+        digest = hashlib.blake2b(digest_size=16)
+        for weights in obj.get_weights():
+            digest.update(np.ascontiguousarray(weights).tobytes())
+        return ("hash", digest.hexdigest())
+    return None  # 无法判断是否变化，总是保存
+
+
+def _temp_path(path):
+    """与目标同目录、同扩展名的临时文件(Keras 根据扩展名选择格式)"""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{os.getpid()}.{threading.get_ident()}.tmp{ext}")
+
+
+def atomic_save(obj, path):
+    """obj.save 到临时文件后原子替换目标文件"""
+    temp_path = _temp_path(path)
+    try:
+        obj.save(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class CheckpointService:
+    """后台线程写盘、按版本去重、原子替换的检查点服务"""
+
+    def __init__(self, directory: str, async_writes: bool = True, archive_path: Optional[str] = None,
+                 logger=None):
+        self.directory = directory
+        self.logger = logger
+        self.async_writes = async_writes
+        self.archive_path = archive_path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint") if async_writes else None
+        self._pending = []
+        self._last_saved: Dict[str, Any] = {}     # 路径 -> 上次保存时的指纹
+        self._archive_items: Dict[str, Any] = {}  # 文件名 -> 最新快照(归档模式)
+        self.stats = {"saved": 0, "skipped": 0, "failed": 0}
+
+    def __getstate__(self):
+        # 后台线程不能序列化(Game 快照)，恢复时重新创建；未完成的写入先等待结束
+        self.flush()
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_pending"] = []
+        state["logger"] = None  # 恢复后由 Game.restore 重新绑定游戏日志
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.async_writes:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+
+    # ---------- 提交 ----------
+
+    def checkpoint_player(self, player) -> int:
+        """提交玩家的检查点，返回实际需要写入的对象数"""
+        items_of = getattr(player, "checkpoint_items", None)
+        if items_of is None:
+            if hasattr(player, "save_model"):
+                player.save_model()  # 未提供快照接口的玩家保持原有的同步保存
+                return 1
+            return 0
+        submitted = 0
+        for filename, obj in items_of().items():
+            if obj is not None and self.submit(filename, obj):
+                submitted += 1
+        return submitted
+
+    def checkpoint_players(self, players, alive_only=True) -> int:
+        submitted = 0
+        for player in players:
+            if alive_only and not player.is_alive():
+                continue
+            try:
+                submitted += self.checkpoint_player(player)
+            except Exception as e:
+                self.stats["failed"] += 1
+                self._report(f"⚠️ 提交{getattr(player, 'name', player)}的检查点失败: {e}")
+        if self.archive_path and submitted:
+            self._write_archive()
+        return submitted
+
+    def submit(self, filename: str, obj) -> bool:
+        """对象有变化时保存(异步或同步)，没有变化返回 False"""
+        path = os.path.join(self.directory, filename)
+        mark = fingerprint(obj)
+        if mark is not None and self._last_saved.get(path) == mark:
+            self.stats["skipped"] += 1
+            return False
+
+        snapshot = obj.snapshot() if hasattr(obj, "snapshot") else None
+        if self.archive_path and snapshot is not None and hasattr(snapshot, "to_arrays"):
+            self._archive_items[filename] = snapshot
+            self._last_saved[path] = mark
+            return True
+
+        self._last_saved[path] = mark
+        if snapshot is not None and self._executor is not None:
+            self._pending.append(self._executor.submit(self._write, snapshot, path))
+        else:
+            self._write(snapshot if snapshot is not None else obj, path)
+        return True
+
+    # ---------- 写盘 ----------
+
+    def _write(self, obj, path):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            atomic_save(obj, path)
+            self.stats["saved"] += 1
+        except Exception as e:
+            self._last_saved.pop(path, None)  # 下次重新尝试
+            self.stats["failed"] += 1
+            self._report(f"⚠️ 写入检查点失败 {path}: {e}")
+
+    def _report(self, message):
+        if self.logger:
+            self.logger.log(message)
+
+    def _write_archive(self):
+        arrays = {}
+        for filename, snapshot in self._archive_items.items():
+            for key, value in snapshot.to_arrays().items():
+                arrays[f"{filename}{ARCHIVE_SEPARATOR}{key}"] = value
+        archive = _ArrayArchive(arrays)
+        if self._executor is not None:
+            self._pending.append(self._executor.submit(self._write, archive, self.archive_path))
+        else:
+            self._write(archive, self.archive_path)
+
+    def flush(self):
+        """等待所有后台写入完成"""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    # ---------- 归档读取 ----------
+
+    @staticmethod
+    def load_archive(path) -> Dict[str, Dict[str, np.ndarray]]:
+        """读取归档，返回 {文件名: {数组名: 数组}}"""
+        items: Dict[str, Dict[str, np.ndarray]] = {}
+        with np.load(path, allow_pickle=False) as data:
+            for key in data.files:
+                filename, name = key.split(ARCHIVE_SEPARATOR, 1)
+                items.setdefault(filename, {})[name] = data[key]
+        return items
+
+    @staticmethod
+    def restore_player(player, archive_items) -> int:
+        """用归档中的内容恢复玩家的网络权重/经验，返回恢复的对象数"""
+        if not hasattr(player, "checkpoint_items"):
+            return 0
+        restored = 0
+        for filename, obj in player.checkpoint_items().items():
+            data = archive_items.get(filename)
+            if data is None or obj is None:
+                continue
+            if hasattr(obj, "load_arrays"):
+                obj.load_arrays(data)
+            else:
+                weights = [data[f"w{i}"] for i in range(len(obj.get_weights()))]
+                obj.set_weights(weights)
+            restored += 1
+        return restored
+
+
+class _ArrayArchive:
+    """把 {键: 数组} 写成单个 .npz 的保存对象"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            np.savez(f, **self.arrays)
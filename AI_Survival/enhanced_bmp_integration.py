@@ -219,6 +219,9 @@ class ConstraintAwareBMPIntegration:
         if self.logger:
             self.logger.log(f"🧠 约束驱动经验处理: {getattr(experience, 'tuple_id', 'unknown')}")
         
+        if getattr(self.original_bmp, 'config', {}).get('incremental_blooming', False):
+            return self._incremental_process_experience(experience)
+        
         # 准备经验列表进行处理
         experiences_to_process = [experience]
         if historical_experiences:
@@ -253,6 +256,31 @@ class ConstraintAwareBMPIntegration:
         
         return new_candidate_rules
     
+    def _incremental_process_experience(self, experience: EOCATR_Tuple) -> List[CandidateRule]:
+        """
+        增量模式：约束驱动生成本就逐条经验进行，历史经验在它们作为新经验时已经处理过，
+        这里只为新经验生成规律，并只用新经验验证已有规律(先验证、后生成，每条经验只验证一次)
+        """
+        try:
+            validated_rule_ids = self.original_bmp.validation_phase([experience])
+            if self.logger and validated_rule_ids:
+                self.logger.log(f"✅ 验证阶段通过{len(validated_rule_ids)}个规律")
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"⚠️ 验证阶段出错: {str(e)}")
+        
+        new_candidate_rules = self.constraint_aware_blooming_phase([experience])
+        
+        try:
+            pruned_rule_ids = self.original_bmp.pruning_phase()
+            if self.logger and pruned_rule_ids:
+                self.logger.log(f"✂️ 剪枝阶段移除{len(pruned_rule_ids)}个规律")
+        except Exception as e:
+            if self.logger:
+                self.logger.log(f"⚠️ 剪枝阶段出错: {str(e)}")
+        
+        return new_candidate_rules
+    
     def _convert_to_candidate_rules(self, constraint_rules: List[Dict[str, Any]], 
                                   experience: EOCATR_Tuple) -> List[CandidateRule]:
         """将约束驱动生成的规律转换为CandidateRule格式"""
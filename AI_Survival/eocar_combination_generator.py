@@ -14,11 +14,13 @@ EOCAR组合生成器（EOCAR Combination Generator）
 版本：1.0.0
 """
 
+import math
 import time
 from dataclasses import dataclass, field
 from typing import Dict, List, Any, Optional, Tuple, Set
 from enum import Enum
 from collections import defaultdict, Counter
+from eocatr_lattice import ELEMENT_ORDER, EOCATRLattice, bounded_top_k, itemset_elements
 from scene_symbolization_mechanism import (
     EOCATR_Tuple, SymbolicEnvironment, SymbolicObjectCategory, 
     SymbolicAction, SymbolicCharacteristics, SymbolicResult, SymbolicTool
@@ -69,6 +71,11 @@ class CombinationType(Enum):
     E_O_C_A_T_R = "full_eocatr_result"            # 完整EOCATR->结果
 
 
+# 违反C₂/C₃约束的单元素规律类型（条件至少包含两个元素）
+FORBIDDEN_COMBINATION_TYPES = {CombinationType.E_R, CombinationType.O_R, CombinationType.C_R,
+                               CombinationType.A_R, CombinationType.T_R}
+
+
 @dataclass
 class CandidateRule:
     """候选规律数据类"""
@@ -114,10 +121,17 @@ class CandidateRule:
     
     def calculate_quality_score(self) -> float:
         """计算规律质量综合得分"""
-        base_score = self.confidence * 0.4
-        support_score = self.get_support_ratio() * 0.3
-        validation_score = self.get_success_rate() * 0.2
-        generalization_score = min(self.generalization_score, 1.0) * 0.1
+        return self.quality_score(self.confidence, self.get_support_ratio(),
+                                  self.get_success_rate(), self.generalization_score)
+    
+    @staticmethod
+    def quality_score(confidence: float, support_ratio: float, success_rate: float,
+                      generalization_score: float) -> float:
+        """质量得分公式（格枚举在实例化规律之前用它给项集打分）"""
+        base_score = confidence * 0.4
+        support_score = support_ratio * 0.3
+        validation_score = success_rate * 0.2
+        generalization_score = min(generalization_score, 1.0) * 0.1
         
         return base_score + support_score + validation_score + generalization_score
 
@@ -324,18 +338,32 @@ class AttributeExtractor:
 class EOCARCombinationGenerator:
     """EOCAR组合生成器主类"""
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, config: Optional[Dict[str, Any]] = None):
         self.logger = logger
         self.attribute_extractor = AttributeExtractor()
         self.generated_rules: List[CandidateRule] = []
         self.rule_counter = 0
+        self.config = self._default_config()
+        self.config.update(config or {})
         
         # 统计信息
         self.generation_stats = {
             'total_rules_generated': 0,
             'rules_by_combination_type': defaultdict(int),
             'rules_by_abstraction_level': defaultdict(int),
-            'generation_time_ms': 0.0
+            'generation_time_ms': 0.0,
+            'lattice_itemsets_counted': 0,
+            'lattice_itemsets_pruned': 0
+        }
+    
+    def _default_config(self) -> Dict[str, Any]:
+        """默认配置"""
+        return {
+            'max_rules': 50,                        # 每次最多返回的规律数
+            'lattice_enumeration': False,           # 用项集格枚举代替逐组合类型的手写生成方法
+            'lattice_min_support_ratio': 0.1,       # 项集至少被批次中这一比例的经验支持(至少 1 条)
+            'lattice_max_attributes_per_element': 2,  # 每个元素参与组合的属性数，与原方法的 [:2] 一致
+            'lattice_max_elements': 5               # 条件中最多包含的元素数
         }
     
     def generate_candidate_rules(self, eocar_experiences: List[EOCATR_Tuple]) -> List[CandidateRule]:
@@ -353,6 +381,15 @@ class EOCARCombinationGenerator:
         if not eocar_experiences:
             return []
         
+        if self.config.get('lattice_enumeration', False):
+            filtered_rules = self._generate_rules_from_lattice(eocar_experiences)
+            generation_time = (time.time() - start_time) * 1000
+            self.generation_stats['generation_time_ms'] = generation_time
+            self.generation_stats['total_rules_generated'] += len(filtered_rules)
+            if self.logger:
+                self.logger.log(f"项集格从{len(eocar_experiences)}个EOCATR经验生成了{len(filtered_rules)}个候选规律")
+            return filtered_rules
+        
         all_candidate_rules = []
         
         # 🔧 优先处理工具使用经验，增强工具规律权重
@@ -436,8 +473,7 @@ class EOCARCombinationGenerator:
         tool_attrs = self.attribute_extractor.extract_tool_attributes(experience.tool)
         
         # 🔧 生成符合约束的组合类型规律（排除违反C₂/C₃约束的两元规律）
-        forbidden_types = {CombinationType.E_R, CombinationType.O_R, CombinationType.C_R, 
-                          CombinationType.A_R, CombinationType.T_R}
+        forbidden_types = FORBIDDEN_COMBINATION_TYPES
         
         # 🔧 定义工具相关的组合类型（优先处理）
         tool_related_types = {
@@ -1410,18 +1446,128 @@ class EOCARCombinationGenerator:
         
         return rules
     
-    def _create_candidate_rule(self, combination_type: CombinationType, condition_elements: List[str],
-                              condition_text: str, expected_result: Dict[str, Any], 
-                                                             source_experience: EOCATR_Tuple, abstraction_level: int = 0) -> CandidateRule:
-        """创建候选规律"""
-        self.rule_counter += 1
+    def _lattice_items(self, experience: EOCATR_Tuple) -> Dict[str, List[Tuple[str, str, str, int]]]:
+        """经验在各元素上的项：具体内容(抽象层次0) + 属性泛化(抽象层次1)，条件元素和文本与手写生成方法一致"""
+        limit = self.config.get('lattice_max_attributes_per_element', 2)
+        extractor = self.attribute_extractor
+        items = {element: [] for element in ELEMENT_ORDER}
+        
+        env = experience.environment
+        if env is not None:
+            items['E'].append(('E', f"环境={env.content}", f"在{env.content}环境中", 0))
+        for attr in extractor.extract_environment_attributes(env)[:limit]:
+            items['E'].append(('E', f"环境属性={attr}", f"在{attr}中", 1))
+        
+        obj = experience.object
+        if obj is not None:
+            items['O'].append(('O', f"对象={obj.content}", f"遇到{obj.content}", 0))
+        # 对象属性经过 set 去重，排序后截取保证结果稳定
+        obj_attrs = sorted(extractor.extract_object_attributes(experience.object_category, experience.characteristics))
+        for attr in obj_attrs[:limit]:
+            items['O'].append(('O', f"对象属性={attr}", f"遇到{attr}", 1))
+        
+        for attr in extractor.extract_characteristics_attributes(experience.characteristics)[:limit]:
+            items['C'].append(('C', f"特征={attr}", f"面对{attr}时", 1))
+        
+        action = experience.action
+        if action is not None:
+            items['A'].append(('A', f"动作={action.content}", f"执行{action.content}", 0))
+        for attr in extractor.extract_action_attributes(action)[:limit]:
+            items['A'].append(('A', f"动作属性={attr}", f"执行{attr}", 1))
+        
+        tool = experience.tool
+        if tool is None:
+            items['T'].append(('T', "工具=无工具", "不使用工具时", 0))
+        else:
+            items['T'].append(('T', f"工具={tool.content}", f"使用{tool.content}工具", 0))
+        for attr in extractor.extract_tool_attributes(tool)[:limit]:
+            items['T'].append(('T', f"工具属性={attr}", f"使用{attr}", 1))
+        
+        return items
+    
+    def _generate_rules_from_lattice(self, experiences: List[EOCATR_Tuple]) -> List[CandidateRule]:
+        """
+        在整批经验的条件项集格上逐层展开，支持度不足的项集连同其超集一起剪掉，
+        符合约束的项集先按质量得分进入有界堆，只有最终入选的 max_rules 个项集实例化为规律
+        """
+        transactions = [self._lattice_items(experience) for experience in experiences]
+        results = [self._summarize_result(experience.result) for experience in experiences]
+        tool_usage = [self._is_tool_usage_experience(experience) for experience in experiences]
+        min_support = max(1, math.ceil(self.config.get('lattice_min_support_ratio', 0.1) * len(experiences)))
+        lattice = EOCATRLattice(transactions, min_support, self.config.get('lattice_max_elements', len(ELEMENT_ORDER)))
+        
+        scored = (entry for level in lattice.levels()
+                  for entry in self._score_lattice_level(level, results, tool_usage))
+        top = bounded_top_k(scored, self.config.get('max_rules', 50))
         
+        self.generation_stats['lattice_itemsets_counted'] += lattice.stats['counted']
+        self.generation_stats['lattice_itemsets_pruned'] += lattice.stats['pruned']
+        
+        rules = []
+        for _, (itemset, combination_type, supporting, contradict_count, abstraction_level,
+                confidence, generalization_score) in top:
+            rule = self._create_candidate_rule(
+                combination_type,
+                [item[1] for item in itemset],
+                "，".join(item[2] for item in itemset),
+                results[supporting[0]],
+                experiences[supporting[0]],
+                abstraction_level=abstraction_level
+            )
+            rule.source_experiences = [experiences[tid].tuple_id for tid in supporting]
+            rule.support_count = len(supporting)
+            rule.contradict_count = contradict_count
+            rule.confidence = confidence
+            rule.generalization_score = generalization_score
+            self.generation_stats['rules_by_combination_type'][combination_type.value] += 1
+            rules.append(rule)
+        return rules
+    
+    def _score_lattice_level(self, level, results: List[Dict[str, Any]], tool_usage: List[bool]):
+        """为一层频繁项集打分，产出 (质量得分, 规律参数)；结果取支持经验中最多的一种，其余计为矛盾"""
+        for itemset, tids in level.items():
+            combination_type = CombinationType["_".join(itemset_elements(itemset)) + "_R"]
+            if combination_type in FORBIDDEN_COMBINATION_TYPES:
+                continue
+            
+            ordered = sorted(tids)
+            outcome = lambda tid: (results[tid].get('content'), results[tid].get('success'))
+            majority = Counter(outcome(tid) for tid in ordered).most_common(1)[0][0]
+            supporting = [tid for tid in ordered if outcome(tid) == majority]
+            contradict_count = len(ordered) - len(supporting)
+            
+            abstraction_level = min(2, sum(item[3] for item in itemset))
+            confidence, generalization_score = self._initial_scores(abstraction_level)
+            # 与逐组合生成相同的工具加成：工具相关组合 +0.1/+0.2，工具使用经验 +0.15/+0.25
+            if 'T' in itemset_elements(itemset):
+                confidence += 0.1
+                generalization_score += 0.2
+            if any(tool_usage[tid] for tid in supporting):
+                confidence += 0.15
+                generalization_score += 0.25
+            
+            score = CandidateRule.quality_score(confidence, len(supporting) / len(ordered), 0.0, generalization_score)
+            yield score, (itemset, combination_type, supporting, contradict_count, abstraction_level,
+                          confidence, generalization_score)
+    
+    def _initial_scores(self, abstraction_level: int) -> Tuple[float, float]:
+        """初始置信度和泛化得分"""
         # 计算初始置信度（基于抽象层次）
         base_confidence = 0.8 if abstraction_level == 0 else 0.6 if abstraction_level == 1 else 0.4
         
         # 计算泛化得分（抽象层次越高，泛化得分越高）
         generalization_score = abstraction_level * 0.3
         
+        return base_confidence, generalization_score
+    
+    def _create_candidate_rule(self, combination_type: CombinationType, condition_elements: List[str],
+                              condition_text: str, expected_result: Dict[str, Any], 
+                                                             source_experience: EOCATR_Tuple, abstraction_level: int = 0) -> CandidateRule:
+        """创建候选规律"""
+        self.rule_counter += 1
+        
+        base_confidence, generalization_score = self._initial_scores(abstraction_level)
+        
         rule = CandidateRule(
             rule_id=f"rule_{self.rule_counter}_{combination_type.value}",
             combination_type=combination_type,
@@ -1482,7 +1628,7 @@ class EOCARCombinationGenerator:
         unique_rules.sort(key=lambda r: r.calculate_quality_score(), reverse=True)
         
         # 限制数量以控制计算复杂度
-        max_rules = 50  # 每次最多返回50个规律
+        max_rules = self.config.get('max_rules', 50)  # 每次最多返回50个规律
         return unique_rules[:max_rules]
     
     def get_statistics(self) -> Dict[str, Any]:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+eocatr_lattice.py
+EOCATR 条件项集格(lattice)枚举
+
+EOCARCombinationGenerator 原先对每条经验遍历全部 CombinationType，每种组合由一个手写的
+_generate_*_r_rules 方法展开，所有规律先全部实例化，再由 _filter_and_deduplicate_rules 排序截断到 50 条，
+绝大多数生成的规律被直接丢弃。这里把组合统一看成项集：
+
+    项      (元素, 条件元素, 条件文本片段, 抽象层次)，如 ("E", "环境=森林", "在森林环境中", 0)
+    事务    一条经验在 E/O/C/A/T 各元素上的全部项
+    项集    每个元素至多取一个项的组合，元素集合对应 CombinationType(E+O -> E_O_R)
+
+按 Apriori 逐层展开：第 k 层候选由两个只在最后一项不同的 k-1 项集连接得到，
+任一 k-1 子集不频繁即剪掉；支持度用事务编号集合求交得到，低于 min_support 的项集及其全部超集不再展开。
+levels() 是生成器，调用方按层消费，bounded_top_k 用有界堆只保留得分最高的 k 条。
+"""
+
+import heapq
+import itertools
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Sequence, Tuple
+
+ELEMENT_ORDER = ("E", "O", "C", "A", "T")
+
+Item = Tuple[str, str, str, int]          # (元素, 条件元素, 条件文本片段, 抽象层次)
+Itemset = Tuple[Item, ...]                # 按 ELEMENT_ORDER 排序，每个元素至多一项
+
+
+def itemset_elements(itemset: Itemset) -> Tuple[str, ...]:
+    """项集涉及的元素，如 ("E", "O")"""
+    return tuple(item[0] for item in itemset)
+
+
+class EOCATRLattice:
+    """一批经验上的条件项集格，按层惰性展开并做支持度剪枝"""
+
+    def __init__(self, transactions: Sequence[Dict[str, List[Item]]], min_support: int = 1,
+                 max_elements: int = len(ELEMENT_ORDER)):
+        self.transactions = transactions
+        self.min_support = max(1, min_support)
+        self.max_elements = max_elements
+        self.stats = {"levels": 0, "counted": 0, "pruned": 0}
+
+    def _frequent_items(self) -> Dict[Itemset, FrozenSet[int]]:
+        tids: Dict[Item, set] = {}
+        for tid, transaction in enumerate(self.transactions):
+            for element in ELEMENT_ORDER:
+                for item in transaction.get(element, ()):
+                    tids.setdefault(item, set()).add(tid)
+        return self._keep_frequent({(item,): frozenset(ids) for item, ids in tids.items()})
+
+    def _keep_frequent(self, counted: Dict[Itemset, FrozenSet[int]]) -> Dict[Itemset, FrozenSet[int]]:
+        self.stats["counted"] += len(counted)
+        frequent = {itemset: ids for itemset, ids in counted.items() if len(ids) >= self.min_support}
+        self.stats["pruned"] += len(counted) - len(frequent)
+        return frequent
+
+    def _next_level(self, level: Dict[Itemset, FrozenSet[int]]) -> Dict[Itemset, FrozenSet[int]]:
+        # 按前 k-2 项分组，组内两两连接；最后一项的元素必须不同且保持 ELEMENT_ORDER 顺序
+        groups: Dict[Itemset, List[Itemset]] = {}
+        for itemset in level:
+            groups.setdefault(itemset[:-1], []).append(itemset)
+        rank = {element: i for i, element in enumerate(ELEMENT_ORDER)}
+        counted = {}
+        for members in groups.values():
+            for left, right in itertools.combinations(members, 2):
+                if rank[left[-1][0]] > rank[right[-1][0]]:
+                    left, right = right, left
+                if left[-1][0] == right[-1][0]:
+                    continue
+                candidate = left + right[-1:]
+                if any(candidate[:i] + candidate[i + 1:] not in level for i in range(len(candidate) - 2)):
+                    continue  # 有不频繁的子集
+                counted[candidate] = level[left] & level[right]
+        return self._keep_frequent(counted)
+
+    def levels(self) -> Iterator[Dict[Itemset, FrozenSet[int]]]:
+        """逐层产出频繁项集 -> 支持该项集的事务编号集合，从单元素项集开始"""
+        level = self._frequent_items()
+        size = 1
+        while level and size <= self.max_elements:
+            self.stats["levels"] += 1
+            yield level
+            if size == self.max_elements:
+                break
+            level = self._next_level(level)
+            size += 1
+
+
+def bounded_top_k(entries: Iterable[Tuple[float, Any]], k: int) -> List[Tuple[float, Any]]:
+    """有界堆保留得分最高的 k 条，按得分降序返回；得分相同时先到者优先"""
+    heap: List[Tuple[float, int, Any]] = []
+    for seq, (score, payload) in enumerate(entries):
+        entry = (score, -seq, payload)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [(score, payload) for score, _, payload in sorted(heap, key=lambda e: e[:2], reverse=True)]
@@ -0,0 +1,451 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+experience_contingency.py
+总经验库的条件 → 结果列联计数表，供 CN1/CN2 规律生成使用
+
+generate_candidate_rules_from_experiences 原先每次都读出全部高质量经验，
+再由 _generate_cn1_rules / _generate_cn2_rules 从头统计各条件取值下的结果分布，
+耗时随经验历史增长。这里在 total_experiences.db 中维护两张充分统计量表：
+
+    experience_contingency               (条件组合, 条件取值, result, 出现档位, 置信度)
+                                         -> 出现次数、成功次数、经验条数、最早发现/最近出现时间
+    experience_contingency_discoverers   (条件组合, 条件取值, 发现者) -> 该发现者经验的最高档位和置信度
+
+计数表不在写入经验时维护(写入路径不再为每次总库写入执行十几条 UPSERT)，写入时只由
+total_experiences / experience_discoverers 上的触发器把变化的 content_hash 登记到 experience_contingency_dirty。
+experience_contingency_rows 保存每条经验上次计入时的取值和计数，refresh 在规律生成前只按登记的
+content_hash 把变化的经验合并进这张表(从总库删除的经验从这张表删除)，再清空登记表；
+这张表上的触发器把变化的经验从旧计数格减去、加入新计数格。refresh 的开销与两次规律生成之间变化的经验数成正比，
+不扫描总库。两次规律生成之间同一条经验的多次合并只计入一次；变化的经验超过已计入经验数
+(记在 experience_contingency_state)的 REBUILD_FRACTION 时(包括新建和旧版本数据库首次打开)直接全量分组统计。
+出现档位 = MIN(occurrence_count, MAX_LEVEL)，规律生成时的 occurrence_count >= min_support
+和 confidence >= min_confidence 过滤在计数表上按档位完成，只扫描计数表。
+min_support 大于 MAX_LEVEL 时档位无法区分，改为直接在 total_experiences 上分组统计(结果相同)。
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+# CN1：单条件字段；CN2：多条件字段组合(与原 _generate_cn1_rules / _generate_cn2_rules 相同)
+CN1_FIELDS = ['environment', 'object', 'characteristics', 'action', 'tools']
+CN2_COMBINATIONS = [
+    ['environment', 'object'],
+    ['environment', 'action'],
+    ['object', 'action'],
+    ['action', 'tools'],
+    ['environment', 'object', 'action'],
+    ['object', 'characteristics', 'action'],
+    ['environment', 'action', 'tools']
+]
+COMBINATIONS = [[field] for field in CN1_FIELDS] + CN2_COMBINATIONS
+
+MAX_LEVEL = 10  # 出现 10 次及以上的经验归入同一档
+REBUILD_FRACTION = 0.25
+
+ROWS_TABLE = "experience_contingency_rows"  # 已计入计数表的经验
+DIRTY_TABLE = "experience_contingency_dirty"  # 上次 refresh 之后变化的经验
+ROW_COLUMNS = CN1_FIELDS + ['result', 'occurrence_count', 'success_count', 'confidence',
+                            'first_discovered_time', 'last_seen_time']
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS experience_contingency (
+        combo TEXT NOT NULL,              -- 条件字段，以 + 连接
+        condition_values TEXT NOT NULL,   -- 条件取值的 JSON 数组
+        result TEXT NOT NULL,
+        level INTEGER NOT NULL,           -- MIN(occurrence_count, MAX_LEVEL)
+        confidence REAL NOT NULL,
+        occurrence_count INTEGER NOT NULL,
+        success_count INTEGER NOT NULL,
+        experiences INTEGER NOT NULL,
+        first_discovered_time REAL,
+        last_seen_time REAL,
+        PRIMARY KEY (combo, condition_values, result, level, confidence)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS experience_contingency_discoverers (
+        combo TEXT NOT NULL,
+        condition_values TEXT NOT NULL,
+        player_id TEXT NOT NULL,
+        level INTEGER NOT NULL,
+        confidence REAL NOT NULL,
+        PRIMARY KEY (combo, condition_values, player_id)
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {ROWS_TABLE} (
+        content_hash TEXT PRIMARY KEY,
+        environment TEXT,
+        object TEXT,
+        characteristics TEXT,
+        action TEXT,
+        tools TEXT,
+        result TEXT,
+        occurrence_count INTEGER,
+        success_count INTEGER,
+        confidence REAL,
+        first_discovered_time REAL,
+        last_seen_time REAL
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {DIRTY_TABLE} (
+        content_hash TEXT PRIMARY KEY
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS experience_contingency_state (
+        counted INTEGER  -- 已计入的经验条数；NULL 表示需要全量统计
+    )
+    """,
+]
+
+
+def combo_name(fields: List[str]) -> str:
+    return '+'.join(fields)
+
+
+def _level(row: str) -> str:
+    return f"MIN({row}.occurrence_count, {MAX_LEVEL})"
+
+
+def _confidence(row: str) -> str:
+    return f"COALESCE({row}.confidence, 0)"
+
+
+def _values(row: str, fields: List[str]) -> str:
+    return f"json_array({', '.join(f'{row}.{field}' for field in fields)})"
+
+
+def _keys(row: str, columns: str = "", source: str = "") -> str:
+    """每个条件组合一行 (combo, condition_values[, columns]) 的 UNION ALL 查询"""
+    return " UNION ALL ".join(
+        f"SELECT '{combo_name(fields)}' AS combo, {_values(row, fields)} AS condition_values{columns} {source}"
+        for fields in COMBINATIONS)
+
+
+def _add_counts(row: str) -> str:
+    # 每个条件组合一条按主键的 UPSERT
+    return "".join(f"""
+        INSERT INTO experience_contingency
+        (combo, condition_values, result, level, confidence, occurrence_count, success_count, experiences,
+         first_discovered_time, last_seen_time)
+        VALUES ('{combo_name(fields)}', {_values(row, fields)}, {row}.result, {_level(row)}, {_confidence(row)},
+                {row}.occurrence_count, {row}.success_count, 1, {row}.first_discovered_time, {row}.last_seen_time)
+        ON CONFLICT (combo, condition_values, result, level, confidence) DO UPDATE SET
+            occurrence_count = occurrence_count + excluded.occurrence_count,
+            success_count = success_count + excluded.success_count,
+            experiences = experiences + 1,
+            first_discovered_time = MIN(first_discovered_time, excluded.first_discovered_time),
+            last_seen_time = MAX(last_seen_time, excluded.last_seen_time);""" for fields in COMBINATIONS)
+
+
+def _remove_counts(row: str) -> str:
+    statements = []
+    for fields in COMBINATIONS:
+        cell = (f"combo = '{combo_name(fields)}' AND condition_values = {_values(row, fields)} "
+                f"AND result = {row}.result AND level = {_level(row)} AND confidence = {_confidence(row)}")
+        statements.append(f"""
+        UPDATE experience_contingency
+        SET occurrence_count = occurrence_count - {row}.occurrence_count,
+            success_count = success_count - {row}.success_count,
+            experiences = experiences - 1
+        WHERE {cell};
+        DELETE FROM experience_contingency WHERE {cell} AND experiences <= 0;""")
+    return "".join(statements)
+
+
+def _update_counts() -> str:
+    # 经验仍在原来的计数格(取值、档位、置信度都没变)：直接加上增量
+    return "".join(f"""
+        UPDATE experience_contingency
+        SET occurrence_count = occurrence_count + NEW.occurrence_count - OLD.occurrence_count,
+            success_count = success_count + NEW.success_count - OLD.success_count,
+            first_discovered_time = MIN(first_discovered_time, NEW.first_discovered_time),
+            last_seen_time = MAX(last_seen_time, NEW.last_seen_time)
+        WHERE combo = '{combo_name(fields)}' AND condition_values = {_values('NEW', fields)}
+          AND result = NEW.result AND level = {_level('NEW')} AND confidence = {_confidence('NEW')};"""
+                   for fields in COMBINATIONS)
+
+
+# 更新前后在同一计数格
+_SAME_CELL = " AND ".join([f"NEW.{field} IS OLD.{field}" for field in CN1_FIELDS + ['result']] +
+                          [f"{_level('NEW')} = {_level('OLD')}", f"{_confidence('NEW')} = {_confidence('OLD')}"])
+
+_DISCOVERERS_UPSERT = """
+        ON CONFLICT (combo, condition_values, player_id) DO UPDATE SET
+            level = MAX(level, excluded.level),
+            confidence = MAX(confidence, excluded.confidence);
+"""
+
+
+# 登记的经验的发现者(新的发现者、升档的经验)，按最高档位和置信度合并；
+# CROSS JOIN 固定从登记表开始连接，不扫描整张 experience_discoverers
+_DIRTY_DISCOVERERS = f"""
+    INSERT INTO experience_contingency_discoverers (combo, condition_values, player_id, level, confidence)
+    SELECT k.combo, k.condition_values, k.player_id, k.level, k.confidence
+    FROM ({_keys('e', f", d.player_id AS player_id, {_level('e')} AS level, {_confidence('e')} AS confidence",
+                 f"FROM {DIRTY_TABLE} AS q CROSS JOIN {ROWS_TABLE} AS e ON e.content_hash = q.content_hash "
+                 f"CROSS JOIN experience_discoverers AS d ON d.content_hash = q.content_hash")}) AS k
+    WHERE true
+    {_DISCOVERERS_UPSERT}
+"""
+
+
+def _rebuild_discoverers(row: str) -> str:
+    """删除经验后重新统计受影响的条件取值的发现者(发现者的最高档位不能做减法)"""
+    rebuild = " UNION ALL ".join(
+        f"SELECT '{combo_name(fields)}', {_values('e', fields)}, d.player_id, "
+        f"MAX({_level('e')}), MAX({_confidence('e')}) "
+        f"FROM {ROWS_TABLE} AS e JOIN experience_discoverers AS d ON d.content_hash = e.content_hash "
+        f"WHERE {' AND '.join(f'e.{field} = {row}.{field}' for field in fields)} "
+        f"GROUP BY d.player_id"
+        for fields in COMBINATIONS)
+    return f"""
+        DELETE FROM experience_contingency_discoverers
+        WHERE (combo, condition_values) IN ({_keys(row)});
+        INSERT OR IGNORE INTO experience_contingency_discoverers (combo, condition_values, player_id, level, confidence)
+        {rebuild};
+    """
+
+
+# 旧版本在 total_experiences / experience_discoverers 上维护计数表的触发器
+OLD_TRIGGERS = ['trg_contingency_insert', 'trg_contingency_update', 'trg_contingency_move',
+                'trg_contingency_delete', 'trg_contingency_discoverer']
+
+TRIGGER_NAMES = ['trg_contingency_rows_insert', 'trg_contingency_rows_update', 'trg_contingency_rows_move',
+                 'trg_contingency_rows_delete']
+
+
+def _mark_dirty(row: str) -> str:
+    # 不用 INSERT OR IGNORE：触发器内语句的冲突处理会被外层语句(UPSERT 等)的冲突处理取代
+    return (f"INSERT INTO {DIRTY_TABLE} (content_hash) SELECT {row}.content_hash "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {DIRTY_TABLE} WHERE content_hash = {row}.content_hash);")
+
+
+# 写入路径上只登记变化的 content_hash(content_hash 是经验的标识，不会被更新)
+DIRTY_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_dirty_{event.lower()} AFTER {event} ON {table}
+    BEGIN
+        {_mark_dirty(row)}
+    END
+    """
+    for table, event, row in (('total_experiences', 'INSERT', 'NEW'), ('total_experiences', 'UPDATE', 'NEW'),
+                              ('total_experiences', 'DELETE', 'OLD'))
+] + [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_dirty_discoverer AFTER INSERT ON experience_discoverers
+    BEGIN
+        {_mark_dirty('NEW')}
+    END
+    """
+]
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_rows_insert AFTER INSERT ON {ROWS_TABLE}
+    BEGIN
+        {_add_counts('NEW')}
+    END
+    """,
+    # 仍在原来的计数格：加上增量
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_rows_update
+    AFTER UPDATE OF occurrence_count, success_count, first_discovered_time, last_seen_time ON {ROWS_TABLE}
+    WHEN {_SAME_CELL}
+    BEGIN
+        {_update_counts()}
+    END
+    """,
+    # 换到了另一个计数格(出现次数跨档、置信度或取值改变)：从旧格减去、加入新格
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_rows_move
+    AFTER UPDATE OF {', '.join(CN1_FIELDS)}, result, occurrence_count, confidence ON {ROWS_TABLE}
+    WHEN NOT ({_SAME_CELL})
+    BEGIN
+        {_remove_counts('OLD')}
+        {_add_counts('NEW')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_contingency_rows_delete AFTER DELETE ON {ROWS_TABLE}
+    BEGIN
+        {_remove_counts('OLD')}
+        {_rebuild_discoverers('OLD')}
+    END
+    """,
+]
+
+_COLUMNS = ', '.join(ROW_COLUMNS)
+
+# 把登记的经验合并进 ROWS_TABLE(取值或计数没有变化时不更新)
+_ROWS_UPSERT = f"""
+    INSERT INTO {ROWS_TABLE} (content_hash, {_COLUMNS})
+    SELECT t.content_hash, {', '.join(f't.{column}' for column in ROW_COLUMNS)}
+    FROM {DIRTY_TABLE} AS q JOIN total_experiences AS t ON t.content_hash = q.content_hash
+    WHERE true
+    ON CONFLICT(content_hash) DO UPDATE SET
+        {', '.join(f'{column} = excluded.{column}' for column in ROW_COLUMNS)}
+    WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in ROW_COLUMNS)}
+"""
+
+# 登记的经验中尚未计入的(新经验)、已从总库删除的
+_DIRTY_SUMMARY = f"""
+    SELECT COALESCE(SUM(k.live AND NOT k.counted), 0), COALESCE(SUM(NOT k.live), 0) FROM (
+        SELECT EXISTS (SELECT 1 FROM total_experiences AS t WHERE t.content_hash = q.content_hash) AS live,
+               EXISTS (SELECT 1 FROM {ROWS_TABLE} AS e WHERE e.content_hash = q.content_hash) AS counted
+        FROM {DIRTY_TABLE} AS q) AS k
+"""
+_DELETE_ROWS = f"""
+    DELETE FROM {ROWS_TABLE} WHERE content_hash IN (
+        SELECT q.content_hash FROM {DIRTY_TABLE} AS q
+        WHERE NOT EXISTS (SELECT 1 FROM total_experiences AS t WHERE t.content_hash = q.content_hash))
+"""
+
+
+def _grouped_counts(where: str) -> str:
+    """直接在 total_experiences 上按条件组合分组统计(回填和 min_support > MAX_LEVEL 时使用)"""
+    return " UNION ALL ".join(
+        f"SELECT '{combo_name(fields)}' AS combo, "
+        f"{_values('e', fields)} AS condition_values, e.result, "
+        f"{_level('e')} AS level, {_confidence('e')} AS confidence, "
+        f"SUM(e.occurrence_count) AS occurrence_count, SUM(e.success_count) AS success_count, "
+        f"COUNT(*) AS experiences, MIN(e.first_discovered_time) AS first_discovered_time, "
+        f"MAX(e.last_seen_time) AS last_seen_time "
+        f"FROM total_experiences AS e {where} GROUP BY 2, 3, 4, 5"
+        for fields in COMBINATIONS)
+
+
+def _grouped_discoverers(where: str) -> str:
+    return " UNION ALL ".join(
+        f"SELECT '{combo_name(fields)}' AS combo, "
+        f"{_values('e', fields)} AS condition_values, d.player_id, "
+        f"MAX({_level('e')}) AS level, MAX({_confidence('e')}) AS confidence "
+        f"FROM total_experiences AS e JOIN experience_discoverers AS d ON d.content_hash = e.content_hash "
+        f"{where} GROUP BY 2, 3"
+        for fields in COMBINATIONS)
+
+
+def create(conn):
+    """创建计数表和登记触发器(删除旧版本的触发器和状态表)；新建时记为需要全量统计，由 refresh 在规律生成前完成"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(experience_contingency_state)")]
+    with conn:
+        for name in OLD_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        if columns and 'counted' not in columns:
+            conn.execute("DROP TABLE experience_contingency_state")  # 旧版本按 updated_time 水位线刷新
+            columns = []
+        for sql in TABLES + TRIGGERS + DIRTY_TRIGGERS:
+            conn.execute(sql)
+        if not columns:
+            conn.execute("INSERT INTO experience_contingency_state (counted) VALUES (NULL)")
+
+
+def _rebuild(conn) -> int:
+    """全量分组统计(不经过 ROWS_TABLE 上的触发器)，返回计入的经验条数"""
+    for name in TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for table in ("experience_contingency", "experience_contingency_discoverers", ROWS_TABLE, DIRTY_TABLE):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(f"INSERT INTO experience_contingency {_grouped_counts('')}")
+    conn.execute(f"INSERT INTO experience_contingency_discoverers {_grouped_discoverers('')}")
+    counted = conn.execute(f"INSERT INTO {ROWS_TABLE} (content_hash, {_COLUMNS}) "
+                           f"SELECT content_hash, {_COLUMNS} FROM total_experiences").rowcount
+    for sql in TRIGGERS:
+        conn.execute(sql)
+    return counted
+
+
+def refresh(conn) -> int:
+    """把上次 refresh 之后写入、合并或删除的经验计入计数表，返回计入的经验条数"""
+    with conn:
+        # 先写状态表取得写锁：此后其他连接的写入(及其登记)要等本次 refresh 提交后才能提交
+        conn.execute("UPDATE experience_contingency_state SET counted = counted")
+        counted = conn.execute("SELECT counted FROM experience_contingency_state").fetchone()[0]
+        dirty = conn.execute(f"SELECT COUNT(*) FROM {DIRTY_TABLE}").fetchone()[0]
+        if counted is None or dirty > max(counted, 1) * REBUILD_FRACTION:
+            refreshed = counted = _rebuild(conn)
+        elif dirty:
+            added, gone = conn.execute(_DIRTY_SUMMARY).fetchone()
+            refreshed = conn.execute(_ROWS_UPSERT).rowcount
+            deleted = conn.execute(_DELETE_ROWS).rowcount if gone else 0
+            conn.execute(_DIRTY_DISCOVERERS)
+            conn.execute(f"DELETE FROM {DIRTY_TABLE}")
+            refreshed += deleted
+            counted += added - deleted
+        else:
+            refreshed = 0
+        conn.execute("UPDATE experience_contingency_state SET counted = ?", (counted,))
+    return refreshed
+
+
+def _combine(func, a, b):
+    return b if a is None else a if b is None else func(a, b)
+
+
+def condition_statistics(query: Callable[[str, tuple], list], min_support: int,
+                         min_confidence: float) -> Dict[Tuple[str, ...], Dict[Tuple, Dict[str, Any]]]:
+    """
+    occurrence_count >= min_support 且 confidence >= min_confidence 的经验在各条件组合下的统计：
+    {条件字段元组: {条件取值元组: {'total_count', 'success_count', 'results': {result: 出现次数},
+                                  'supporting_experiences', 'first_discovered_time', 'last_seen_time',
+                                  'discoverers'}}}
+    条件取值按总出现次数从多到少排列。query(sql, params) 执行查询并返回行(DatabaseManager.execute_query)；
+    调用前先用 refresh 计入新的经验。
+    """
+    if min_support <= MAX_LEVEL:
+        params = (min_support, min_confidence)
+        counts = query("""
+            SELECT combo, condition_values, result, SUM(occurrence_count) AS occurrence_count,
+                   SUM(success_count) AS success_count, SUM(experiences) AS experiences,
+                   MIN(first_discovered_time) AS first_discovered_time, MAX(last_seen_time) AS last_seen_time
+            FROM experience_contingency WHERE level >= ? AND confidence >= ?
+            GROUP BY combo, condition_values, result
+        """, params)
+        discoverers = query("""
+            SELECT combo, condition_values, player_id FROM experience_contingency_discoverers
+            WHERE level >= ? AND confidence >= ?
+        """, params)
+    else:
+        where = f"WHERE e.occurrence_count >= ? AND {_confidence('e')} >= ?"
+        counts = query(f"""
+            SELECT combo, condition_values, result, SUM(occurrence_count) AS occurrence_count,
+                   SUM(success_count) AS success_count, SUM(experiences) AS experiences,
+                   MIN(first_discovered_time) AS first_discovered_time, MAX(last_seen_time) AS last_seen_time
+            FROM ({_grouped_counts(where)}) GROUP BY combo, condition_values, result
+        """, (min_support, min_confidence) * len(COMBINATIONS))
+        discoverers = query(_grouped_discoverers(where), (min_support, min_confidence) * len(COMBINATIONS))
+
+    statistics: Dict[Tuple[str, ...], Dict[Tuple, Dict[str, Any]]] = {tuple(f): {} for f in COMBINATIONS}
+    for row in counts:
+        cells = statistics[tuple(row['combo'].split('+'))]
+        values = tuple(json.loads(row['condition_values']))
+        stats = cells.get(values)
+        if stats is None:
+            stats = cells[values] = {
+                'total_count': 0,
+                'success_count': 0,
+                'results': {},
+                'supporting_experiences': 0,
+                'first_discovered_time': row['first_discovered_time'],
+                'last_seen_time': row['last_seen_time'],
+                'discoverers': set()
+            }
+        stats['total_count'] += row['occurrence_count']
+        stats['success_count'] += row['success_count']
+        stats['results'][row['result']] = row['occurrence_count']
+        stats['supporting_experiences'] += row['experiences']
+        stats['first_discovered_time'] = _combine(min, stats['first_discovered_time'], row['first_discovered_time'])
+        stats['last_seen_time'] = _combine(max, stats['last_seen_time'], row['last_seen_time'])
+
+    for row in discoverers:
+        stats = statistics[tuple(row['combo'].split('+'))].get(tuple(json.loads(row['condition_values'])))
+        if stats is not None:
+            stats['discoverers'].add(row['player_id'])
+
+    for fields, cells in statistics.items():
+        statistics[fields] = dict(sorted(cells.items(), key=lambda item: (-item[1]['total_count'], item[0])))
+    return statistics
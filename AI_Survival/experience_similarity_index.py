@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+experience_similarity_index.py
+总经验库的 EOCATR 词项倒排索引，用于查找近似重复的经验
+
+FiveLibrarySystem._check_experience_similarity 原先只取同一 action 的前 50 行逐一比较，
+库越大漏掉的相似经验越多。这里在 total_experiences.db 中维护一张倒排表 experience_tokens：
+
+    <字段>=<完整取值>     完整取值相同(字段相似度 1.0)
+    <字段>~<三字符片段>   取值的连续三个字符(取值互相包含时字段相似度 0.7)
+
+长度不少于 3 的取值互相包含时必然共享三字符片段；库中长度不足 3 的取值被查询取值包含时，
+按查询取值的 1~2 字符子串查找 <字段>=<子串>。因此与查询经验在某个字段上相似度大于 0 的经验
+一定共享该字段的某个查询词项(查询取值本身不足 3 个字符时例外，见 search)。
+
+索引不在写入经验时维护：total_experiences 的 id 自增且 EOCATR 字段写入后不再变化，
+catch_up 在查询前按 experience_tokens_state 中记录的最大 id 把新增的经验批量登记，
+同时累计各词项的文档数(experience_token_counts)。
+
+查询时按文档数从少到多探查查询词项(先探查稀有词项，类似前缀过滤)，取回尚未见过的经验、
+用 FiveLibrarySystem 原有的加权公式精确打分。未见过的经验的相似度不超过各字段尚未探查的
+词项得分之和；该上界低于当前第 k 名(或 min_similarity)时停止，不必读取共享常见词项的大量经验。
+"""
+
+from collections import Counter
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+# 字段权重(与 _calculate_experience_similarity 相同)
+FIELD_WEIGHTS = {
+    'environment': 0.2,
+    'object': 0.2,
+    'characteristics': 0.15,
+    'action': 0.25,
+    'tools': 0.1,
+    'result': 0.1
+}
+PARTIAL_MATCH = 0.7  # 取值互相包含时的字段相似度
+GRAM = 3             # 片段长度
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS experience_tokens (
+        token TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (token, content_hash)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS experience_token_counts (
+        token TEXT PRIMARY KEY,
+        experiences INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS experience_tokens_state (
+        last_id INTEGER NOT NULL  -- 已登记词项的最大 total_experiences.id
+    )
+    """,
+]
+
+TOKEN_INSERT = "INSERT OR IGNORE INTO experience_tokens (token, content_hash) VALUES (?, ?)"
+COUNT_UPSERT = """
+    INSERT INTO experience_token_counts (token, experiences) VALUES (?, ?)
+    ON CONFLICT(token) DO UPDATE SET experiences = experiences + excluded.experiences
+"""
+
+_CHUNK = 500  # IN 列表的参数个数上限
+_COLUMNS = ", ".join(['content_hash'] + list(FIELD_WEIGHTS))  # 打分只需要的列
+
+
+def normalize_value(value: Any) -> str:
+    return str(value if value is not None else '').lower().strip()
+
+
+def _grams(value: str) -> List[str]:
+    return list(dict.fromkeys(value[i:i + GRAM] for i in range(len(value) - GRAM + 1)))
+
+
+def experience_tokens(values: Dict[str, Any]) -> List[str]:
+    """一条经验登记的词项"""
+    tokens = []
+    for field in FIELD_WEIGHTS:
+        value = normalize_value(values[field])
+        tokens.append(f"{field}={value}")
+        tokens.extend(f"{field}~{gram}" for gram in _grams(value))
+    return tokens
+
+
+def query_tokens(field: str, value: Any) -> List[Tuple[str, float]]:
+    """查询取值在一个字段上的词项及其能说明的最高字段相似度"""
+    value = normalize_value(value)
+    tokens = {f"{field}={value}": 1.0}
+    for gram in _grams(value):
+        tokens[f"{field}~{gram}"] = PARTIAL_MATCH
+    for length in range(1, GRAM):  # 库中被 value 包含的短取值
+        for i in range(len(value) - length + 1):
+            tokens.setdefault(f"{field}={value[i:i + length]}", PARTIAL_MATCH)
+    return list(tokens.items())
+
+
+def field_similarity(value1: Any, value2: Any) -> float:
+    value1, value2 = normalize_value(value1), normalize_value(value2)
+    if value1 == value2:
+        return 1.0
+    if value1 and value2 and (value1 in value2 or value2 in value1):
+        return PARTIAL_MATCH
+    return 0.0
+
+
+def weighted_similarity(values1: Dict[str, Any], values2) -> float:
+    """按 FIELD_WEIGHTS 加权的字段相似度之和(0.0-1.0)"""
+    return sum(field_similarity(values1.get(field), values2[field]) * weight
+               for field, weight in FIELD_WEIGHTS.items())
+
+
+def create(conn):
+    """创建索引表。旧版本的索引(写入时逐条登记的单词词项，没有 experience_tokens_state)删除后由 catch_up 重建"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'experience_tokens_state'").fetchone()
+    with conn:
+        if not exists:
+            conn.execute("DROP TABLE IF EXISTS experience_tokens")
+            conn.execute("DROP TABLE IF EXISTS experience_token_counts")
+        for sql in TABLES:
+            conn.execute(sql)
+        if not exists:
+            conn.execute("INSERT INTO experience_tokens_state (last_id) VALUES (0)")
+
+
+def catch_up(conn) -> int:
+    """为上次登记之后写入总经验库的经验批量登记词项，返回登记的经验条数"""
+    last_id = conn.execute("SELECT last_id FROM experience_tokens_state").fetchone()[0]
+    fields = ", ".join(FIELD_WEIGHTS)
+    rows = conn.execute(f"SELECT id, content_hash, {fields} FROM total_experiences WHERE id > ? ORDER BY id",
+                        (last_id,)).fetchall()
+    if not rows:
+        return 0
+    token_rows = []
+    counts = Counter()
+    for row in rows:
+        tokens = experience_tokens(dict(zip(FIELD_WEIGHTS, row[2:])))
+        token_rows.extend((token, row[1]) for token in tokens)
+        counts.update(tokens)
+    with conn:
+        conn.executemany(TOKEN_INSERT, token_rows)
+        conn.executemany(COUNT_UPSERT, counts.items())
+        conn.execute("UPDATE experience_tokens_state SET last_id = ?", (rows[-1][0],))
+    return len(rows)
+
+
+def _in_list(count: int) -> str:
+    return ", ".join("?" * count)
+
+
+def _probe_steps(values: Dict[str, Any], counts: Dict[str, int]):
+    """
+    把查询词项分成探查步骤 (代价, 字段, 词项列表, 探查后该字段的剩余得分, 上界下降量)：
+    每个字段先探查完整取值(剩余得分 1.0 -> 0.7)，再探查全部部分匹配词项(0.7 -> 0)。
+    查询取值不足 GRAM 个字符时，包含它的库中取值没有共享词项，该字段的剩余得分保持 0.7。
+    步骤按 代价 / 上界下降量 从小到大排列，同一字段的两步保持先后顺序。
+    """
+    steps = []
+    for field, weight in FIELD_WEIGHTS.items():
+        value = normalize_value(values.get(field))
+        tokens = query_tokens(field, value)
+        floor = PARTIAL_MATCH if 0 < len(value) < GRAM else 0.0
+        exact, partial = tokens[:1], tokens[1:]
+        exact_cost = counts.get(exact[0][0], 0)
+        partial_cost = sum(counts.get(token, 0) for token, _ in partial)
+        after_exact = PARTIAL_MATCH if partial or floor else 0.0
+        exact_step = (exact_cost, field, [exact[0][0]], after_exact)
+        if after_exact > floor:
+            partial_step = (partial_cost, field, [token for token, _ in partial], floor)
+            # 部分匹配步骤比完整取值步骤更划算时两步合并(必须先探查完整取值)
+            if partial_cost / (after_exact - floor) < exact_cost / (1.0 - after_exact):
+                steps.append((exact_cost + partial_cost, field, exact_step[2] + partial_step[2], floor,
+                              weight * (1.0 - floor)))
+                continue
+            steps.append(exact_step + (weight * (1.0 - after_exact),))
+            steps.append(partial_step + (weight * (after_exact - floor),))
+        else:
+            steps.append(exact_step + (weight * (1.0 - after_exact),))
+    order = {field: i for i, field in enumerate(FIELD_WEIGHTS)}
+    steps.sort(key=lambda step: (step[0] / step[4] if step[4] else float('inf'), order[step[1]], -step[3]))
+    return steps
+
+
+def search(query: Callable[[str, tuple], list], values: Dict[str, Any], top_k: int = 10,
+           min_similarity: float = 0.0) -> List[Tuple[float, Any]]:
+    """
+    返回与 values 最相似的至多 top_k 条总经验库记录 [(相似度, 记录)]，相似度从高到低，
+    只包含相似度大于 0 且不低于 min_similarity 的记录。
+    query(sql, params) 执行查询并返回行(DatabaseManager.execute_query)；调用前先用 catch_up 登记新经验。
+    """
+    all_tokens = [token for field in FIELD_WEIGHTS for token, _ in query_tokens(field, values.get(field))]
+    counts = {}
+    for start in range(0, len(all_tokens), _CHUNK):
+        chunk = all_tokens[start:start + _CHUNK]
+        counts.update((row['token'], row['experiences']) for row in query(
+            f"SELECT token, experiences FROM experience_token_counts WHERE token IN ({_in_list(len(chunk))})",
+            tuple(chunk)))
+
+    remaining = dict.fromkeys(FIELD_WEIGHTS, 1.0)  # 各字段尚未探查的词项能说明的最高相似度
+    seen: Set[str] = set()
+    best: List[Tuple[float, Any]] = []
+
+    def bound() -> float:
+        return sum(FIELD_WEIGHTS[field] * score for field, score in remaining.items())
+
+    def done() -> bool:
+        # 未见过的经验的相似度不超过 bound()
+        upper = bound()
+        if upper <= 0 or upper < min_similarity:
+            return True
+        return len(best) >= top_k and best[top_k - 1][0] >= upper
+
+    # 库中取值的种类很少：每个字段按取值缓存字段相似度
+    field_scores = {field: {} for field in FIELD_WEIGHTS}
+
+    def similarity_of(row) -> float:
+        total = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            scores = field_scores[field]
+            value = row[field]
+            if value not in scores:
+                scores[value] = field_similarity(values.get(field), value) * weight
+            total += scores[value]
+        return total
+
+    def score(rows):
+        for row in rows:
+            seen.add(row['content_hash'])
+            similarity = similarity_of(row)
+            if similarity > 0 and similarity >= min_similarity:
+                best.append((similarity, row['content_hash']))
+        best.sort(key=lambda item: item[0], reverse=True)
+        del best[top_k:]
+
+    for cost, field, tokens, after, _ in _probe_steps(values, counts):
+        if done():
+            break
+        tokens = [token for token in tokens if counts.get(token)]
+        hashes = set()
+        for start in range(0, len(tokens), _CHUNK):
+            chunk = tokens[start:start + _CHUNK]
+            hashes.update(row['content_hash'] for row in query(
+                f"SELECT content_hash FROM experience_tokens WHERE token IN ({_in_list(len(chunk))})",
+                tuple(chunk)))
+        hashes = sorted(hashes - seen)
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start:start + _CHUNK]
+            score(query(f"SELECT {_COLUMNS} FROM total_experiences WHERE content_hash IN ({_in_list(len(chunk))})",
+                        tuple(chunk)))
+        remaining[field] = after
+
+    if not done():
+        # 只剩不足 GRAM 个字符的查询取值可能被未见过的经验包含：逐条比较其余经验
+        score(row for row in query(f"SELECT {_COLUMNS} FROM total_experiences") if row['content_hash'] not in seen)
+    return _records(query, best)
+
+
+def _records(query: Callable[[str, tuple], list], best: List[Tuple[float, str]]) -> List[Tuple[float, Any]]:
+    """按 content_hash 取回入选经验的完整记录"""
+    if not best:
+        return []
+    records = {row['content_hash']: row for row in query(
+        f"SELECT * FROM total_experiences WHERE content_hash IN ({_in_list(len(best))})",
+        tuple(content_hash for _, content_hash in best))}
+    return [(similarity, records[content_hash]) for similarity, content_hash in best if content_hash in records]
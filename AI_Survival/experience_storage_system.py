@@ -12,7 +12,6 @@
 
 import json
 import time
-import sqlite3
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field, asdict
 from typing import Dict, List, Any, Optional, Tuple, Set, Union
@@ -21,6 +20,8 @@ from collections import defaultdict, deque
 import threading
 import os
 
+import sqlite_pool
+
 
 class ExperienceType(Enum):
     """经验类型枚举"""
@@ -150,7 +151,7 @@ class DirectExperienceDB:
         
     def _init_database(self):
         """初始化数据库"""
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite_pool.get_connection(self.db_path) as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS direct_experiences (
                     id TEXT PRIMARY KEY,
@@ -177,7 +178,7 @@ class DirectExperienceDB:
     def add_experience(self, experience: ExperienceEntry) -> bool:
         """添加直接经验"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 conn.execute('''
                     INSERT OR REPLACE INTO direct_experiences 
                     (id, timestamp, context, action, result, outcome_quality, 
@@ -210,7 +211,7 @@ class DirectExperienceDB:
     def get_experience(self, experience_id: str) -> Optional[ExperienceEntry]:
         """获取指定经验"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute('''
                     SELECT * FROM direct_experiences WHERE id = ?
                 ''', (experience_id,))
@@ -252,7 +253,7 @@ class DirectExperienceDB:
             query += " ORDER BY importance_score DESC, timestamp DESC LIMIT ?"
             params.append(limit)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute(query, params)
                 rows = cursor.fetchall()
                 
@@ -307,7 +308,7 @@ class DirectExperienceDB:
     def _cleanup_old_experiences(self):
         """清理旧经验以控制内存使用"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute('SELECT COUNT(*) FROM direct_experiences')
                 count = cursor.fetchone()[0]
                 
@@ -389,7 +390,7 @@ class IndirectExperienceDB:
         
     def _init_database(self):
         """初始化数据库"""
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite_pool.get_connection(self.db_path) as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS indirect_experiences (
                     id TEXT PRIMARY KEY,
@@ -420,7 +421,7 @@ class IndirectExperienceDB:
             adjusted_reliability = experience.metadata.reliability * trust_score
             experience.metadata.reliability = min(adjusted_reliability, 1.0)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 conn.execute('''
                     INSERT OR REPLACE INTO indirect_experiences 
                     (id, source_agent, trust_score, timestamp, context, action, 
@@ -453,7 +454,7 @@ class IndirectExperienceDB:
                                   limit: int = 100) -> List[ExperienceEntry]:
         """获取高信任度的间接经验"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute('''
                     SELECT * FROM indirect_experiences 
                     WHERE trust_score >= ?
@@ -479,7 +480,7 @@ class IndirectExperienceDB:
             self.trust_network[source_agent] = max(0.0, min(1.0, new_trust))
             
             # 更新该智能体相关经验的信任度
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 conn.execute('''
                     UPDATE indirect_experiences 
                     SET trust_score = ? 
@@ -518,7 +519,7 @@ class IndirectExperienceDB:
     def _cleanup_old_experiences(self):
         """清理旧的间接经验"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute('SELECT COUNT(*) FROM indirect_experiences')
                 count = cursor.fetchone()[0]
                 
@@ -546,7 +547,7 @@ class RuleKnowledgeDB:
         
     def _init_database(self):
         """初始化规律数据库"""
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite_pool.get_connection(self.db_path) as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS rules (
                     id TEXT PRIMARY KEY,
@@ -573,7 +574,7 @@ class RuleKnowledgeDB:
     def store_rule(self, rule_data: Dict[str, Any]) -> bool:
         """存储规律"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 conn.execute('''
                     INSERT OR REPLACE INTO rules 
                     (id, rule_type, pattern, conditions, predictions, confidence,
@@ -614,7 +615,7 @@ class RuleKnowledgeDB:
             query += " ORDER BY confidence DESC LIMIT ?"
             params.append(limit)
             
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite_pool.get_connection(self.db_path) as conn:
                 cursor = conn.execute(query, params)
                 rules = []
                 
@@ -772,15 +773,15 @@ class ExperienceStorageSystem:
         with self._lock:
             # 实时统计
             try:
-                with sqlite3.connect(self.direct_db.db_path) as conn:
+                with sqlite_pool.get_connection(self.direct_db.db_path) as conn:
                     cursor = conn.execute('SELECT COUNT(*) FROM direct_experiences')
                     direct_count = cursor.fetchone()[0]
                 
-                with sqlite3.connect(self.indirect_db.db_path) as conn:
+                with sqlite_pool.get_connection(self.indirect_db.db_path) as conn:
                     cursor = conn.execute('SELECT COUNT(*) FROM indirect_experiences')
                     indirect_count = cursor.fetchone()[0]
                 
-                with sqlite3.connect(self.rule_db.db_path) as conn:
+                with sqlite_pool.get_connection(self.rule_db.db_path) as conn:
                     cursor = conn.execute('SELECT COUNT(*) FROM rules')
                     rules_count = cursor.fetchone()[0]
                 
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+experiment_runner.py
+并行实验运行器
+
+取代"改写main.py源码 + 子进程 + 解析最新game_*.log"的批量实验方式：
+每个实验配置在进程池中的独立进程里通过 SimulationEngine 运行，
+并返回结构化的 ExperimentResult。每次运行使用独立工作目录，
+五库数据库、模型文件和日志互不干扰。
+"""
+
+import itertools
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import multiprocessing
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@dataclass
+class ExperimentConfig:
+    """单次实验配置"""
+    seed: int = 42
+    predator_abundance: int = 50          # 对应 settings["animal_abundance_predator"]
+    game_duration: int = 30
+    agent_mix: Dict[str, int] = field(default_factory=lambda: {"DQN": 10, "PPO": 10, "ILAI": 10, "RILAI": 10})  # 完整组合，未列出的类型为 0
+    extra_settings: Dict[str, Any] = field(default_factory=dict)  # 其他 settings 覆盖项
+    workdir: Optional[str] = None         # 运行目录(None 表示当前目录)
+
+    def to_settings(self) -> Dict[str, Any]:
+        """转换为 SimulationEngine 的 settings 覆盖项"""
+        overrides = dict(self.extra_settings)
+        overrides.update({
+            "seed": self.seed,
+            "animal_abundance_predator": self.predator_abundance,
+            "game_duration": self.game_duration,
+            "agent_mix": dict(self.agent_mix),
+        })
+        return overrides
+
+    @property
+    def label(self) -> str:
+        mix = "-".join(f"{k}{v}" for k, v in sorted(self.agent_mix.items()))
+        return f"seed{self.seed}_pred{self.predator_abundance}_days{self.game_duration}_{mix}"
+
+
+@dataclass
+class ExperimentResult:
+    """单次实验结果"""
+    config: ExperimentConfig
+    success: bool
+    days: int = 0
+    wall_time: float = 0.0
+    avg_day_time: float = 0.0
+    rankings: List[Dict[str, Any]] = field(default_factory=list)
+    survival_by_type: Dict[str, float] = field(default_factory=dict)  # 各类型平均生存天数
+    error: Optional[str] = None
+    pid: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def build_experiment_grid(seeds: Iterable[int],
+                          predator_abundances: Iterable[int] = (50,),
+                          durations: Iterable[int] = (30,),
+                          agent_mixes: Optional[Iterable[Dict[str, int]]] = None,
+                          extra_settings: Optional[Dict[str, Any]] = None) -> List[ExperimentConfig]:
+    """按 (种子, 猛兽丰度, 天数, 玩家组合) 的笛卡尔积生成实验配置"""
+    if agent_mixes is None:
+        agent_mixes = [ExperimentConfig().agent_mix]
+    configs = []
+    for seed, predators, duration, mix in itertools.product(
+            seeds, predator_abundances, durations, list(agent_mixes)):
+        configs.append(ExperimentConfig(
+            seed=seed,
+            predator_abundance=predators,
+            game_duration=duration,
+            agent_mix=dict(mix),
+            extra_settings=dict(extra_settings or {}),
+        ))
+    return configs
+
+
+def run_experiment(config: ExperimentConfig) -> ExperimentResult:
+    """在当前进程中运行单次实验(进程池的工作函数)"""
+    start = time.time()
+    cwd = os.getcwd()
+    try:
+        if config.workdir:
+            os.makedirs(config.workdir, exist_ok=True)
+            os.chdir(config.workdir)
+        if CODE_DIR not in sys.path:
+            sys.path.insert(0, CODE_DIR)
+
+        # main 在导入时按当前目录创建 saved_models 等相对路径，因此需在 chdir 之后导入
+        import importlib
+        if "main" in sys.modules:
+            game_main = importlib.reload(sys.modules["main"])
+        else:
+            game_main = importlib.import_module("main")
+
+        engine = game_main.SimulationEngine(config.to_settings())
+        summary = engine.run()
+
+        survival_by_type: Dict[str, List[int]] = {}
+        for player in engine.game.players:
+            survival_by_type.setdefault(player.player_type, []).append(player.survival_days)
+
+        return ExperimentResult(
+            config=config,
+            success=True,
+            days=summary['days'],
+            wall_time=time.time() - start,
+            avg_day_time=summary['avg_day_time'],
+            rankings=summary['rankings'],
+            survival_by_type={k: sum(v) / len(v) for k, v in survival_by_type.items()},
+            pid=os.getpid(),
+        )
+    except Exception:
+        return ExperimentResult(
+            config=config,
+            success=False,
+            wall_time=time.time() - start,
+            error=traceback.format_exc(),
+            pid=os.getpid(),
+        )
+    finally:
+        os.chdir(cwd)  # 在当前进程中直接调用时不改变调用方的工作目录
+
+
+class ParallelExperimentRunner:
+    """基于 ProcessPoolExecutor 的并行实验运行器"""
+
+    def __init__(self, max_workers: Optional[int] = None, output_dir: Optional[str] = "experiment_runs",
+                 isolate_workdirs: bool = True):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.output_dir = output_dir
+        self.isolate_workdirs = isolate_workdirs
+
+    def _assign_workdirs(self, configs: List[ExperimentConfig]) -> List[ExperimentConfig]:
+        if not self.isolate_workdirs:
+            return configs
+        batch_dir = os.path.abspath(os.path.join(
+            self.output_dir, datetime.now().strftime("batch_%Y%m%d_%H%M%S")))
+        return [
+            config if config.workdir else
+            replace(config, workdir=os.path.join(batch_dir, f"run{index:03d}_{config.label}"))
+            for index, config in enumerate(configs, 1)
+        ]
+
+    def _create_executor(self, workers: int) -> ProcessPoolExecutor:
+        # spawn：每个工作进程都重新导入 main，避免 fork 继承 TensorFlow/SQLite 状态
+        kwargs = {"max_workers": workers, "mp_context": multiprocessing.get_context("spawn")}
+        if sys.version_info >= (3, 11):
+            kwargs["max_tasks_per_child"] = 1  # 每个进程只跑一次实验，全局 settings/logger 不会串扰
+        return ProcessPoolExecutor(**kwargs)
+
+    def run(self, configs: List[ExperimentConfig],
+            on_result: Optional[Callable[[ExperimentResult], None]] = None) -> List[ExperimentResult]:
+        """并行运行所有配置，按输入顺序返回结果"""
+        configs = self._assign_workdirs(list(configs))
+        if not configs:
+            return []
+        results: List[Optional[ExperimentResult]] = [None] * len(configs)
+        workers = min(self.max_workers, len(configs))
+        with self._create_executor(workers) as executor:
+            futures = {executor.submit(run_experiment, config): i for i, config in enumerate(configs)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 工作进程异常退出(如被系统杀死)时也返回结构化结果
+                    result = ExperimentResult(config=configs[index], success=False, error=str(e))
+                results[index] = result
+                if on_result:
+                    on_result(result)
+        return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Run AI Survival experiments in parallel")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[42])
+    parser.add_argument("--predators", type=int, nargs="+", default=[50])
+    parser.add_argument("--days", type=int, nargs="+", default=[30])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", type=str, default="experiment_results.json")
+    args = parser.parse_args()
+
+    grid = build_experiment_grid(args.seeds, args.predators, args.days)
+    runner = ParallelExperimentRunner(max_workers=args.workers)
+    print(f"🧪 Running {len(grid)} experiments on {min(runner.max_workers, len(grid))} workers")
+    results = runner.run(grid, on_result=lambda r: print(
+        f"   {'✅' if r.success else '❌'} {r.config.label} ({r.wall_time:.1f}s)"))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump([r.to_dict() for r in results], f, ensure_ascii=False, indent=2, default=str)
+    print(f"📄 Results saved: {args.output}")
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+five_library_export.py
+把五库数据导出为按运行分区的 Parquet 列式文件，并提供跨运行查询接口(需要 pyarrow)
+
+tools/query_rules.py、inspect_rules.py 和各分析脚本每次都要打开 SQLite 文件、逐行拼出 pandas 表，
+分析几百次运行就要打开几百组数据库。这里把一次或多次运行的五张表导出为：
+
+    <输出目录>/<表名>/run_id=<运行 ID>/part-0.parquet
+
+    direct_experiences / total_experiences / direct_rules / total_rules / decisions
+
+列类型由 SQLite 声明的类型决定(INTEGER -> int64，REAL -> float64，TEXT -> string)，
+某列存在不符合声明类型的值时整列按字符串导出；JSON 列(conditions、predictions、context 等)保持原字符串。
+同一运行重新导出时覆盖其分区。
+
+    export_runs(find_runs("experiments"), "five_library_parquet")
+    data = FiveLibraryDataset("five_library_parquet")
+    data.to_pandas("direct_rules", columns=["run_id", "rule_type", "confidence"],
+                   filter=data.field("validation_status") == "validated")
+    data.aggregate("total_experiences", ["run_id", "action"], [("occurrence_count", "sum")])
+
+查询通过 pyarrow.dataset 进行：只读取需要的列，run_id 分区和过滤条件在读文件之前剪枝，
+不同运行的表结构不同(旧版本缺少的列)时自动合并为统一的结构，缺少的列为空值。
+"""
+
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# 表名 -> 数据库文件名
+FIVE_LIBRARY_TABLES = {
+    'direct_experiences': 'direct_experiences.db',
+    'total_experiences': 'total_experiences.db',
+    'direct_rules': 'direct_rules.db',
+    'total_rules': 'total_rules.db',
+    'decisions': 'decisions.db',
+}
+
+DEFAULT_BATCH_SIZE = 50000
+PART_FILE = "part-0.parquet"
+
+# SQLite typeof() 中与目标类型兼容的取值
+_COMPATIBLE = {
+    'int64': ('integer', 'null'),
+    'float64': ('integer', 'real', 'null'),
+    'string': ('text', 'null'),
+    'binary': ('blob', 'null'),
+}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("五库列式导出需要 pyarrow (pip install pyarrow)")
+
+
+def _declared_kind(declared: str) -> Optional[str]:
+    """按 SQLite 的类型亲和规则把声明类型映射为列类型(无法确定时为 None)"""
+    declared = (declared or '').upper()
+    if 'INT' in declared:
+        return 'int64'
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return 'string'
+    if 'BLOB' in declared:
+        return 'binary'
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return 'float64'
+    return None
+
+
+def _column_kinds(conn: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+    """[(列名, 列类型)]：声明类型与实际存储的值不一致时改为 string"""
+    columns = [(row[1], _declared_kind(row[2])) for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    if not columns:
+        return []
+    # 一次查询统计每列出现过的存储类型
+    checks = ", ".join(
+        f"MAX(typeof(\"{name}\") = '{storage}')"
+        for name, _ in columns for storage in ('integer', 'real', 'text', 'blob'))
+    flags = conn.execute(f'SELECT {checks} FROM "{table}"').fetchone()
+    kinds = []
+    for i, (name, kind) in enumerate(columns):
+        seen = {storage for storage, flag in zip(('integer', 'real', 'text', 'blob'), flags[i * 4:i * 4 + 4])
+                if flag}
+        if kind is None:
+            kind = 'int64' if seen <= {'integer'} else 'float64' if seen <= {'integer', 'real'} else 'string'
+        elif not seen <= set(_COMPATIBLE[kind]):
+            kind = 'string'
+        kinds.append((name, kind))
+    return kinds
+
+
+def _to_string(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def _record_batch(rows: List[tuple], kinds: List[Tuple[str, str]], schema) -> "pa.RecordBatch":
+    arrays = []
+    for i, (_, kind) in enumerate(kinds):
+        values = [row[i] for row in rows]
+        if kind == 'string':
+            values = [_to_string(value) for value in values]
+        arrays.append(pa.array(values, type=schema.field(i).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def default_run_id(run_dir: str) -> str:
+    """运行 ID 默认取目录名；目录名为 five_libraries 时取上一级目录名"""
+    path = Path(run_dir).resolve()
+    return path.parent.name if path.name == 'five_libraries' else path.name
+
+
+def export_table(db_path: str, table: str, output_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """把一个 SQLite 表写成一个 Parquet 文件，返回行数(表不存在时返回 -1，不写文件)"""
+    _require_pyarrow()
+    conn = sqlite3.connect(f"file:{Path(db_path).resolve()}?mode=ro", uri=True)
+    try:
+        kinds = _column_kinds(conn, table)
+        if not kinds:
+            return -1
+        schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in kinds])
+        cursor = conn.execute(f'SELECT * FROM "{table}"')
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        rows_written = 0
+        with pq.ParquetWriter(output_path, schema, compression='zstd') as writer:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.write_batch(_record_batch(rows, kinds, schema))
+                rows_written += len(rows)
+        return rows_written
+    finally:
+        conn.close()
+
+
+def export_run(run_dir: str, output_dir: str, run_id: Optional[str] = None,
+               tables: Optional[Iterable[str]] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    导出一次运行(一个五库目录)的各表，返回 {表名: 行数}。
+    目录中不存在的数据库或表跳过；重新导出同一 run_id 时覆盖原分区。
+    """
+    _require_pyarrow()
+    run_id = run_id or default_run_id(run_dir)
+    counts = {}
+    for table in tables or FIVE_LIBRARY_TABLES:
+        db_path = os.path.join(run_dir, FIVE_LIBRARY_TABLES[table])
+        partition = os.path.join(output_dir, table, f"run_id={quote(run_id, safe='')}")
+        if os.path.isdir(partition):
+            shutil.rmtree(partition)
+        if not os.path.exists(db_path):
+            continue
+        rows = export_table(db_path, table, os.path.join(partition, PART_FILE), batch_size)
+        if rows >= 0:
+            counts[table] = rows
+    return counts
+
+
+def find_runs(root: str) -> Dict[str, str]:
+    """
+    查找 root 下所有包含五库数据库的目录，返回 {运行 ID: 目录}。
+    运行 ID 为目录相对 root 的路径(以 / 分隔)，结尾的 five_libraries 省略。
+    """
+    runs = {}
+    root_path = Path(root)
+    for dirpath, _, filenames in os.walk(root):
+        if not any(name in filenames for name in FIVE_LIBRARY_TABLES.values()):
+            continue
+        relative = Path(dirpath).relative_to(root_path)
+        if relative.name == 'five_libraries':
+            relative = relative.parent
+        run_id = relative.as_posix() if relative.parts else default_run_id(dirpath)
+        runs[run_id] = dirpath
+    return dict(sorted(runs.items()))
+
+
+def export_runs(runs, output_dir: str, tables: Optional[Iterable[str]] = None,
+                batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Dict[str, int]]:
+    """
+    导出多次运行，runs 为 {运行 ID: 目录}(find_runs 的结果)或目录列表，返回 {运行 ID: {表名: 行数}}
+    """
+    if not isinstance(runs, dict):
+        runs = {default_run_id(run_dir): run_dir for run_dir in runs}
+    tables = list(tables or FIVE_LIBRARY_TABLES)
+    return {run_id: export_run(run_dir, output_dir, run_id, tables, batch_size)
+            for run_id, run_dir in runs.items()}
+
+
+class FiveLibraryDataset:
+    """导出目录上的跨运行查询接口"""
+
+    def __init__(self, path: str):
+        _require_pyarrow()
+        self.path = str(path)
+        self._datasets: Dict[str, "ds.Dataset"] = {}
+
+    @staticmethod
+    def field(name: str):
+        """过滤条件中的列，例如 data.field("confidence") > 0.8"""
+        return ds.field(name)
+
+    def tables(self) -> List[str]:
+        return [table for table in FIVE_LIBRARY_TABLES if os.path.isdir(os.path.join(self.path, table))]
+
+    def dataset(self, table: str) -> "ds.Dataset":
+        """表的 pyarrow 数据集(各运行的文件结构合并为统一结构)，首次使用时打开"""
+        dataset = self._datasets.get(table)
+        if dataset is None:
+            files = sorted(str(p) for p in Path(self.path, table).glob(f"run_id=*/{PART_FILE}"))
+            if not files:
+                raise KeyError(f"导出目录中没有表 {table}")
+            schemas = [pq.read_schema(f) for f in files]
+            try:
+                schema = pa.unify_schemas(schemas, promote_options="permissive")
+            except TypeError:  # pyarrow < 14
+                schema = pa.unify_schemas(schemas)
+            partitioning = ds.partitioning(pa.schema([("run_id", pa.string())]), flavor="hive")
+            schema = schema.append(pa.field("run_id", pa.string()))
+            dataset = self._datasets[table] = ds.dataset(
+                files, schema=schema, format="parquet", partitioning=partitioning,
+                partition_base_dir=os.path.join(self.path, table))
+        return dataset
+
+    def runs(self, table: Optional[str] = None) -> List[str]:
+        """已导出的运行 ID"""
+        tables = [table] if table else self.tables()
+        run_ids = set()
+        for name in tables:
+            column = self.dataset(name).to_table(columns=["run_id"]).column("run_id")
+            run_ids.update(column.unique().to_pylist())
+        return sorted(run_ids)
+
+    def _filter(self, filter, runs: Optional[Sequence[str]]):
+        if runs is not None:
+            run_filter = ds.field("run_id").isin(list(runs))
+            filter = run_filter if filter is None else filter & run_filter
+        return filter
+
+    def scan(self, table: str, columns: Optional[List[str]] = None, filter=None,
+             runs: Optional[Sequence[str]] = None) -> "pa.Table":
+        """读取表中满足 filter 的行(只读取 columns 列)，runs 限定运行 ID"""
+        return self.dataset(table).to_table(columns=columns, filter=self._filter(filter, runs))
+
+    def to_pandas(self, table: str, columns: Optional[List[str]] = None, filter=None,
+                  runs: Optional[Sequence[str]] = None):
+        return self.scan(table, columns, filter, runs).to_pandas()
+
+    def count(self, table: str, filter=None, runs: Optional[Sequence[str]] = None) -> int:
+        return self.dataset(table).count_rows(filter=self._filter(filter, runs))
+
+    def aggregate(self, table: str, group_by: List[str], aggregations: List[Tuple[str, str]],
+                  filter=None, runs: Optional[Sequence[str]] = None) -> "pa.Table":
+        """
+        分组聚合，aggregations 为 [(列名, 聚合函数)]，例如 [("confidence", "mean"), ("rule_id", "count")]；
+        结果列名为 <列名>_<聚合函数>
+        """
+        columns = list(dict.fromkeys(list(group_by) + [column for column, _ in aggregations]))
+        return self.scan(table, columns, filter, runs).group_by(group_by).aggregate(aggregations)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="把五库数据导出为按运行分区的 Parquet 文件")
+    parser.add_argument("root", help="包含一次或多次运行五库目录的根目录")
+    parser.add_argument("output", help="导出目录")
+    parser.add_argument("--tables", nargs="*", choices=list(FIVE_LIBRARY_TABLES), help="只导出这些表")
+    args = parser.parse_args()
+
+    for run_id, counts in export_runs(find_runs(args.root), args.output, args.tables).items():
+        print(f"{run_id}: " + ", ".join(f"{table}={rows}" for table, rows in counts.items()))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+five_library_sql.py
+五库系统共用的 UPSERT 语句
+
+经验的去重和计数由数据库的唯一约束完成：INSERT ... ON CONFLICT(content_hash) DO UPDATE，
+不再先 SELECT 再决定 INSERT 还是 UPDATE。发现者保存在规范化的 experience_discoverers 表中
+(每个经验库文件各一张)，经验表的 discoverers 列由该表派生出 JSON 数组，
+供读取 discoverers 的现有代码继续使用。
+"""
+
+import sqlite3
+
+# RETURNING 需要 SQLite 3.35；更旧的版本在同一事务中再 SELECT 一次
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+DISCOVERERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS experience_discoverers (
+        content_hash TEXT NOT NULL,
+        player_id TEXT NOT NULL,
+        first_seen REAL,  -- 该玩家第一次遇到这条经验的时间，决定发现者的先后顺序
+        PRIMARY KEY (content_hash, player_id)
+    ) WITHOUT ROWID
+"""
+
+# 按玩家查询(玩家命名空间)
+DISCOVERERS_PLAYER_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_discoverers_player ON experience_discoverers(player_id)
+"""
+
+# 从旧的 JSON 列迁移(只在新建 experience_discoverers 表时执行)
+DISCOVERERS_BACKFILL = """
+    INSERT OR IGNORE INTO experience_discoverers (content_hash, player_id, first_seen)
+    SELECT e.content_hash, j.value, e.first_discovered_time
+    FROM {table} AS e, json_each(e.discoverers) AS j
+    WHERE json_valid(e.discoverers)
+    ORDER BY e.id, j.key
+"""
+
+DISCOVERER_INSERT = """
+    INSERT OR IGNORE INTO experience_discoverers (content_hash, player_id, first_seen) VALUES (?, ?, ?)
+"""
+
+DISCOVERERS_FROM_JSON_INSERT = """
+    INSERT OR IGNORE INTO experience_discoverers (content_hash, player_id, first_seen)
+    SELECT ?, value, ? FROM json_each(?)
+"""
+
+# 参数为 content_hash
+DISCOVERERS_JSON = """(
+    SELECT json_group_array(player_id) FROM (
+        SELECT player_id FROM experience_discoverers WHERE content_hash = ? ORDER BY first_seen, player_id
+    )
+)"""
+
+# 单条经验：出现次数 +1，参数按列名绑定(新插入的行就是参数本身)。
+# 新经验的发现者只有当前玩家，并随即同步到总库，插入时即记为已同步；
+# 已有经验只在出现新的发现者时才从发现者表重建 JSON 数组
+DIRECT_EXPERIENCE_UPSERT = f"""
+    INSERT INTO direct_experiences
+    (content_hash, environment, object, characteristics, action, tools, result,
+     player_id, timestamp, success, metadata, occurrence_count, success_count,
+     first_discovered_by, first_discovered_time, last_seen_time, discoverers, avg_success_rate,
+     synced_occurrence_count, synced_seen_time)
+    VALUES (:content_hash, :environment, :object, :characteristics, :action, :tools, :result,
+            :player_id, :timestamp, :success, :metadata, 1, :success,
+            :player_id, :timestamp, :timestamp, json_array(:player_id), :success, 1, :timestamp)
+    ON CONFLICT(content_hash) DO UPDATE SET
+        occurrence_count = occurrence_count + 1,
+        success_count = success_count + excluded.success_count,
+        last_seen_time = excluded.last_seen_time,
+        discoverers = CASE
+            WHEN EXISTS (SELECT 1 FROM json_each(discoverers) WHERE value = excluded.player_id) THEN discoverers
+            ELSE {DISCOVERERS_JSON.replace("?", "excluded.content_hash")}
+        END,
+        avg_success_rate = CAST(success_count + excluded.success_count AS FLOAT) / (occurrence_count + 1)
+"""
+
+# 合并后的多次出现(写后缓冲；同一次刷新也写入总库，同步位置随之前移)
+DIRECT_EXPERIENCE_BATCH_UPSERT = f"""
+    INSERT INTO direct_experiences
+    (content_hash, environment, object, characteristics, action, tools, result,
+     player_id, timestamp, success, metadata, occurrence_count, success_count,
+     first_discovered_by, first_discovered_time, last_seen_time, discoverers, avg_success_rate,
+     synced_occurrence_count, synced_seen_time)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {DISCOVERERS_JSON}, ?,
+            ?12, ?16)  -- 同步位置取本批的 occurrence_count、last_seen_time 参数
+    ON CONFLICT(content_hash) DO UPDATE SET
+        occurrence_count = occurrence_count + excluded.occurrence_count,
+        success_count = success_count + excluded.success_count,
+        last_seen_time = MAX(COALESCE(last_seen_time, 0), excluded.last_seen_time),
+        discoverers = excluded.discoverers,
+        avg_success_rate = CAST(success_count + excluded.success_count AS FLOAT)
+                           / (occurrence_count + excluded.occurrence_count),
+        synced_occurrence_count = COALESCE(synced_occurrence_count, 0) + excluded.synced_occurrence_count,
+        synced_seen_time = MAX(COALESCE(synced_seen_time, 0), excluded.synced_seen_time)
+"""
+
+# 把直接库中的计数合并进总库(同 content_hash 的计数相加)
+TOTAL_EXPERIENCE_UPSERT = f"""
+    INSERT INTO total_experiences
+    (content_hash, environment, object, characteristics, action, tools, result,
+     success, occurrence_count, success_count, first_discovered_by,
+     first_discovered_time, last_seen_time, discoverers, avg_success_rate, confidence)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {DISCOVERERS_JSON}, ?, ?)
+    ON CONFLICT(content_hash) DO UPDATE SET
+        occurrence_count = occurrence_count + excluded.occurrence_count,
+        success_count = success_count + excluded.success_count,
+        last_seen_time = MAX(COALESCE(last_seen_time, 0), excluded.last_seen_time),
+        discoverers = excluded.discoverers,
+        avg_success_rate = CAST(success_count + excluded.success_count AS FLOAT)
+                           / (occurrence_count + excluded.occurrence_count),
+        confidence = CASE
+            WHEN occurrence_count + excluded.occurrence_count >= 10 THEN 0.9
+            WHEN occurrence_count + excluded.occurrence_count >= 5 THEN 0.8
+            WHEN occurrence_count + excluded.occurrence_count >= 3 THEN 0.7
+            ELSE 0.6
+        END,
+        updated_time = julianday('now')
+"""
+
+DIRECT_RULE_INSERT = """
+    INSERT INTO direct_rules (
+        rule_id, content_hash, rule_type, conditions, predictions,
+        confidence, support_count, contradiction_count, validation_count,
+        created_time, creator_id, validation_status
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+# 规律验证结果(按验证顺序在一个事务中执行；CASE 使用更新前的计数和置信度，与逐条更新时相同)
+RULE_VALIDATION_SUCCESS_UPDATE = """
+    UPDATE direct_rules
+    SET support_count = support_count + 1,
+        confidence = ?,
+        last_validated = ?,
+        validation_count = validation_count + 1,
+        validation_status = CASE
+            WHEN validation_count + 1 >= 3 AND confidence >= 0.7 THEN 'validated'
+            ELSE validation_status
+        END
+    WHERE rule_id = ?
+"""
+
+RULE_VALIDATION_FAILURE_UPDATE = """
+    UPDATE direct_rules
+    SET contradiction_count = contradiction_count + 1,
+        confidence = ?,
+        last_validated = ?,
+        validation_count = validation_count + 1,
+        validation_status = CASE
+            WHEN contradiction_count + 1 >= 3 OR confidence < 0.3 THEN 'rejected'
+            ELSE validation_status
+        END
+    WHERE rule_id = ?
+"""
+
+DECISION_INSERT = """
+    INSERT OR IGNORE INTO decisions (
+        decision_id, content_hash, context, action, confidence,
+        source, success_count, failure_count, total_uses,
+        created_time, last_used, avg_success_rate, emrs_score
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+DECISION_USE_UPDATE = """
+    UPDATE decisions
+    SET total_uses = total_uses + ?,
+        last_used = MAX(last_used, ?),
+        updated_time = ?
+    WHERE content_hash = ?
+"""
+
+
+# 直接库记录自上次同步到总库以来的变化是否显著(新增出现 >= 5 次，或最近出现时间推后 >= 1 小时)，
+# 附加在 UPSERT 的 RETURNING 行上，决定是否重新同步时不必再查询总库
+DIRECT_RESYNC_CHECK = """
+    (occurrence_count - COALESCE(synced_occurrence_count, 0) >= 5
+     OR last_seen_time - COALESCE(synced_seen_time, 0) >= 3600) AS needs_resync
+"""
+
+# 添加经验时取回的列(RETURNING * 要把整行转换为 Python 对象，是 UPSERT 中开销最大的部分)
+DIRECT_UPSERT_COLUMNS = f"id, occurrence_count, discoverers, {DIRECT_RESYNC_CHECK}"
+
+# 同步到总库时取回的列
+TOTAL_UPSERT_COLUMNS = "occurrence_count, success_count, json_array_length(discoverers) AS discoverer_count"
+
+# 同步到总库后记录同步位置
+DIRECT_SYNC_MARK = """
+    UPDATE direct_experiences SET synced_occurrence_count = ?, synced_seen_time = ? WHERE content_hash = ?
+"""
+
+
+def experience_confidence(occurrence_count: int) -> float:
+    """总经验库中出现次数 -> 置信度"""
+    return 0.9 if occurrence_count >= 10 else \
+        0.8 if occurrence_count >= 5 else \
+        0.7 if occurrence_count >= 3 else 0.6
+
+
+def upsert_returning(upsert_sql: str, params, table: str, content_hash: str, columns: str = "*"):
+    """
+    返回 [(sql, params), ...]：执行 UPSERT 并取回该 content_hash 的行(默认整行)。
+    结果行为最后一条语句的第一行。
+    """
+    if SUPPORTS_RETURNING:
+        return [(f"{upsert_sql} RETURNING {columns}", params)]
+    return [(upsert_sql, params), (f"SELECT {columns} FROM {table} WHERE content_hash = ?", (content_hash,))]
@@ -25,6 +25,20 @@ from pathlib import Path
 import logging
 import os
 
+import experience_contingency
+import experience_similarity_index
+import sqlite_pool
+from hash_membership import get_membership
+from rule_condition_index import ACTIVE_STATUSES, get_rule_index
+from five_library_sql import (
+    DIRECT_EXPERIENCE_UPSERT, DIRECT_RESYNC_CHECK, DIRECT_SYNC_MARK, DIRECT_UPSERT_COLUMNS, DISCOVERER_INSERT,
+    DISCOVERERS_BACKFILL, DISCOVERERS_FROM_JSON_INSERT, DISCOVERERS_PLAYER_INDEX, DISCOVERERS_TABLE,
+    RULE_VALIDATION_FAILURE_UPDATE, RULE_VALIDATION_SUCCESS_UPDATE, TOTAL_EXPERIENCE_UPSERT, TOTAL_UPSERT_COLUMNS,
+    experience_confidence, upsert_returning,
+)
+from five_library_write_behind import WriteBehindBuffer, DEFAULT_FLUSH_INTERVAL
+from turn_profiler import profiled
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -148,45 +162,73 @@ class Decision:
         return hashlib.md5(content.encode('utf-8')).hexdigest()
 
 class DatabaseManager:
-    """数据库管理器"""
+    """数据库管理器(复用 sqlite_pool 中按线程保持的长连接)"""
     
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.lock = threading.Lock()
+    
+    @property
+    def lock(self) -> threading.RLock:
+        """同一数据库文件的所有管理器共用的锁(内存模式下各线程共用一个连接，事务不能交错)"""
+        return sqlite_pool.path_lock(self.db_path)
     
     def get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row  # 使结果可以按列名访问
-        return conn
+        """获取当前线程的数据库长连接(WAL 模式，不要关闭)"""
+        return sqlite_pool.get_connection(self.db_path)
     
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """执行查询"""
         with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
+            cursor = self.get_connection().cursor()
+            cursor.row_factory = sqlite3.Row  # 使结果可以按列名访问
+            try:
                 cursor.execute(query, params)
                 return cursor.fetchall()
+            finally:
+                cursor.close()
     
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """执行更新操作"""
         with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute(query, params)
-                conn.commit()
+            conn = self.get_connection()
+            with conn:  # 成功提交，异常回滚
+                cursor = conn.execute(query, params)
                 return cursor.rowcount
 
+    def execute_transaction(self, statements: List[Tuple[str, tuple]]) -> List[List[sqlite3.Row]]:
+        """在一个事务中依次执行多条语句，返回每条语句的结果行"""
+        with self.lock:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            try:
+                with conn:
+                    return [cursor.execute(query, params).fetchall() for query, params in statements]
+            finally:
+                cursor.close()
+
+    def close(self):
+        """关闭该数据库在各线程上的连接"""
+        sqlite_pool.close_connections(self.db_path)
+
 class FiveLibrarySystem:
     """五库系统核心实现"""
     
-    def __init__(self, base_path: str = "five_libraries"):
+    def __init__(self, base_path: str = "five_libraries", write_behind: bool = False,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, storage: str = "disk"):
         """
         初始化五库系统
         
         Args:
             base_path: 五库文件存储基础路径
+            write_behind: 是否启用写后缓冲(经验/规律/决策在内存中合并，由后台线程批量写入)
+            flush_interval: 写后缓冲的刷新间隔(秒)
+            storage: "disk" 直接读写 .db 文件；"memory" 使用内存中的 SQLite 数据库，
+                     只在 checkpoint()、close() 和进程退出时用 backup API 写回 .db 文件
         """
+        if storage not in ("disk", "memory"):
+            raise ValueError(f"未知的五库存储方式: {storage}")
+        self.storage = storage
         self.base_path = Path(base_path)
         self.base_path.mkdir(exist_ok=True)
         
@@ -199,23 +241,20 @@ class FiveLibrarySystem:
             'decisions': self.base_path / "decisions.db"
         }
         
+        if storage == "memory":
+            # 同一进程中同一路径的实例共用一个内存数据库(与磁盘模式共用文件一致)
+            for path in self.db_paths.values():
+                sqlite_pool.use_memory(str(path))
+        
         # 数据库管理器
         self.db_managers = {
             name: DatabaseManager(str(path)) 
             for name, path in self.db_paths.items()
         }
         
-        # 缓存系统
-        self.cache = {
-            'experience_hashes': set(),
-            'rule_hashes': set(),
-            'decision_hashes': set(),
-            'last_cache_update': 0
-        }
-        
         # ✅ 新增：同步状态跟踪
         self.sync_tracker = {
-            'synced_experience_hashes': set(),  # 已同步的经验哈希
+            'synced_experience_hashes': None,   # 已同步的经验哈希(_initialize_sync_tracker 中设置)
             'pending_sync_hashes': set(),       # 待同步的经验哈希
             'last_sync_check': 0,               # 上次同步检查时间
             'sync_batch_size': 100,  # 性能优化: 大幅增加批量大小  # 性能优化: 增加批量大小
@@ -236,6 +275,21 @@ class FiveLibrarySystem:
         # 初始化五库数据库
         self._initialize_five_libraries()
         
+        # 缓存系统：总经验库/总规律库/决策库的 content_hash 成员集合
+        # (布隆过滤器 + 索引确认，同一数据库文件的实例共享，写入时增量更新)
+        self.cache = {
+            'experience_hashes': get_membership(self.db_paths['total_experiences'], 'total_experiences'),
+            'rule_hashes': get_membership(self.db_paths['total_rules'], 'total_rules'),
+            'decision_hashes': get_membership(self.db_paths['decisions'], 'decisions'),
+            'last_cache_update': time.time()
+        }
+        
+        # 直接规律库的 (条件字段, 取值) -> rule_id 倒排索引，规律验证只匹配候选规律(同一数据库的实例共享)
+        self.rule_index = get_rule_index(self.db_paths['direct_rules'])
+        
+        # 写后缓冲(可选)
+        self.write_buffer = WriteBehindBuffer(self.db_paths, flush_interval) if write_behind else None
+        
         # ✅ 新增：初始化同步状态
         self._initialize_sync_tracker()
         
@@ -303,15 +357,24 @@ class FiveLibrarySystem:
                 discoverers TEXT DEFAULT '[]',
                 avg_success_rate REAL DEFAULT 0.0,
                 created_time REAL DEFAULT (julianday('now')),
-                synced_to_total INTEGER DEFAULT 0
+                synced_to_total INTEGER DEFAULT 0,
+                synced_occurrence_count INTEGER DEFAULT 0,  -- 上次同步到总库时的出现次数
+                synced_seen_time REAL DEFAULT 0  -- 上次同步到总库时的最近出现时间
             )
         """)
         
-        # 创建索引
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_hash ON direct_experiences(content_hash)")
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_player ON direct_experiences(player_id)")
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_action ON direct_experiences(action)")
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_sync ON direct_experiences(synced_to_total)")
+        # 旧数据库补充同步位置列(默认 0：变化显著时重新同步一次)
+        columns = {row['name'] for row in db_manager.execute_query("PRAGMA table_info(direct_experiences)")}
+        for column, declaration in (('synced_occurrence_count', 'INTEGER DEFAULT 0'),
+                                    ('synced_seen_time', 'REAL DEFAULT 0')):
+            if column not in columns:
+                db_manager.execute_update(f"ALTER TABLE direct_experiences ADD COLUMN {column} {declaration}")
+        
+        # 经验表不建二级索引：content_hash 已有 UNIQUE 约束的索引，按玩家查询走 experience_discoverers，
+        # 没有按 action、synced_to_total 过滤的查询；每个索引都让每次插入多写一棵 B 树，旧数据库中的删除
+        for index in ('idx_direct_hash', 'idx_direct_player', 'idx_direct_action', 'idx_direct_sync'):
+            db_manager.execute_update(f"DROP INDEX IF EXISTS {index}")
+        self._init_discoverers_table(db_manager, 'direct_experiences')
     
     def _init_total_experiences_db(self):
         """初始化总经验库"""
@@ -342,10 +405,27 @@ class FiveLibrarySystem:
             )
         """)
         
-        # 创建索引
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_total_hash ON total_experiences(content_hash)")
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_total_action ON total_experiences(action)")
-        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_total_confidence ON total_experiences(confidence)")
+        # 经验表不建二级索引(content_hash 已有 UNIQUE 约束的索引，没有按 action、confidence 过滤或排序的查询)
+        for index in ('idx_total_hash', 'idx_total_action', 'idx_total_confidence'):
+            db_manager.execute_update(f"DROP INDEX IF EXISTS {index}")
+        self._init_discoverers_table(db_manager, 'total_experiences')
+        
+        # EOCATR 词项倒排索引(近似重复查找)，查询前才为新写入的经验批量登记词项
+        with db_manager.lock:
+            experience_similarity_index.create(db_manager.get_connection())
+        
+        # CN1/CN2 规律生成的列联计数表(规律生成前批量更新，写入经验时不维护)
+        with db_manager.lock:
+            experience_contingency.create(db_manager.get_connection())
+    
+    def _init_discoverers_table(self, db_manager: DatabaseManager, table: str):
+        """创建规范化的发现者表，首次创建时从 discoverers JSON 列迁移已有数据"""
+        exists = db_manager.execute_query(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'experience_discoverers'")
+        db_manager.execute_update(DISCOVERERS_TABLE)
+        db_manager.execute_update(DISCOVERERS_PLAYER_INDEX)
+        if not exists:
+            db_manager.execute_update(DISCOVERERS_BACKFILL.format(table=table))
     
     def _init_direct_rules_db(self):
         """初始化直接规律库"""
@@ -379,6 +459,7 @@ class FiveLibrarySystem:
         db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_rule_type ON direct_rules(rule_type)")
         db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_rule_confidence ON direct_rules(confidence)")
         db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_rule_sync ON direct_rules(synced_to_total)")
+        db_manager.execute_update("CREATE INDEX IF NOT EXISTS idx_direct_rule_creator ON direct_rules(creator_id)")
     
     def _init_total_rules_db(self):
         """初始化总规律库"""
@@ -487,23 +568,14 @@ class FiveLibrarySystem:
         return stats
     
     def _update_cache(self):
-        """更新缓存"""
+        """更新缓存：只读入其他实例或进程新写入的行"""
         current_time = time.time()
         if current_time - self.cache['last_cache_update'] < 60:  # 1分钟内不重复更新
             return
         
         try:
-            # 更新经验哈希缓存
-            result = self.db_managers['total_experiences'].execute_query("SELECT content_hash FROM total_experiences")
-            self.cache['experience_hashes'] = {row['content_hash'] for row in result}
-            
-            # 更新规律哈希缓存
-            result = self.db_managers['total_rules'].execute_query("SELECT content_hash FROM total_rules")
-            self.cache['rule_hashes'] = {row['content_hash'] for row in result}
-            
-            # 更新决策哈希缓存
-            result = self.db_managers['decisions'].execute_query("SELECT content_hash FROM decisions")
-            self.cache['decision_hashes'] = {row['content_hash'] for row in result}
+            for key in ('experience_hashes', 'rule_hashes', 'decision_hashes'):
+                self.cache[key].refresh()
             
             self.cache['last_cache_update'] = current_time
             
@@ -711,18 +783,7 @@ class FiveLibrarySystem:
                 duplication_result['duplicate_source'] = 'cache'
                 return duplication_result
             
-            # 2. 检查总经验库
-            total_result = self.db_managers['total_experiences'].execute_query(
-                "SELECT * FROM total_experiences WHERE content_hash = ?", (content_hash,)
-            )
-            
-            if total_result:
-                duplication_result['is_duplicate'] = True
-                duplication_result['duplicate_source'] = 'total'
-                duplication_result['existing_record'] = dict(total_result[0])
-                return duplication_result
-            
-            # 3. 检查直接经验库
+            # 2. 总经验库的成员集合未命中是确定的(不在总库中)，只需检查直接经验库
             direct_result = self.db_managers['direct_experiences'].execute_query(
                 "SELECT * FROM direct_experiences WHERE content_hash = ?", (content_hash,)
             )
@@ -733,7 +794,7 @@ class FiveLibrarySystem:
                 duplication_result['existing_record'] = dict(direct_result[0])
                 return duplication_result
             
-            # 4. 模糊相似度检查（可选）
+            # 3. 模糊相似度检查（可选）
             similarity_check = self._check_experience_similarity(experience)
             duplication_result['similarity_score'] = similarity_check['max_similarity']
             
@@ -747,12 +808,13 @@ class FiveLibrarySystem:
         
         return duplication_result
     
-    def _check_experience_similarity(self, experience: EOCATRExperience) -> Dict[str, Any]:
+    def _check_experience_similarity(self, experience: EOCATRExperience, top_k: int = 10) -> Dict[str, Any]:
         """
-        检查经验相似度
+        检查经验相似度(通过总经验库的 EOCATR 词项倒排索引)
         
         Args:
             experience: 经验对象
+            top_k: 最多返回的相似经验数量
             
         Returns:
             相似度检查结果
@@ -764,19 +826,17 @@ class FiveLibrarySystem:
         }
         
         try:
-            # 查询相同action的经验进行相似度比较
-            similar_experiences = self.db_managers['total_experiences'].execute_query(
-                "SELECT * FROM total_experiences WHERE action = ? LIMIT 50", 
-                (experience.action,)
-            )
+            db_manager = self.db_managers['total_experiences']
+            with db_manager.lock:
+                experience_similarity_index.catch_up(db_manager.get_connection())
+            values = {field: getattr(experience, field, '') for field in experience_similarity_index.FIELD_WEIGHTS}
+            matches = experience_similarity_index.search(db_manager.execute_query, values, top_k=top_k)
             
-            for record in similar_experiences:
-                similarity = self._calculate_experience_similarity(experience, record)
-                
-                if similarity > similarity_result['max_similarity']:
-                    similarity_result['max_similarity'] = similarity
-                    similarity_result['most_similar_record'] = dict(record)
-                
+            if matches:
+                similarity_result['max_similarity'] = matches[0][0]
+                similarity_result['most_similar_record'] = dict(matches[0][1])
+            
+            for similarity, record in matches:
                 if similarity > 0.7:  # 70%以上相似度记录
                     similarity_result['similar_records'].append({
                         'record': dict(record),
@@ -800,37 +860,15 @@ class FiveLibrarySystem:
             相似度分数 (0.0-1.0)
         """
         try:
-            # 字段权重
-            field_weights = {
-                'environment': 0.2,
-                'object': 0.2,
-                'characteristics': 0.15,
-                'action': 0.25,
-                'tools': 0.1,
-                'result': 0.1
-            }
-            
-            total_similarity = 0.0
+            fields = experience_similarity_index.FIELD_WEIGHTS
+            values1 = {field: getattr(exp1, field, '') for field in fields}
             
-            for field, weight in field_weights.items():
-                val1 = str(getattr(exp1, field, '')).lower().strip()
-                
-                # 兼容sqlite3.Row和dict两种类型
-                if hasattr(exp2_record, 'keys'):  # dict-like
-                    val2 = str(exp2_record.get(field, '') if hasattr(exp2_record, 'get') else exp2_record[field]).lower().strip()
-                else:  # sqlite3.Row
-                    val2 = str(exp2_record[field] if field in exp2_record.keys() else '').lower().strip()
-                
-                if val1 == val2:
-                    field_similarity = 1.0
-                elif val1 in val2 or val2 in val1:
-                    field_similarity = 0.7
-                else:
-                    field_similarity = 0.0
-                
-                total_similarity += field_similarity * weight
+            # 兼容sqlite3.Row和dict两种类型
+            keys = exp2_record.keys()
+            values2 = {field: exp2_record[field] if field in keys else '' for field in fields}
             
-            return total_similarity
+            # 字段完全相同计 1.0，互相包含计 0.7，按字段权重加权
+            return experience_similarity_index.weighted_similarity(values1, values2)
             
         except Exception as e:
             logger.error(f"❌ 相似度计算失败: {str(e)}")
@@ -876,6 +914,7 @@ class FiveLibrarySystem:
 
     # ==================== 去重同步模块 ====================
     
+    @profiled("five_library.add_experience")
     def add_experience_to_direct_library(self, experience: EOCATRExperience) -> Dict[str, Any]:
         """
         添加经验到直接经验库
@@ -913,63 +952,49 @@ class FiveLibrarySystem:
             content_hash = normalized_exp.generate_hash()
             add_result['content_hash'] = content_hash
             
-            # 2. 检查直接经验库中是否已存在
-            existing_direct = self.db_managers['direct_experiences'].execute_query(
-                "SELECT * FROM direct_experiences WHERE content_hash = ?", (content_hash,)
-            )
-            
-            if existing_direct:
-                # 更新现有记录
-                record_id = existing_direct[0]['id']
-                self.db_managers['direct_experiences'].execute_update("""
-                    UPDATE direct_experiences 
-                    SET occurrence_count = occurrence_count + 1,
-                        success_count = success_count + ?,
-                        last_seen_time = ?,
-                        discoverers = CASE 
-                            WHEN discoverers LIKE '%"' || ? || '"%' THEN discoverers
-                            ELSE json_insert(discoverers, '$[#]', ?)
-                        END,
-                        avg_success_rate = CAST(success_count + ? AS FLOAT) / (occurrence_count + 1)
-                    WHERE id = ?
-                """, (
-                    int(normalized_exp.success), normalized_exp.timestamp, 
-                    normalized_exp.player_id, normalized_exp.player_id,
-                    int(normalized_exp.success), record_id
-                ))
-                
+            if self.write_buffer is not None:
+                # 写后缓冲模式：只在内存中去重，直接库和总库由后台批量 UPSERT
+                known = (self.write_buffer.has_pending_experience(content_hash) or
+                         content_hash in self.cache['experience_hashes'])
+                self.write_buffer.queue_experience(self.format_experience_for_storage(normalized_exp))
+                self.cache['experience_hashes'].add(content_hash)
                 add_result['success'] = True
-                add_result['action'] = 'updated'
-                add_result['experience_id'] = record_id
-                add_result['sync_required'] = True
-                
-            else:
-                # 添加新记录
-                storage_data = self.format_experience_for_storage(normalized_exp)
-                
-                result = self.db_managers['direct_experiences'].execute_update("""
-                    INSERT INTO direct_experiences 
-                    (content_hash, environment, object, characteristics, action, tools, result,
-                     player_id, timestamp, success, metadata, occurrence_count, success_count,
-                     first_discovered_by, first_discovered_time, last_seen_time, discoverers, avg_success_rate)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    storage_data['content_hash'],
-                    storage_data['environment'], storage_data['object'], storage_data['characteristics'],
-                    storage_data['action'], storage_data['tools'], storage_data['result'],
-                    storage_data['player_id'], storage_data['timestamp'], storage_data['success'],
-                    storage_data['metadata'], 1, int(normalized_exp.success),
-                    storage_data['player_id'], storage_data['timestamp'], storage_data['timestamp'],
-                    f'["{storage_data["player_id"]}"]', float(normalized_exp.success)
-                ))
-                
-                add_result['success'] = True
-                add_result['action'] = 'added'
-                add_result['experience_id'] = result
-                add_result['sync_required'] = True
+                add_result['action'] = 'updated' if known else 'added'
+                return add_result
             
-            # 3. 更新缓存
-            self.cache['experience_hashes'].add(content_hash)
+            # 2. 一个事务内登记发现者并 UPSERT：新内容插入，已有内容累加计数；
+            #    返回行附带 needs_resync，是否重新同步到总库不必再查询。
+            #    规范化后的经验字段类型已确定，直接作为参数
+            #    (format_experience_for_storage 会再算一次哈希并把 metadata 序列化后再解析一遍)
+            exp = normalized_exp
+            success = int(exp.success)
+            record = {
+                'content_hash': content_hash,
+                'environment': exp.environment, 'object': exp.object, 'characteristics': exp.characteristics,
+                'action': exp.action, 'tools': exp.tools, 'result': exp.result,
+                'player_id': exp.player_id, 'timestamp': exp.timestamp, 'success': success,
+                'metadata': json.dumps(exp.metadata),
+            }
+            returned = self.db_managers['direct_experiences'].execute_transaction(
+                [(DISCOVERER_INSERT, (content_hash, exp.player_id, exp.timestamp))] +
+                upsert_returning(DIRECT_EXPERIENCE_UPSERT, record, 'direct_experiences', content_hash,
+                                 DIRECT_UPSERT_COLUMNS)
+            )[-1][0]
+            
+            add_result['success'] = True
+            add_result['action'] = 'added' if returned['occurrence_count'] == 1 else 'updated'
+            add_result['experience_id'] = returned['id']
+            add_result['occurrence_count'] = returned['occurrence_count']
+            if add_result['action'] == 'added':
+                # 新插入的行就是参数本身，同步到总库时不必取回整行
+                direct_record = dict(record, occurrence_count=1, success_count=success,
+                                     first_discovered_by=exp.player_id, first_discovered_time=exp.timestamp,
+                                     last_seen_time=exp.timestamp, discoverers=returned['discoverers'],
+                                     avg_success_rate=float(success), synced_occurrence_count=1,
+                                     synced_seen_time=exp.timestamp)
+            else:
+                direct_record = returned
+            add_result['sync_required'] = True
             
             # 🔧 优化: 降低重复日志的级别
             if add_result['action'] == 'added':
@@ -990,16 +1015,17 @@ class FiveLibrarySystem:
         
         # ✅ 修改：智能同步机制
         if add_result['success'] and add_result.get('content_hash'):
-            self._smart_sync_experience(add_result['content_hash'], add_result['action'])
+            self._smart_sync_experience(add_result['content_hash'], add_result['action'], direct_record)
 
         return add_result
     
-    def sync_experience_to_total_library(self, content_hash: str) -> Dict[str, Any]:
+    def sync_experience_to_total_library(self, content_hash: str, direct_record=None) -> Dict[str, Any]:
         """
         将经验从直接经验库同步到总经验库
         
         Args:
             content_hash: 经验内容哈希
+            direct_record: 直接经验库中的记录(调用方已取得时传入，省去一次查询)
             
         Returns:
             同步结果字典
@@ -1015,105 +1041,35 @@ class FiveLibrarySystem:
         
         try:
             # 1. 获取直接经验库中的记录
-            direct_records = self.db_managers['direct_experiences'].execute_query(
-                "SELECT * FROM direct_experiences WHERE content_hash = ?", (content_hash,)
-            )
-            
-            if not direct_records:
-                sync_result['action'] = 'skipped'
-                sync_result['reason'] = '直接经验库中未找到记录'
-                return sync_result
-            
-            direct_record = direct_records[0]
-            
-            # 2. 检查总经验库中是否已存在
-            total_records = self.db_managers['total_experiences'].execute_query(
-                "SELECT * FROM total_experiences WHERE content_hash = ?", (content_hash,)
-            )
-            
-            if total_records:
-                # 合并到现有记录
-                total_record = total_records[0]
-                
-                # 解析发现者列表
-                try:
-                    direct_discoverers = json.loads(direct_record['discoverers'])
-                    total_discoverers = json.loads(total_record['discoverers'])
-                except (json.JSONDecodeError, TypeError):
-                    direct_discoverers = [direct_record['first_discovered_by']]
-                    total_discoverers = [total_record['first_discovered_by']]
-                
-                # 合并发现者列表
-                merged_discoverers = list(set(direct_discoverers + total_discoverers))
-                
-                # 计算合并后的统计数据
-                new_occurrence_count = total_record['occurrence_count'] + direct_record['occurrence_count']
-                new_success_count = total_record['success_count'] + direct_record['success_count']
-                new_avg_success_rate = new_success_count / new_occurrence_count if new_occurrence_count > 0 else 0.0
-                
-                # 更新总经验库记录
-                self.db_managers['total_experiences'].execute_update("""
-                    UPDATE total_experiences 
-                    SET occurrence_count = ?,
-                        success_count = ?,
-                        last_seen_time = CASE 
-                            WHEN ? > last_seen_time THEN ? 
-                            ELSE last_seen_time 
-                        END,
-                        discoverers = ?,
-                        avg_success_rate = ?,
-                        confidence = CASE 
-                            WHEN ? >= 10 THEN 0.9
-                            WHEN ? >= 5 THEN 0.8
-                            WHEN ? >= 3 THEN 0.7
-                            ELSE 0.6
-                        END
-                    WHERE content_hash = ?
-                """, (
-                    new_occurrence_count, new_success_count,
-                    direct_record['last_seen_time'], direct_record['last_seen_time'],
-                    json.dumps(merged_discoverers), new_avg_success_rate,
-                    new_occurrence_count, new_occurrence_count, new_occurrence_count,
-                    content_hash
-                ))
-                
-                sync_result['action'] = 'merged'
-                sync_result['total_occurrence_count'] = new_occurrence_count
-                sync_result['total_success_count'] = new_success_count
-                sync_result['discoverer_count'] = len(merged_discoverers)
-                
-            else:
-                # 创建新的总经验库记录
-                confidence = 0.9 if direct_record['occurrence_count'] >= 10 else \
-                           0.8 if direct_record['occurrence_count'] >= 5 else \
-                           0.7 if direct_record['occurrence_count'] >= 3 else 0.6
-                
-                self.db_managers['total_experiences'].execute_update("""
-                    INSERT INTO total_experiences 
-                    (content_hash, environment, object, characteristics, action, tools, result,
-                     success, occurrence_count, success_count, first_discovered_by, 
-                     first_discovered_time, last_seen_time, discoverers, avg_success_rate, confidence)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    direct_record['content_hash'],
-                    direct_record['environment'], direct_record['object'], direct_record['characteristics'],
-                    direct_record['action'], direct_record['tools'], direct_record['result'],
-                    direct_record['success'], direct_record['occurrence_count'], direct_record['success_count'],
-                    direct_record['first_discovered_by'], direct_record['first_discovered_time'],
-                    direct_record['last_seen_time'], direct_record['discoverers'],
-                    direct_record['avg_success_rate'], confidence
-                ))
+            if direct_record is None:
+                direct_records = self.db_managers['direct_experiences'].execute_query(
+                    "SELECT * FROM direct_experiences WHERE content_hash = ?", (content_hash,)
+                )
                 
-                sync_result['action'] = 'created'
-                sync_result['total_occurrence_count'] = direct_record['occurrence_count']
-                sync_result['total_success_count'] = direct_record['success_count']
+                if not direct_records:
+                    sync_result['action'] = 'skipped'
+                    sync_result['reason'] = '直接经验库中未找到记录'
+                    return sync_result
                 
-                # 解析发现者数量
-                try:
-                    discoverers = json.loads(direct_record['discoverers'])
-                    sync_result['discoverer_count'] = len(discoverers)
-                except (json.JSONDecodeError, TypeError):
-                    sync_result['discoverer_count'] = 1
+                direct_record = direct_records[0]
+            
+            # 2. 一个事务内合并发现者并 UPSERT：总库中没有则创建，已有则累加计数
+            total_record = self.db_managers['total_experiences'].execute_transaction(
+                self._total_sync_statements(direct_record)
+            )[-1][0]
+            
+            # 合并后的出现次数一定大于直接库中的次数
+            created = total_record['occurrence_count'] == direct_record['occurrence_count']
+            sync_result['action'] = 'created' if created else 'merged'
+            sync_result['total_occurrence_count'] = total_record['occurrence_count']
+            sync_result['total_success_count'] = total_record['success_count']
+            sync_result['discoverer_count'] = total_record['discoverer_count']
+            self.cache['experience_hashes'].add(content_hash)
+            
+            # 3. 记录同步位置
+            sync_mark = self._sync_mark(direct_record)
+            if sync_mark is not None:
+                self.db_managers['direct_experiences'].execute_update(*sync_mark)
             
             sync_result['success'] = True
             
@@ -1134,6 +1090,40 @@ class FiveLibrarySystem:
         
         return sync_result
     
+    @staticmethod
+    def _total_sync_statements(direct_record) -> List[Tuple[str, tuple]]:
+        """把一条直接库记录合并进总库的语句：发现者、UPSERT(结果行为最后一条语句的第一行)"""
+        content_hash = direct_record['content_hash']
+        
+        # 发现者列表(旧数据格式异常时退回首个发现者)
+        direct_discoverers = direct_record['discoverers']
+        try:
+            if not isinstance(json.loads(direct_discoverers), list):
+                raise TypeError(direct_discoverers)
+        except (json.JSONDecodeError, TypeError):
+            direct_discoverers = json.dumps([direct_record['first_discovered_by']])
+        
+        return [(DISCOVERERS_FROM_JSON_INSERT, (content_hash, direct_record['first_discovered_time'],
+                                                direct_discoverers))] + \
+            upsert_returning(TOTAL_EXPERIENCE_UPSERT, (
+                content_hash,
+                direct_record['environment'], direct_record['object'], direct_record['characteristics'],
+                direct_record['action'], direct_record['tools'], direct_record['result'],
+                direct_record['success'], direct_record['occurrence_count'], direct_record['success_count'],
+                direct_record['first_discovered_by'], direct_record['first_discovered_time'],
+                direct_record['last_seen_time'], content_hash,
+                direct_record['avg_success_rate'], experience_confidence(direct_record['occurrence_count'])
+            ), 'total_experiences', content_hash, TOTAL_UPSERT_COLUMNS)
+    
+    @staticmethod
+    def _sync_mark(direct_record) -> Optional[Tuple[str, tuple]]:
+        """记录同步位置的语句；同步位置已是最新(刚插入的新经验在 UPSERT 时即记为已同步)时返回 None"""
+        synced = (direct_record['occurrence_count'], direct_record['last_seen_time'])
+        if 'synced_occurrence_count' in direct_record.keys() and synced == (
+                direct_record['synced_occurrence_count'], direct_record['synced_seen_time']):
+            return None
+        return DIRECT_SYNC_MARK, synced + (direct_record['content_hash'],)
+    
     def batch_sync_experiences(self, limit: int = 100) -> Dict[str, Any]:
         """
         批量同步直接经验库到总经验库
@@ -1396,21 +1386,24 @@ class FiveLibrarySystem:
         start_time = time.time()
         
         try:
-            # 获取高质量经验数据
-            high_quality_experiences = self.db_managers['total_experiences'].execute_query("""
-                SELECT * FROM total_experiences 
-                WHERE occurrence_count >= ? AND confidence >= ?
-                ORDER BY occurrence_count DESC, avg_success_rate DESC
-            """, (min_support, min_confidence))
-            
-            logger.info(f"🔍 找到 {len(high_quality_experiences)} 条高质量经验用于规律生成")
+            # 高质量经验(出现次数 >= min_support 且置信度 >= min_confidence)在各条件组合下的计数：
+            # 先把上次生成之后变化的经验计入列联计数表，再读取计数表，不再读出全部经验
+            db_manager = self.db_managers['total_experiences']
+            with db_manager.lock:
+                experience_contingency.refresh(db_manager.get_connection())
+            condition_stats = experience_contingency.condition_statistics(
+                db_manager.execute_query, min_support, min_confidence)
+            experience_count = sum(stats['supporting_experiences']
+                                   for stats in condition_stats[(experience_contingency.CN1_FIELDS[0],)].values())
+            
+            logger.info(f"🔍 找到 {experience_count} 条高质量经验用于规律生成")
             
             # 生成CN1规律（单条件预测）
-            cn1_rules = self._generate_cn1_rules(high_quality_experiences, min_support, min_confidence)
+            cn1_rules = self._generate_cn1_rules(condition_stats, min_support, min_confidence)
             generation_result['cn1_rules_generated'] = len(cn1_rules)
             
             # 生成CN2规律（多条件预测）
-            cn2_rules = self._generate_cn2_rules(high_quality_experiences, min_support, min_confidence)
+            cn2_rules = self._generate_cn2_rules(condition_stats, min_support, min_confidence)
             generation_result['cn2_rules_generated'] = len(cn2_rules)
             
             # 合并所有规律
@@ -1419,7 +1412,7 @@ class FiveLibrarySystem:
             generation_result['rule_details'] = all_rules
             
             # 计算统计信息
-            generation_result['statistics'] = self._calculate_rule_generation_stats(all_rules, high_quality_experiences)
+            generation_result['statistics'] = self._calculate_rule_generation_stats(all_rules, experience_count)
             
             generation_result['success'] = True
             generation_result['processing_time'] = time.time() - start_time
@@ -1432,12 +1425,12 @@ class FiveLibrarySystem:
         
         return generation_result
     
-    def _generate_cn1_rules(self, experiences: List, min_support: int, min_confidence: float) -> List[Dict]:
+    def _generate_cn1_rules(self, condition_stats: Dict, min_support: int, min_confidence: float) -> List[Dict]:
         """
         生成CN1规律（单条件预测）
         
         Args:
-            experiences: 经验数据列表
+            condition_stats: experience_contingency.condition_statistics 的结果
             min_support: 最小支持度
             min_confidence: 最小置信度
             
@@ -1446,39 +1439,10 @@ class FiveLibrarySystem:
         """
         cn1_rules = []
         
-        # 定义可能的条件字段和预测字段
-        condition_fields = ['environment', 'object', 'characteristics', 'action', 'tools']
-        prediction_fields = ['result', 'success']
-        
         # 为每个条件字段生成规律
-        for condition_field in condition_fields:
-            # 统计条件值的分布
-            condition_stats = {}
-            
-            for exp in experiences:
-                condition_value = exp[condition_field]
-                if condition_value not in condition_stats:
-                    condition_stats[condition_value] = {
-                        'total_count': 0,
-                        'success_count': 0,
-                        'results': {},
-                        'experiences': []
-                    }
-                
-                stats = condition_stats[condition_value]
-                stats['total_count'] += exp['occurrence_count']
-                stats['success_count'] += exp['success_count']
-                stats['experiences'].append(exp)
-                
-                # 统计结果分布
-                result = exp['result']
-                if result not in stats['results']:
-                    stats['results'][result] = {'count': 0, 'success_rate': 0.0}
-                stats['results'][result]['count'] += exp['occurrence_count']
-                stats['results'][result]['success_rate'] = exp['avg_success_rate']
-            
+        for condition_field in experience_contingency.CN1_FIELDS:
             # 为每个条件值生成规律
-            for condition_value, stats in condition_stats.items():
+            for (condition_value,), stats in condition_stats[(condition_field,)].items():
                 if stats['total_count'] >= min_support:
                     # 生成成功率预测规律
                     success_rate = stats['success_count'] / stats['total_count'] if stats['total_count'] > 0 else 0.0
@@ -1486,31 +1450,30 @@ class FiveLibrarySystem:
                     if success_rate >= min_confidence or success_rate <= (1 - min_confidence):
                         cn1_rule = self._create_cn1_rule(
                             condition_field, condition_value, 'success', success_rate >= 0.5,
-                            success_rate, stats['total_count'], stats['experiences']
+                            success_rate, stats['total_count'], stats
                         )
                         cn1_rules.append(cn1_rule)
                     
                     # 生成最可能结果预测规律
                     if stats['results']:
-                        most_common_result = max(stats['results'].items(), key=lambda x: x[1]['count'])
-                        result_name, result_stats = most_common_result
-                        result_confidence = result_stats['count'] / stats['total_count']
+                        result_name, result_count = self._most_common_result(stats['results'])
+                        result_confidence = result_count / stats['total_count']
                         
                         if result_confidence >= min_confidence:
                             cn1_rule = self._create_cn1_rule(
                                 condition_field, condition_value, 'result', result_name,
-                                result_confidence, stats['total_count'], stats['experiences']
+                                result_confidence, stats['total_count'], stats
                             )
                             cn1_rules.append(cn1_rule)
         
         return cn1_rules
     
-    def _generate_cn2_rules(self, experiences: List, min_support: int, min_confidence: float) -> List[Dict]:
+    def _generate_cn2_rules(self, condition_stats: Dict, min_support: int, min_confidence: float) -> List[Dict]:
         """
         生成CN2规律（多条件预测）
         
         Args:
-            experiences: 经验数据列表
+            condition_stats: experience_contingency.condition_statistics 的结果
             min_support: 最小支持度
             min_confidence: 最小置信度
             
@@ -1519,50 +1482,9 @@ class FiveLibrarySystem:
         """
         cn2_rules = []
         
-        # 定义条件字段组合
-        condition_combinations = [
-            ['environment', 'object'],
-            ['environment', 'action'],
-            ['object', 'action'],
-            ['action', 'tools'],
-            ['environment', 'object', 'action'],
-            ['object', 'characteristics', 'action'],
-            ['environment', 'action', 'tools']
-        ]
-        
-        prediction_fields = ['result', 'success']
-        
         # 为每个条件组合生成规律
-        for condition_fields in condition_combinations:
-            # 统计条件组合的分布
-            combination_stats = {}
-            
-            for exp in experiences:
-                # 创建条件组合键
-                condition_key = tuple(exp[field] for field in condition_fields)
-                
-                if condition_key not in combination_stats:
-                    combination_stats[condition_key] = {
-                        'total_count': 0,
-                        'success_count': 0,
-                        'results': {},
-                        'experiences': []
-                    }
-                
-                stats = combination_stats[condition_key]
-                stats['total_count'] += exp['occurrence_count']
-                stats['success_count'] += exp['success_count']
-                stats['experiences'].append(exp)
-                
-                # 统计结果分布
-                result = exp['result']
-                if result not in stats['results']:
-                    stats['results'][result] = {'count': 0, 'success_rate': 0.0}
-                stats['results'][result]['count'] += exp['occurrence_count']
-                stats['results'][result]['success_rate'] = exp['avg_success_rate']
-            
-            # 为每个条件组合生成规律
-            for condition_values, stats in combination_stats.items():
+        for condition_fields in experience_contingency.CN2_COMBINATIONS:
+            for condition_values, stats in condition_stats[tuple(condition_fields)].items():
                 if stats['total_count'] >= min_support:
                     # 创建条件字典
                     conditions = dict(zip(condition_fields, condition_values))
@@ -1573,27 +1495,31 @@ class FiveLibrarySystem:
                     if success_rate >= min_confidence or success_rate <= (1 - min_confidence):
                         cn2_rule = self._create_cn2_rule(
                             conditions, 'success', success_rate >= 0.5,
-                            success_rate, stats['total_count'], stats['experiences']
+                            success_rate, stats['total_count'], stats
                         )
                         cn2_rules.append(cn2_rule)
                     
                     # 生成最可能结果预测规律
                     if stats['results']:
-                        most_common_result = max(stats['results'].items(), key=lambda x: x[1]['count'])
-                        result_name, result_stats = most_common_result
-                        result_confidence = result_stats['count'] / stats['total_count']
+                        result_name, result_count = self._most_common_result(stats['results'])
+                        result_confidence = result_count / stats['total_count']
                         
                         if result_confidence >= min_confidence:
                             cn2_rule = self._create_cn2_rule(
                                 conditions, 'result', result_name,
-                                result_confidence, stats['total_count'], stats['experiences']
+                                result_confidence, stats['total_count'], stats
                             )
                             cn2_rules.append(cn2_rule)
         
         return cn2_rules
     
+    @staticmethod
+    def _most_common_result(results: Dict[str, int]) -> Tuple[str, int]:
+        """出现次数最多的结果(次数相同时取结果名较小者)"""
+        return min(results.items(), key=lambda item: (-item[1], item[0]))
+    
     def _create_cn1_rule(self, condition_field: str, condition_value: str, prediction_field: str, 
-                        prediction_value, confidence: float, support_count: int, experiences: List) -> Dict:
+                        prediction_value, confidence: float, support_count: int, support: Dict) -> Dict:
         """
         创建CN1规律
         
@@ -1604,7 +1530,7 @@ class FiveLibrarySystem:
             prediction_value: 预测值
             confidence: 置信度
             support_count: 支持度
-            experiences: 支持该规律的经验列表
+            support: 条件取值的统计(发现者、最早发现/最近出现时间、支持经验条数)
             
         Returns:
             CN1规律字典
@@ -1614,21 +1540,6 @@ class FiveLibrarySystem:
         
         rule_id = f"CN1_{hashlib.md5(f'{conditions}_{predictions}'.encode()).hexdigest()[:12]}"
         
-        # 计算额外统计信息
-        discoverers = set()
-        first_discovery_time = float('inf')
-        last_seen_time = 0.0
-        
-        for exp in experiences:
-            try:
-                exp_discoverers = json.loads(exp['discoverers'])
-                discoverers.update(exp_discoverers)
-            except (json.JSONDecodeError, TypeError):
-                discoverers.add(exp['first_discovered_by'])
-            
-            first_discovery_time = min(first_discovery_time, exp['first_discovered_time'])
-            last_seen_time = max(last_seen_time, exp['last_seen_time'])
-        
         return {
             'rule_id': rule_id,
             'rule_type': 'CN1',
@@ -1640,15 +1551,15 @@ class FiveLibrarySystem:
             'created_time': time.time(),
             'creator_id': 'BPM_SYSTEM',
             'validation_status': 'pending',
-            'discoverers': list(discoverers),
-            'first_discovered_time': first_discovery_time if first_discovery_time != float('inf') else time.time(),
-            'last_seen_time': last_seen_time,
-            'supporting_experiences': len(experiences),
+            'discoverers': sorted(support['discoverers']),
+            'first_discovered_time': support['first_discovered_time'] or time.time(),
+            'last_seen_time': support['last_seen_time'] or 0.0,
+            'supporting_experiences': support['supporting_experiences'],
             'content_hash': hashlib.md5(f'{conditions}_{predictions}'.encode()).hexdigest()
         }
     
     def _create_cn2_rule(self, conditions: Dict, prediction_field: str, prediction_value, 
-                        confidence: float, support_count: int, experiences: List) -> Dict:
+                        confidence: float, support_count: int, support: Dict) -> Dict:
         """
         创建CN2规律
         
@@ -1658,7 +1569,7 @@ class FiveLibrarySystem:
             prediction_value: 预测值
             confidence: 置信度
             support_count: 支持度
-            experiences: 支持该规律的经验列表
+            support: 条件取值的统计(发现者、最早发现/最近出现时间、支持经验条数)
             
         Returns:
             CN2规律字典
@@ -1667,21 +1578,6 @@ class FiveLibrarySystem:
         
         rule_id = f"CN2_{hashlib.md5(f'{conditions}_{predictions}'.encode()).hexdigest()[:12]}"
         
-        # 计算额外统计信息
-        discoverers = set()
-        first_discovery_time = float('inf')
-        last_seen_time = 0.0
-        
-        for exp in experiences:
-            try:
-                exp_discoverers = json.loads(exp['discoverers'])
-                discoverers.update(exp_discoverers)
-            except (json.JSONDecodeError, TypeError):
-                discoverers.add(exp['first_discovered_by'])
-            
-            first_discovery_time = min(first_discovery_time, exp['first_discovered_time'])
-            last_seen_time = max(last_seen_time, exp['last_seen_time'])
-        
         return {
             'rule_id': rule_id,
             'rule_type': 'CN2',
@@ -1693,26 +1589,26 @@ class FiveLibrarySystem:
             'created_time': time.time(),
             'creator_id': 'BPM_SYSTEM',
             'validation_status': 'pending',
-            'discoverers': list(discoverers),
-            'first_discovered_time': first_discovery_time if first_discovery_time != float('inf') else time.time(),
-            'last_seen_time': last_seen_time,
-            'supporting_experiences': len(experiences),
+            'discoverers': sorted(support['discoverers']),
+            'first_discovered_time': support['first_discovered_time'] or time.time(),
+            'last_seen_time': support['last_seen_time'] or 0.0,
+            'supporting_experiences': support['supporting_experiences'],
             'content_hash': hashlib.md5(f'{conditions}_{predictions}'.encode()).hexdigest()
         }
     
-    def _calculate_rule_generation_stats(self, rules: List[Dict], experiences: List) -> Dict:
+    def _calculate_rule_generation_stats(self, rules: List[Dict], experience_count: int) -> Dict:
         """
         计算规律生成统计信息
         
         Args:
             rules: 生成的规律列表
-            experiences: 原始经验数据
+            experience_count: 参与生成的经验条数
             
         Returns:
             统计信息字典
         """
         stats = {
-            'total_experiences_processed': len(experiences),
+            'total_experiences_processed': experience_count,
             'total_rules_generated': len(rules),
             'cn1_rules': len([r for r in rules if r['rule_type'] == 'CN1']),
             'cn2_rules': len([r for r in rules if r['rule_type'] == 'CN2']),
@@ -1769,10 +1665,11 @@ class FiveLibrarySystem:
         for rule in rules:
             covered_experiences.add(rule['content_hash'])
         
-        stats['coverage_rate'] = len(covered_experiences) / max(len(experiences), 1)
+        stats['coverage_rate'] = len(covered_experiences) / max(experience_count, 1)
         
         return stats
     
+    @profiled("five_library.add_rules")
     def add_rules_to_direct_library(self, rules: List[Dict]) -> Dict[str, Any]:
         """添加规律列表到直接规律库"""
         if not rules:
@@ -1813,6 +1710,29 @@ class FiveLibrarySystem:
                     creator_id=rule.get('creator_id', 'system')
                 ).generate_hash()
                 
+                row = (
+                    rule['rule_id'],
+                    content_hash,
+                    rule['rule_type'],
+                    json.dumps(rule['conditions']),
+                    json.dumps(rule['predictions']),
+                    rule['confidence'],
+                    rule.get('support_count', 0),
+                    rule.get('contradiction_count', 0),
+                    rule.get('validation_count', 0),
+                    time.time(),
+                    rule.get('creator_id', 'system'),
+                    rule.get('validation_status', 'pending')
+                )
+                
+                if self.write_buffer is not None:
+                    # 写后缓冲模式：数据库中已有的同内容规律在写入时忽略
+                    if self.write_buffer.queue_rule(content_hash, row):
+                        added_rules.append(rule['rule_id'])
+                    else:
+                        duplicate_rules.append(rule['rule_id'])
+                    continue
+                
                 # 检查重复
                 existing = db_manager.execute_query(
                     "SELECT rule_id FROM direct_rules WHERE content_hash = ?",
@@ -1830,20 +1750,7 @@ class FiveLibrarySystem:
                         confidence, support_count, contradiction_count, validation_count,
                         created_time, creator_id, validation_status
                     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    rule['rule_id'],
-                    content_hash,
-                    rule['rule_type'],
-                    json.dumps(rule['conditions']),
-                    json.dumps(rule['predictions']),
-                    rule['confidence'],
-                    rule.get('support_count', 0),
-                    rule.get('contradiction_count', 0),
-                    rule.get('validation_count', 0),
-                    time.time(),
-                    rule.get('creator_id', 'system'),
-                    rule.get('validation_status', 'pending')
-                ))
+                """, row)
                 
                 added_rules.append(rule['rule_id'])
                 
@@ -1877,6 +1784,7 @@ class FiveLibrarySystem:
         
         return result
     
+    @profiled("five_library.add_rule")
     def add_rule(self, rule_type: str = None, conditions: Dict = None, predictions: Dict = None, 
                  confidence: float = 0.7, creator_id: str = "system", rule_dict: Dict = None, 
                  **kwargs) -> Dict[str, Any]:
@@ -2016,6 +1924,24 @@ class FiveLibrarySystem:
         Args:
             experience: 新的EOCATR经验
             
+        Returns:
+            验证结果
+        """
+        pending_updates = []
+        validation_result = self._validate_rules_with_index(experience, {}, pending_updates)
+        self._apply_rule_validations(pending_updates)
+        return validation_result
+    
+    def _validate_rules_with_index(self, experience: EOCATRExperience, active_rules: Dict[str, Dict],
+                                   pending_updates: List[Tuple[str, tuple]]) -> Dict[str, Any]:
+        """
+        用条件倒排索引找出候选规律并验证，验证结果记入 pending_updates，由调用方一次写入
+        
+        Args:
+            experience: 新的EOCATR经验
+            active_rules: 本批次已读取的规律(rule_id -> 规律记录，随验证结果在内存中更新)
+            pending_updates: 待执行的 (sql, params) 列表
+            
         Returns:
             验证结果
         """
@@ -2042,31 +1968,28 @@ class FiveLibrarySystem:
             normalized_exp = exp_validation['normalized_experience']
             validation_result['experience_hash'] = normalized_exp.generate_hash()
             
-            # 获取所有待验证的规律
-            pending_rules = self.db_managers['direct_rules'].execute_query("""
-                SELECT * FROM direct_rules 
-                WHERE validation_status = 'pending' OR validation_status = 'validated'
-                ORDER BY confidence DESC, support_count DESC
-            """)
+            # 只读取条件全部命中的待验证规律
+            self.rule_index.refresh()
+            candidate_rules = self._load_active_rules(self.rule_index.candidates(normalized_exp), active_rules)
             
-            logger.info(f"🔍 开始验证 {len(pending_rules)} 条规律")
+            logger.info(f"🔍 开始验证 {len(candidate_rules)} 条候选规律 (索引中共 {len(self.rule_index)} 条)")
             
             # 逐一验证规律
-            for rule in pending_rules:
+            for rule in candidate_rules:
                 match_result = self._match_rule_with_experience(rule, normalized_exp)
                 
                 if match_result['is_match']:
                     validation_result['matched_rules'].append(rule['rule_id'])
+                    confidence_before = rule['confidence']
                     
                     # 执行验证
                     verify_result = self._verify_rule_prediction(rule, normalized_exp, match_result)
                     
                     if verify_result['is_correct']:
                         validation_result['validated_rules'] += 1
-                        self._update_rule_validation_success(rule, verify_result)
                     else:
                         validation_result['contradicted_rules'] += 1
-                        self._update_rule_validation_failure(rule, verify_result)
+                    self._record_rule_validation(rule, verify_result, pending_updates)
                     
                     validation_result['updated_rules'] += 1
                     validation_result['validation_details'].append({
@@ -2077,8 +2000,8 @@ class FiveLibrarySystem:
                         'prediction_field': verify_result['prediction_field'],
                         'expected_value': verify_result['expected_value'],
                         'actual_value': verify_result['actual_value'],
-                        'confidence_before': rule['confidence'],
-                        'confidence_after': verify_result.get('new_confidence', rule['confidence'])
+                        'confidence_before': confidence_before,
+                        'confidence_after': verify_result.get('new_confidence', confidence_before)
                     })
             
             validation_result['success'] = True
@@ -2092,6 +2015,28 @@ class FiveLibrarySystem:
         
         return validation_result
     
+    def _load_active_rules(self, rule_ids: List[str], active_rules: Dict[str, Dict]) -> List[Dict]:
+        """
+        读取候选规律中仍为 pending/validated 的记录，按置信度、支持度从高到低排列
+        
+        已被拒绝或删除的规律(例如由其他实例验证)移出倒排索引。
+        """
+        missing = [rule_id for rule_id in rule_ids if rule_id not in active_rules]
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = self.db_managers['direct_rules'].execute_query(f"""
+                SELECT * FROM direct_rules
+                WHERE rule_id IN ({', '.join('?' * len(chunk))}) AND validation_status IN (?, ?)
+            """, tuple(chunk) + ACTIVE_STATUSES)
+            for row in rows:
+                active_rules[row['rule_id']] = dict(row)
+        self.rule_index.discard_all(rule_id for rule_id in missing if rule_id not in active_rules)
+        
+        rules = [active_rules[rule_id] for rule_id in rule_ids
+                 if rule_id in active_rules and active_rules[rule_id]['validation_status'] in ACTIVE_STATUSES]
+        rules.sort(key=lambda rule: (rule['confidence'], rule['support_count'] or 0), reverse=True)
+        return rules
+    
     def _match_rule_with_experience(self, rule: dict, experience: EOCATRExperience) -> Dict[str, Any]:
         """
         检查规律是否与经验匹配
@@ -2229,67 +2174,48 @@ class FiveLibrarySystem:
         
         return verify_result
     
-    def _update_rule_validation_success(self, rule: dict, verify_result: dict):
+    def _record_rule_validation(self, rule: dict, verify_result: dict, pending_updates: List[Tuple[str, tuple]]):
         """
-        更新规律验证成功的统计
+        记录一次规律验证结果：加入待执行的更新，并在内存中同步更新规律记录(供同一批次后续的经验使用)
         
         Args:
             rule: 规律记录
             verify_result: 验证结果
+            pending_updates: 待执行的 (sql, params) 列表
         """
-        try:
-            self.db_managers['direct_rules'].execute_update("""
-                UPDATE direct_rules 
-                SET support_count = support_count + 1,
-                    confidence = ?,
-                    last_validated = ?,
-                    validation_count = validation_count + 1,
-                    validation_status = CASE 
-                        WHEN validation_count + 1 >= 3 AND confidence >= 0.7 THEN 'validated'
-                        ELSE validation_status
-                    END
-                WHERE rule_id = ?
-            """, (
-                verify_result['new_confidence'],
-                time.time(),
-                rule['rule_id']
-            ))
-            
-            logger.debug(f"✅ 规律 {rule['rule_id']} 验证成功更新")
-            
-        except Exception as e:
-            logger.error(f"❌ 更新规律验证成功失败: {str(e)}")
+        now = time.time()
+        new_confidence = verify_result['new_confidence']
+        validation_count = rule['validation_count'] or 0
+        
+        if verify_result['is_correct']:
+            sql = RULE_VALIDATION_SUCCESS_UPDATE
+            if validation_count + 1 >= 3 and rule['confidence'] >= 0.7:
+                rule['validation_status'] = 'validated'
+            rule['support_count'] = (rule['support_count'] or 0) + 1
+        else:
+            sql = RULE_VALIDATION_FAILURE_UPDATE
+            contradiction_count = rule['contradiction_count'] or 0
+            if contradiction_count + 1 >= 3 or rule['confidence'] < 0.3:
+                rule['validation_status'] = 'rejected'
+                self.rule_index.discard(rule['rule_id'])
+            rule['contradiction_count'] = contradiction_count + 1
+        
+        rule['validation_count'] = validation_count + 1
+        rule['confidence'] = new_confidence
+        rule['last_validated'] = now
+        pending_updates.append((sql, (new_confidence, now, rule['rule_id'])))
     
-    def _update_rule_validation_failure(self, rule: dict, verify_result: dict):
-        """
-        更新规律验证失败的统计
-        
-        Args:
-            rule: 规律记录
-            verify_result: 验证结果
-        """
+    def _apply_rule_validations(self, pending_updates: List[Tuple[str, tuple]]) -> int:
+        """在一个事务中写入全部规律验证结果，返回更新的条数"""
+        if not pending_updates:
+            return 0
         try:
-            self.db_managers['direct_rules'].execute_update("""
-                UPDATE direct_rules 
-                SET contradiction_count = contradiction_count + 1,
-                    confidence = ?,
-                    last_validated = ?,
-                    validation_count = validation_count + 1,
-                    validation_status = CASE 
-                        WHEN contradiction_count + 1 >= 3 OR confidence < 0.3 THEN 'rejected'
-                        ELSE validation_status
-                    END
-                WHERE rule_id = ?
-            """, (
-                verify_result['new_confidence'],
-                time.time(),
-                rule['rule_id']
-            ))
-            
-            logger.debug(f"⚠️ 规律 {rule['rule_id']} 验证失败更新")
-            
+            self.db_managers['direct_rules'].execute_transaction(pending_updates)
+            logger.debug(f"✅ {len(pending_updates)} 条规律验证结果已更新")
+            return len(pending_updates)
         except Exception as e:
-            logger.error(f"❌ 更新规律验证失败失败: {str(e)}")
+            logger.error(f"❌ 更新规律验证结果失败: {str(e)}")
+            return 0
     
     def batch_validate_rules(self, experiences: List[EOCATRExperience]) -> Dict[str, Any]:
         """
@@ -2315,8 +2241,11 @@ class FiveLibrarySystem:
         start_time = time.time()
         
         try:
+            # 同一批次的规律记录只读取一次，验证结果最后在一个事务中写入
+            active_rules = {}
+            pending_updates = []
             for i, experience in enumerate(experiences):
-                validation_result = self.validate_rules_against_experience(experience)
+                validation_result = self._validate_rules_with_index(experience, active_rules, pending_updates)
                 
                 if validation_result['success']:
                     batch_result['processed_experiences'] += 1
@@ -2328,6 +2257,8 @@ class FiveLibrarySystem:
                 if (i + 1) % 10 == 0:
                     logger.info(f"📊 批量验证进度: {i + 1}/{len(experiences)}")
             
+            self._apply_rule_validations(pending_updates)
+            
             # 生成验证摘要
             batch_result['validation_summary'] = self._generate_validation_summary()
             batch_result['updated_rules'] = list(batch_result['updated_rules'])
@@ -2841,6 +2772,7 @@ class FiveLibrarySystem:
                     last_validated, validation_status
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, insert_data)
+            self.cache['rule_hashes'].add(rule_dict['content_hash'])
             
             create_result['new_rule_id'] = new_rule_id
             create_result['fields_copied'] = [
@@ -2980,22 +2912,31 @@ class FiveLibrarySystem:
         
         return sync_result
     
-    def get_recent_experiences(self, limit: int = 5) -> List[Dict]:
+    def get_recent_experiences(self, limit: int = 5, player_id: str = None) -> List[Dict]:
         """
         获取最近的直接经验
         
         Args:
             limit: 返回的经验数量限制
+            player_id: 只返回该玩家发现过的经验(玩家命名空间)，为 None 时返回所有玩家的
             
         Returns:
             最近的经验列表
         """
         try:
-            recent_experiences = self.db_managers['direct_experiences'].execute_query("""
-                SELECT * FROM direct_experiences 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (limit,))
+            if player_id is None:
+                recent_experiences = self.db_managers['direct_experiences'].execute_query("""
+                    SELECT * FROM direct_experiences 
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                """, (limit,))
+            else:
+                recent_experiences = self.db_managers['direct_experiences'].execute_query("""
+                    SELECT * FROM direct_experiences 
+                    WHERE content_hash IN (SELECT content_hash FROM experience_discoverers WHERE player_id = ?)
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                """, (player_id, limit))
             
             return [dict(exp) for exp in recent_experiences]
             
@@ -3003,22 +2944,31 @@ class FiveLibrarySystem:
             logger.error(f"❌ 获取最近经验失败: {str(e)}")
             return []
     
-    def get_recent_rules(self, limit: int = 5) -> List[Dict]:
+    def get_recent_rules(self, limit: int = 5, creator_id: str = None) -> List[Dict]:
         """
         获取最近的直接规律
         
         Args:
             limit: 返回的规律数量限制
+            creator_id: 只返回该玩家创建的规律(玩家命名空间)，为 None 时返回所有玩家的
             
         Returns:
             最近的规律列表
         """
         try:
-            recent_rules = self.db_managers['direct_rules'].execute_query("""
-                SELECT * FROM direct_rules 
-                ORDER BY created_time DESC 
-                LIMIT ?
-            """, (limit,))
+            if creator_id is None:
+                recent_rules = self.db_managers['direct_rules'].execute_query("""
+                    SELECT * FROM direct_rules 
+                    ORDER BY created_time DESC 
+                    LIMIT ?
+                """, (limit,))
+            else:
+                recent_rules = self.db_managers['direct_rules'].execute_query("""
+                    SELECT * FROM direct_rules 
+                    WHERE creator_id = ?
+                    ORDER BY created_time DESC 
+                    LIMIT ?
+                """, (creator_id, limit))
             
             return [dict(rule) for rule in recent_rules]
             
@@ -3685,6 +3635,22 @@ class FiveLibrarySystem:
             # 生成内容哈希
             content_hash = decision.generate_hash()
             
+            if self.write_buffer is not None:
+                # 写后缓冲模式：同一决策的多次使用合并为一次 UPDATE
+                row = (
+                    decision.decision_id, content_hash, json.dumps(decision.context), decision.action,
+                    decision.confidence, decision.source, decision.success_count, decision.failure_count,
+                    decision.total_uses, decision.created_time, decision.last_used, 0.0, 0.0
+                )
+                known = (self.write_buffer.has_pending_decision(content_hash) or
+                         content_hash in self.cache['decision_hashes'])
+                add_result['decision_id'] = self.write_buffer.queue_decision(content_hash, row, time.time())
+                self.cache['decision_hashes'].add(content_hash)
+                add_result['action'] = 'updated' if known else 'added'
+                add_result['success'] = True
+                add_result['processing_time'] = time.time() - start_time
+                return add_result
+            
             # 检查是否已存在
             existing_decision = self.db_managers['decisions'].execute_query(
                 "SELECT * FROM decisions WHERE content_hash = ?", (content_hash,)
@@ -3731,6 +3697,7 @@ class FiveLibrarySystem:
                     0.0   # emrs_score
                 ))
                 
+                self.cache['decision_hashes'].add(content_hash)
                 add_result['action'] = 'added'
                 add_result['decision_id'] = decision.decision_id
             
@@ -4060,10 +4027,33 @@ class FiveLibrarySystem:
         
         return recommendations
 
+    def __setstate__(self, state):
+        # 恢复快照：内存模式需要在新进程中重新登记内存数据库
+        self.__dict__.update(state)
+        if getattr(self, 'storage', 'disk') == "memory":
+            for path in self.db_paths.values():
+                sqlite_pool.use_memory(str(path))
+
+    def flush_pending_writes(self) -> int:
+        """立即写入写后缓冲中的记录，返回写入的行数(未启用时为 0)"""
+        return self.write_buffer.flush() if self.write_buffer is not None else 0
+
+    def checkpoint(self) -> int:
+        """内存模式：先写入写后缓冲，再把五个内存数据库写回 .db 文件，返回写回的数据库数量"""
+        self.flush_pending_writes()
+        if self.storage != "memory":
+            return 0
+        return sum(sqlite_pool.checkpoint(str(path)) for path in self.db_paths.values())
+
     def close(self):
         """关闭系统资源"""
+        if self.write_buffer is not None:
+            self.write_buffer.close()
         # 清理缓存
         self.cache.clear()
+        # 关闭数据库长连接(同一路径的其他实例下次访问时会重新打开)
+        for db_manager in self.db_managers.values():
+            db_manager.close()
         logger.info("🔒 五库系统已关闭")
 
     # ========== 对象属性验证和工具有效性分析 ==========
@@ -4574,26 +4564,22 @@ class FiveLibrarySystem:
     def _initialize_sync_tracker(self):
         """初始化同步状态跟踪器"""
         try:
-            # 获取总经验库中所有已同步的经验哈希
-            total_hashes = self.db_managers['total_experiences'].execute_query(
-                "SELECT content_hash FROM total_experiences"
-            )
-            
-            for record in total_hashes:
-                self.sync_tracker['synced_experience_hashes'].add(record['content_hash'])
+            # 已同步 = 已在总经验库中：与经验哈希缓存共用同一个成员集合，不再把总经验库整表读入内存
+            self.sync_tracker['synced_experience_hashes'] = self.cache['experience_hashes']
             
             logger.info(f"📊 Sync tracker initialized: {len(self.sync_tracker['synced_experience_hashes'])} experiences synced")
             
         except Exception as e:
             logger.warning(f"⚠️ Sync tracker initialization failed: {e}")
 
-    def _smart_sync_experience(self, content_hash: str, action: str):
+    def _smart_sync_experience(self, content_hash: str, action: str, direct_record=None):
         """
         智能同步经验：只同步真正需要同步的经验
         
         Args:
             content_hash: 经验内容哈希
             action: 操作类型 ('added', 'updated')
+            direct_record: 刚写入的直接经验库记录(可选，省去重新查询)
         """
         try:
             # 1. 检查是否已经同步过
@@ -4601,7 +4587,7 @@ class FiveLibrarySystem:
                 # 如果是更新操作，检查是否需要重新同步
                 if action == 'updated':
                     # 检查更新是否显著（例如occurrence_count变化超过阈值）
-                    if self._should_resync_updated_experience(content_hash):
+                    if self._should_resync_updated_experience(content_hash, direct_record):
                         logger.debug(f"🔄 经验需要重新同步: {content_hash[:16]}...")
                         self._add_to_pending_sync(content_hash)
                     else:
@@ -4614,7 +4600,7 @@ class FiveLibrarySystem:
             # 2. 新经验或需要重新同步的经验
             if action == 'added':
                 # 立即同步新经验
-                sync_result = self.sync_experience_to_total_library(content_hash)
+                sync_result = self.sync_experience_to_total_library(content_hash, direct_record)
                 if sync_result['success']:
                     self.sync_tracker['synced_experience_hashes'].add(content_hash)
                     logger.debug(f"✅ 新经验立即同步: {sync_result['action']} - {content_hash[:16]}...")
@@ -4630,40 +4616,28 @@ class FiveLibrarySystem:
         except Exception as e:
             logger.warning(f"⚠️ Smart sync failed: {e}")
     
-    def _should_resync_updated_experience(self, content_hash: str) -> bool:
+    def _should_resync_updated_experience(self, content_hash: str, direct_record=None) -> bool:
         """
-        判断更新的经验是否需要重新同步
+        判断更新的经验是否需要重新同步：自上次同步以来新增出现超过5次，或最近出现时间推后超过1小时
         
         Args:
             content_hash: 经验内容哈希
+            direct_record: 直接经验库中的记录(可选；UPSERT 返回的行已带 needs_resync)
             
         Returns:
             是否需要重新同步
         """
         try:
-            # 获取直接经验库中的记录
-            direct_record = self.db_managers['direct_experiences'].execute_query(
-                "SELECT occurrence_count, last_seen_time FROM direct_experiences WHERE content_hash = ?", 
-                (content_hash,)
-            )
-            
-            # 获取总经验库中的记录
-            total_record = self.db_managers['total_experiences'].execute_query(
-                "SELECT occurrence_count, last_seen_time FROM total_experiences WHERE content_hash = ?", 
-                (content_hash,)
-            )
-            
-            if not direct_record or not total_record:
-                return True  # 如果记录不存在，需要同步
-            
-            direct_count = direct_record[0]['occurrence_count']
-            total_count = total_record[0]['occurrence_count']
-            
-            # 如果occurrence_count差异超过5，或者时间差异超过1小时，则需要重新同步
-            count_diff = abs(direct_count - total_count)
-            time_diff = abs(direct_record[0]['last_seen_time'] - total_record[0]['last_seen_time'])
+            if direct_record is None or 'needs_resync' not in direct_record.keys():
+                direct_record = self.db_managers['direct_experiences'].execute_query(
+                    f"SELECT {DIRECT_RESYNC_CHECK} FROM direct_experiences WHERE content_hash = ?",
+                    (content_hash,)
+                )
+                if not direct_record:
+                    return True  # 如果记录不存在，需要同步
+                direct_record = direct_record[0]
             
-            return count_diff >= 5 or time_diff >= 3600
+            return bool(direct_record['needs_resync'])
             
         except Exception as e:
             logger.debug(f"检查重新同步需求失败: {e}")
@@ -4697,29 +4671,39 @@ class FiveLibrarySystem:
         if not self.sync_tracker['pending_sync_hashes']:
             return
         
-        sync_count = 0
-        failed_count = 0
-        
         # 复制待同步集合，避免在迭代时修改
         pending_hashes = self.sync_tracker['pending_sync_hashes'].copy()
         self.sync_tracker['pending_sync_hashes'].clear()
         
-        for content_hash in pending_hashes:
+        # 一次读出全部待同步记录，总库的合并、直接库的同步位置各在一个事务中完成
+        try:
+            direct_records = self.db_managers['direct_experiences'].execute_query(
+                "SELECT * FROM direct_experiences WHERE content_hash IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(pending_hashes)),)
+            )
+            statements = []
+            for direct_record in direct_records:
+                statements.extend(self._total_sync_statements(direct_record))
+            self.db_managers['total_experiences'].execute_transaction(statements)
+        except Exception as e:
+            logger.warning(f"批量同步失败: {e}")
+            # 失败的重新加入待同步队列
+            self.sync_tracker['pending_sync_hashes'].update(pending_hashes)
+            return
+        
+        synced_hashes = {direct_record['content_hash'] for direct_record in direct_records}
+        self.sync_tracker['synced_experience_hashes'].update(synced_hashes)
+        # 直接库中找不到的重新加入待同步队列
+        self.sync_tracker['pending_sync_hashes'].update(pending_hashes - synced_hashes)
+        sync_count, failed_count = len(synced_hashes), len(pending_hashes) - len(synced_hashes)
+        
+        # 总库已合并：同步位置写入失败时不重新同步，以免重复计数
+        sync_marks = [mark for mark in map(self._sync_mark, direct_records) if mark is not None]
+        if sync_marks:
             try:
-                sync_result = self.sync_experience_to_total_library(content_hash)
-                if sync_result['success']:
-                    self.sync_tracker['synced_experience_hashes'].add(content_hash)
-                    sync_count += 1
-                else:
-                    failed_count += 1
-                    # 失败的重新加入待同步队列
-                    self.sync_tracker['pending_sync_hashes'].add(content_hash)
-                    
+                self.db_managers['direct_experiences'].execute_transaction(sync_marks)
             except Exception as e:
-                failed_count += 1
-                logger.warning(f"批量同步失败: {content_hash[:16]}... - {e}")
-                # 失败的重新加入待同步队列
-                self.sync_tracker['pending_sync_hashes'].add(content_hash)
+                logger.warning(f"记录同步位置失败: {e}")
         
         logger.info(f"📊 Sync completed: {sync_count} successful/{failed_count} failed")  # Simplified log
 
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+five_library_write_behind.py
+五库系统的写后缓冲(write-behind)队列
+
+默认模式下每条经验都要各自提交一次直接经验库和总经验库的事务。启用写后缓冲后，FiveLibrarySystem 只在内存中去重并把记录
+放入本缓冲区，立即返回；后台线程每隔 flush_interval 秒把缓冲区合并写入：
+
+    直接经验库 / 总经验库  同一 content_hash 的出现次数、成功次数合并为一行，
+                           executemany UPSERT (ON CONFLICT(content_hash) DO UPDATE)，
+                           发现者写入 experience_discoverers
+    直接规律库             INSERT ... ON CONFLICT DO NOTHING
+    决策库                 INSERT OR IGNORE 后按合并的使用次数 UPDATE
+
+每个数据库每次刷新只有一个事务。Game 每天的知识同步之前、游戏结束(end_game)、close()
+和进程退出时强制刷新。进程内所有缓冲区共享一个后台线程。
+未刷新的记录对数据库查询不可见，因此启用后同一天内读取五库的决策可能与默认模式不同。
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Tuple
+
+import sqlite_pool
+from five_library_sql import (
+    DECISION_INSERT, DECISION_USE_UPDATE, DIRECT_EXPERIENCE_BATCH_UPSERT, DIRECT_RULE_INSERT,
+    DISCOVERER_INSERT, TOTAL_EXPERIENCE_UPSERT, experience_confidence,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class WriteBehindBuffer:
+    """一个 FiveLibrarySystem 实例的待写入记录(按 content_hash 合并)"""
+
+    def __init__(self, db_paths: Dict[str, Any], flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.db_paths = {name: str(path) for name, path in db_paths.items()}
+        self.flush_interval = flush_interval
+        self._init_runtime()
+        self._experiences: Dict[str, Dict[str, Any]] = {}
+        self._rules: Dict[str, tuple] = {}
+        self._decisions: Dict[str, Dict[str, Any]] = {}
+        self._queued_rule_hashes = set()  # 本实例排过队的规律(内存去重)
+        self.stats = {"queued": 0, "flushes": 0, "rows_written": 0, "transactions": 0, "failed": 0}
+        _flusher.register(self)
+
+    def _init_runtime(self):
+        self._lock = threading.Lock()        # 保护待写入字典
+        self._flush_lock = threading.Lock()  # 同一时刻只有一个刷新
+        self.last_flush = time.time()
+
+    def __getstate__(self):
+        # Game 快照前先把缓冲区写入数据库，快照中只保留配置和统计
+        self.flush()
+        state = self.__dict__.copy()
+        for key in ("_lock", "_flush_lock"):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+        _flusher.register(self)
+
+    # ---------- 入队 ----------
+
+    def queue_experience(self, storage_data: Dict[str, Any]) -> bool:
+        """合并一条格式化后的经验，返回缓冲区中此前是否没有该 content_hash"""
+        player_id = storage_data['player_id']
+        timestamp = storage_data['timestamp']
+        with self._lock:
+            self.stats["queued"] += 1
+            entry = self._experiences.get(storage_data['content_hash'])
+            if entry is None:
+                self._experiences[storage_data['content_hash']] = {
+                    'data': storage_data,
+                    'occurrence_count': 1,
+                    'success_count': int(storage_data['success']),
+                    'first_time': timestamp,
+                    'last_seen_time': timestamp,
+                    'discoverers': [player_id],
+                }
+                return True
+            entry['occurrence_count'] += 1
+            entry['success_count'] += int(storage_data['success'])
+            entry['last_seen_time'] = max(entry['last_seen_time'], timestamp)
+            if player_id not in entry['discoverers']:
+                entry['discoverers'].append(player_id)
+            return False
+
+    def queue_rule(self, content_hash: str, row: tuple) -> bool:
+        """排队插入一条规律，本实例已排过队的内容返回 False"""
+        with self._lock:
+            if content_hash in self._queued_rule_hashes:
+                return False
+            self._queued_rule_hashes.add(content_hash)
+            self._rules[content_hash] = row
+            self.stats["queued"] += 1
+            return True
+
+    def queue_decision(self, content_hash: str, row: tuple, used_time: float) -> str:
+        """排队一次决策使用(新决策插入，已有决策 total_uses + 1)，返回缓冲区中该决策的 decision_id"""
+        with self._lock:
+            self.stats["queued"] += 1
+            entry = self._decisions.get(content_hash)
+            if entry is None:
+                self._decisions[content_hash] = {'row': row, 'uses': 1, 'last_used': used_time}
+                return row[0]
+            entry['uses'] += 1
+            entry['last_used'] = max(entry['last_used'], used_time)
+            return entry['row'][0]
+
+    def has_pending_experience(self, content_hash: str) -> bool:
+        with self._lock:
+            return content_hash in self._experiences
+
+    def has_pending_decision(self, content_hash: str) -> bool:
+        with self._lock:
+            return content_hash in self._decisions
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._experiences) + len(self._rules) + len(self._decisions)
+
+    # ---------- 刷新 ----------
+
+    def flush(self) -> int:
+        """把缓冲区写入数据库，返回写入的行数"""
+        with self._flush_lock:
+            with self._lock:
+                experiences, self._experiences = self._experiences, {}
+                rules, self._rules = self._rules, {}
+                decisions, self._decisions = self._decisions, {}
+            self.last_flush = time.time()
+            if not (experiences or rules or decisions):
+                return 0
+
+            written = 0
+            if experiences:
+                entries = list(experiences.values())
+                discoverers = [(e['data']['content_hash'], player_id, e['first_time'])
+                               for e in entries for player_id in e['discoverers']]
+                if self._execute('direct_experiences', [(DISCOVERER_INSERT, discoverers),
+                                                        (DIRECT_EXPERIENCE_BATCH_UPSERT, [self._direct_row(e) for e in entries])]):
+                    written += len(entries)
+                    # 总库与直接库是不同的数据库文件，总库失败时不重试以免重复计数直接库
+                    self._execute('total_experiences', [(DISCOVERER_INSERT, discoverers),
+                                                        (TOTAL_EXPERIENCE_UPSERT, [self._total_row(e) for e in entries])])
+                else:
+                    self._requeue_experiences(experiences)
+            if rules:
+                if self._execute('direct_rules', [(DIRECT_RULE_INSERT, list(rules.values()))]):
+                    written += len(rules)
+                else:
+                    with self._lock:
+                        self._rules.update(rules)
+            if decisions:
+                # 新决策先以 total_uses - 1 插入，再统一加上合并的使用次数：
+                # 插入的行得到 total_uses + uses - 1，已存在的行得到 total_uses + uses
+                inserts, updates = [], []
+                now = time.time()
+                for content_hash, entry in decisions.items():
+                    row = entry['row']
+                    inserts.append(row[:8] + (row[8] - 1,) + row[9:])
+                    updates.append((entry['uses'], entry['last_used'], now, content_hash))
+                if self._execute('decisions', [(DECISION_INSERT, inserts), (DECISION_USE_UPDATE, updates)]):
+                    written += len(decisions)
+                else:
+                    with self._lock:
+                        for content_hash, entry in decisions.items():
+                            self._decisions.setdefault(content_hash, entry)
+
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += written
+            return written
+
+    def _execute(self, library: str, statements: List[Tuple[str, list]]) -> bool:
+        """在一个事务中执行若干 executemany"""
+        path = self.db_paths[library]
+        try:
+            with sqlite_pool.path_lock(path):
+                conn = sqlite_pool.get_connection(path)
+                with conn:
+                    for sql, rows in statements:
+                        conn.executemany(sql, rows)
+            self.stats["transactions"] += 1
+            return True
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"⚠️ 写后缓冲刷新{library}失败，下次重试: {e}")
+            return False
+
+    def _requeue_experiences(self, experiences):
+        with self._lock:
+            for content_hash, entry in experiences.items():
+                current = self._experiences.get(content_hash)
+                if current is None:
+                    self._experiences[content_hash] = entry
+                    continue
+                current['occurrence_count'] += entry['occurrence_count']
+                current['success_count'] += entry['success_count']
+                current['first_time'] = min(current['first_time'], entry['first_time'])
+                current['last_seen_time'] = max(current['last_seen_time'], entry['last_seen_time'])
+                current['discoverers'] = entry['discoverers'] + [
+                    p for p in current['discoverers'] if p not in entry['discoverers']]
+
+    @staticmethod
+    def _direct_row(entry) -> tuple:
+        data = entry['data']
+        return (
+            data['content_hash'], data['environment'], data['object'], data['characteristics'],
+            data['action'], data['tools'], data['result'],
+            data['player_id'], data['timestamp'], data['success'], data['metadata'],
+            entry['occurrence_count'], entry['success_count'],
+            data['player_id'], entry['first_time'], entry['last_seen_time'],
+            data['content_hash'], entry['success_count'] / entry['occurrence_count'],
+        )
+
+    @staticmethod
+    def _total_row(entry) -> tuple:
+        data = entry['data']
+        return (
+            data['content_hash'], data['environment'], data['object'], data['characteristics'],
+            data['action'], data['tools'], data['result'], data['success'],
+            entry['occurrence_count'], entry['success_count'],
+            data['player_id'], entry['first_time'], entry['last_seen_time'],
+            data['content_hash'], entry['success_count'] / entry['occurrence_count'],
+            experience_confidence(entry['occurrence_count']),
+        )
+
+    def close(self):
+        self.flush()
+        _flusher.unregister(self)
+
+
+class _Flusher:
+    """进程内共享的后台刷新线程"""
+
+    TICK = 0.1
+
+    def __init__(self):
+        self._buffers = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, buffer: WriteBehindBuffer):
+        with self._lock:
+            self._buffers.add(buffer)
+            # fork 出的子进程中没有父进程的线程，需要重新启动
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="five-library-write-behind", daemon=True)
+                self._thread.start()
+
+    def unregister(self, buffer: WriteBehindBuffer):
+        with self._lock:
+            self._buffers.discard(buffer)
+
+    def buffers(self) -> List[WriteBehindBuffer]:
+        with self._lock:
+            return list(self._buffers)
+
+    def _run(self):
+        while True:
+            time.sleep(self.TICK)
+            now = time.time()
+            for buffer in self.buffers():
+                if now - buffer.last_flush >= buffer.flush_interval:
+                    try:
+                        buffer.flush()
+                    except Exception as e:
+                        logger.warning(f"⚠️ 写后缓冲后台刷新失败: {e}")
+
+    def flush_all(self) -> int:
+        return sum(buffer.flush() for buffer in self.buffers())
+
+
+_flusher = _Flusher()
+
+
+def flush_all() -> int:
+    """立即刷新进程内所有写后缓冲区(游戏结束时调用)，返回写入的行数"""
+    return _flusher.flush_all()
+
+
+# 先于 sqlite_pool 的退出钩子执行(atexit 后注册先执行)
+atexit.register(flush_all)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+game_snapshot.py
+整局游戏状态的快照与恢复
+
+快照是一个 zip 文件：
+    state.pkl        Game 对象图(地图、动植物、玩家状态、BMP/记忆等内存结构、神经网络权重)
+                     以及 random / numpy 全局随机数状态
+    databases/...    对象图中引用到的 SQLite 数据库(五库等)，通过 SQLite backup API 得到一致副本
+    manifest.json    版本、天数和数据库列表
+
+线程锁等无法序列化的对象在写入时替换为新建的同类对象；Game 自身会丢弃 UI 相关引用
+(canvas、回调、翻译监控线程)。恢复时数据库写回原来的相对路径，因此可以在另一个
+工作目录(例如 experiment_runner 的独立 workdir)中从同一快照分叉出多个分支继续运行。
+
+注意：pickle 按模块名记录类，以 `python main.py` 直接运行时保存的快照
+只能在同样以脚本方式运行的进程中恢复(反之亦然)。
+"""
+
+import copy
+import functools
+import io
+import json
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+import numpy as np
+
+import hash_membership
+import rule_condition_index
+import sqlite_pool
+
+SNAPSHOT_VERSION = 1
+
+_LOCK_TYPE = type(threading.Lock())
+_RLOCK_TYPE = type(threading.RLock())
+
+
+def _is_local_function(func) -> bool:
+    qualname = getattr(func, "__qualname__", "")
+    return "<lambda>" in qualname or "<locals>" in qualname
+
+
+def _rebuild_defaultdict(template, items):
+    result = defaultdict(functools.partial(copy.deepcopy, template))
+    result.update(items)
+    return result
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """替换线程锁并收集对象图中的 SQLite 数据库路径"""
+
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.db_paths: Set[str] = set()
+
+    def reducer_override(self, obj):
+        if isinstance(obj, _LOCK_TYPE):
+            return threading.Lock, ()
+        if isinstance(obj, _RLOCK_TYPE):
+            return threading.RLock, ()
+        if isinstance(obj, defaultdict) and _is_local_function(obj.default_factory):
+            # defaultdict(lambda: {...}) 的工厂函数无法序列化，改为复制其默认值的模板
+            return _rebuild_defaultdict, (obj.default_factory(), dict(obj))
+        if not isinstance(obj, type):
+            db_path = getattr(obj, "__dict__", {}).get("db_path")
+            if isinstance(db_path, str) and db_path.endswith(".db"):
+                self.db_paths.add(db_path)
+        return NotImplemented
+
+
+def _database_bytes(path: str) -> bytes:
+    """用 SQLite backup API 导出一致的数据库副本(不受未提交事务或 WAL 影响)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = os.path.join(tmp, "copy.db")
+        memory = sqlite_pool.is_memory(path)
+        # 内存模式的五库直接从内存数据库导出
+        source = sqlite_pool.get_connection(path) if memory else sqlite3.connect(path)
+        target = sqlite3.connect(copy_path)
+        try:
+            with sqlite_pool.path_lock(path):
+                source.backup(target)
+        finally:
+            target.close()
+            if not memory:
+                source.close()
+        with open(copy_path, "rb") as f:
+            return f.read()
+
+
+def _archive_name(db_path: str) -> str:
+    return "databases/" + os.path.normpath(db_path).replace(os.sep, "/").lstrip("/")
+
+
+def save_snapshot(game, path: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """把 game 写入快照文件(先写临时文件再原子替换)，返回 manifest"""
+    buffer = io.BytesIO()
+    pickler = _SnapshotPickler(buffer)
+    pickler.dump({
+        "game": game,
+        "random_state": random.getstate(),
+        "numpy_state": np.random.get_state(),
+        "extra": extra or {},
+    })
+
+    databases = sorted(p for p in pickler.db_paths if os.path.exists(p) or sqlite_pool.is_memory(p))
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "day": getattr(game, "current_day", None),
+        "databases": {p: _archive_name(p) for p in databases},
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=".snapshot_", suffix=".tmp", dir=directory)
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(temp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+            archive.writestr("state.pkl", buffer.getvalue())
+            for db_path, name in manifest["databases"].items():
+                archive.writestr(name, _database_bytes(db_path))
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return manifest
+
+
+def load_snapshot(path: str, restore_databases: bool = True, restore_random: bool = True) -> Dict[str, Any]:
+    """
+    读取快照，返回 {"game", "extra", "manifest"}。
+    restore_databases 为 True 时把数据库写回原相对路径(覆盖当前文件)。
+    """
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read("manifest.json"))
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {manifest.get('version')}")
+        if restore_databases:
+            for db_path, name in manifest["databases"].items():
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                sqlite_pool.close_connections(db_path)  # 长连接仍指向旧文件
+                hash_membership.forget(db_path, remove_files=True)  # 位图对应的是旧文件的内容
+                rule_condition_index.forget(db_path)
+                for suffix in ("-wal", "-shm", "-journal"):  # 旧数据库的日志文件不能与新副本混用
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
+                with open(db_path, "wb") as f:
+                    f.write(archive.read(name))
+        state = pickle.loads(archive.read("state.pkl"))
+
+    if restore_random:
+        random.setstate(state["random_state"])
+        np.random.set_state(state["numpy_state"])
+    return {"game": state["game"], "extra": state["extra"], "manifest": manifest}
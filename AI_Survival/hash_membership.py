@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+hash_membership.py
+五库 content_hash 的成员判断：可扩展布隆过滤器 + 索引确认
+
+FiveLibrarySystem 原先每分钟把 total_experiences / total_rules / decisions 的全部 content_hash
+重新读进 Python 集合，构造时还要为同步跟踪器再读一遍总经验库，内存和重载时间随库的大小线性增长。
+这里改为每个 (进程, 数据库文件, 表) 共享一个增量维护的过滤器：
+
+    写入时 add()                新内容只设置若干位，不做任何查询
+    判断时 in                   过滤器判定不存在直接返回 False；可能存在时
+                                用 content_hash 上的唯一索引精确确认(过滤器允许误判，不会漏判)
+    refresh()                   只读取 rowid 大于水位线的新行(其他实例或进程写入的内容)
+    save()                      过滤器连同水位线写入数据库旁边的 <db>.<table>.bloom 位图文件，
+                                下次启动直接加载，再从水位线追赶
+
+过滤器由若干容量逐级翻倍、误判率逐级减半的切片组成(Scalable Bloom Filter)，
+总误判率不超过 error_rate / (1 - 0.5)。删除行不需要更新过滤器，只会多一次索引确认。
+"""
+
+import atexit
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlite_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 4096
+DEFAULT_ERROR_RATE = 0.001
+GROWTH = 2          # 每个新切片的容量倍数
+TIGHTENING = 0.5    # 每个新切片的误判率倍数
+
+_MAGIC = b"BLM1"
+_HEADER = struct.Struct("<4sqdI")   # magic, 水位线(rowid), 首片误判率, 切片数
+_SLICE = struct.Struct("<QIQQ")     # 容量, 哈希函数个数, 位数, 已加入数量
+
+
+def _key_pair(key: str) -> Tuple[int, int]:
+    """把 content_hash 转成两个 64 位整数，用于双重哈希生成 k 个位置"""
+    try:
+        digest = bytes.fromhex(key)
+        if len(digest) < 16:
+            raise ValueError
+    except ValueError:
+        digest = hashlib.md5(key.encode("utf-8")).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return h1, h2
+
+
+class _BloomSlice:
+    """固定容量的布隆过滤器切片"""
+
+    __slots__ = ("capacity", "num_hashes", "num_bits", "count", "bits")
+
+    def __init__(self, capacity: int, error_rate: float, num_hashes: int = 0, num_bits: int = 0,
+                 count: int = 0, bits: Optional[bytearray] = None):
+        self.capacity = capacity
+        self.num_hashes = num_hashes or max(1, math.ceil(math.log2(1.0 / error_rate)))
+        self.num_bits = num_bits or max(64, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.count = count
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    def positions(self, h1: int, h2: int):
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, h1: int, h2: int) -> bool:
+        """加入并返回此前是否不存在"""
+        bits = self.bits
+        new = False
+        for pos in self.positions(h1, h2):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __contains__(self, pair: Tuple[int, int]) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(*pair))
+
+
+class ScalableBloomFilter:
+    """容量自动增长的布隆过滤器(只增不删)"""
+
+    def __init__(self, initial_capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.slices = [_BloomSlice(initial_capacity, error_rate * (1 - TIGHTENING))]
+
+    def add(self, key: str) -> bool:
+        pair = _key_pair(key)
+        if any(pair in s for s in self.slices):
+            return False
+        current = self.slices[-1]
+        if current.count >= current.capacity:
+            level = len(self.slices)
+            current = _BloomSlice(self.initial_capacity * GROWTH ** level,
+                                  self.error_rate * (1 - TIGHTENING) * TIGHTENING ** level)
+            self.slices.append(current)
+        return current.add(*pair)
+
+    def __contains__(self, key: str) -> bool:
+        pair = _key_pair(key)
+        return any(pair in s for s in self.slices)
+
+    def __len__(self) -> int:
+        """已加入的(近似)数量"""
+        return sum(s.count for s in self.slices)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(s.bits) for s in self.slices)
+
+    def to_bytes(self, watermark: int = 0) -> bytes:
+        parts = [_HEADER.pack(_MAGIC, watermark, self.error_rate, len(self.slices))]
+        for s in self.slices:
+            parts.append(_SLICE.pack(s.capacity, s.num_hashes, s.num_bits, s.count))
+            parts.append(bytes(s.bits))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple["ScalableBloomFilter", int]:
+        """返回 (过滤器, 水位线)，格式不对时抛出 ValueError"""
+        magic, watermark, error_rate, num_slices = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC or num_slices < 1:
+            raise ValueError("not a bloom filter file")
+        offset = _HEADER.size
+        slices = []
+        for _ in range(num_slices):
+            capacity, num_hashes, num_bits, count = _SLICE.unpack_from(data, offset)
+            offset += _SLICE.size
+            size = (num_bits + 7) // 8
+            bits = bytearray(data[offset:offset + size])
+            if len(bits) != size:
+                raise ValueError("truncated bloom filter file")
+            offset += size
+            slices.append(_BloomSlice(capacity, error_rate, num_hashes, num_bits, count, bits))
+        bloom = cls(slices[0].capacity, error_rate)
+        bloom.slices = slices
+        return bloom, watermark
+
+
+class HashMembership:
+    """一张表 content_hash 列的成员集合(布隆过滤器 + 唯一索引确认)"""
+
+    def __init__(self, db_path: str, table: str, column: str = "content_hash"):
+        self.db_path = str(db_path)
+        self.table = table
+        self.column = column
+        self.bloom_path = f"{self.db_path}.{table}.bloom"
+        self._lock = threading.Lock()
+        self.watermark = 0  # 已读入过滤器的最大 rowid
+        self.stats = {"lookups": 0, "bloom_negatives": 0, "confirmed": 0, "false_positives": 0, "caught_up": 0}
+        self.bloom = self._load()
+        self.refresh()
+
+    def __reduce__(self):
+        # 反序列化(恢复 Game 快照)时重新取得本进程共享的实例
+        return get_membership, (self.db_path, self.table)
+
+    def _load(self) -> ScalableBloomFilter:
+        try:
+            with open(self.bloom_path, "rb") as f:
+                bloom, self.watermark = ScalableBloomFilter.from_bytes(f.read())
+            return bloom
+        except FileNotFoundError:
+            pass
+        except (ValueError, struct.error, OSError) as e:
+            logger.warning(f"⚠️ 布隆过滤器文件无效，重新构建: {self.bloom_path} ({e})")
+        self.watermark = 0
+        return ScalableBloomFilter()
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with sqlite_pool.path_lock(self.db_path):
+            return sqlite_pool.get_connection(self.db_path).execute(sql, params).fetchall()
+
+    def refresh(self) -> int:
+        """读入 rowid 大于水位线的新行，返回读入的行数"""
+        try:
+            max_rowid = self._query(f"SELECT MAX(rowid) FROM {self.table}")[0][0] or 0
+        except sqlite3.Error:
+            return 0  # 表尚未创建
+        with self._lock:
+            if max_rowid < self.watermark:
+                # 数据库被替换(例如恢复快照)：位图已不对应当前的表，重新构建
+                self.bloom = ScalableBloomFilter()
+                self.watermark = 0
+            added = 0
+            rows = self._query(f"SELECT rowid, {self.column} FROM {self.table} WHERE rowid > ? ORDER BY rowid",
+                               (self.watermark,))
+            for rowid, content_hash in rows:
+                self.bloom.add(content_hash)
+                self.watermark = rowid
+                added += 1
+            self.stats["caught_up"] += added
+            return added
+
+    def add(self, content_hash: str):
+        """记录一条已写入(或即将写入)的内容"""
+        with self._lock:
+            self.bloom.add(content_hash)
+
+    def update(self, content_hashes: Iterable[str]):
+        with self._lock:
+            for content_hash in content_hashes:
+                self.bloom.add(content_hash)
+
+    def might_contain(self, content_hash: str) -> bool:
+        """只查过滤器：False 表示一定不存在"""
+        return content_hash in self.bloom
+
+    def __contains__(self, content_hash: str) -> bool:
+        self.stats["lookups"] += 1
+        if content_hash not in self.bloom:
+            self.stats["bloom_negatives"] += 1
+            return False
+        if not self._query(f"SELECT 1 FROM {self.table} WHERE {self.column} = ? LIMIT 1", (content_hash,)):
+            self.stats["false_positives"] += 1
+            return False
+        self.stats["confirmed"] += 1
+        return True
+
+    def __len__(self) -> int:
+        return len(self.bloom)
+
+    def save(self):
+        """把过滤器和水位线写入位图文件(先写临时文件再替换)"""
+        with self._lock:
+            data = self.bloom.to_bytes(self.watermark)
+        tmp_path = f"{self.bloom_path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.bloom_path)
+        except OSError as e:
+            logger.warning(f"⚠️ 保存布隆过滤器失败: {self.bloom_path} ({e})")
+
+
+_memberships: Dict[Tuple[int, str, str], HashMembership] = {}
+_lock = threading.Lock()
+
+
+def get_membership(db_path: str, table: str) -> HashMembership:
+    """返回本进程中 db_path 上 table 的共享成员集合，同一数据库的所有 FiveLibrarySystem 实例共用"""
+    key = (os.getpid(), os.path.abspath(str(db_path)), table)
+    with _lock:
+        membership = _memberships.get(key)
+        if membership is None:
+            membership = _memberships[key] = HashMembership(db_path, table)
+        return membership
+
+
+def forget(db_path: Optional[str] = None, remove_files: bool = False) -> int:
+    """丢弃 db_path(为 None 时为全部)的成员集合，数据库文件被覆盖(恢复快照)前调用"""
+    target = os.path.abspath(str(db_path)) if db_path is not None else None
+    with _lock:
+        keys = [key for key in _memberships if target is None or key[1] == target]
+        dropped = [_memberships.pop(key) for key in keys]
+    if remove_files:
+        for membership in dropped:
+            try:
+                os.remove(membership.bloom_path)
+            except OSError:
+                pass
+    return len(dropped)
+
+
+def save_all():
+    """保存本进程的全部过滤器(进程退出时自动调用)"""
+    pid = os.getpid()
+    with _lock:
+        memberships = [m for key, m in _memberships.items() if key[0] == pid]
+    for membership in memberships:
+        if os.path.exists(membership.db_path):
+            membership.save()
+
+
+# atexit 后注册先执行：先于 sqlite_pool 关闭连接
+atexit.register(save_all)
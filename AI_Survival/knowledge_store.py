@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+knowledge_store.py
+一局游戏共享的五库知识服务(单写线程 + 玩家命名空间)
+
+默认每个 ILAI/RILAI 玩家各自创建 FiveLibrarySystem()，20 个实例各有一套锁、缓存和连接，
+却写同一组 five_libraries/*.db；GlobalKnowledgeSync 还会再打开一组 global_five_libraries/。
+启用 settings["shared_knowledge_store"] 后 Game 只创建一个 KnowledgeStore：
+
+    KnowledgeStore.system       唯一的 FiveLibrarySystem(GlobalKnowledgeSync 也使用它)
+    写线程                       所有会写库的调用都排队到同一个线程执行，调用方等待结果返回，
+                                 因此只有写线程持有写连接，各调用的先后顺序与单线程时相同
+    KnowledgeStore.view(id)     玩家视图：与 FiveLibrarySystem 相同的接口，
+                                 查询方法(READ_METHODS)在调用方线程直接执行，其余方法交给写线程；
+                                 get_own_experiences / get_own_rules 只返回该玩家发现或创建的内容
+
+共享的同步队列、缓存使批量同步等时机与每个玩家一个实例时不同，因此该选项默认关闭。
+"""
+
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+import sqlite_pool
+from five_library_system import FiveLibrarySystem
+from five_library_write_behind import DEFAULT_FLUSH_INTERVAL
+
+DEFAULT_BASE_PATH = "five_libraries"
+
+# 只读的 FiveLibrarySystem 方法：在调用方线程执行(WAL 模式下读写互不阻塞)
+READ_METHODS = frozenset({
+    'get_system_statistics', 'validate_eocatr_experience', 'check_experience_duplication',
+    'format_experience_for_storage', 'get_sync_statistics', 'get_rule_generation_summary',
+    'get_rule_validation_report', 'get_recent_experiences', 'get_recent_rules',
+    'get_rule_sync_statistics', 'query_decisions', 'get_decision_statistics',
+    'validate_object_attributes', 'get_tool_effectiveness_report', 'analyze_experience_with_attributes',
+    'get_eocatr_matrix_statistics', 'validate_eocatr_matrix_completeness',
+})
+
+
+class KnowledgeStore:
+    """一局游戏的五库知识服务"""
+
+    def __init__(self, base_path: str = DEFAULT_BASE_PATH, write_behind: bool = False,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, storage: str = "disk"):
+        self.base_path = base_path
+        self.system = FiveLibrarySystem(base_path, write_behind=write_behind, flush_interval=flush_interval,
+                                        storage=storage)
+        self.stats = {"writes": 0, "reads": 0}
+        self._views: Dict[str, "PlayerKnowledgeView"] = {}
+        self._start_writer()
+
+    def _start_writer(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="knowledge-store-writer", daemon=True)
+        self._writer.start()
+
+    def __getstate__(self):
+        # Game 快照：线程和队列不保存，恢复时重新启动写线程
+        state = self.__dict__.copy()
+        state.pop("_queue", None)
+        state.pop("_writer", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._start_writer()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, func, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        sqlite_pool.close_thread_connections()
+
+    def write(self, func: Callable, *args, **kwargs) -> Any:
+        """在写线程上执行 func 并返回结果(写线程已停止时在当前线程执行)"""
+        self.stats["writes"] += 1
+        if threading.current_thread() is self._writer or not self._writer.is_alive():
+            return func(*args, **kwargs)
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future.result()
+
+    def read(self, func: Callable, *args, **kwargs) -> Any:
+        self.stats["reads"] += 1
+        return func(*args, **kwargs)
+
+    def view(self, player_id: str) -> "PlayerKnowledgeView":
+        """返回玩家的命名空间视图(同一玩家复用同一个视图)"""
+        view = self._views.get(player_id)
+        if view is None:
+            view = self._views[player_id] = PlayerKnowledgeView(self, player_id)
+        return view
+
+    def flush(self) -> int:
+        """写入写后缓冲中的记录"""
+        return self.write(self.system.flush_pending_writes)
+
+    def close(self):
+        """停止写线程并关闭五库连接"""
+        if self._writer.is_alive():
+            self.write(self.system.close)
+            self._queue.put(None)
+            self._writer.join()
+        else:
+            self.system.close()
+
+
+class PlayerKnowledgeView:
+    """玩家看到的五库接口：查询在本线程执行，写入交给 KnowledgeStore 的写线程"""
+
+    def __init__(self, store: KnowledgeStore, player_id: str):
+        self._store = store
+        self.player_id = player_id
+
+    def __getattr__(self, name):
+        store = self.__dict__.get('_store')
+        if store is None or name.startswith('__'):
+            raise AttributeError(name)  # 反序列化过程中尚未设置 _store
+        attr = getattr(store.system, name)
+        if not callable(attr):
+            return attr
+        if name in READ_METHODS:
+            return functools.partial(store.read, attr)
+        return functools.partial(store.write, attr)
+
+    def add_experience_to_direct_library(self, experience) -> Dict[str, Any]:
+        if not getattr(experience, 'player_id', None):
+            experience.player_id = self.player_id
+        return self._store.write(self._store.system.add_experience_to_direct_library, experience)
+
+    def get_own_experiences(self, limit: int = 5) -> List[Dict]:
+        """该玩家发现过的最近经验"""
+        return self._store.read(self._store.system.get_recent_experiences, limit, player_id=self.player_id)
+
+    def get_own_rules(self, limit: int = 5) -> List[Dict]:
+        """该玩家创建的最近规律"""
+        return self._store.read(self._store.system.get_recent_rules, limit, creator_id=self.player_id)
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+nn_backend.py
+DQN/PPO 神经网络后端
+
+DQN/PPO 使用的网络只是几层全连接 (78 -> 128 -> ... -> 7)，
+NumpyMLP 用纯 NumPy 实现其前向、MSE 训练 (Adam) 和 PPO 裁剪目标的梯度更新，
+接口与原先使用的 Keras 模型保持一致 (predict / fit / get_weights / set_weights / save)。
+
+默认后端为 "numpy"，TensorFlow 只有在 settings["nn_backend"] = "tensorflow" 时才会导入。
+NumPy 后端可以直接读取 saved_models/ 中已有的 .keras 文件 (需要 h5py)，
+保存时使用 .npz 格式。
+"""
+
+import io
+import json
+import os
+import zipfile
+from types import SimpleNamespace
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import h5py  # 读取 .keras 文件中的权重
+except ImportError:
+    h5py = None
+
+BACKENDS = ("numpy", "tensorflow")
+MODEL_EXTENSIONS = {"numpy": ".npz", "tensorflow": ".keras"}
+
+_tensorflow = None
+
+
+def import_tensorflow():
+    """首次使用时导入 TensorFlow(仅 tensorflow 后端需要)"""
+    global _tensorflow
+    if _tensorflow is None:
+        os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+        import tensorflow
+        tensorflow.get_logger().setLevel('ERROR')
+        _tensorflow = tensorflow
+    return _tensorflow
+
+
+def _activate(values: np.ndarray, activation: str) -> np.ndarray:
+    if activation == "relu":
+        return np.maximum(values, 0)
+    if activation == "softmax":
+        shifted = np.exp(values - values.max(axis=-1, keepdims=True))
+        return shifted / shifted.sum(axis=-1, keepdims=True)
+    if activation == "tanh":
+        return np.tanh(values)
+    if activation == "sigmoid":
+        return 1.0 / (1.0 + np.exp(-values))
+    return values  # linear
+
+
+def _activation_grad(grad: np.ndarray, output: np.ndarray, activation: str) -> np.ndarray:
+    """把对激活输出的梯度转换为对激活前输入的梯度"""
+    if activation == "relu":
+        return grad * (output > 0)
+    if activation == "softmax":
+        return output * (grad - (grad * output).sum(axis=-1, keepdims=True))
+    if activation == "tanh":
+        return grad * (1.0 - output ** 2)
+    if activation == "sigmoid":
+        return grad * output * (1.0 - output)
+    return grad
+
+
+class NumpyMLP:
+    """纯 NumPy 的全连接网络，接口兼容 DQN/PPO 代码中用到的 Keras Sequential 方法"""
+
+    def __init__(self, layer_sizes: Sequence[int], activations: Sequence[str],
+                 dropout: Optional[Sequence[float]] = None, learning_rate: float = 0.001,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            layer_sizes: [输入维度, 隐藏层..., 输出维度]
+            activations: 每个全连接层的激活函数
+            dropout: 每个全连接层之后的 Dropout 比例(仅训练时生效)
+        """
+        if len(activations) != len(layer_sizes) - 1:
+            raise ValueError("activations 数量必须等于全连接层数")
+        self.layer_sizes = [int(n) for n in layer_sizes]
+        self.activations = list(activations)
+        self.dropout = list(dropout) if dropout is not None else [0.0] * len(self.activations)
+        self.learning_rate = learning_rate
+        self.rng = np.random.default_rng(seed)
+        self.version = 0  # 每次权重变化加 1，供检查点去重使用
+
+        # Glorot uniform 初始化，偏置为 0 (与 Keras Dense 默认一致)
+        self.kernels: List[np.ndarray] = []
+        self.biases: List[np.ndarray] = []
+        for fan_in, fan_out in zip(self.layer_sizes[:-1], self.layer_sizes[1:]):
+            limit = np.sqrt(6.0 / (fan_in + fan_out))
+            self.kernels.append(self.rng.uniform(-limit, limit, (fan_in, fan_out)).astype(np.float32))
+            self.biases.append(np.zeros(fan_out, dtype=np.float32))
+        self._reset_optimizer()
+
+    # ---------- 前向 ----------
+
+    def _forward(self, x, training=False):
+        """返回各层激活输出和 Dropout 掩码(反向传播使用)"""
+        outputs = [np.asarray(x, dtype=np.float32).reshape(-1, self.layer_sizes[0])]
+        masks = []
+        for kernel, bias, activation, rate in zip(self.kernels, self.biases,
+                                                   self.activations, self.dropout):
+            hidden = _activate(outputs[-1] @ kernel + bias, activation)
+            mask = None
+            if training and rate > 0:
+                mask = (self.rng.random(hidden.shape) >= rate).astype(np.float32) / (1.0 - rate)
+                hidden = hidden * mask
+            masks.append(mask)
+            outputs.append(hidden.astype(np.float32, copy=False))
+        return outputs, masks
+
+    def predict(self, x, verbose=0, batch_size=None):
+        return self._forward(x)[0][-1]
+
+    def __call__(self, x, training=False):
+        return self._forward(x, training)[0][-1]
+
+    def dense_layers(self):
+        """(kernel, bias, activation) 列表，供 RLInferenceBatcher 批量推理使用"""
+        return list(zip(self.kernels, self.biases, self.activations))
+
+    # ---------- 反向与优化 ----------
+
+    def _backward(self, outputs, masks, grad_output, pre_activation=False):
+        """
+        从输出层梯度反向传播，返回与 get_weights() 顺序一致的梯度列表。
+        pre_activation=True 表示 grad_output 已经是对输出层激活前 logits 的梯度。
+        """
+        grads = [None] * (2 * len(self.kernels))
+        grad = grad_output
+        for i in reversed(range(len(self.kernels))):
+            if masks[i] is not None:
+                grad = grad * masks[i]
+            if not (pre_activation and i == len(self.kernels) - 1):
+                grad = _activation_grad(grad, outputs[i + 1], self.activations[i])
+            grads[2 * i] = outputs[i].T @ grad
+            grads[2 * i + 1] = grad.sum(axis=0)
+            if i > 0:
+                grad = grad @ self.kernels[i].T
+        return grads
+
+    def _reset_optimizer(self):
+        self._adam_step = 0
+        self._adam_m = [np.zeros_like(w) for w in self.get_weights()]
+        self._adam_v = [np.zeros_like(w) for w in self.get_weights()]
+
+    def apply_gradients(self, grads, beta_1=0.9, beta_2=0.999, epsilon=1e-7):
+        """Adam 更新(参数与 Keras Adam 默认值一致)"""
+        self._adam_step += 1
+        self.version += 1
+        step = self._adam_step
+        lr = self.learning_rate * np.sqrt(1 - beta_2 ** step) / (1 - beta_1 ** step)
+        params = self.get_weights()
+        for param, grad, m, v in zip(params, grads, self._adam_m, self._adam_v):
+            m += (grad - m) * (1 - beta_1)
+            v += (grad * grad - v) * (1 - beta_2)
+            param -= (lr * m / (np.sqrt(v) + epsilon)).astype(np.float32)
+
+    def fit(self, x, y, epochs=1, batch_size=32, verbose=0, shuffle=True):
+        """以 MSE 损失训练，返回带 history 属性的对象(与 Keras 一致)"""
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.layer_sizes[0])
+        y = np.asarray(y, dtype=np.float32).reshape(len(x), -1)
+        losses = []
+        for _ in range(epochs):
+            order = self.rng.permutation(len(x)) if shuffle else np.arange(len(x))
+            epoch_loss = 0.0
+            for start in range(0, len(x), batch_size):
+                batch = order[start:start + batch_size]
+                outputs, masks = self._forward(x[batch], training=True)
+                error = outputs[-1] - y[batch]
+                epoch_loss += float(np.mean(error ** 2)) * len(batch)
+                grad = 2.0 * error / error.size
+                self.apply_gradients(self._backward(outputs, masks, grad))
+            losses.append(epoch_loss / max(len(x), 1))
+        return SimpleNamespace(history={"loss": losses})
+
+    def ppo_update(self, states, actions, old_log_probs, advantages, clip_ratio=0.2):
+        """
+        对 PPO 裁剪目标 -mean(min(r*A, clip(r)*A)) 做一次梯度下降，返回策略损失。
+        输出层须为 softmax，梯度直接在 logits 上计算: d(log p_a)/dz = onehot(a) - p。
+        """
+        outputs, masks = self._forward(states, training=True)
+        probs = outputs[-1]
+        actions = np.asarray(actions, dtype=np.int64)
+        rows = np.arange(len(actions))
+        new_log_probs = np.log(probs[rows, actions] + 1e-10)
+        ratio = np.exp(new_log_probs - np.asarray(old_log_probs, dtype=np.float32))
+        advantages = np.asarray(advantages, dtype=np.float32)
+        unclipped = ratio * advantages
+        clipped = np.clip(ratio, 1 - clip_ratio, 1 + clip_ratio) * advantages
+        # 与 tf.minimum 相同，相等时梯度流向第一个参数
+        active = unclipped <= clipped
+
+        grad_log_prob = -(ratio * advantages * active) / len(actions)
+        onehot = np.zeros_like(probs)
+        onehot[rows, actions] = 1.0
+        grad_logits = grad_log_prob[:, None] * (onehot - probs)
+        self.apply_gradients(self._backward(outputs, masks, grad_logits, pre_activation=True))
+        return float(-np.mean(np.minimum(unclipped, clipped)))
+
+    # ---------- 权重 ----------
+
+    def get_weights(self):
+        weights = []
+        for kernel, bias in zip(self.kernels, self.biases):
+            weights.extend((kernel, bias))
+        return weights
+
+    def set_weights(self, weights):
+        if len(weights) != 2 * len(self.kernels):
+            raise ValueError(f"权重数量不符: 期望 {2 * len(self.kernels)}，实际 {len(weights)}")
+        self.kernels = [np.array(w, dtype=np.float32) for w in weights[0::2]]
+        self.biases = [np.array(b, dtype=np.float32) for b in weights[1::2]]
+        self._reset_optimizer()
+        self.version += 1
+
+    def to_arrays(self):
+        """结构信息(JSON 字符串 config)和权重 w0, w1, ... 组成的数组字典"""
+        config = {
+            "layer_sizes": self.layer_sizes,
+            "activations": self.activations,
+            "dropout": self.dropout,
+            "learning_rate": self.learning_rate,
+        }
+        arrays = {f"w{i}": w for i, w in enumerate(self.get_weights())}
+        arrays["config"] = np.array(json.dumps(config))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, data):
+        config = json.loads(str(data["config"]))
+        model = cls(config["layer_sizes"], config["activations"],
+                    config.get("dropout"), config.get("learning_rate", 0.001))
+        model.set_weights([data[f"w{i}"] for i in range(2 * (len(config["layer_sizes"]) - 1))])
+        return model
+
+    def snapshot(self):
+        """权重的独立副本(后台线程保存时训练可以继续)"""
+        return NumpyMLP.from_arrays(self.to_arrays())
+
+    def save(self, path):
+        """保存为 .npz(结构信息以 JSON 存放在 config 字段中)"""
+        with open(path, "wb") as f:
+            np.savez(f, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+
+    @classmethod
+    def from_keras(cls, path, learning_rate=0.001):
+        """从 Keras 3 的 .keras 文件(zip: config.json + model.weights.h5)读取结构和权重"""
+        if h5py is None:
+            raise ImportError("读取 .keras 文件需要 h5py")
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read("config.json"))
+            weights_file = io.BytesIO(archive.read("model.weights.h5"))
+
+        activations, dropout, dense_names = [], [], []
+        input_dim = None
+        type_counts = {}
+        for layer in config["config"]["layers"]:
+            kind = layer["class_name"]
+            layer_config = layer.get("config", {})
+            if kind == "InputLayer":
+                input_dim = layer_config.get("batch_shape", [None, None])[-1]
+                continue
+            # 权重文件中的层名按类型依次编号: dense, dense_1, dense_2 ...
+            base = "dense" if kind == "Dense" else kind.lower()
+            count = type_counts.get(base, 0)
+            type_counts[base] = count + 1
+            if kind == "Dense":
+                dense_names.append(base if count == 0 else f"{base}_{count}")
+                activations.append(layer_config.get("activation", "linear"))
+                dropout.append(0.0)
+            elif kind == "Dropout":
+                if dropout:
+                    dropout[-1] = float(layer_config.get("rate", 0.0))
+            else:
+                raise ValueError(f"不支持的层类型: {kind}")
+
+        with h5py.File(weights_file, "r") as f:
+            weights = []
+            for name in dense_names:
+                weights.append(np.array(f[f"layers/{name}/vars/0"]))
+                weights.append(np.array(f[f"layers/{name}/vars/1"]))
+
+        layer_sizes = [input_dim or weights[0].shape[0]] + [w.shape[1] for w in weights[0::2]]
+        model = cls(layer_sizes, activations, dropout, learning_rate)
+        model.set_weights(weights)
+        return model
+
+
+# ---------- 后端选择 ----------
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的神经网络后端: {backend} (可选: {', '.join(BACKENDS)})")
+
+
+def build_model(layer_sizes, activations, dropout=None, learning_rate=0.001,
+                backend="numpy", loss="mse"):
+    """按 [输入维度, 隐藏层..., 输出维度] 构建全连接网络"""
+    _check_backend(backend)
+    if backend == "numpy":
+        return NumpyMLP(layer_sizes, activations, dropout, learning_rate)
+
+    tf = import_tensorflow()
+    model = tf.keras.Sequential()
+    model.add(tf.keras.Input(shape=(layer_sizes[0],)))
+    for i, (units, activation) in enumerate(zip(layer_sizes[1:], activations)):
+        model.add(tf.keras.layers.Dense(units, activation=activation))
+        if dropout and dropout[i]:
+            model.add(tf.keras.layers.Dropout(dropout[i]))
+    model.compile(loss=loss, optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate))
+    return model
+
+
+def model_path(directory, stem, backend="numpy"):
+    """模型保存路径(按后端决定扩展名)"""
+    _check_backend(backend)
+    return os.path.join(directory, stem + MODEL_EXTENSIONS[backend])
+
+
+def find_model(directory, stem, backend="numpy"):
+    """查找已有模型文件：优先本后端格式，NumPy 后端也可读取 .keras"""
+    candidates = [model_path(directory, stem, backend)]
+    if backend == "numpy" and h5py is not None:
+        candidates.append(model_path(directory, stem, "tensorflow"))
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def load_model(path, backend="numpy", learning_rate=0.001):
+    """读取模型文件(.npz 或 .keras)"""
+    _check_backend(backend)
+    if backend == "tensorflow":
+        return import_tensorflow().keras.models.load_model(path)
+    if path.endswith(".npz"):
+        return NumpyMLP.load(path)
+    return NumpyMLP.from_keras(path, learning_rate)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+parallel_blooming.py
+跨玩家并行的 BMP 怒放
+
+原先每个 ILAI/RILAI 玩家在自己的回合里同步调用 bpm.process_experience，怒放、验证、剪枝都是
+纯 Python 计算，受 GIL 限制，20 个玩家只能在一个核上依次执行。ParallelBloomingPool 把这部分工作
+交给工作进程：
+
+    玩家回合中    enqueue() 只记录 (新经验, 历史经验)，不做计算
+    玩家回合结束  submit_pending() 把该玩家本回合的经验连同规律增量提交给它固定的工作进程，
+                  后面的玩家继续行动，工作进程同时怒放
+    所有玩家行动后 merge_all() 等待结果，把规律差异合并回各玩家的 candidate_rules /
+                  validated_rules / pruned_rules，下一次决策前规律已是最新
+
+每个工作进程为分配给它的玩家保存一份 BMP 副本(模式组、去重索引等状态留在副本中)。
+主进程记录副本的规律状态：提交时只发送主进程一侧变化过的规律(其他代码路径同步调用 BMP、
+验证规律等产生的修改)，工作进程只返回本次变化的规律。同一条规律在两边同时被修改时以工作进程为准。
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RULE_POOLS = ("candidate_rules", "validated_rules", "pruned_rules")
+COUNTERS = ("total_rules_generated", "total_rules_pruned", "total_rules_validated",
+            "total_rules_merged", "total_rules_rejected")
+
+RuleVersions = Dict[str, Dict[str, tuple]]  # 规律池 -> rule_id -> 版本
+
+
+def rule_version(rule) -> tuple:
+    """规律可变字段的快照：验证、激活、晋升都会改变其中至少一项"""
+    evidence = getattr(rule, "evidence", None)
+    return (rule.confidence, getattr(rule, "strength", None), getattr(rule, "status", None),
+            getattr(rule, "activation_count", 0), getattr(rule, "last_activation", 0.0),
+            getattr(rule, "validation_attempts", 0),
+            getattr(evidence, "total_tests", 0), getattr(evidence, "successful_tests", 0),
+            len(getattr(evidence, "supporting_experiences", ())),
+            len(getattr(evidence, "contradicting_experiences", ())))
+
+
+def rule_versions(bpm) -> RuleVersions:
+    return {pool: {rule_id: rule_version(rule) for rule_id, rule in getattr(bpm, pool).items()}
+            for pool in RULE_POOLS}
+
+
+def diff_rules(bpm, base: Optional[RuleVersions]) -> Dict[str, Any]:
+    """bpm 相对 base 的规律差异：{"full": 是否全量, 规律池: {"upsert": {id: 规律}, "remove": [id]}}"""
+    delta: Dict[str, Any] = {"full": base is None}
+    for pool in RULE_POOLS:
+        rules = getattr(bpm, pool)
+        known = (base or {}).get(pool, {})
+        delta[pool] = {
+            "upsert": {rule_id: rule for rule_id, rule in rules.items()
+                       if known.get(rule_id) != rule_version(rule)},
+            "remove": [rule_id for rule_id in known if rule_id not in rules],
+        }
+    return delta
+
+
+def apply_rule_delta(bpm, delta: Dict[str, Any]):
+    """把规律差异写入 bpm；全量差异先清空规律池"""
+    for pool in RULE_POOLS:
+        rules = getattr(bpm, pool)
+        if delta.get("full"):
+            rules.clear()
+        for rule_id in delta[pool]["remove"]:
+            rules.pop(rule_id, None)
+        rules.update(delta[pool]["upsert"])
+    fingerprint = getattr(bpm, "_generate_content_fingerprint", None)
+    if fingerprint is not None:
+        for pool in ("candidate_rules", "validated_rules"):
+            bpm.rule_fingerprints.update(fingerprint(rule) for rule in delta[pool]["upsert"].values())
+
+
+def advance_versions(base: Optional[RuleVersions], delta: Dict[str, Any]) -> RuleVersions:
+    """base 应用 delta 之后的规律状态"""
+    versions = {pool: ({} if delta.get("full") else dict((base or {}).get(pool, {}))) for pool in RULE_POOLS}
+    for pool in RULE_POOLS:
+        for rule_id in delta[pool]["remove"]:
+            versions[pool].pop(rule_id, None)
+        versions[pool].update((rule_id, rule_version(rule)) for rule_id, rule in delta[pool]["upsert"].items())
+    return versions
+
+
+# 工作进程中各玩家的 BMP 副本
+_REPLICAS: Dict[str, Any] = {}
+
+
+def _new_replica(config: Dict[str, Any]):
+    from blooming_and_pruning_model import BloomingAndPruningModel
+    from enhanced_bmp_integration import integrate_constraint_awareness_to_bmp
+    bpm = BloomingAndPruningModel()
+    bpm.config.update(config)
+    integrate_constraint_awareness_to_bmp(bpm)  # 与 ILAIPlayer 中的 BMP 相同的约束感知怒放
+    return bpm
+
+
+def run_blooming_job(key: str, config: Dict[str, Any], delta: Dict[str, Any],
+                     experiences: List[Tuple[Any, List[Any]]]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """工作进程：同步规律增量，依次处理经验，返回规律差异和计数器增量"""
+    bpm = _REPLICAS.get(key)
+    if bpm is None or delta.get("full"):
+        bpm = _REPLICAS[key] = _new_replica(config)
+    bpm.config.update(config)
+    apply_rule_delta(bpm, delta)
+    bpm.rule_index.sync(bpm.candidate_rules, bpm.validated_rules)
+
+    before = rule_versions(bpm)
+    counters = {name: getattr(bpm, name, 0) for name in COUNTERS}
+    for experience, historical in experiences:
+        bpm.process_experience(experience, historical)
+    return diff_rules(bpm, before), {name: getattr(bpm, name, 0) - counters[name] for name in COUNTERS}
+
+
+class ParallelBloomingPool:
+    """玩家固定分配到单进程执行器的 BMP 怒放进程池"""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executors: List[Optional[ProcessPoolExecutor]] = [None] * self.workers
+        self._assigned: Dict[str, int] = {}                    # 玩家 -> 工作进程序号
+        self._synced: Dict[str, Optional[RuleVersions]] = {}   # 玩家 -> 副本的规律状态
+        self._queued: Dict[str, List[Tuple[Any, List[Any]]]] = {}
+        self._running: Dict[str, Tuple[Any, Any]] = {}         # 玩家 -> (bpm, Future)
+        self.stats = {"submitted": 0, "experiences": 0, "merged_rules": 0, "failed": 0}
+
+    def __getstate__(self):
+        # 工作进程和副本不能序列化(Game 快照)：恢复后首次提交时全量同步
+        state = self.__dict__.copy()
+        state.update(_executors=[None] * self.workers, _synced={}, _queued={}, _running={})
+        return state
+
+    def _executor(self, index: int) -> ProcessPoolExecutor:
+        if self._executors[index] is None:
+            # 与 experiment_runner 相同使用 spawn；每个执行器只有一个进程，玩家的副本始终在同一进程中
+            self._executors[index] = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        return self._executors[index]
+
+    def enqueue(self, key: str, experience, historical: List[Any]):
+        """记录一条待怒放的经验(在玩家回合结束时提交)"""
+        self._queued.setdefault(key, []).append((experience, list(historical)))
+
+    def submit_pending(self, key: str, bpm):
+        """提交该玩家排队的经验；同一玩家上一次的结果尚未合并时先合并"""
+        experiences = self._queued.pop(key, None)
+        if not experiences:
+            return
+        if key in self._running:
+            self._merge(key)
+        index = self._assigned.setdefault(key, len(self._assigned) % self.workers)
+        synced = self._synced.get(key)
+        delta = diff_rules(bpm, synced)
+        future = self._executor(index).submit(run_blooming_job, key, dict(bpm.config), delta, experiences)
+        self._synced[key] = advance_versions(synced, delta)
+        self._running[key] = (bpm, future)
+        self.stats["submitted"] += 1
+        self.stats["experiences"] += len(experiences)
+
+    def _merge(self, key: str) -> int:
+        bpm, future = self._running.pop(key)
+        try:
+            diff, counters = future.result()
+        except Exception as e:
+            # 工作进程失败(包括进程被杀死)：丢弃副本，下次提交时全量同步
+            logger.warning("BMP 并行怒放失败(%s): %s", key, e)
+            self.stats["failed"] += 1
+            self._synced[key] = None
+            index = self._assigned[key]
+            if self._executors[index] is not None and getattr(self._executors[index], "_broken", False):
+                self._executors[index].shutdown(wait=False)
+                self._executors[index] = None
+                for other, other_index in self._assigned.items():
+                    if other_index == index:
+                        self._synced[other] = None
+            return 0
+        apply_rule_delta(bpm, diff)
+        self._synced[key] = advance_versions(self._synced.get(key), diff)
+        for name, value in counters.items():
+            setattr(bpm, name, getattr(bpm, name, 0) + value)
+        merged = sum(len(diff[pool]["upsert"]) + len(diff[pool]["remove"]) for pool in RULE_POOLS)
+        self.stats["merged_rules"] += merged
+        return merged
+
+    def merge_all(self) -> int:
+        """等待所有已提交的怒放完成并合并，返回变化的规律数"""
+        return sum(self._merge(key) for key in list(self._running))
+
+    def close(self):
+        self.merge_all()
+        for executor in self._executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self._executors = [None] * self.workers
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+replay_buffer.py
+预分配数组的环形经验回放缓冲区
+
+原先 DQN/RILAI 的经验回放是 deque(maxlen=10000) 中的 Python 元组，
+每次训练都要从 random.sample 的结果重新拼出 5 个 NumPy 数组。
+ReplayBuffer 把 state / next_state 保存在预分配的 float32 矩阵中，
+action / reward / done 保存为向量，插入为 O(1) 的环形写入，
+采样直接生成索引数组并一次性切片；可选按优先级(默认 |reward| + 0.01)采样。
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+Batch = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class ReplayBuffer:
+    """环形经验回放缓冲区"""
+
+    def __init__(self, capacity: int = 10000, state_size: Optional[int] = None,
+                 priority_offset: float = 0.01, alpha: float = 1.0, seed: Optional[int] = None):
+        """
+        Args:
+            capacity: 最大经验条数，写满后覆盖最旧的经验
+            state_size: 状态向量长度；为 None 时在第一次写入时确定
+            priority_offset: 默认优先级 |reward| + priority_offset 中的偏移量(避免为 0)
+            alpha: 优先级采样指数，概率正比于 priority ** alpha
+        """
+        self.capacity = int(capacity)
+        self.priority_offset = priority_offset
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.position = 0  # 下一次写入的位置
+        self.version = 0   # 每次内容变化加 1，供检查点去重使用
+
+        self.actions = np.zeros(self.capacity, dtype=np.int64)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=np.float32)
+        self.priorities = np.zeros(self.capacity, dtype=np.float64)
+        self.states = None
+        self.next_states = None
+        if state_size is not None:
+            self._allocate(state_size)
+
+    def _allocate(self, state_size):
+        self.state_size = int(state_size)
+        self.states = np.zeros((self.capacity, self.state_size), dtype=np.float32)
+        self.next_states = np.zeros((self.capacity, self.state_size), dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    # ---------- 写入 ----------
+
+    def add(self, state, action, reward, next_state, done, priority: Optional[float] = None):
+        """写入一条经验(覆盖最旧的经验)"""
+        if self.states is None:
+            self._allocate(np.size(state))
+        i = self.position
+        self.states[i] = state
+        self.next_states[i] = next_state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.dones[i] = done
+        self.priorities[i] = abs(reward) + self.priority_offset if priority is None else priority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.version += 1
+
+    def append(self, experience):
+        """兼容 deque.append((state, action, reward, next_state, done))"""
+        self.add(*experience)
+
+    def clear(self):
+        self.size = 0
+        self.position = 0
+        self.version += 1
+
+    # ---------- 采样 ----------
+
+    def sample_indices(self, batch_size: int, prioritized: bool = False) -> np.ndarray:
+        """不放回地抽取 batch_size 个索引(不足时全部返回)"""
+        batch_size = min(batch_size, self.size)
+        if not prioritized:
+            return self.rng.choice(self.size, size=batch_size, replace=False)
+        weights = self.priorities[:self.size] ** self.alpha
+        return self.rng.choice(self.size, size=batch_size, replace=False, p=weights / weights.sum())
+
+    def sample(self, batch_size: int, prioritized: bool = False) -> Batch:
+        """返回 (states, actions, rewards, next_states, dones, indices)"""
+        indices = self.sample_indices(batch_size, prioritized)
+        return (self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], indices)
+
+    def update_priorities(self, indices, priorities):
+        """按新的优先级(例如 TD 误差)更新已抽取的经验"""
+        self.priorities[indices] = np.abs(priorities) + self.priority_offset
+
+    # ---------- 持久化 ----------
+
+    def to_arrays(self):
+        """按时间顺序(从旧到新)导出已有经验"""
+        order = self._chronological()
+        arrays = {"capacity": np.array(self.capacity)}
+        if self.states is not None:
+            arrays.update(states=self.states[order], next_states=self.next_states[order])
+        arrays.update(actions=self.actions[order], rewards=self.rewards[order],
+                      dones=self.dones[order], priorities=self.priorities[order])
+        return arrays
+
+    def load_arrays(self, data):
+        """读取 to_arrays() 导出的经验；超过容量时保留最新的部分"""
+        if "states" not in data:
+            self.clear()
+            return self
+        keep = slice(-self.capacity, None)
+        states = data["states"][keep]
+        if self.states is None or self.states.shape[1] != states.shape[1]:
+            self._allocate(states.shape[1])
+        count = len(states)
+        self.states[:count] = states
+        self.next_states[:count] = data["next_states"][keep]
+        self.actions[:count] = data["actions"][keep]
+        self.rewards[:count] = data["rewards"][keep]
+        self.dones[:count] = data["dones"][keep]
+        self.priorities[:count] = data["priorities"][keep]
+        self.size = count
+        self.position = count % self.capacity
+        self.version += 1
+        return self
+
+    def snapshot(self):
+        """当前经验的独立副本(后台线程保存时可以继续写入)"""
+        copy = ReplayBuffer(max(self.size, 1), priority_offset=self.priority_offset, alpha=self.alpha)
+        return copy.load_arrays(self.to_arrays())
+
+    def save(self, path):
+        """按时间顺序保存已有经验为 .npz"""
+        with open(path, "wb") as f:
+            np.savez(f, **self.to_arrays())
+
+    def load(self, path):
+        """读取 save() 保存的经验"""
+        with np.load(path, allow_pickle=False) as data:
+            return self.load_arrays({key: data[key] for key in data.files})
+
+    def _chronological(self) -> np.ndarray:
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.capacity) + self.position) % self.capacity
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rl_inference_batcher.py
+回合级RL批量推理
+
+每个 DQN/PPO 玩家原本在自己的回合里对单个状态调用一次 Keras predict，
+每天要付出 20 次以上的框架调用开销。RLInferenceBatcher 在玩家行动阶段开始前
+收集所有存活 RL 玩家的 get_state 向量，按网络结构分组，把各玩家的权重堆叠后
+用一次 NumPy 批量前向计算得到全部输出，再交给各玩家的 select_action 使用。
+
+堆叠后的权重按网络结构缓存：成员不变时只把权重版本(NumpyMLP.version)变化的玩家写回对应的行；
+没有版本计数的模型(Keras)每回合重新提取。
+
+注意：批量推理使用的是玩家行动阶段开始时的状态(早于本回合的饥渴消耗和其他玩家的移动)。
+该状态同时存放在玩家上，take_turn 用它代替重新调用 get_state，
+存入经验/轨迹的状态与选择动作(以及 PPO 的 log_prob、价值估计)所用的状态一致。
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from nn_backend import _activate
+
+# (玩家上的网络属性名, 存放批量输出的属性名)
+BATCHED_NETWORKS = (
+    ("q_network", "_batched_q_values"),
+    ("policy_network", "_batched_policy"),
+    ("value_network", "_batched_value"),
+)
+STATE_ATTR = "_batched_state"  # 批量推理所用的状态
+
+
+def extract_dense_layers(model) -> Optional[List[Tuple[np.ndarray, np.ndarray, str]]]:
+    """
+    提取模型的全连接层 (kernel, bias, activation)。
+    不支持的层结构或尚未构建权重的模型返回 None(调用方回退到逐玩家 predict)。
+    """
+    if model is None:
+        return None
+    if hasattr(model, "dense_layers"):
+        return model.dense_layers()
+    layers = []
+    for layer in getattr(model, "layers", []):
+        weights = layer.get_weights()
+        if not weights:
+            if type(layer).__name__ in ("Dropout", "InputLayer"):
+                continue  # 推理时 Dropout 不起作用
+            return None
+        if len(weights) != 2:
+            return None
+        activation = layer.get_config().get("activation", "linear")
+        layers.append((weights[0], weights[1], activation))
+    return layers or None
+
+
+def weights_version(model) -> Optional[int]:
+    """权重版本计数(NumpyMLP 每次更新权重时递增)；没有计数器时返回 None"""
+    return getattr(model, "version", None)
+
+
+def batched_forward(stacked_layers, inputs: np.ndarray) -> np.ndarray:
+    """对 P 个同结构网络做一次前向计算：inputs (P, in)，权重 (P, in, out)"""
+    hidden = inputs.astype(np.float64)
+    for kernels, biases, activation in stacked_layers:
+        hidden = _activate(np.einsum("pi,pio->po", hidden, kernels) + biases, activation)
+    return hidden
+
+
+class RLInferenceBatcher:
+    """回合级批量推理器"""
+
+    def __init__(self):
+        self._stacks: Dict[Any, Tuple[list, list, list]] = {}  # (网络属性, 结构) -> (模型, 权重版本, 堆叠权重)
+        self.stats = {
+            "turns": 0,
+            "players_batched": 0,
+            "forward_passes": 0,
+            "weight_restacks": 0,
+            "weight_rows_updated": 0,
+            "total_time": 0.0,
+        }
+
+    def __getstate__(self):
+        # 堆叠权重是模型权重的副本，不随游戏快照保存
+        state = self.__dict__.copy()
+        state["_stacks"] = {}
+        return state
+
+    def _stacked_weights(self, key, members) -> list:
+        """同结构网络的堆叠权重：成员不变时只更新权重有变化的行"""
+        models = [model for _, model, _ in members]
+        versions = [weights_version(model) for model in models]
+        cached = self._stacks.get(key)
+        if cached is None or len(cached[0]) != len(models) or any(
+                old is not model for old, model in zip(cached[0], models)):
+            stacked = [
+                (np.stack([layers[i][0] for _, _, layers in members]),
+                 np.stack([layers[i][1] for _, _, layers in members]),
+                 members[0][2][i][2])
+                for i in range(len(members[0][2]))
+            ]
+            self.stats["weight_restacks"] += 1
+        else:
+            stacked = cached[2]
+            for row, (version, old_version, (_, _, layers)) in enumerate(zip(versions, cached[1], members)):
+                if version is not None and version == old_version:
+                    continue
+                for (kernels, biases, _), (kernel, bias, _) in zip(stacked, layers):
+                    kernels[row] = kernel
+                    biases[row] = bias
+                self.stats["weight_rows_updated"] += 1
+        self._stacks[key] = (models, versions, stacked)
+        return stacked
+
+    def prepare_turn(self, game) -> int:
+        """为本回合所有存活 RL 玩家计算网络输出，返回参与批量推理的玩家数"""
+        start = time.perf_counter()
+        for player in game.players:
+            # 上一回合未被取用的结果(例如玩家在选择动作前出错)不能留到本回合
+            for _, output_attr in BATCHED_NETWORKS:
+                player.__dict__.pop(output_attr, None)
+            player.__dict__.pop(STATE_ATTR, None)
+        players = [
+            p for p in game.players
+            if p.is_alive() and hasattr(p, "get_state")
+            and any(getattr(p, attr, None) is not None for attr, _ in BATCHED_NETWORKS)
+        ]
+        if not players:
+            return 0
+        states = {id(p): p.get_state(game) for p in players}
+
+        batched = set()
+        for network_attr, output_attr in BATCHED_NETWORKS:
+            groups: Dict[Any, List[Tuple[Any, Any, list]]] = {}
+            for player in players:
+                model = getattr(player, network_attr, None)
+                layers = extract_dense_layers(model)
+                if layers is None:
+                    continue
+                signature = tuple((w.shape, b.shape, act) for w, b, act in layers)
+                groups.setdefault(signature, []).append((player, model, layers))
+
+            for signature, members in groups.items():
+                inputs = np.stack([states[id(p)] for p, _, _ in members])
+                if inputs.shape[1] != signature[0][0][0]:
+                    continue  # 状态维度与网络输入不符，保持逐玩家 predict
+                stacked = self._stacked_weights((network_attr, signature), members)
+                outputs = batched_forward(stacked, inputs)
+                self.stats["forward_passes"] += 1
+                for (player, _, _), output in zip(members, outputs):
+                    setattr(player, output_attr, output)
+                    batched.add(id(player))
+
+        for player in players:
+            if id(player) in batched:
+                setattr(player, STATE_ATTR, states[id(player)])
+        self.stats["turns"] += 1
+        self.stats["players_batched"] += len(batched)
+        self.stats["total_time"] += time.perf_counter() - start
+        return len(batched)
+
+
+def take_batched_output(player, output_attr: str) -> Optional[np.ndarray]:
+    """取出(并清除)玩家本回合的批量推理结果，没有则返回 None"""
+    return player.__dict__.pop(output_attr, None)
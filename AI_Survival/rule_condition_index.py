@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rule_condition_index.py
+直接规律库的条件倒排索引：(条件字段, 取值) -> rule_id
+
+validate_rules_against_experience 原先对每条新经验都读出全部 pending/validated 规律，
+在 Python 中逐条调用 _match_rule_with_experience，耗时随规律总数增长。
+这里在内存中维护倒排索引，一条经验只需查找其字段取值对应的倒排表：
+规律的每个条件都命中(命中次数 == 条件数)才是候选，与 _match_rule_with_experience 的完全匹配要求一致
+(取值按 str(value).lower() 比较)。
+
+    refresh()     只读取 id 大于水位线的新规律(本实例、写后缓冲和其他实例写入的规律都会补上)
+    discard()     规律被判定为 rejected 后移出索引
+    candidates()  一条经验的候选 rule_id
+
+同一进程中同一数据库的 FiveLibrarySystem 实例共用一个索引(get_rule_index)。
+索引只用于缩小范围：候选规律仍从数据库读取当前的状态和置信度，已被其他实例拒绝或删除的规律在读取时剔除。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import sqlite_pool
+
+ACTIVE_STATUSES = ('pending', 'validated')
+
+Key = Tuple[str, str]
+
+
+def normalize(value) -> str:
+    return str(value).lower()
+
+
+class RuleConditionIndex:
+    """一个 direct_rules 表的条件倒排索引"""
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        self.postings: Dict[Key, Set[str]] = {}
+        self.rule_keys: Dict[str, List[Key]] = {}
+        self.field_counts: Counter = Counter()  # 各条件字段出现在多少条规律中
+        self.watermark = 0
+        self.stats = {"caught_up": 0, "lookups": 0, "candidates": 0, "discarded": 0}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def __reduce__(self):
+        # 随 FiveLibrarySystem 序列化时只保存路径，恢复后取本进程的共享索引
+        return get_rule_index, (self.db_path,)
+
+    def __len__(self) -> int:
+        return len(self.rule_keys)
+
+    def __contains__(self, rule_id: str) -> bool:
+        return rule_id in self.rule_keys
+
+    def add(self, rule_id: str, conditions: Dict):
+        """登记一条规律；没有条件的规律永远不会完全匹配，不登记"""
+        if not conditions:
+            return
+        keys = [(field, normalize(value)) for field, value in conditions.items()]
+        with self._lock:
+            if rule_id in self.rule_keys:
+                return
+            self.rule_keys[rule_id] = keys
+            for key in keys:
+                self.postings.setdefault(key, set()).add(rule_id)
+                self.field_counts[key[0]] += 1
+
+    def discard(self, rule_id: str):
+        with self._lock:
+            keys = self.rule_keys.pop(rule_id, None)
+            if keys is None:
+                return
+            for key in keys:
+                rule_ids = self.postings.get(key)
+                if rule_ids is not None:
+                    rule_ids.discard(rule_id)
+                    if not rule_ids:
+                        del self.postings[key]
+                self.field_counts[key[0]] -= 1
+                if self.field_counts[key[0]] <= 0:
+                    del self.field_counts[key[0]]
+            self.stats["discarded"] += 1
+
+    def discard_all(self, rule_ids: Iterable[str]):
+        for rule_id in rule_ids:
+            self.discard(rule_id)
+
+    def refresh(self) -> int:
+        """读入 id 大于水位线的新规律，返回读入的行数"""
+        conn = sqlite_pool.get_connection(self.db_path)
+        db_lock = sqlite_pool.path_lock(self.db_path)
+        try:
+            with db_lock:
+                max_id = conn.execute("SELECT MAX(id) FROM direct_rules").fetchone()[0] or 0
+        except sqlite3.Error:
+            return 0  # 表尚未创建
+        if max_id == self.watermark:
+            return 0
+        with self._lock:
+            if max_id < self.watermark:
+                # 数据库被替换(例如恢复快照)：重新构建
+                self.postings.clear()
+                self.rule_keys.clear()
+                self.field_counts.clear()
+                self.watermark = 0
+            with db_lock:
+                rows = conn.execute(
+                    "SELECT id, rule_id, conditions, validation_status FROM direct_rules WHERE id > ? ORDER BY id",
+                    (self.watermark,)).fetchall()
+            if rows:
+                self.watermark = rows[-1][0]
+        for _, rule_id, conditions, status in rows:
+            if status not in ACTIVE_STATUSES:
+                continue
+            try:
+                conditions = json.loads(conditions)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(conditions, dict):
+                self.add(rule_id, conditions)
+        self.stats["caught_up"] += len(rows)
+        return len(rows)
+
+    def candidates(self, experience) -> List[str]:
+        """条件全部与经验字段取值相同的 rule_id"""
+        self.stats["lookups"] += 1
+        hits: Counter = Counter()
+        with self._lock:
+            for field in self.field_counts:
+                value = getattr(experience, field, None)
+                if value is None:
+                    continue
+                rule_ids = self.postings.get((field, normalize(value)))
+                if rule_ids:
+                    hits.update(rule_ids)
+            matched = [rule_id for rule_id, count in hits.items() if count == len(self.rule_keys[rule_id])]
+        self.stats["candidates"] += len(matched)
+        return matched
+
+
+_indexes: Dict[Tuple[int, str], RuleConditionIndex] = {}
+_lock = threading.Lock()
+
+
+def get_rule_index(db_path: str) -> RuleConditionIndex:
+    """返回本进程中 db_path 的共享规律条件索引"""
+    key = (os.getpid(), os.path.abspath(str(db_path)))
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = RuleConditionIndex(db_path)
+        return index
+
+
+def forget(db_path: Optional[str] = None) -> int:
+    """丢弃 db_path(为 None 时为全部)的索引，数据库文件被覆盖(恢复快照)前调用"""
+    target = os.path.abspath(str(db_path)) if db_path is not None else None
+    with _lock:
+        keys = [key for key in _indexes if target is None or key[1] == target]
+        for key in keys:
+            del _indexes[key]
+    return len(keys)
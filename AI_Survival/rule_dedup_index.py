@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rule_dedup_index.py
+怒放与剪枝模型(BMP)规律去重索引
+
+_is_obvious_duplicate_simple / _is_duplicate_rule 原先对每条新规律都把候选规律和已验证规律拼成列表，
+逐条做内容比较或相似度计算，怒放一批规律的开销随规律总数平方增长。这里维护两个索引：
+
+    内容桶  (规律类型, 模式文本(去空白、小写), 排序后的条件元素) -> 规律
+            内容完全相同的规律必然落在同一个桶中，只需在桶内用 _is_content_identical 确认
+    分块    规律类型 -> 条件字段集合 -> 规律
+            _calculate_rule_similarity 对不同类型的规律返回 0，条件字段重叠度低的规律相似度有上界，
+            similarity_candidates 只返回上界可能超过阈值的分块中的规律
+
+规律池(candidate_rules / validated_rules)在很多地方被直接修改(晋升、剪枝、外部写入)，
+索引不拦截这些修改，而是在每轮去重开始时调用 sync 与规律池对齐：按对象身份比较，只处理增删的规律。
+规律进入规律池后内容字段(类型、模式、条件、预测)不再修改，因此身份不变即索引项有效。
+"""
+
+from typing import Dict, FrozenSet, Iterator, List, Tuple
+
+ContentKey = Tuple[str, str, Tuple[str, ...]]
+
+
+def content_key(rule) -> ContentKey:
+    """内容桶的键：与 _is_content_identical 比较的字段一致(预测和条件留给桶内确认)"""
+    return (rule.rule_type.value, (rule.pattern or '').strip().lower(),
+            tuple(sorted(str(element) for element in rule.condition_elements)))
+
+
+def key_overlap(keys1: FrozenSet[str], keys2: FrozenSet[str]) -> float:
+    """条件字段集合的重叠度，与 _calculate_dict_similarity 的键相似度一致(都为空时为 1，一方为空时为 0)"""
+    if not keys1 and not keys2:
+        return 1.0
+    if not keys1 or not keys2:
+        return 0.0
+    return len(keys1 & keys2) / len(keys1 | keys2)
+
+
+class RuleDedupIndex:
+    """候选规律和已验证规律的内容桶 + 分块索引"""
+
+    def __init__(self):
+        # id(规律对象) -> (规律, 内容键, 规律类型, 条件字段集合)；保存对象本身，id 不会被复用
+        self.entries: Dict[int, Tuple[object, ContentKey, str, FrozenSet[str]]] = {}
+        self.by_content: Dict[ContentKey, Dict[int, object]] = {}
+        self.blocks: Dict[str, Dict[FrozenSet[str], Dict[int, object]]] = {}
+        self.stats = {"synced": 0, "content_lookups": 0, "similarity_lookups": 0, "compared": 0}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getstate__(self):
+        # 以对象 id 为键，序列化(快照、deepcopy)后失效：只保存统计，下次 sync 时重建
+        return {"stats": self.stats}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.stats.update(state.get("stats", {}))
+
+    def add(self, rule):
+        oid = id(rule)
+        if oid in self.entries:
+            return
+        key = content_key(rule)
+        rule_type = rule.rule_type.value
+        fields = frozenset(rule.conditions or {})
+        self.entries[oid] = (rule, key, rule_type, fields)
+        self.by_content.setdefault(key, {})[oid] = rule
+        self.blocks.setdefault(rule_type, {}).setdefault(fields, {})[oid] = rule
+
+    def discard(self, rule):
+        self._remove(id(rule))
+
+    def _remove(self, oid: int):
+        entry = self.entries.pop(oid, None)
+        if entry is None:
+            return
+        _, key, rule_type, fields = entry
+        bucket = self.by_content[key]
+        del bucket[oid]
+        if not bucket:
+            del self.by_content[key]
+        block = self.blocks[rule_type][fields]
+        del block[oid]
+        if not block:
+            del self.blocks[rule_type][fields]
+            if not self.blocks[rule_type]:
+                del self.blocks[rule_type]
+
+    def sync(self, *pools: Dict[str, object]) -> int:
+        """与规律池对齐：移除已不在池中的规律，登记新加入的规律，返回变化的条数"""
+        live = {id(rule): rule for pool in pools for rule in pool.values()}
+        removed = self.entries.keys() - live.keys()
+        added = live.keys() - self.entries.keys()
+        for oid in removed:
+            self._remove(oid)
+        for oid in added:
+            self.add(live[oid])
+        self.stats["synced"] += len(removed) + len(added)
+        return len(removed) + len(added)
+
+    def content_matches(self, rule) -> List[object]:
+        """与 rule 处于同一内容桶的规律(可能内容相同)"""
+        self.stats["content_lookups"] += 1
+        return list(self.by_content.get(content_key(rule), {}).values())
+
+    def similarity_candidates(self, rule, min_key_overlap: float = 0.0) -> Iterator[object]:
+        """同类型、条件字段重叠度不低于 min_key_overlap 的规律"""
+        self.stats["similarity_lookups"] += 1
+        fields = frozenset(rule.conditions or {})
+        for block_fields, block in list(self.blocks.get(rule.rule_type.value, {}).items()):
+            if key_overlap(fields, block_fields) >= min_key_overlap:
+                self.stats["compared"] += len(block)
+                yield from list(block.values())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rule_match_index.py
+怒放与剪枝模型(BMP)候选规律匹配网络
+
+validation_phase 每处理一批新经验，原先对全部候选规律调用 _validate_rule_with_experiences，
+逐条用 _is_rule_applicable 重新解析条件字典。而验证只会改变两类规律：
+通过等值条件的规律，以及 action / environment 条件与经验取值(.value)相同的弱匹配规律；
+其余规律的 total_applicable 为 0，验证不改变它们(也不会走到 C 条件的随机抽样)。
+
+这里在规律进入候选规律池时把条件编译成类似 Rete 的判别网络，只找出这两类规律：
+
+    alpha 表    (字段, 取值) -> 规律，字段为 E/O/A/T(object_category/action/environment 与简写键同义)
+    计数连接    查找时取经验各字段取值对应的 alpha 表，命中次数 == 等值条件数的规律通过
+    无条件表    没有等值条件(或等值条件无法建表)的规律，总是通过
+    弱匹配表    (action 条件, environment 条件) -> 规律，没有该条件时记为 ANY
+
+特征(C)、characteristic_*、*_threshold 等无法建表的条件不在网络中判断，
+通过的规律仍由 _validate_rule_with_experiences 完整验证。
+
+候选规律池(candidate_rules)换成 RulePool：字典的增删改都会同步到网络中。
+规律池被整体替换(加载、外部赋值)或反序列化后是普通字典，下次查找时 track() 重新编译。
+规律进入规律池后条件字典不再修改(与 rule_dedup_index 的假设相同)。
+"""
+
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+# 条件键 -> 经验字段；长键即使取值为 None 也参与比较，简写键取值为 None 时忽略(与 _is_rule_applicable 一致)
+EQUALITY_KEYS = {'object_category': 'O', 'action': 'A', 'environment': 'E'}
+SHORTHAND_KEYS = {'E': 'E', 'O': 'O', 'A': 'A', 'T': 'T'}
+
+ANY = ('<any>',)  # 弱匹配表中"没有该条件"的取值
+
+
+def context_value(x):
+    """与 _is_rule_applicable 中的 _safe_value 相同：兼容枚举/符号元素"""
+    return getattr(x, 'value', getattr(x, 'content', x))
+
+
+def context_fields(context) -> Dict[str, Any]:
+    return {
+        'E': context_value(context.environment),
+        'O': context_value(context.object_category),
+        'A': context_value(context.action),
+        'T': context_value(getattr(context, 'tool', None)),
+    }
+
+
+def compile_conditions(conditions) -> Optional[Set[Tuple[str, Hashable]]]:
+    """编译条件字典中的等值条件；取值不可哈希时返回 None(只能逐条判断)"""
+    if not isinstance(conditions, dict):
+        return set()
+    tests = set()
+    for key, expected in conditions.items():
+        field = EQUALITY_KEYS.get(key) or (SHORTHAND_KEYS.get(key) if expected is not None else None)
+        if field is None:
+            continue
+        try:
+            tests.add((field, expected))
+        except TypeError:
+            return None
+    return tests
+
+
+def loose_key(conditions) -> Optional[Tuple[Hashable, Hashable]]:
+    """
+    弱匹配表的键 (action 条件, environment 条件)，没有该条件时为 ANY；
+    条件不是字典时两项都是 ANY。取值不可哈希时不会与经验取值相等，返回 None(不登记)
+    """
+    if not isinstance(conditions, dict):
+        return ANY, ANY
+    key = (conditions.get('action', ANY), conditions.get('environment', ANY))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class RulePool(dict):
+    """增删改同步到 RuleMatchIndex 的候选规律池"""
+
+    def __init__(self, index: 'RuleMatchIndex', rules=None):
+        super().__init__()
+        self.index = index
+        for rule_id, rule in (rules or {}).items():
+            self[rule_id] = rule
+
+    def __reduce__(self):
+        # 序列化为普通字典：网络不随之保存，恢复后由 track() 重新编译
+        return dict, (dict(self),)
+
+    def __setitem__(self, rule_id, rule):
+        # 覆盖已有的键时字典顺序不变，网络中的顺序号也沿用
+        seq = self.index.remove(rule_id) if rule_id in self else None
+        super().__setitem__(rule_id, rule)
+        self.index.add(rule_id, rule, seq)
+
+    def __delitem__(self, rule_id):
+        super().__delitem__(rule_id)
+        self.index.remove(rule_id)
+
+    def pop(self, rule_id, *default):
+        if rule_id in self:
+            self.index.remove(rule_id)
+        return super().pop(rule_id, *default)
+
+    def popitem(self):
+        rule_id, rule = super().popitem()
+        self.index.remove(rule_id)
+        return rule_id, rule
+
+    def setdefault(self, rule_id, rule=None):
+        if rule_id not in self:
+            self[rule_id] = rule
+        return self[rule_id]
+
+    def update(self, *args, **kwargs):
+        for rule_id, rule in dict(*args, **kwargs).items():
+            self[rule_id] = rule
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        for rule_id in list(self):
+            self.index.remove(rule_id)
+        super().clear()
+
+
+class RuleMatchIndex:
+    """候选规律的判别网络"""
+
+    def __init__(self):
+        self.alpha: Dict[Tuple[str, Hashable], Set[str]] = {}
+        self.entries: Dict[str, Tuple[int, int]] = {}  # rule_id -> (顺序号, 等值条件数)
+        self.unconditional: Dict[str, None] = {}
+        self.field_counts: Counter = Counter()
+        self.loose: Dict[tuple, Dict[str, None]] = {}  # (action, environment) -> 规律
+        self._tests: Dict[str, Set[Tuple[str, Hashable]]] = {}
+        self._loose_keys: Dict[str, tuple] = {}
+        self._seq = 0
+        self.stats = {"compiled": 0, "lookups": 0, "matched": 0}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getstate__(self):
+        # 规律池序列化为普通字典，网络只保存统计，下次查找时重新编译
+        return {"stats": self.stats}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.stats.update(state.get("stats", {}))
+
+    def track(self, rules: Dict[str, Any]) -> RulePool:
+        """返回与网络同步的规律池；rules 已是本网络的 RulePool 时原样返回"""
+        if isinstance(rules, RulePool) and rules.index is self:
+            return rules
+        for rule_id in list(self.entries):
+            self.remove(rule_id)
+        return RulePool(self, rules)
+
+    def add(self, rule_id: str, rule, seq: Optional[int] = None):
+        conditions = getattr(rule, 'conditions', None)
+        tests = compile_conditions(conditions)
+        if seq is None:
+            self._seq += 1
+            seq = self._seq
+        self.stats["compiled"] += 1
+        loose = loose_key(conditions)
+        if loose is not None:
+            self._loose_keys[rule_id] = loose
+            self.loose.setdefault(loose, {})[rule_id] = None
+        self.entries[rule_id] = (seq, len(tests or ()))
+        if not tests:
+            self.unconditional[rule_id] = None
+            return
+        self._tests[rule_id] = tests
+        for test in tests:
+            self.alpha.setdefault(test, set()).add(rule_id)
+            self.field_counts[test[0]] += 1
+
+    def remove(self, rule_id: str) -> Optional[int]:
+        """移出网络，返回该规律的顺序号"""
+        entry = self.entries.pop(rule_id, None)
+        if entry is None:
+            return None
+        self.unconditional.pop(rule_id, None)
+        loose = self._loose_keys.pop(rule_id, None)
+        if loose is not None:
+            members = self.loose[loose]
+            del members[rule_id]
+            if not members:
+                del self.loose[loose]
+        for test in self._tests.pop(rule_id, ()):
+            members = self.alpha[test]
+            members.discard(rule_id)
+            if not members:
+                del self.alpha[test]
+            self.field_counts[test[0]] -= 1
+            if self.field_counts[test[0]] <= 0:
+                del self.field_counts[test[0]]
+        return entry[0]
+
+    def match(self, context) -> List[str]:
+        """通过全部等值条件的规律(未排序)"""
+        self.stats["lookups"] += 1
+        hits: Counter = Counter()
+        if self.field_counts:
+            values = context_fields(context)
+            for field in self.field_counts:
+                try:
+                    members = self.alpha.get((field, values[field]))
+                except TypeError:
+                    members = None  # 经验取值不可哈希：不可能与可哈希的条件相等
+                if members:
+                    hits.update(members)
+        rule_ids = [rule_id for rule_id, count in hits.items() if count == self.entries[rule_id][1]]
+        rule_ids.extend(self.unconditional)
+        self.stats["matched"] += len(rule_ids)
+        return rule_ids
+
+    def match_loose(self, action, environment) -> List[str]:
+        """action / environment 条件与给定取值相同(或没有该条件)的规律"""
+        rule_ids = []
+        for action_key in ((action, ANY) if action != ANY else (ANY,)):
+            for environment_key in ((environment, ANY) if environment != ANY else (ANY,)):
+                try:
+                    rule_ids.extend(self.loose.get((action_key, environment_key), ()))
+                except TypeError:
+                    continue  # 经验取值不可哈希：不可能与可哈希的条件相等
+        return rule_ids
+
+    def sort_keys(self, rule_ids) -> List[str]:
+        """按加入顺序(即规律池的字典顺序)排列"""
+        return sorted(rule_ids, key=lambda rule_id: self.entries[rule_id][0])
@@ -25,6 +25,7 @@ from symbolic_core_v3 import (
     SymbolicElement, EOCATR_Tuple, SymbolType, AbstractionLevel,
     create_element, create_tuple
 )
+from turn_profiler import profiled
 
 class SymbolicEnvironment(Enum):
     """环境上下文符号化枚举"""
@@ -204,6 +205,7 @@ class SceneSymbolizationMechanism:
         self.last_action_with_tool = None  # 记录上次工具使用
         self.converter = SymbolicConverter()
         
+    @profiled("ilai.ssm.symbolize_scene")
     def symbolize_scene(self, game, player) -> List[EOCATR_Tuple]:
         """
         将游戏场景符号化为E-O-C-A-T-R元组列表（V3兼容版本）
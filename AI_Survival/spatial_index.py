@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+spatial_index.py
+地图实体空间索引
+
+GameMap 为植物、动物、玩家各维护一个按格子分桶的索引 (cell -> entities)。
+实体的 x / y / alive / collected 属性由 SpatiallyIndexed 混入类托管，
+赋值时自动更新所在的桶，因此移动、采集、死亡后索引始终保持最新。
+
+查询结果保持实体首次加入索引的顺序，与原先遍历 game_map.plants /
+game_map.animals / game.players 列表得到的"第一个匹配"一致。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Position = Tuple[int, int]
+
+
+class SpatialIndex:
+    """按格子分桶的实体索引，支持格子、半径和最近邻查询"""
+
+    def __init__(self):
+        self._cells: Dict[Position, Dict[int, Any]] = {}  # (x, y) -> {id(entity): entity}
+        self._positions: Dict[int, Position] = {}         # id(entity) -> 当前所在格子
+        self._order: Dict[int, int] = {}                  # id(entity) -> 首次加入顺序
+        self._entities: Dict[int, Any] = {}               # id(entity) -> 实体(包括暂不活跃的)
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, entity):
+        return id(entity) in self._positions
+
+    def __getstate__(self):
+        # 内部字典以 id(entity) 为键，反序列化后 id 会变化：按加入顺序保存实体和位置
+        order = sorted(self._order.items(), key=lambda item: item[1])
+        return {"entries": [(self._entities[key], self._positions.get(key)) for key, _ in order],
+                "next_order": self._next_order}
+
+    def __setstate__(self, state):
+        self.__init__()
+        for entity, position in state["entries"]:
+            key = id(entity)
+            self._order[key] = self._next_order
+            self._next_order += 1
+            self._entities[key] = entity
+            if position is not None:
+                self._cells.setdefault(position, {})[key] = entity
+                self._positions[key] = position
+        self._next_order = max(self._next_order, state["next_order"])
+
+    # ---------- 维护 ----------
+
+    def attach(self, entity):
+        """登记实体并让其后续的位置/状态变化自动同步到本索引"""
+        key = id(entity)
+        if key not in self._order:
+            self._order[key] = self._next_order
+            self._next_order += 1
+        self._entities[key] = entity
+        entity._spatial_index = self
+        self.update(entity)
+
+    def detach(self, entity):
+        """彻底移除实体(不再跟踪其变化)"""
+        self._remove(id(entity))
+        self._order.pop(id(entity), None)
+        self._entities.pop(id(entity), None)
+        entity._spatial_index = None
+
+    def update(self, entity):
+        """按实体当前坐标和存活状态重新放置到对应的桶"""
+        key = id(entity)
+        if not entity.is_spatially_active():
+            self._remove(key)
+            return
+        position = (entity.x, entity.y)
+        old_position = self._positions.get(key)
+        if old_position == position:
+            return
+        if old_position is not None:
+            self._remove(key)
+        self._cells.setdefault(position, {})[key] = entity
+        self._positions[key] = position
+
+    def move_to(self, entity, position):
+        """批量移动的快速路径：调用方已知实体存活且新坐标为 position"""
+        key = id(entity)
+        old_position = self._positions.get(key)
+        if old_position == position:
+            return
+        if old_position is not None:
+            self._remove(key)
+        self._cells.setdefault(position, {})[key] = entity
+        self._positions[key] = position
+
+    def _remove(self, key):
+        position = self._positions.pop(key, None)
+        if position is None:
+            return
+        bucket = self._cells.get(position)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[position]
+
+    # ---------- 查询 ----------
+
+    def _ordered(self, entities):
+        if len(entities) > 1:
+            entities.sort(key=lambda e: self._order.get(id(e), 0))
+        return entities
+
+    def at(self, x, y) -> List[Any]:
+        """返回格子 (x, y) 上的实体"""
+        bucket = self._cells.get((x, y))
+        if not bucket:
+            return []
+        return self._ordered(list(bucket.values()))
+
+    def first_at(self, x, y, predicate: Optional[Callable[[Any], bool]] = None):
+        """返回格子 (x, y) 上第一个满足条件的实体"""
+        for entity in self.at(x, y):
+            if predicate is None or predicate(entity):
+                return entity
+        return None
+
+    def in_radius(self, x, y, radius, metric: str = "manhattan",
+                  predicate: Optional[Callable[[Any], bool]] = None) -> List[Any]:
+        """返回半径内的实体；metric 为 manhattan(|dx|+|dy|) 或 chebyshev(max(|dx|,|dy|))"""
+        chebyshev = metric == "chebyshev"
+        found = []
+        # 半径覆盖的格子多于已占用格子时，直接遍历已占用的桶更快
+        if (2 * radius + 1) ** 2 > len(self._cells):
+            cells = self._cells.items()
+        else:
+            cells = (((cx, cy), self._cells[(cx, cy)])
+                     for cx in range(x - radius, x + radius + 1)
+                     for cy in range(y - radius, y + radius + 1)
+                     if (cx, cy) in self._cells)
+        for (cx, cy), bucket in cells:
+            dx, dy = abs(cx - x), abs(cy - y)
+            distance = max(dx, dy) if chebyshev else dx + dy
+            if distance > radius:
+                continue
+            for entity in bucket.values():
+                if predicate is None or predicate(entity):
+                    found.append(entity)
+        return self._ordered(found)
+
+    def nearest(self, x, y, max_radius: Optional[int] = None,
+                predicate: Optional[Callable[[Any], bool]] = None):
+        """返回曼哈顿距离最近的实体(距离相同取最先加入者)，超出 max_radius 返回 None"""
+        if not self._positions:
+            return None
+        if max_radius is None or (2 * max_radius + 1) ** 2 > len(self._cells):
+            best, best_key = None, None
+            for (cx, cy), bucket in self._cells.items():
+                distance = abs(cx - x) + abs(cy - y)
+                if max_radius is not None and distance > max_radius:
+                    continue
+                for entity in bucket.values():
+                    if predicate is not None and not predicate(entity):
+                        continue
+                    key = (distance, self._order.get(id(entity), 0))
+                    if best_key is None or key < best_key:
+                        best, best_key = entity, key
+            return best
+        # 由近及远按菱形环扩展，找到的第一个非空环即为最近距离
+        for distance in range(max_radius + 1):
+            candidates = []
+            for dx in range(-distance, distance + 1):
+                rest = distance - abs(dx)
+                for dy in ({rest, -rest} if rest else {0}):
+                    bucket = self._cells.get((x + dx, y + dy))
+                    if bucket:
+                        candidates.extend(e for e in bucket.values()
+                                          if predicate is None or predicate(e))
+            if candidates:
+                return min(candidates, key=lambda e: self._order.get(id(e), 0))
+        return None
+
+
+def indexed_attribute(name):
+    """生成一个赋值时会同步空间索引的属性"""
+    private = "_" + name
+
+    def getter(self):
+        try:
+            return self.__dict__[private]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def setter(self, value):
+        self.__dict__[private] = value
+        index = self.__dict__.get("_spatial_index")
+        if index is not None:
+            index.update(self)
+
+    return property(getter, setter)
+
+
+class SpatiallyIndexed:
+    """混入类：托管 x / y / alive，赋值时同步到所属的 SpatialIndex"""
+
+    x = indexed_attribute("x")
+    y = indexed_attribute("y")
+    alive = indexed_attribute("alive")
+
+    def is_spatially_active(self):
+        """只有存活的实体出现在索引中"""
+        return self.__dict__.get("_alive", True)
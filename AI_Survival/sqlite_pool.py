@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+sqlite_pool.py
+按线程、按数据库复用的 SQLite 长连接
+
+五库系统和经验存储系统原先每次查询/更新都 sqlite3.connect 一次：
+一次 add_experience_to_direct_library 要打开 4~6 个连接，每次都重新解析 schema、
+重新编译语句。这里为每个 (进程, 线程, 数据库文件) 保留一个长连接，并设置：
+    journal_mode=WAL       读写互不阻塞，提交只追加 WAL
+    synchronous=NORMAL     WAL 模式下提交不再每次 fsync
+    mmap_size              读取通过内存映射
+    cached_statements      连接级的预编译语句缓存
+    busy_timeout           多线程/多进程写入时等待而不是立即报错
+
+连接的 row_factory 保持默认(元组)，需要按列名访问的调用方在游标上设置 sqlite3.Row。
+覆盖或删除数据库文件之前(例如恢复快照)应先调用 close_connections(path)。
+
+内存模式：use_memory(path) 之后本进程对该文件的访问都改用一个 :memory: 数据库
+(文件已存在时先载入其内容，所有线程共用这一个连接)，插入不再写磁盘。
+共用连接上的事务不能交错，因此在连接上执行语句的代码都要持有 path_lock(path)
+(DatabaseManager、写后缓冲的刷新、checkpoint 等都使用这把按路径的锁)。
+checkpoint(path) 用 SQLite backup API 把内存数据库写回 .db 文件(先写临时文件再替换)；
+close_connections 和进程退出时也会先写回再关闭。
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+CACHED_STATEMENTS = 256
+MMAP_SIZE = 64 * 1024 * 1024
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_connections: Dict[Tuple[int, int, str], sqlite3.Connection] = {}
+_memory_paths: Set[str] = set()                                  # 改用内存数据库的文件(绝对路径)
+_memory_connections: Dict[Tuple[int, str], sqlite3.Connection] = {}
+_path_locks: Dict[Tuple[int, str], threading.RLock] = {}        # (进程, 绝对路径) -> 锁
+_path_lock_aliases: Dict[Tuple[int, str], threading.RLock] = {}  # (进程, 调用方给出的路径) -> 锁
+_lock = threading.Lock()
+
+
+def _key(db_path: str) -> Tuple[int, int, str]:
+    # 包含进程号：fork 出的子进程不能沿用父进程的连接
+    return os.getpid(), threading.get_ident(), os.path.abspath(db_path)
+
+
+def open_connection(db_path: str) -> sqlite3.Connection:
+    """新建一个按上述 PRAGMA 配置好的连接(不进入连接池)"""
+    conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def path_lock(db_path: str) -> threading.RLock:
+    """本进程内 db_path 的锁(可重入)：同一文件的所有 DatabaseManager 和写入线程共用"""
+    alias = (os.getpid(), db_path)
+    lock = _path_lock_aliases.get(alias)
+    if lock is None:
+        with _lock:
+            lock = _path_locks.setdefault((alias[0], os.path.abspath(db_path)), threading.RLock())
+            _path_lock_aliases[alias] = lock
+    return lock
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """返回当前线程对 db_path 的长连接，不存在时创建"""
+    key = _key(db_path)
+    conn = _connections.get(key)
+    if conn is None:
+        if key[2] in _memory_paths:
+            return _memory_connection(key[0], key[2])
+        conn = open_connection(db_path)
+        with _lock:
+            _connections[key] = conn
+    return conn
+
+
+def use_memory(db_path: str):
+    """此后本进程对 db_path 的访问都使用内存数据库"""
+    path = os.path.abspath(db_path)
+    if path in _memory_paths:
+        return
+    close_connections(path)  # 已打开的文件连接不再使用
+    with _lock:
+        _memory_paths.add(path)
+
+
+def use_disk(db_path: str):
+    """写回并关闭 db_path 的内存数据库，此后重新直接读写文件"""
+    close_connections(db_path)
+    with _lock:
+        _memory_paths.discard(os.path.abspath(db_path))
+
+
+def is_memory(db_path: str) -> bool:
+    return os.path.abspath(db_path) in _memory_paths
+
+
+def _memory_connection(pid: int, path: str) -> sqlite3.Connection:
+    with _lock:
+        conn = _memory_connections.get((pid, path))
+        if conn is None:
+            conn = sqlite3.connect(":memory:", check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            if os.path.exists(path):
+                source = sqlite3.connect(path)
+                try:
+                    source.backup(conn)
+                finally:
+                    source.close()
+            conn.execute("PRAGMA temp_store=MEMORY")
+            _memory_connections[(pid, path)] = conn
+        return conn
+
+
+def _write_back(path: str, conn: sqlite3.Connection):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".checkpoint"
+    target = sqlite3.connect(tmp_path)
+    try:
+        conn.backup(target)
+    finally:
+        target.close()
+    for suffix in ("-wal", "-shm"):  # 旧文件的 WAL 不能与新内容混用
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.replace(tmp_path, path)
+
+
+def checkpoint(db_path: Optional[str] = None) -> int:
+    """把 db_path(为 None 时为全部)的内存数据库写回磁盘文件，返回写回的数量"""
+    target = os.path.abspath(db_path) if db_path is not None else None
+    pid = os.getpid()
+    with _lock:
+        items = [(key[1], conn) for key, conn in _memory_connections.items()
+                 if key[0] == pid and (target is None or key[1] == target)]
+    for path, conn in items:
+        with path_lock(path):
+            _write_back(path, conn)
+    return len(items)
+
+
+def close_connections(db_path: Optional[str] = None) -> int:
+    """关闭 db_path(为 None 时为全部)在各线程上的连接，返回关闭的数量"""
+    target = os.path.abspath(db_path) if db_path is not None else None
+    pid = os.getpid()
+    with _lock:
+        keys = [key for key in _connections if target is None or key[2] == target]
+        conns = [_connections.pop(key) for key in keys]
+        memory_keys = [key for key in _memory_connections if target is None or key[1] == target]
+        memory = [(key, _memory_connections.pop(key)) for key in memory_keys]
+    closed = 0
+    for key, conn in memory:
+        if key[0] != pid:
+            continue
+        # 先写回磁盘；路径仍是内存模式，下次访问时从文件重新载入
+        with path_lock(key[1]):
+            try:
+                _write_back(key[1], conn)
+            finally:
+                conn.close()
+        closed += 1
+    for key, conn in zip(keys, conns):
+        if key[0] != pid:
+            continue  # 父进程的连接不在本进程关闭
+        try:
+            conn.close()
+            closed += 1
+        except sqlite3.Error:
+            pass
+    return closed
+
+
+def close_thread_connections() -> int:
+    """关闭当前线程持有的全部连接(工作线程退出前调用)"""
+    pid, thread_id = os.getpid(), threading.get_ident()
+    with _lock:
+        keys = [key for key in _connections if key[0] == pid and key[1] == thread_id]
+        conns = [_connections.pop(key) for key in keys]
+    for conn in conns:
+        conn.close()
+    return len(conns)
+
+
+def open_connection_count() -> int:
+    return len(_connections) + len(_memory_connections)
+
+
+# 进程退出时关闭连接，让 SQLite 把 WAL 合并回主数据库文件(内存数据库写回文件)
+atexit.register(close_connections)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP 增量怒放自测：每条新经验只为其所属模式组生成规律、只验证一次，
+历史经验只在首次调用时用于初始化模式组，约束感知集成同样只处理新经验，
+验证阶段经规律匹配网络只验证可能适用的候选规律，结果与逐条验证一致
+"""
+
+import copy
+import random
+
+from blooming_and_pruning_model import BloomingAndPruningModel
+from enhanced_bmp_integration import integrate_constraint_awareness_to_bmp
+from testing_utils import random_candidate_rule, random_eocatr_tuple
+
+
+def incremental_model(window=5):
+    bpm = BloomingAndPruningModel()
+    bpm.config.update({'incremental_blooming': True, 'incremental_pattern_window': window})
+    return bpm
+
+
+def record_calls(bpm, name):
+    calls = []
+    original = getattr(bpm, name)
+
+    def wrapper(*args):
+        calls.append(args)
+        return original(*args)
+    setattr(bpm, name, wrapper)
+    return calls
+
+
+def test_only_touched_patterns_are_bloomed():
+    rng = random.Random(1)
+    bpm = incremental_model()
+    generated = record_calls(bpm, '_generate_rules_for_pattern')
+    validated = record_calls(bpm, 'validation_phase')
+    history = []
+    for _ in range(40):
+        experience = random_eocatr_tuple(rng)
+        del generated[:], validated[:]
+        new_rules = bpm.process_experience(experience, history[-10:])
+        history.append(experience)
+
+        keys = [key for key in bpm._experience_pattern_keys(experience)
+                if not key.startswith("TOOL_COMPARISON_") or len(bpm.pattern_experiences[key]) >= 2]
+        assert [call[0] for call in generated] == keys  # 只处理新经验所属的模式组
+        assert all(experience in call[1] and len(call[1]) <= 5 for call in generated)
+        assert [call[0] for call in validated] == [[experience]]  # 每条经验只验证一次
+        assert all(rule.rule_id in bpm.candidate_rules or rule.rule_id in bpm.pruned_rules for rule in new_rules)
+    assert all(len(group) <= 5 for group in bpm.pattern_experiences.values())
+    assert bpm.total_rules_generated > 0
+
+
+def test_history_only_seeds_empty_patterns():
+    rng = random.Random(2)
+    history = [random_eocatr_tuple(rng) for _ in range(8)]
+    bpm = incremental_model(window=20)
+    generated = record_calls(bpm, '_generate_rules_for_pattern')
+    bpm.process_experience(history[-1], history[:-1])
+    seeded = sum(len(group) for group in bpm.pattern_experiences.values())
+    assert seeded == sum(len(bpm._experience_pattern_keys(exp)) for exp in history)  # 每条历史经验加入所属模式组
+    first_calls = len(generated)
+
+    experience = random_eocatr_tuple(rng)
+    bpm.process_experience(experience, history)  # 已初始化：历史经验不再加入
+    assert sum(len(group) for group in bpm.pattern_experiences.values()) == \
+        seeded + len(bpm._experience_pattern_keys(experience))
+    assert len(generated) - first_calls <= len(bpm._experience_pattern_keys(experience))
+
+
+def test_constraint_aware_integration_processes_new_experience_only():
+    rng = random.Random(3)
+    bpm = incremental_model()
+    integration = integrate_constraint_awareness_to_bmp(bpm)
+    bloomed = record_calls(integration, 'constraint_aware_blooming_phase')
+    validated = record_calls(bpm, 'validation_phase')
+    history = [random_eocatr_tuple(rng) for _ in range(10)]
+    experience = random_eocatr_tuple(rng)
+    bpm.process_experience(experience, history)
+    assert [call[0] for call in bloomed] == [[experience]]
+    assert [call[0] for call in validated] == [[experience]]
+
+
+def rule_states(bpm):
+    return {rule_id: (pool, rule.confidence, rule.evidence.total_tests, rule.evidence.successful_tests,
+                      len(rule.evidence.supporting_experiences), len(rule.evidence.contradicting_experiences))
+            for pool in ('candidate_rules', 'validated_rules') for rule_id, rule in getattr(bpm, pool).items()}
+
+
+def test_validation_phase_checks_applicable_rules_only():
+    rng = random.Random(4)
+    rules = [random_candidate_rule(rng, i) for i in range(300)]
+    for rule in rules[:240]:
+        # 怒放生成的规律大多带 action / environment 条件
+        rule.conditions.update(action=rng.choice(["attack", "collect"]), environment=rng.choice(["开阔地", "森林"]))
+    narrowed, reference = BloomingAndPruningModel(), BloomingAndPruningModel()
+    for bpm in (narrowed, reference):
+        bpm.config['auto_promotion_enabled'] = False
+        for rule in copy.deepcopy(rules):
+            bpm.candidate_rules[rule.rule_id] = rule
+    reference._validation_candidates = lambda experiences: list(reference.candidate_rules.items())
+    checked = record_calls(narrowed, '_validate_rule_with_experiences')
+    candidates = 0
+
+    for round_index in range(30):
+        experiences = [random_eocatr_tuple(rng) for _ in range(rng.randint(1, 3))]
+        if round_index % 2:
+            # 没有 .value 的取值：等值条件照常匹配，弱匹配只剩没有 action / environment 条件的规律
+            for experience in experiences:
+                experience.action, experience.environment = experience.action.content, experience.environment.content
+        candidates += len(narrowed.candidate_rules)
+        random.seed(round_index)
+        narrowed_ids = narrowed.validation_phase(experiences)
+        random.seed(round_index)
+        assert narrowed_ids == reference.validation_phase(experiences)
+        assert rule_states(narrowed) == rule_states(reference)
+        assert list(narrowed.candidate_rules) == list(reference.candidate_rules)
+    assert narrowed.validated_rules
+    assert len(checked) < candidates * 2 / 3
+
+
+if __name__ == "__main__":
+    test_only_touched_patterns_are_bloomed()
+    test_history_only_seeds_empty_patterns()
+    test_constraint_aware_integration_processes_new_experience_only()
+    test_validation_phase_checks_applicable_rules_only()
+    print("✅ 自测通过: BMP 增量怒放按预期工作")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP 规律去重索引自测：内容桶 + 分块索引的去重结果与逐条比较全部规律一致，
+内容相同、rule_id 不同的规律被识别为重复，规律池被直接修改后 sync 对齐
+"""
+
+import copy
+import random
+
+from blooming_and_pruning_model import BloomingAndPruningModel, CandidateRule, RuleType
+
+TYPES = [RuleType.CAUSAL, RuleType.CONDITIONAL, RuleType.SPATIAL]
+FIELDS = {"object": ["rabbit", "berry"], "action": ["attack", "gather"], "environment": ["forest", "open_field"],
+          "tool": ["none", "spear"], "distance": [1, 2, 3]}
+
+
+def random_rule(rng, idx):
+    fields = rng.sample(sorted(FIELDS), rng.randint(0, 4))
+    conditions = {field: rng.choice(FIELDS[field]) for field in fields}
+    predictions = {"success": rng.random() < 0.5} if rng.random() < 0.7 else {}
+    pattern = " ".join(f"{value}" for value in conditions.values()) + " -> " + rng.choice(["food", "damage"])
+    return CandidateRule(rule_id=f"r{idx}", rule_type=rng.choice(TYPES), pattern=pattern,
+                         conditions=conditions, predictions=predictions)
+
+
+def build_model(rng, count):
+    bpm = BloomingAndPruningModel()
+    for i in range(count):
+        rule = random_rule(rng, i)
+        pool = bpm.candidate_rules if i % 2 else bpm.validated_rules
+        pool[rule.rule_id] = rule
+    bpm.rule_index.sync(bpm.candidate_rules, bpm.validated_rules)
+    return bpm
+
+
+def pooled(bpm):
+    return list(bpm.candidate_rules.values()) + list(bpm.validated_rules.values())
+
+
+def reference_obvious_duplicate(bpm, rule):
+    """原实现：内容指纹 + 与全部规律逐条比较内容"""
+    if bpm._generate_content_fingerprint(rule) in bpm.rule_fingerprints:
+        return True
+    return any(bpm._is_content_identical(rule, existing) for existing in pooled(bpm))
+
+
+def reference_duplicate(bpm, rule):
+    """原实现的相似度部分：与全部规律逐条计算相似度(指纹改为内容指纹)"""
+    if bpm._generate_content_fingerprint(rule) in bpm.rule_fingerprints:
+        return True
+    return any(bpm._calculate_rule_similarity(rule, existing) > bpm.rule_similarity_threshold
+               for existing in pooled(bpm))
+
+
+def probes(rng, bpm, count):
+    existing = pooled(bpm)
+    result = []
+    for i in range(count):
+        if i % 3 == 0:  # 内容相同、rule_id 不同
+            rule = copy.deepcopy(rng.choice(existing))
+            rule.rule_id = f"copy{i}"
+        else:
+            rule = random_rule(rng, 10000 + i)
+        result.append(rule)
+    return result
+
+
+def test_matches_full_comparison():
+    rng = random.Random(7)
+    bpm = build_model(rng, 400)
+    duplicates = 0
+    for rule in probes(rng, bpm, 300):
+        expected = reference_duplicate(bpm, rule)
+        assert bpm._is_duplicate_rule(rule) == expected, rule
+        assert bpm._is_obvious_duplicate_simple(rule) == reference_obvious_duplicate(bpm, rule), rule
+        duplicates += expected
+    assert 100 <= duplicates < 300  # 复制的规律全部识别为重复，随机规律部分重复
+    assert bpm.rule_index.stats["compared"] < 300 * 400 / 10  # 只比较同分块的规律
+
+
+def test_copied_rule_with_new_id_is_duplicate():
+    bpm = BloomingAndPruningModel()
+    rule = CandidateRule(rule_id="a", rule_type=RuleType.CAUSAL, pattern="berry gather -> food",
+                         conditions={"object": "berry", "action": "gather"}, predictions={"success": True})
+    bpm.rule_fingerprints.add(bpm._generate_content_fingerprint(rule))
+    copied = copy.deepcopy(rule)
+    copied.rule_id = "b"
+    assert bpm._is_duplicate_rule(copied)  # 原指纹包含 rule_id，无法发现
+
+
+def test_sync_follows_direct_pool_changes():
+    rng = random.Random(3)
+    bpm = build_model(rng, 60)
+    removed = next(iter(bpm.candidate_rules.values()))
+    del bpm.candidate_rules[removed.rule_id]
+    promoted = next(iter(bpm.candidate_rules.values()))
+    bpm.validated_rules[promoted.rule_id] = bpm.candidate_rules.pop(promoted.rule_id)
+    added = random_rule(rng, 999)
+    bpm.candidate_rules[added.rule_id] = added
+
+    copied = copy.deepcopy(removed)
+    copied.rule_id = "again"
+    assert bpm._is_obvious_duplicate_simple(copied) == reference_obvious_duplicate(bpm, copied)  # 已删除的规律不再匹配
+    assert bpm.rule_index.sync(bpm.candidate_rules, bpm.validated_rules) == 2  # 移动的规律不变
+    for rule in (removed, promoted, added):
+        probe = copy.deepcopy(rule)
+        probe.rule_id = "probe"
+        assert bpm._is_obvious_duplicate_simple(probe) == reference_obvious_duplicate(bpm, probe)
+        assert bpm._is_duplicate_rule(probe) == reference_duplicate(bpm, probe)
+
+    restored = copy.deepcopy(bpm)  # 反序列化后索引为空，下次 sync 重建
+    assert len(restored.rule_index) == 0
+    restored.rule_index.sync(restored.candidate_rules, restored.validated_rules)
+    assert len(restored.rule_index) == len(pooled(restored))
+
+
+if __name__ == "__main__":
+    test_matches_full_comparison()
+    test_copied_rule_with_new_id_is_duplicate()
+    test_sync_follows_direct_pool_changes()
+    print("✅ 自测通过: BMP 规律去重索引按预期工作")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP 候选规律匹配网络自测：网络找出的规律覆盖逐条调用 _is_rule_applicable 判断适用的规律
+(没有 C/阈值等剩余条件时两者完全一致)，弱匹配表与 _validate_rule_with_experiences 的弱匹配一致，
+规律池的增删改和整体替换都同步到网络
+"""
+
+import copy
+import random
+
+from blooming_and_pruning_model import BloomingAndPruningModel
+from rule_match_index import RuleMatchIndex, compile_conditions
+from testing_utils import random_candidate_rule as random_rule, random_eocatr_tuple
+
+
+def has_residual(rule):
+    """网络不判断的条件：C/阈值等，或取值不可哈希的等值条件"""
+    return compile_conditions(rule.conditions) is None or any(
+        key == 'C' or key.startswith('characteristic_') or key.endswith('_threshold') for key in rule.conditions)
+
+
+def build_model(rng, count):
+    bpm = BloomingAndPruningModel()
+    for i in range(count):
+        rule = random_rule(rng, i)
+        bpm.candidate_rules[rule.rule_id] = rule
+    return bpm
+
+
+def assert_covers(bpm, context, seed):
+    matched = set(bpm.rule_matcher.match(context))
+    random.seed(seed)
+    for rule_id, rule in bpm.candidate_rules.items():
+        applicable = bpm._is_rule_applicable(rule, context)
+        if applicable:
+            assert rule_id in matched
+        elif not has_residual(rule):
+            assert rule_id not in matched
+    return matched
+
+
+def weakly_matched(rule, action, environment):
+    """_validate_rule_with_experiences 中的弱匹配"""
+    cond = rule.conditions if isinstance(rule.conditions, dict) else {}
+    return ((('action' not in cond) or cond.get('action') == action) and
+            (('environment' not in cond) or cond.get('environment') == environment))
+
+
+def test_match_covers_rule_by_rule_evaluation():
+    rng = random.Random(21)
+    bpm = build_model(rng, 600)
+    for i in range(200):
+        context = random_eocatr_tuple(rng)
+        assert_covers(bpm, context, i)
+        action, environment = context.action.value, context.environment.value
+        expected = [rule_id for rule_id, rule in bpm.candidate_rules.items()
+                    if weakly_matched(rule, action, environment)]
+        assert bpm.rule_matcher.sort_keys(bpm.rule_matcher.match_loose(action, environment)) == expected
+        # 经验取值缺少 .value 时只剩没有 action / environment 条件的规律
+        expected = [rule_id for rule_id, rule in bpm.candidate_rules.items() if weakly_matched(rule, None, None)]
+        assert bpm.rule_matcher.sort_keys(bpm.rule_matcher.match_loose(None, None)) == expected
+
+    # 每条规律都有等值条件时，只找出通过等值条件的少数规律
+    selective = BloomingAndPruningModel()
+    for i in range(600):
+        rule = random_rule(rng, i)
+        rule.conditions["object_category"] = rng.choice(["tiger", "rabbit", "berry", "stone"])
+        rule.conditions["action"] = rng.choice(["attack", "collect", "move"])
+        selective.candidate_rules[rule.rule_id] = rule
+    for i in range(200):
+        assert_covers(selective, random_eocatr_tuple(rng), 1000 + i)
+    assert selective.rule_matcher.stats["matched"] < 200 * 600 / 4
+
+
+def assert_in_sync(bpm, contexts):
+    fresh = RuleMatchIndex()
+    fresh.track(dict(bpm.candidate_rules))
+    matcher = bpm.rule_matcher
+    assert len(matcher) == len(bpm.candidate_rules)
+    assert matcher.sort_keys(bpm.candidate_rules) == list(bpm.candidate_rules)
+    for context in contexts:
+        assert matcher.sort_keys(matcher.match(context)) == fresh.sort_keys(fresh.match(context))
+        values = (context.action.value, context.environment.value)
+        assert matcher.sort_keys(matcher.match_loose(*values)) == fresh.sort_keys(fresh.match_loose(*values))
+
+
+def test_pool_changes_follow_network():
+    rng = random.Random(22)
+    bpm = build_model(rng, 200)
+    contexts = [random_eocatr_tuple(rng) for _ in range(30)]
+    assert_in_sync(bpm, contexts)
+
+    # 删除、覆盖、pop、update、setdefault
+    del bpm.candidate_rules[next(iter(bpm.candidate_rules))]
+    bpm.candidate_rules.pop(next(iter(bpm.candidate_rules)))
+    replaced = next(iter(bpm.candidate_rules))
+    bpm.candidate_rules[replaced] = random_rule(rng, 10000)
+    bpm.candidate_rules.update({f"new{i}": random_rule(rng, 20000 + i) for i in range(20)})
+    bpm.candidate_rules.setdefault("extra", random_rule(rng, 30000))
+    assert_in_sync(bpm, contexts)
+
+    # 整体替换：验证时重新编译
+    bpm.candidate_rules = {rule_id: rule for rule_id, rule in list(bpm.candidate_rules.items())[:50]}
+    bpm._validation_candidates(contexts[:1])
+    assert_in_sync(bpm, contexts)
+
+    restored = copy.deepcopy(bpm)  # 反序列化后规律池是普通字典，验证时重新编译
+    assert type(restored.candidate_rules) is dict and len(restored.rule_matcher) == 0
+    restored._validation_candidates(contexts[:1])
+    assert_in_sync(restored, contexts)
+
+    bpm.candidate_rules.clear()
+    assert len(bpm.rule_matcher) == 0
+
+
+if __name__ == "__main__":
+    test_match_covers_rule_by_rule_evaluation()
+    test_pool_changes_follow_network()
+    print("✅ 自测通过: BMP 候选规律匹配网络按预期工作")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+检查点服务自测：后台写入、未变化跳过、原子替换不留临时文件、合并归档恢复、后台写入失败报告到游戏日志
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from checkpoint_service import CheckpointService
+from nn_backend import NumpyMLP
+from replay_buffer import ReplayBuffer
+
+
+class DummyPlayer:
+    def __init__(self, name):
+        self.name = name
+        self.q_network = NumpyMLP([4, 8, 2], ["relu", "linear"], seed=len(name))
+        self.memory = ReplayBuffer(10)
+        self.memory.add(np.ones(4), 1, 1.0, np.ones(4), False)
+
+    def is_alive(self):
+        return True
+
+    def checkpoint_items(self):
+        return {f"dqn_model_{self.name}.npz": self.q_network, f"dqn_replay_{self.name}.npz": self.memory}
+
+
+class RecordingLogger:
+    """与 main.Logger 相同的 log(message) 接口"""
+
+    def __init__(self):
+        self.logs = []
+
+    def log(self, message):
+        self.logs.append(message)
+
+
+def test_async_dedup_and_atomic_write():
+    player = DummyPlayer("P1")
+    with tempfile.TemporaryDirectory() as tmp:
+        service = CheckpointService(tmp)
+        assert service.checkpoint_players([player]) == 2
+        assert service.checkpoint_players([player]) == 0  # 没有变化
+        player.q_network.fit(np.ones((4, 4)), np.zeros((4, 2)))
+        assert service.checkpoint_players([player]) == 1
+        service.close()
+
+        assert service.stats == {"saved": 3, "skipped": 3, "failed": 0}
+        assert sorted(os.listdir(tmp)) == ["dqn_model_P1.npz", "dqn_replay_P1.npz"]
+        saved = NumpyMLP.load(os.path.join(tmp, "dqn_model_P1.npz"))
+        x = np.ones((1, 4))
+        assert np.allclose(saved.predict(x), player.q_network.predict(x))
+
+
+def test_combined_archive_restore():
+    players = [DummyPlayer("P1"), DummyPlayer("P22")]
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "run.npz")
+        service = CheckpointService(tmp, archive_path=archive)
+        service.checkpoint_players(players)
+        service.close()
+        assert os.listdir(tmp) == ["run.npz"]
+
+        fresh = DummyPlayer("P22")
+        fresh.memory.clear()
+        items = CheckpointService.load_archive(archive)
+        assert CheckpointService.restore_player(fresh, items) == 2
+    x = np.ones((1, 4))
+    assert np.allclose(fresh.q_network.predict(x), players[1].q_network.predict(x))
+    assert len(fresh.memory) == 1
+
+
+def test_background_failures_reach_game_logger():
+    player = DummyPlayer("P1")
+    game_logger = RecordingLogger()
+    with tempfile.TemporaryDirectory() as tmp:
+        blocker = os.path.join(tmp, "file")
+        open(blocker, "w").close()
+        service = CheckpointService(os.path.join(blocker, "models"), logger=game_logger)
+        assert service.checkpoint_players([player]) == 2
+        service.flush()
+        assert service.stats["failed"] == 2
+        assert len(game_logger.logs) == 2 and all("写入检查点失败" in message for message in game_logger.logs)
+        assert service.checkpoint_players([player]) == 2  # 失败的对象下次重新尝试
+        service.close()
+
+
+if __name__ == "__main__":
+    test_async_dedup_and_atomic_write()
+    test_combined_archive_restore()
+    test_background_failures_reach_game_logger()
+    print("✅ 自测通过: 检查点服务按预期工作")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EOCATR 项集格枚举自测：逐层展开 + 支持度剪枝得到的频繁项集与穷举一致，
+有界堆的前 k 条与全排序一致，生成器的格枚举只返回符合 C₂/C₃ 约束、得分最高的规律
+"""
+
+import itertools
+import random
+
+from eocar_combination_generator import (FORBIDDEN_COMBINATION_TYPES, CandidateRule,
+                                         EOCARCombinationGenerator)
+from eocatr_lattice import ELEMENT_ORDER, EOCATRLattice, bounded_top_k
+from testing_utils import random_eocatr_tuple
+
+
+def random_transaction(rng):
+    return {element: [(element, f"{element}={value}", "", 0)
+                      for value in rng.sample(range(4), rng.randint(0, 2))]
+            for element in ELEMENT_ORDER}
+
+
+def brute_force_itemsets(transactions, min_support):
+    """穷举每个元素至多取一项的全部组合并统计支持度"""
+    counts = {}
+    for transaction in transactions:
+        choices = [[None] + transaction[element] for element in ELEMENT_ORDER]
+        for combination in itertools.product(*choices):
+            itemset = tuple(item for item in combination if item is not None)
+            if itemset:
+                counts[itemset] = counts.get(itemset, 0) + 1
+    return {itemset: count for itemset, count in counts.items() if count >= min_support}
+
+
+def test_lattice_matches_brute_force():
+    rng = random.Random(5)
+    transactions = [random_transaction(rng) for _ in range(40)]
+    for min_support in (1, 3, 6):
+        lattice = EOCATRLattice(transactions, min_support)
+        found = {itemset: len(tids) for level in lattice.levels() for itemset, tids in level.items()}
+        assert found == brute_force_itemsets(transactions, min_support)
+        assert lattice.stats["pruned"] > 0 or min_support == 1
+
+    shallow = EOCATRLattice(transactions, 2, max_elements=2)
+    assert max(len(itemset) for level in shallow.levels() for itemset in level) == 2
+
+
+def test_bounded_top_k_matches_sort():
+    rng = random.Random(6)
+    entries = [(rng.choice([0.1, 0.2, 0.3, 0.4]), i) for i in range(200)]
+    expected = sorted(entries, key=lambda entry: (-entry[0], entry[1]))[:17]  # 得分相同时先到者优先
+    assert bounded_top_k(iter(entries), 17) == expected
+    assert bounded_top_k(entries[:5], 17) == sorted(entries[:5], key=lambda entry: (-entry[0], entry[1]))
+
+
+def test_generator_lattice_returns_top_rules():
+    rng = random.Random(7)
+    experiences = [random_eocatr_tuple(rng) for _ in range(30)]
+    generator = EOCARCombinationGenerator(config={'lattice_enumeration': True, 'max_rules': 20,
+                                                  'lattice_min_support_ratio': 0.1})
+    rules = generator.generate_candidate_rules(experiences)
+    assert len(rules) == 20
+    assert not any(rule.combination_type in FORBIDDEN_COMBINATION_TYPES for rule in rules)
+    scores = [rule.calculate_quality_score() for rule in rules]
+    assert scores == sorted(scores, reverse=True)
+    assert len({tuple(rule.condition_elements) for rule in rules}) == len(rules)
+
+    transactions = [{item[1] for items in generator._lattice_items(exp).values() for item in items}
+                    for exp in experiences]
+    for rule in rules:
+        matching = [tid for tid, items in enumerate(transactions) if set(rule.condition_elements) <= items]
+        assert rule.support_count + rule.contradict_count == len(matching) >= 3  # 支持度 >= 10% * 30
+        assert len(rule.source_experiences) == rule.support_count >= rule.contradict_count
+
+    # 与穷举全部项集后排序截断一致
+    everything = EOCARCombinationGenerator(config={'lattice_enumeration': True, 'max_rules': 10 ** 6,
+                                                   'lattice_min_support_ratio': 0.1})
+    full = everything.generate_candidate_rules(experiences)
+    assert len(full) > 100
+    assert [round(rule.calculate_quality_score(), 9) for rule in full[:20]] == [round(s, 9) for s in scores]
+    assert all(full[i].calculate_quality_score() >= full[i + 1].calculate_quality_score()
+               for i in range(len(full) - 1))
+
+
+def test_single_experience_keeps_constraints():
+    rng = random.Random(8)
+    experience = random_eocatr_tuple(rng)
+    generator = EOCARCombinationGenerator(config={'lattice_enumeration': True})
+    rules = generator.generate_candidate_rules([experience])
+    assert 0 < len(rules) <= 50
+    assert all(len(rule.condition_elements) >= 2 and rule.support_count == 1 for rule in rules)
+    assert all(rule.source_experiences == [experience.tuple_id] for rule in rules)
+    assert rules[0].calculate_quality_score() == max(
+        CandidateRule.quality_score(r.confidence, 1.0, 0.0, r.generalization_score) for r in rules)
+
+
+if __name__ == "__main__":
+    test_lattice_matches_brute_force()
+    test_bounded_top_k_matches_sort()
+    test_generator_lattice_returns_top_rules()
+    test_single_experience_keeps_constraints()
+    print("✅ 自测通过: EOCATR 项集格枚举按预期工作")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列联计数表自测：插入、合并、删除经验后由计数表生成的 CN1/CN2 规律与逐条统计全部经验的结果一致，
+写入经验时不更新计数表、规律生成前只计入登记为变化的经验(包括只新增发现者的经验)，旧版本的数据库(写入触发器)首次打开时删除触发器并全量统计，
+min_support 超过档位上限时直接分组统计
+"""
+
+import random
+import tempfile
+
+import experience_contingency
+from five_library_system import FiveLibrarySystem
+from testing_utils import close_system, random_library_experience
+
+ENVIRONMENTS = ["open_field", "forest"]
+OBJECTS = ["rabbit", "berry"]
+ACTIONS = ["attack", "gather", "drink"]
+CHOICES = {"environment": ENVIRONMENTS, "object": OBJECTS, "action": ACTIONS, "tools": ["none", "spear"],
+           "result": ["food_gain", "fail"], "player_id": ["ILAI1", "ILAI2", "RILAI1"]}
+
+
+def add_experiences(system, rng, count):
+    for _ in range(count):
+        system.add_experience_to_direct_library(random_library_experience(rng, CHOICES, success_rate=0.6))
+    system.batch_sync_experiences(limit=count)  # 其余未同步的经验一次合并进总库
+
+
+def brute_force(system, min_support, min_confidence):
+    """逐条统计全部高质量经验(原 _generate_cn1_rules / _generate_cn2_rules 的做法)"""
+    manager = system.db_managers["total_experiences"]
+    rows = manager.execute_query("SELECT * FROM total_experiences WHERE occurrence_count >= ? AND confidence >= ?",
+                                 (min_support, min_confidence))
+    discoverers = {}
+    for row in manager.execute_query("SELECT content_hash, player_id FROM experience_discoverers"):
+        discoverers.setdefault(row["content_hash"], set()).add(row["player_id"])
+    expected = {}
+    for fields in experience_contingency.COMBINATIONS:
+        cells = {}
+        for row in rows:
+            stats = cells.setdefault(tuple(row[f] for f in fields),
+                                     {"total": 0, "success": 0, "results": {}, "n": 0, "players": set()})
+            stats["total"] += row["occurrence_count"]
+            stats["success"] += row["success_count"]
+            stats["results"][row["result"]] = stats["results"].get(row["result"], 0) + row["occurrence_count"]
+            stats["n"] += 1
+            stats["players"] |= discoverers.get(row["content_hash"], set())
+        for values, stats in cells.items():
+            if stats["total"] < min_support:
+                continue
+            conditions = dict(zip(fields, values))
+            success_rate = stats["success"] / stats["total"]
+            if success_rate >= min_confidence or success_rate <= 1 - min_confidence:
+                expected[(str(conditions), "success")] = (success_rate, stats["total"], stats["n"],
+                                                          sorted(stats["players"]))
+            result, count = min(stats["results"].items(), key=lambda item: (-item[1], item[0]))
+            if count / stats["total"] >= min_confidence:
+                expected[(str(conditions), result)] = (count / stats["total"], stats["total"], stats["n"],
+                                                       sorted(stats["players"]))
+    return expected
+
+
+def generated(system, min_support, min_confidence):
+    result = system.generate_candidate_rules_from_experiences(min_support, min_confidence)
+    assert result["success"], result.get("error")
+    rules = {}
+    for rule in result["rule_details"]:
+        key = "success" if "success" in rule["predictions"] else rule["predictions"]["result"]
+        rules[(str(rule["conditions"]), key)] = (rule["confidence"], rule["support_count"],
+                                                 rule["supporting_experiences"], rule["discoverers"])
+    return rules
+
+
+def assert_same(system, min_support=3, min_confidence=0.6):
+    expected = brute_force(system, min_support, min_confidence)
+    actual = generated(system, min_support, min_confidence)
+    assert expected and actual.keys() == expected.keys()
+    for key, (confidence, support, n, players) in expected.items():
+        assert abs(actual[key][0] - confidence) < 1e-9 and actual[key][1:] == (support, n, players), key
+
+
+def test_counts_follow_inserts_merges_and_deletes():
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        add_experiences(system, rng, 400)  # 重复的经验在总库中合并，出现次数跨过各档位
+        assert_same(system)
+        assert_same(system, min_support=5, min_confidence=0.55)
+        assert_same(system, min_support=12, min_confidence=0.6)  # 超过档位上限：直接分组统计
+
+        manager = system.db_managers["total_experiences"]
+        manager.execute_update("DELETE FROM total_experiences WHERE action = 'drink'")
+        assert_same(system)
+        close_system(system)
+
+
+def test_counts_are_refreshed_incrementally():
+    rng = random.Random(17)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        manager = system.db_managers["total_experiences"]
+        add_experiences(system, rng, 300)
+        assert manager.execute_query("SELECT COUNT(*) AS n FROM experience_contingency")[0]["n"] == 0
+        assert_same(system)  # 首次生成：全量统计
+
+        # 少量新增、合并和删除：只计入变化的经验
+        add_experiences(system, rng, 3)
+        manager.execute_update("DELETE FROM total_experiences WHERE id = (SELECT MIN(id) FROM total_experiences)")
+        with manager.lock:
+            refreshed = experience_contingency.refresh(manager.get_connection())
+        assert 1 < refreshed <= 4  # 至多 3 条新增或合并的经验和 1 条删除的经验
+        assert_same(system)
+        with manager.lock:
+            assert experience_contingency.refresh(manager.get_connection()) == 0  # 没有变化
+        assert manager.execute_query(f"SELECT COUNT(*) AS n FROM {experience_contingency.DIRTY_TABLE}")[0]["n"] == 0
+
+        # 只新增发现者的经验也登记为变化
+        content_hash = manager.execute_query("SELECT content_hash FROM total_experiences "
+                                             "ORDER BY occurrence_count DESC LIMIT 1")[0]["content_hash"]
+        manager.execute_update("INSERT INTO experience_discoverers (content_hash, player_id, first_seen) "
+                               "VALUES (?, 'DQN9', 0)", (content_hash,))
+        assert manager.execute_query(f"SELECT COUNT(*) AS n FROM {experience_contingency.DIRTY_TABLE}")[0]["n"] == 1
+        assert_same(system)
+        assert manager.execute_query(f"SELECT COUNT(*) AS n FROM {experience_contingency.DIRTY_TABLE}")[0]["n"] == 0
+        close_system(system)
+
+
+def test_write_behind_updates_counts():
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp, write_behind=True, flush_interval=3600)
+        for _ in range(200):
+            system.add_experience_to_direct_library(random_library_experience(rng, CHOICES, success_rate=0.6))
+        system.flush_pending_writes()
+        assert_same(system)
+        close_system(system)
+
+
+def test_old_triggers_are_replaced():
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        add_experiences(system, rng, 200)
+        manager = system.db_managers["total_experiences"]
+        # 模拟旧版本的数据库：计数表由总库上的触发器维护，没有已计入经验表、登记表和状态表
+        for name in ("experience_contingency_rows", "experience_contingency_state"):
+            manager.execute_update(f"DROP TABLE {name}")
+        manager.execute_update("""
+            CREATE TRIGGER trg_contingency_insert AFTER INSERT ON total_experiences
+            BEGIN UPDATE experience_contingency SET experiences = experiences + 1; END""")
+        close_system(system)
+
+        system = FiveLibrarySystem(tmp)
+        manager = system.db_managers["total_experiences"]
+        assert not manager.execute_query("SELECT 1 FROM sqlite_master WHERE name = 'trg_contingency_insert'")
+        add_experiences(system, rng, 50)
+        assert_same(system)
+        close_system(system)
+
+
+if __name__ == "__main__":
+    test_counts_follow_inserts_merges_and_deletes()
+    test_counts_are_refreshed_incrementally()
+    test_write_behind_updates_counts()
+    test_old_triggers_are_replaced()
+    print("✅ 自测通过: CN1/CN2 列联计数表按预期工作")
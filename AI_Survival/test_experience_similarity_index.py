@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+经验相似度倒排索引自测：索引检索与全表逐条比较的结果一致(包括只有子串关系的取值和很短的取值)、
+不再局限于同一 action 的前 50 条、写入经验时不登记词项而在查询前批量登记、常见词项不会取回整个库、
+旧版本的索引首次打开时重建
+"""
+
+import random
+import tempfile
+import time
+
+import experience_similarity_index
+from five_library_system import EOCATRExperience, FiveLibrarySystem
+from testing_utils import close_system, random_library_experience
+
+ENVIRONMENTS = ["open_field", "forest", "river_bank", "cave"]
+OBJECTS = ["rabbit", "wild_rabbit", "boar", "berry", "red_berry", "fish"]
+ACTIONS = ["attack", "gather", "move", "drink"]
+TOOLS = ["spear", "none", "basket", "stone_spear"]
+CHOICES = {"environment": ENVIRONMENTS, "object": OBJECTS, "characteristics": ["near", "far", "near_water"],
+           "action": ACTIONS, "tools": TOOLS, "result": ["success", "fail", "food_gain"]}
+
+
+def brute_force(system, experience, top_k):
+    rows = system.db_managers["total_experiences"].execute_query("SELECT * FROM total_experiences")
+    scores = sorted((system._calculate_experience_similarity(experience, row) for row in rows), reverse=True)
+    return [score for score in scores if score > 0][:top_k]
+
+
+def test_index_matches_full_scan():
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        for _ in range(150):
+            system.add_experience_to_direct_library(random_library_experience(rng, CHOICES))
+        for _ in range(20):
+            query = random_library_experience(rng, CHOICES)
+            result = system._check_experience_similarity(query, top_k=5)
+            expected = brute_force(system, query, 5)
+            assert result["max_similarity"] == expected[0]
+            scores = [r["similarity"] for r in result["similar_records"]]
+            assert scores == [s for s in expected if s > 0.7]
+        close_system(system)
+
+
+def test_search_is_not_limited_to_first_rows_of_action():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        for i in range(60):
+            system.add_experience_to_direct_library(EOCATRExperience(
+                environment=f"plain_{i}", object="stone", characteristics="far", action="gather",
+                tools="none", result="nothing", player_id="P1", timestamp=time.time(), success=False))
+        target = EOCATRExperience(
+            environment="forest", object="berry", characteristics="near", action="gather",
+            tools="basket", result="food_gain", player_id="P1", timestamp=time.time(), success=True)
+        system.add_experience_to_direct_library(target)  # 同一 action 的第 61 条
+        query = EOCATRExperience(environment="forest", object="red_berry", characteristics="near",
+                                 action="gather", tools="basket", result="food_gain",
+                                 player_id="P2", timestamp=time.time(), success=True)
+        result = system._check_experience_similarity(query, top_k=1)
+        assert result["most_similar_record"]["object"] == "berry"
+        assert abs(result["max_similarity"] - 0.94) < 1e-9  # 只有 object 是部分匹配
+        close_system(system)
+
+
+def test_substring_and_short_values_match_full_scan():
+    rng = random.Random(11)
+    choices = {"environment": ["forest", "rainforest", "for", "st"], "object": ["spear", "pear", "ear", "e", "x"],
+               "characteristics": ["near", "ne", ""], "action": ACTIONS, "tools": ["none", "on", "stone"],
+               "result": ["ok", "okay", "food_gain"]}
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        for _ in range(120):
+            system.add_experience_to_direct_library(random_library_experience(rng, choices))
+        for _ in range(40):
+            query = random_library_experience(rng, choices)
+            for top_k in (1, 5):
+                result = system._check_experience_similarity(query, top_k=top_k)
+                expected = brute_force(system, query, top_k)
+                assert result["max_similarity"] == expected[0]
+                assert [r["similarity"] for r in result["similar_records"]] == [s for s in expected if s > 0.7]
+        close_system(system)
+
+
+def test_index_is_built_lazily_and_reads_few_rows():
+    rng = random.Random(13)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        manager = system.db_managers["total_experiences"]
+        for _ in range(400):
+            system.add_experience_to_direct_library(random_library_experience(rng, CHOICES))
+        assert manager.execute_query("SELECT COUNT(*) AS n FROM experience_tokens")[0]["n"] == 0
+
+        # 与库中某条经验只差 tools：常见词项(如 action=gather)不会把整个库取回
+        existing = dict(manager.execute_query("SELECT * FROM total_experiences LIMIT 1")[0])
+        query = EOCATRExperience(**{field: existing[field] for field in experience_similarity_index.FIELD_WEIGHTS
+                                    if field != "tools"}, tools="catapult", player_id="P1",
+                                 timestamp=time.time(), success=True)
+        read = []
+        original_query = manager.execute_query
+
+        def counting_query(sql, params=()):
+            rows = original_query(sql, params)
+            if "FROM total_experiences" in sql:
+                read.extend(rows)
+            return rows
+
+        manager.execute_query = counting_query
+        result = system._check_experience_similarity(query, top_k=1)
+        manager.execute_query = original_query
+        total = original_query("SELECT COUNT(*) AS n FROM total_experiences")[0]["n"]
+        assert abs(result["max_similarity"] - 0.9) < 1e-9
+        assert original_query("SELECT COUNT(DISTINCT content_hash) AS n FROM experience_tokens")[0]["n"] == total
+        assert len(read) < total / 4
+        close_system(system)
+
+
+def test_old_index_is_rebuilt():
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        for _ in range(30):
+            system.add_experience_to_direct_library(random_library_experience(rng, CHOICES))
+        manager = system.db_managers["total_experiences"]
+        # 模拟旧版本的数据库：写入时登记的单词词项，没有文档数和登记位置
+        manager.execute_update("DROP TABLE experience_tokens_state")
+        manager.execute_update("DROP TABLE experience_token_counts")
+        manager.execute_update("DROP TABLE experience_tokens")
+        manager.execute_update("CREATE TABLE experience_tokens (token TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                               "field TEXT NOT NULL, PRIMARY KEY (token, content_hash)) WITHOUT ROWID")
+        manager.execute_update("INSERT INTO experience_tokens VALUES ('object~berry', 'stale', 'object')")
+        close_system(system)
+
+        system = FiveLibrarySystem(tmp)
+        manager = system.db_managers["total_experiences"]
+        query = random_library_experience(rng, CHOICES)
+        assert system._check_experience_similarity(query)["max_similarity"] == brute_force(system, query, 1)[0]
+        indexed = manager.execute_query("SELECT COUNT(DISTINCT content_hash) AS n FROM experience_tokens")[0]["n"]
+        assert indexed == manager.execute_query("SELECT COUNT(*) AS n FROM total_experiences")[0]["n"]
+        close_system(system)
+
+
+def test_write_behind_flush_is_indexed_on_query():
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp, write_behind=True, flush_interval=3600)
+        experience = random_library_experience(rng, CHOICES)
+        system.add_experience_to_direct_library(experience)
+        system.flush_pending_writes()
+        result = system._check_experience_similarity(experience)
+        assert [r["similarity"] for r in result["similar_records"]] == [1.0]
+        close_system(system)
+
+
+if __name__ == "__main__":
+    test_index_matches_full_scan()
+    test_search_is_not_limited_to_first_rows_of_action()
+    test_substring_and_short_values_match_full_scan()
+    test_index_is_built_lazily_and_reads_few_rows()
+    test_old_index_is_rebuilt()
+    test_write_behind_flush_is_indexed_on_query()
+    print("✅ 自测通过: 经验相似度倒排索引按预期工作")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五库列式导出自测：多次运行导出后各表行数、取值与 SQLite 一致，按运行过滤和分组聚合正确，
+重新导出覆盖原分区，列中混有不符合声明类型的值时按字符串导出
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import five_library_export
+import sqlite_pool
+from five_library_export import FiveLibraryDataset, export_run, export_runs, find_runs
+from five_library_system import Decision, EOCATRExperience, FiveLibrarySystem
+
+
+def build_run(path, seed, count):
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    system = FiveLibrarySystem(path)
+    for _ in range(count):
+        system.add_experience_to_direct_library(EOCATRExperience(
+            environment=rng.choice(["open_field", "forest"]), object=rng.choice(["rabbit", "berry"]),
+            characteristics="near", action=rng.choice(["attack", "gather"]), tools="none",
+            result=rng.choice(["food_gain", "fail"]), player_id="ILAI1", timestamp=time.time(),
+            success=rng.random() < 0.6))
+    system.batch_sync_experiences(limit=count)
+    system.add_rules_to_direct_library([
+        {"rule_id": f"R{seed}_{i}", "rule_type": "CN1", "conditions": {"object": obj},
+         "predictions": {"success": True}, "confidence": 0.5 + i / 10, "support_count": 2,
+         "contradiction_count": 0, "created_time": time.time(), "creator_id": "ILAI1"}
+        for i, obj in enumerate(["rabbit", "berry", "fish"])])
+    system.add_decision_to_library(Decision(decision_id=f"D{seed}", context={"object": "berry", "seed": seed},
+                                            action="gather", confidence=0.7, source="wbm_generated"))
+    system.close()
+    for db_path in system.db_paths.values():
+        sqlite_pool.close_connections(str(db_path))
+
+
+def sqlite_count(run_dir, table, sql="COUNT(*)"):
+    conn = sqlite3.connect(os.path.join(run_dir, five_library_export.FIVE_LIBRARY_TABLES[table]))
+    value = conn.execute(f"SELECT {sql} FROM {table}").fetchone()[0]
+    conn.close()
+    return value
+
+
+def sqlite_rows(run_dir, table, columns):
+    conn = sqlite3.connect(os.path.join(run_dir, five_library_export.FIVE_LIBRARY_TABLES[table]))
+    rows = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {columns[0]}").fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+
+def test_export_and_query_runs():
+    if five_library_export.pa is None:
+        return  # 没有 pyarrow 时跳过
+    with tempfile.TemporaryDirectory() as tmp:
+        root, output = os.path.join(tmp, "experiments"), os.path.join(tmp, "parquet")
+        build_run(os.path.join(root, "seed 1", "five_libraries"), 1, 60)
+        build_run(os.path.join(root, "seed2"), 2, 90)
+        runs = find_runs(root)
+        assert list(runs) == ["seed 1", "seed2"]  # 结尾的 five_libraries 省略
+
+        counts = export_runs(runs, output)
+        data = FiveLibraryDataset(output)
+        assert data.tables() == list(five_library_export.FIVE_LIBRARY_TABLES)
+        assert data.runs() == ["seed 1", "seed2"]
+        for run_id, run_dir in runs.items():
+            assert counts[run_id] == {table: sqlite_count(run_dir, table) for table in counts[run_id]}
+            assert counts[run_id]["direct_rules"] == 3 and counts[run_id]["decisions"] == 1
+            columns = ["content_hash", "occurrence_count", "success_count", "confidence"]
+            exported = data.scan("total_experiences", columns, runs=[run_id]).sort_by("content_hash")
+            assert list(zip(*exported.to_pydict().values())) == sqlite_rows(run_dir, "total_experiences", columns)
+
+        field = data.field
+        rules = data.to_pandas("direct_rules", ["run_id", "rule_id", "confidence"], filter=field("confidence") > 0.55)
+        assert sorted(rules["rule_id"]) == ["R1_1", "R1_2", "R2_1", "R2_2"]
+        assert data.count("direct_experiences", filter=field("action") == "attack", runs=["seed2"]) == \
+            sqlite_rows(runs["seed2"], "direct_experiences", ["action"]).count(("attack",))
+
+        totals = data.aggregate("total_experiences", ["run_id"], [("occurrence_count", "sum")]).to_pydict()
+        assert dict(zip(totals["run_id"], totals["occurrence_count_sum"])) == {
+            run_id: sqlite_count(run_dir, "total_experiences", "SUM(occurrence_count)") for run_id, run_dir in runs.items()}
+
+        build_run(runs["seed2"], 3, 30)  # 同一运行继续写入后重新导出：覆盖原分区
+        export_run(runs["seed2"], output, "seed2")
+        data = FiveLibraryDataset(output)
+        before = counts["seed2"]["decisions"]
+        assert data.count("decisions", runs=["seed2"]) == sqlite_count(runs["seed2"], "decisions") == before + 1
+        assert data.count("decisions") == before + 2
+
+
+def test_mismatched_values_are_exported_as_strings():
+    if five_library_export.pa is None:
+        return  # 没有 pyarrow 时跳过
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "decisions.db"))
+        conn.execute("CREATE TABLE decisions (decision_id TEXT, confidence REAL, success_count INTEGER, extra)")
+        conn.executemany("INSERT INTO decisions VALUES (?, ?, ?, ?)",
+                         [("D1", 0.5, 1, 2), ("D2", 0.75, "n/a", 3.5), ("D3", None, 2, None)])
+        conn.commit()
+        conn.close()
+
+        assert export_run(tmp, os.path.join(tmp, "out"), "old") == {"decisions": 3}
+        table = FiveLibraryDataset(os.path.join(tmp, "out")).scan("decisions").sort_by("decision_id")
+        assert str(table.schema.field("confidence").type) == "double"
+        assert str(table.schema.field("extra").type) == "double"  # 未声明类型：按实际值推断
+        assert table.column("success_count").to_pylist() == ["1", "n/a", "2"]
+
+
+if __name__ == "__main__":
+    test_export_and_query_runs()
+    test_mismatched_values_are_exported_as_strings()
+    print("✅ 自测通过: 五库列式导出与查询按预期工作")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五库内存存储自测：插入不写 .db 文件、checkpoint 用 backup API 写回完整内容、
+同一路径的实例共用内存数据库、关闭时写回、多个实例和写后缓冲在不同线程写同一个内存数据库时
+事务不交错(不丢行)、非法的 storage 参数
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+import sqlite_pool
+from five_library_system import FiveLibrarySystem
+from testing_utils import close_system, make_experience
+
+
+def count_rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_checkpoint_writes_database_files():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp, storage="memory")
+        for obj in ("berry", "mushroom", "fish"):
+            assert system.add_experience_to_direct_library(make_experience(object=obj))["action"] == "added"
+        path = str(system.db_paths["direct_experiences"])
+        assert sqlite_pool.is_memory(path) and not os.path.exists(path)  # 尚未写磁盘
+
+        assert system.checkpoint() == 5
+        assert count_rows(path, "direct_experiences") == 3
+        assert count_rows(str(system.db_paths["total_experiences"]), "total_experiences") == 3
+
+        second = FiveLibrarySystem(tmp, storage="memory")  # 与第一个实例共用内存数据库
+        assert second.add_experience_to_direct_library(make_experience(object="berry"))["action"] != "added"
+        second.add_experience_to_direct_library(make_experience(object="apple"))
+        assert count_rows(path, "direct_experiences") == 3  # 写回前文件内容不变
+        close_system(second)
+        assert count_rows(path, "direct_experiences") == 4  # 关闭时写回
+        close_system(system)
+
+
+def test_memory_database_reloads_from_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        system.add_experience_to_direct_library(make_experience(object="berry"))
+        close_system(system)
+
+        system = FiveLibrarySystem(tmp, storage="memory")  # 已有的 .db 文件载入内存
+        rows = system.get_recent_experiences(limit=5)
+        assert [row["object"] for row in rows] == ["berry"]
+        close_system(system)
+
+
+def test_concurrent_writers_share_memory_connection():
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = FiveLibrarySystem(tmp, storage="memory")
+        buffered = FiveLibrarySystem(tmp, storage="memory", write_behind=True, flush_interval=3600)
+        actions = []
+        stop = threading.Event()
+
+        def add(system, prefix):
+            for i in range(200):
+                actions.append(system.add_experience_to_direct_library(make_experience(object=f"{prefix}{i}"))["action"])
+
+        def flush():
+            while not stop.is_set():
+                buffered.flush_pending_writes()
+
+        flusher = threading.Thread(target=flush)
+        writers = [threading.Thread(target=add, args=(direct, "a")), threading.Thread(target=add, args=(buffered, "b"))]
+        flusher.start()
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        stop.set()
+        flusher.join()
+        buffered.flush_pending_writes()
+
+        assert actions.count("added") == 400 and buffered.write_buffer.stats["failed"] == 0
+        for library in ("direct_experiences", "total_experiences"):
+            rows = direct.db_managers[library].execute_query(f"SELECT COUNT(*) AS n FROM {library}")
+            assert rows[0]["n"] == 400
+        close_system(buffered)
+        close_system(direct)
+
+
+def test_invalid_storage():
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            FiveLibrarySystem(tmp, storage="tape")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("storage='tape' 应当报错")
+
+
+if __name__ == "__main__":
+    test_checkpoint_writes_database_files()
+    test_memory_database_reloads_from_file()
+    test_concurrent_writers_share_memory_connection()
+    test_invalid_storage()
+    print("✅ 自测通过: 五库内存存储按预期工作")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五库经验 UPSERT 自测：新增/更新计数、发现者顺序、总库创建/合并、旧 JSON 发现者迁移、
+重新同步的判断(来自 UPSERT 返回行，不查询总库)
+"""
+
+import json
+import tempfile
+
+from five_library_system import FiveLibrarySystem
+from testing_utils import close_system, make_experience
+
+
+def test_upsert_counts_and_discoverers():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        results = [system.add_experience_to_direct_library(make_experience(p)) for p in ("P2", "P1", "P2")]
+        assert [r["action"] for r in results] == ["added", "updated", "updated"]
+        assert [r["occurrence_count"] for r in results] == [1, 2, 3]
+        assert len({r["experience_id"] for r in results}) == 1
+
+        row = system.db_managers["direct_experiences"].execute_query(
+            "SELECT occurrence_count, success_count, discoverers FROM direct_experiences")[0]
+        assert (row["occurrence_count"], row["success_count"]) == (3, 3)
+        assert json.loads(row["discoverers"]) == ["P2", "P1"]  # 按首次发现顺序，不重复
+
+        content_hash = results[0]["content_hash"]
+        synced = system.sync_experience_to_total_library(content_hash)
+        assert synced["action"] == "merged" and synced["discoverer_count"] == 2
+        total = system.db_managers["total_experiences"].execute_query(
+            "SELECT occurrence_count, discoverers FROM total_experiences")[0]
+        assert total["occurrence_count"] == 4 and sorted(json.loads(total["discoverers"])) == ["P1", "P2"]
+        close_system(system)
+
+
+def test_sync_creates_then_merges():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        content_hash = system.add_experience_to_direct_library(make_experience("P1"))["content_hash"]
+        total = system.db_managers["total_experiences"].execute_query(
+            "SELECT occurrence_count, confidence FROM total_experiences WHERE content_hash = ?", (content_hash,))
+        assert [(r["occurrence_count"], r["confidence"]) for r in total] == [(1, 0.6)]  # 新经验立即同步
+
+        system.db_managers["total_experiences"].execute_update("DELETE FROM total_experiences")
+        assert system.sync_experience_to_total_library(content_hash)["action"] == "created"
+        merged = system.sync_experience_to_total_library(content_hash)
+        assert (merged["action"], merged["total_occurrence_count"]) == ("merged", 2)
+        close_system(system)
+
+
+def test_resync_decision_comes_from_direct_row():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        total_manager = system.db_managers["total_experiences"]
+        queries = []
+        original_query = total_manager.execute_query
+        total_manager.execute_query = lambda sql, params=(): queries.append(sql) or original_query(sql, params)
+
+        content_hash = system.add_experience_to_direct_library(make_experience("P1"))["content_hash"]
+        for _ in range(4):
+            system.add_experience_to_direct_library(make_experience("P1"))
+        assert not system._should_resync_updated_experience(content_hash)  # 自同步以来新增 4 次
+        assert not system.sync_tracker["pending_sync_hashes"]
+
+        # 第 5 次新增：加入待同步队列，批量同步后记录同步位置
+        system.add_experience_to_direct_library(make_experience("P2"))
+        row = system.db_managers["direct_experiences"].execute_query(
+            "SELECT occurrence_count, synced_occurrence_count FROM direct_experiences")[0]
+        assert (row["occurrence_count"], row["synced_occurrence_count"]) == (6, 6)
+        assert not system._should_resync_updated_experience(content_hash)
+        assert original_query("SELECT occurrence_count FROM total_experiences")[0]["occurrence_count"] == 7
+        assert not any("FROM total_experiences" in sql for sql in queries)
+        close_system(system)
+
+
+def test_existing_json_discoverers_are_migrated():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        content_hash = system.add_experience_to_direct_library(make_experience("P1"))["content_hash"]
+        manager = system.db_managers["direct_experiences"]
+        # 模拟旧版本的数据库：只有 JSON 列，没有发现者表
+        manager.execute_update("DROP TABLE experience_discoverers")
+        manager.execute_update("UPDATE direct_experiences SET discoverers = ?", (json.dumps(["P1", "P7"]),))
+        close_system(system)
+
+        system = FiveLibrarySystem(tmp)
+        result = system.add_experience_to_direct_library(make_experience("P3"))
+        assert result["content_hash"] == content_hash and result["action"] == "updated"
+        row = system.db_managers["direct_experiences"].execute_query(
+            "SELECT discoverers FROM direct_experiences")[0]
+        assert sorted(json.loads(row["discoverers"])) == ["P1", "P3", "P7"]
+        close_system(system)
+
+
+if __name__ == "__main__":
+    test_upsert_counts_and_discoverers()
+    test_sync_creates_then_merges()
+    test_resync_decision_comes_from_direct_row()
+    test_existing_json_discoverers_are_migrated()
+    print("✅ 自测通过: 五库经验 UPSERT 按预期工作")
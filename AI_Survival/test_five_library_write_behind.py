@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+五库写后缓冲自测：合并后的计数与逐条写入一致、发现者合并、规律内存去重、决策使用次数合并
+"""
+
+import json
+import os
+import tempfile
+
+from five_library_system import Decision, FiveLibrarySystem
+from testing_utils import close_system, make_experience
+
+
+ADDS = [("P1", True, "rabbit"), ("P2", True, "rabbit"), ("P1", True, "rabbit"),
+        ("P3", False, "boar"), ("P2", True, "rabbit")]
+
+
+def library_rows(system, table):
+    rows = system.db_managers[table].execute_query(
+        f"SELECT content_hash, occurrence_count, success_count, discoverers FROM {table} ORDER BY content_hash")
+    return [(r["content_hash"], r["occurrence_count"], r["success_count"], sorted(json.loads(r["discoverers"])))
+            for r in rows]
+
+
+def test_buffered_experiences_match_direct_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        direct = FiveLibrarySystem(os.path.join(tmp, "direct"))
+        buffered = FiveLibrarySystem(os.path.join(tmp, "buffered"), write_behind=True, flush_interval=3600)
+        actions = []
+        for player_id, success, obj in ADDS:
+            direct.add_experience_to_direct_library(make_experience(player_id, success, object=obj))
+            actions.append(buffered.add_experience_to_direct_library(make_experience(player_id, success, object=obj))["action"])
+
+        assert actions == ["added", "updated", "updated", "added", "updated"]
+        assert library_rows(buffered, "direct_experiences") == []  # 尚未刷新
+        assert buffered.flush_pending_writes() == 2
+        assert library_rows(buffered, "direct_experiences") == library_rows(direct, "direct_experiences")
+        total = library_rows(buffered, "total_experiences")
+        assert sorted(row[1:] for row in total) == [(1, 0, ["P3"]), (4, 4, ["P1", "P2"])]
+
+        # 第二次刷新在已有行上累加
+        buffered.add_experience_to_direct_library(make_experience("P4", True, object="rabbit"))
+        buffered.flush_pending_writes()
+        counts = {r[1]: r for r in library_rows(buffered, "direct_experiences")}
+        assert counts[5][2] == 5 and counts[5][3] == ["P1", "P2", "P4"]
+        close_system(direct)
+        close_system(buffered)
+
+
+def test_buffered_rules_and_decisions():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp, write_behind=True, flush_interval=3600)
+        rule = {"rule_id": "R1", "rule_type": "E-A-R", "conditions": {"action": "attack"},
+                "predictions": {"result": "success"}, "confidence": 0.8}
+        assert system.add_rules_to_direct_library([rule])["added_count"] == 1
+        assert system.add_rules_to_direct_library([dict(rule, rule_id="R2")])["duplicate_count"] == 1
+
+        decision = Decision(decision_id="D1", context={"hp": 50}, action="flee", confidence=0.7, source="test")
+        results = [system.add_decision_to_library(decision) for _ in range(3)]
+        assert [r["action"] for r in results] == ["added", "updated", "updated"]
+        system.flush_pending_writes()
+
+        rules = system.db_managers["direct_rules"].execute_query("SELECT rule_id FROM direct_rules")
+        assert [r["rule_id"] for r in rules] == ["R1"]
+        uses = system.db_managers["decisions"].execute_query("SELECT total_uses FROM decisions")
+        assert [r["total_uses"] for r in uses] == [2]  # 新增 total_uses=0，之后两次使用各 +1
+        system.add_decision_to_library(decision)
+        system.flush_pending_writes()
+        uses = system.db_managers["decisions"].execute_query("SELECT total_uses FROM decisions")
+        assert [r["total_uses"] for r in uses] == [3]
+        close_system(system)
+
+
+if __name__ == "__main__":
+    test_buffered_experiences_match_direct_writes()
+    test_buffered_rules_and_decisions()
+    print("✅ 自测通过: 五库写后缓冲按预期工作")
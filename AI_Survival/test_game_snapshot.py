@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游戏快照自测：锁与 lambda defaultdict 可序列化、SQLite 数据库随快照保存和写回、
+随机数状态恢复、空间索引在反序列化后保持顺序
+"""
+
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+
+from game_snapshot import load_snapshot, save_snapshot
+from spatial_index import SpatialIndex, SpatiallyIndexed
+
+
+class DummyStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.counts = defaultdict(lambda: {"hits": 0})
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE items (name TEXT)")
+        conn.execute("INSERT INTO items VALUES ('apple')")
+        conn.commit()
+        conn.close()
+
+
+class DummyGame:
+    def __init__(self, db_path):
+        self.current_day = 7
+        self.store = DummyStore(db_path)
+        self.store.counts["P1"]["hits"] += 3
+
+
+class Entity(SpatiallyIndexed):
+    def __init__(self, x, y):
+        self.x, self.y, self.alive = x, y, True
+
+
+def test_snapshot_round_trip_restores_databases_and_random_state():
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            os.makedirs("data")
+            game = DummyGame(os.path.join("data", "store.db"))
+            random.seed(5)
+            manifest = save_snapshot(game, "snap.bin", extra={"tag": "a"})
+            expected = random.random()
+            assert manifest["day"] == 7 and list(manifest["databases"]) == [game.store.db_path]
+
+            conn = sqlite3.connect(game.store.db_path)
+            conn.execute("DELETE FROM items")
+            conn.commit()
+            conn.close()
+
+            loaded = load_snapshot("snap.bin")
+            restored = loaded["game"]
+            assert loaded["extra"] == {"tag": "a"}
+            assert random.random() == expected
+            assert restored.store.counts["P1"]["hits"] == 3
+            assert restored.store.counts["P2"] == {"hits": 0}
+            with restored.store.lock:
+                pass
+            conn = sqlite3.connect(restored.store.db_path)
+            assert conn.execute("SELECT name FROM items").fetchall() == [("apple",)]
+            conn.close()
+        finally:
+            os.chdir(cwd)
+
+
+def test_spatial_index_survives_pickle():
+    index = SpatialIndex()
+    entities = [Entity(1, 1), Entity(2, 2), Entity(1, 1)]
+    for entity in entities:
+        index.attach(entity)
+    entities[0].alive = False  # 暂不活跃的实体也要保留加入顺序
+
+    restored_entities, restored = pickle.loads(pickle.dumps((entities, index)))
+    assert restored.at(1, 1) == [restored_entities[2]]
+    restored_entities[0].alive = True
+    restored_entities[1].y = 1
+    restored_entities[1].x = 1
+    assert restored.at(1, 1) == restored_entities
+    assert len(restored) == 3
+
+
+if __name__ == "__main__":
+    test_snapshot_round_trip_restores_databases_and_random_state()
+    test_spatial_index_survives_pickle()
+    print("✅ 自测通过: 游戏快照按预期工作")
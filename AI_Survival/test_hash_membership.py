@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+content_hash 成员集合自测：布隆过滤器不漏判、误判由索引确认、按水位线增量追赶、位图文件保存与加载、
+五库实例之间共享
+"""
+
+import hashlib
+import os
+import tempfile
+
+import hash_membership
+import sqlite_pool
+from five_library_system import Decision, FiveLibrarySystem
+from hash_membership import HashMembership, ScalableBloomFilter
+
+
+def md5(i):
+    return hashlib.md5(str(i).encode()).hexdigest()
+
+
+def make_table(path, hashes):
+    conn = sqlite_pool.get_connection(path)
+    with conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY AUTOINCREMENT, content_hash TEXT UNIQUE)")
+        conn.executemany("INSERT INTO items (content_hash) VALUES (?)", [(h,) for h in hashes])
+
+
+def test_scalable_bloom_filter():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+    keys = [md5(i) for i in range(2000)]
+    for key in keys:
+        bloom.add(key)
+    assert len(bloom.slices) > 1  # 超过容量后自动增加切片
+    assert all(key in bloom for key in keys)
+    false_positives = sum(md5(f"x{i}") in bloom for i in range(5000))
+    assert false_positives < 5000 * 0.02
+
+    restored, watermark = ScalableBloomFilter.from_bytes(bloom.to_bytes(watermark=42))
+    assert watermark == 42 and all(key in restored for key in keys) and len(restored) == len(bloom)
+
+
+def test_membership_catches_up_and_persists():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.db")
+        make_table(path, [md5(i) for i in range(50)])
+        membership = HashMembership(path, "items")
+        assert membership.watermark == 50
+        assert md5(3) in membership and md5("missing") not in membership
+
+        make_table(path, [md5(i) for i in range(50, 60)])  # 其他实例写入
+        assert membership.refresh() == 10 and md5(55) in membership
+
+        # 过滤器说“可能存在”但表中没有的内容由索引否定
+        membership.add(md5("queued"))
+        assert membership.might_contain(md5("queued")) and md5("queued") not in membership
+
+        membership.save()
+        make_table(path, [md5(60)])
+        reloaded = HashMembership(path, "items")
+        assert reloaded.stats["caught_up"] == 1  # 只读入保存之后的新行
+        assert all(md5(i) in reloaded for i in range(61))
+        sqlite_pool.close_connections(path)
+
+
+def test_replaced_database_rebuilds_filter():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "items.db")
+        make_table(path, [md5(i) for i in range(20)])
+        HashMembership(path, "items").save()
+        sqlite_pool.close_connections(path)
+        os.remove(path)
+        make_table(path, ["a" * 32])  # 更小的表：水位线超过 MAX(rowid)
+        membership = HashMembership(path, "items")
+        assert membership.watermark == 1 and len(membership) == 1
+        sqlite_pool.close_connections(path)
+
+
+def test_five_library_instances_share_membership():
+    with tempfile.TemporaryDirectory() as tmp:
+        first, second = FiveLibrarySystem(tmp), FiveLibrarySystem(tmp)
+        assert first.cache["decision_hashes"] is second.cache["decision_hashes"]
+        assert first.sync_tracker["synced_experience_hashes"] is first.cache["experience_hashes"]
+
+        decision = Decision(decision_id="D1", context={"hp": 10}, action="eat", confidence=0.5, source="test")
+        assert first.add_decision_to_library(decision)["action"] == "added"
+        assert decision.generate_hash() in second.cache["decision_hashes"]  # 无需重新加载
+        for system in (first, second):
+            system.close()
+        hash_membership.save_all()
+        assert os.path.exists(os.path.join(tmp, "decisions.db.decisions.bloom"))
+        for path in first.db_paths.values():
+            hash_membership.forget(str(path))
+            sqlite_pool.close_connections(str(path))
+
+
+if __name__ == "__main__":
+    test_scalable_bloom_filter()
+    test_membership_catches_up_and_persists()
+    test_replaced_database_rebuilds_filter()
+    test_five_library_instances_share_membership()
+    print("✅ 自测通过: content_hash 成员集合按预期工作")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享知识库自测：写入在唯一的写线程上执行、查询在调用方线程执行、玩家命名空间、快照后重新启动写线程
+"""
+
+import io
+import pickle
+import tempfile
+import threading
+
+from game_snapshot import _SnapshotPickler
+from knowledge_store import KnowledgeStore
+from testing_utils import make_experience
+
+
+def test_writes_run_on_single_writer_thread():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KnowledgeStore(tmp)
+        threads = set()
+        workers = [threading.Thread(target=lambda: threads.add(store.write(threading.current_thread).name))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert threads == {"knowledge-store-writer"}
+        assert store.read(threading.current_thread) is threading.current_thread()
+
+        view = store.view("ILAI1")
+        assert store.view("ILAI1") is view
+        assert view.add_experience_to_direct_library(make_experience("ILAI1", object="berry"))["action"] == "added"
+        assert view.get_recent_experiences(limit=5)[0]["object"] == "berry"  # 查询接口与 FiveLibrarySystem 相同
+        store.close()
+        assert not store._writer.is_alive()
+
+
+def test_player_namespaces():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KnowledgeStore(tmp)
+        alice, bob = store.view("ILAI1"), store.view("ILAI2")
+        alice.add_experience_to_direct_library(make_experience("ILAI1", object="berry"))
+        bob.add_experience_to_direct_library(make_experience("ILAI2", object="mushroom"))
+        bob.add_experience_to_direct_library(make_experience("ILAI2", object="berry"))  # 同一经验的第二个发现者
+        anonymous = make_experience("", object="fish")
+        alice.add_experience_to_direct_library(anonymous)
+        assert anonymous.player_id == "ILAI1"
+
+        assert sorted(e["object"] for e in alice.get_own_experiences(10)) == ["berry", "fish"]
+        assert sorted(e["object"] for e in bob.get_own_experiences(10)) == ["berry", "mushroom"]
+        assert len(alice.get_recent_experiences(10)) == 3
+
+        alice.add_rule(rule_type="E-A-R", conditions={"action": "gather"}, predictions={"result": "food"},
+                       confidence=0.8, creator_id="ILAI1")
+        assert [r["creator_id"] for r in alice.get_own_rules(5)] == ["ILAI1"]
+        assert bob.get_own_rules(5) == []
+        store.close()
+
+
+def test_snapshot_restarts_writer():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = KnowledgeStore(tmp)
+        view = store.view("RILAI1")
+        buffer = io.BytesIO()
+        _SnapshotPickler(buffer).dump(view)  # Game 快照使用的序列化方式
+        restored_view = pickle.loads(buffer.getvalue())
+        restored = restored_view._store
+        assert restored is not store and restored._writer.is_alive()
+        assert restored.write(threading.current_thread).name == "knowledge-store-writer"
+        assert restored.view("RILAI1") is restored_view
+        restored.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    test_writes_run_on_single_writer_thread()
+    test_player_namespaces()
+    test_snapshot_restarts_writer()
+    print("✅ 自测通过: 共享知识库按预期工作")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NumPy 网络后端自测：读取已有 .keras 模型、MSE 训练、PPO 裁剪目标更新、.npz 保存/加载
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+import nn_backend
+from nn_backend import NumpyMLP
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_models")
+
+
+def test_load_existing_keras_model():
+    pytest.importorskip("h5py")
+    path = nn_backend.find_model(MODEL_DIR, "dqn_model_DQN1")
+    if path is None:
+        pytest.skip("saved_models 中没有 dqn_model_DQN1 模型")
+    model = nn_backend.load_model(path)
+    assert model.layer_sizes == [78, 128, 256, 128, 7]
+    assert model.dropout[:2] == [0.2, 0.2]
+
+    state = np.random.default_rng(0).random((3, 78)).astype(np.float32)
+    expected = state
+    for kernel, bias, activation in model.dense_layers():
+        expected = expected @ kernel + bias
+        if activation == "relu":
+            expected = np.maximum(expected, 0)
+    assert np.allclose(model.predict(state, verbose=0), expected, atol=1e-5)
+
+
+def test_fit_reduces_mse():
+    rng = np.random.default_rng(1)
+    x = rng.random((64, 4)).astype(np.float32)
+    y = x @ rng.random((4, 2)).astype(np.float32)
+    model = NumpyMLP([4, 16, 2], ["relu", "linear"], learning_rate=0.01, seed=1)
+    before = np.mean((model.predict(x) - y) ** 2)
+    model.fit(x, y, epochs=50, verbose=0)
+    assert np.mean((model.predict(x) - y) ** 2) < before * 0.5
+
+
+def test_ppo_update_follows_advantage():
+    model = NumpyMLP([3, 8, 2], ["relu", "softmax"], learning_rate=0.01, seed=2)
+    states = np.ones((8, 3), dtype=np.float32)
+    actions = np.zeros(8, dtype=np.int64)
+    before = model.predict(states)[0, 0]
+    for _ in range(5):
+        old_log_probs = np.log(model.predict(states)[:, 0])
+        model.ppo_update(states, actions, old_log_probs, np.ones(8), clip_ratio=0.2)
+    assert model.predict(states)[0, 0] > before
+
+
+def test_save_and_load_roundtrip():
+    model = NumpyMLP([5, 6, 3], ["relu", "softmax"], seed=3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = nn_backend.model_path(tmp, "ppo_policy_test")
+        model.save(path)
+        assert nn_backend.find_model(tmp, "ppo_policy_test") == path
+        loaded = nn_backend.load_model(path)
+    x = np.random.default_rng(4).random((2, 5))
+    assert np.allclose(loaded.predict(x), model.predict(x))
+    assert loaded.activations == ["relu", "softmax"]
+
+
+if __name__ == "__main__":
+    test_load_existing_keras_model()
+    test_fit_reduces_mse()
+    test_ppo_update_follows_advantage()
+    test_save_and_load_roundtrip()
+    print("✅ 自测通过: NumPy 网络后端按预期工作")
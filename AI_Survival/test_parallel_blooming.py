@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMP 并行怒放自测：经工作进程处理后合并回来的规律与在主进程中依次处理一致，
+主进程一侧的规律修改作为增量发送给副本，进程池序列化(Game 快照)后重新全量同步
+"""
+
+import copy
+import random
+
+import parallel_blooming
+from blooming_and_pruning_model import BloomingAndPruningModel
+from enhanced_bmp_integration import integrate_constraint_awareness_to_bmp
+from parallel_blooming import ParallelBloomingPool, diff_rules, rule_versions, run_blooming_job
+from testing_utils import random_eocatr_tuple
+
+
+def seeded_model(rng):
+    """原始怒放阶段生成一批候选规律，后续经验会验证、晋升它们"""
+    bpm = BloomingAndPruningModel()
+    bpm.blooming_phase([random_eocatr_tuple(rng) for _ in range(12)])
+    return bpm
+
+
+def rule_state(bpm):
+    return {pool: {rule_id: rule.confidence for rule_id, rule in getattr(bpm, pool).items()}
+            for pool in parallel_blooming.RULE_POOLS}
+
+
+def test_pool_matches_sequential_processing():
+    rng = random.Random(11)
+    players = {f"ILAI{i}": seeded_model(rng) for i in range(3)}
+    batches = {key: [(random_eocatr_tuple(rng), [random_eocatr_tuple(rng) for _ in range(3)]) for _ in range(4)]
+               for key in players}
+
+    expected = {}
+    for key, bpm in players.items():
+        reference = copy.deepcopy(bpm)
+        integrate_constraint_awareness_to_bmp(reference)
+        for experience, historical in batches[key]:
+            reference.process_experience(experience, historical)
+        expected[key] = rule_state(reference)
+
+    pool = ParallelBloomingPool(2)
+    try:
+        for key, bpm in players.items():
+            for experience, historical in batches[key]:
+                pool.enqueue(key, experience, historical)
+            pool.submit_pending(key, bpm)
+        changed = pool.merge_all()
+    finally:
+        pool.close()
+    assert changed > 0 and pool.stats["failed"] == 0
+    assert {key: rule_state(bpm) for key, bpm in players.items()} == expected
+    assert pool.stats["submitted"] == 3 and pool.stats["experiences"] == 12
+
+
+def test_main_side_changes_are_sent_as_delta():
+    rng = random.Random(12)
+    bpm = seeded_model(rng)
+    key = "delta_test"
+    job = [(random_eocatr_tuple(rng), [])]
+
+    first = diff_rules(bpm, None)
+    assert first["full"] and len(first["candidate_rules"]["upsert"]) == len(bpm.candidate_rules)
+    diff, _ = run_blooming_job(key, dict(bpm.config), first, job)
+    parallel_blooming.apply_rule_delta(bpm, diff)
+    synced = rule_versions(bpm)
+    assert rule_state(parallel_blooming._REPLICAS[key]) == rule_state(bpm)
+
+    # 主进程删除一条、修改一条规律：增量只包含这两条
+    removed, changed = list(bpm.candidate_rules)[:2]
+    del bpm.candidate_rules[removed]
+    bpm.candidate_rules[changed].confidence = 0.99
+    delta = diff_rules(bpm, synced)
+    assert not delta["full"]
+    assert delta["candidate_rules"]["remove"] == [removed]
+    assert list(delta["candidate_rules"]["upsert"]) == [changed]
+    assert not any(delta[pool]["upsert"] or delta[pool]["remove"] for pool in ("validated_rules", "pruned_rules"))
+
+    replica = parallel_blooming._REPLICAS[key]
+    parallel_blooming.apply_rule_delta(replica, delta)
+    assert rule_state(replica) == rule_state(bpm)
+    del parallel_blooming._REPLICAS[key]
+
+
+def test_pickled_pool_resyncs_in_full():
+    rng = random.Random(13)
+    bpm = seeded_model(rng)
+    pool = ParallelBloomingPool(1)
+    pool._synced["ILAI1"] = rule_versions(bpm)
+    pool._assigned["ILAI1"] = 0
+    restored = copy.deepcopy(pool)
+    assert restored._synced == {} and restored._executors == [None]
+    assert restored._assigned == {"ILAI1": 0}
+
+
+if __name__ == "__main__":
+    test_pool_matches_sequential_processing()
+    test_main_side_changes_are_sent_as_delta()
+    test_pickled_pool_resyncs_in_full()
+    print("✅ 自测通过: BMP 并行怒放按预期工作")
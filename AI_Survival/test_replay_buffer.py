@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+经验回放缓冲区自测：环形覆盖、批量采样、优先级采样、保存/加载
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from replay_buffer import ReplayBuffer
+
+
+def fill(buffer, count, state_size=4):
+    for i in range(count):
+        state = np.full(state_size, i, dtype=np.float32)
+        buffer.add(state, i % 3, float(i), state + 1, i % 2 == 0)
+
+
+def test_ring_overwrites_oldest():
+    buffer = ReplayBuffer(capacity=5, seed=0)
+    fill(buffer, 8)
+    assert len(buffer) == 5
+    assert sorted(buffer.rewards.tolist()) == [3.0, 4.0, 5.0, 6.0, 7.0]
+
+    states, actions, rewards, next_states, dones, indices = buffer.sample(3)
+    assert states.shape == (3, 4) and states.dtype == np.float32
+    assert len(set(indices.tolist())) == 3
+    assert np.all(next_states == states + 1)
+    assert np.all(actions == rewards.astype(int) % 3)
+
+
+def test_prioritized_sampling_prefers_large_rewards():
+    buffer = ReplayBuffer(capacity=100, seed=1)
+    for i in range(100):
+        buffer.add(np.zeros(2), 0, 100.0 if i < 5 else 0.0, np.zeros(2), False)
+    hits = sum(int((buffer.sample_indices(5, prioritized=True) < 5).sum()) for _ in range(20))
+    assert hits > 90  # 几乎总是抽中高奖励经验
+
+    buffer.update_priorities(np.arange(5), np.zeros(5))
+    assert np.allclose(buffer.priorities[:5], buffer.priority_offset)
+
+
+def test_save_and_load_keeps_order():
+    buffer = ReplayBuffer(capacity=5, seed=2)
+    fill(buffer, 7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "replay.npz")
+        buffer.save(path)
+        restored = ReplayBuffer(capacity=3).load(path)
+    assert len(restored) == 3
+    assert restored.rewards[:3].tolist() == [4.0, 5.0, 6.0]  # 保留最新的经验
+    restored.add(np.zeros(4), 0, 9.0, np.zeros(4), False)
+    assert restored.rewards[0] == 9.0
+
+
+if __name__ == "__main__":
+    test_ring_overwrites_oldest()
+    test_prioritized_sampling_prefers_large_rewards()
+    test_save_and_load_keeps_order()
+    print("✅ 自测通过: 经验回放缓冲区按预期工作")
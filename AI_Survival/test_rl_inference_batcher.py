@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回合级批量推理自测：批量前向的输出与各玩家逐个 predict 一致(含不同结构分组、
+Keras 式逐层权重接口)，堆叠权重只在权重版本变化时更新，推理所用的状态留给 take_turn
+"""
+
+import numpy as np
+
+from nn_backend import NumpyMLP
+from rl_inference_batcher import STATE_ATTR, RLInferenceBatcher, take_batched_output
+
+
+class KerasLikeLayer:
+    def __init__(self, kernel, bias, activation):
+        self.weights, self.activation = [kernel, bias], activation
+
+    def get_weights(self):
+        return [w.copy() for w in self.weights]
+
+    def get_config(self):
+        return {"activation": self.activation}
+
+
+class KerasLikeModel:
+    """没有 version 计数器、按层提供权重的模型"""
+
+    def __init__(self, mlp):
+        self.mlp = mlp
+        self.layers = [KerasLikeLayer(k, b, a) for k, b, a in mlp.dense_layers()]
+
+    def predict(self, x, verbose=0):
+        return self.mlp.predict(x)
+
+
+class FakePlayer:
+    def __init__(self, rng, q_network=None, policy_network=None, value_network=None, state_size=6):
+        self.state = rng.normal(size=state_size).astype(np.float32)
+        self.q_network, self.policy_network, self.value_network = q_network, policy_network, value_network
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def get_state(self, game):
+        return self.state
+
+
+class FakeGame:
+    def __init__(self, players):
+        self.players = players
+
+
+def assert_matches_predict(players):
+    for player in players:
+        for network_attr, output_attr in (("q_network", "_batched_q_values"),
+                                          ("policy_network", "_batched_policy"),
+                                          ("value_network", "_batched_value")):
+            model = getattr(player, network_attr)
+            if model is None:
+                continue
+            expected = model.predict(player.state.reshape(1, -1), verbose=0)[0]
+            np.testing.assert_allclose(take_batched_output(player, output_attr), expected, rtol=1e-5, atol=1e-6)
+        assert getattr(player, STATE_ATTR) is player.state
+
+
+def test_batched_forward_matches_predict():
+    rng = np.random.default_rng(1)
+    dqn = [FakePlayer(rng, q_network=NumpyMLP([6, 16, 8, 4], ["relu", "relu", "linear"], seed=i)) for i in range(4)]
+    ppo = [FakePlayer(rng, policy_network=NumpyMLP([6, 12, 4], ["tanh", "softmax"], seed=10 + i),
+                      value_network=NumpyMLP([6, 12, 1], ["relu", "linear"], seed=20 + i)) for i in range(3)]
+    keras = [FakePlayer(rng, q_network=KerasLikeModel(NumpyMLP([6, 16, 8, 4], ["relu", "relu", "linear"], seed=30)))]
+    players = dqn + ppo + keras
+    batcher = RLInferenceBatcher()
+    assert batcher.prepare_turn(FakeGame(players)) == len(players)
+    assert batcher.stats["forward_passes"] == 3  # q_network(同结构的 NumPy 与 Keras 式模型一组)、策略、价值
+    assert_matches_predict(players)
+
+
+def test_stacked_weights_follow_weight_versions():
+    rng = np.random.default_rng(2)
+    players = [FakePlayer(rng, q_network=NumpyMLP([6, 8, 3], ["relu", "linear"], seed=i)) for i in range(5)]
+    game = FakeGame(players)
+    batcher = RLInferenceBatcher()
+    batcher.prepare_turn(game)
+    assert batcher.stats["weight_restacks"] == 1
+
+    # 权重未变化：直接复用堆叠权重
+    batcher.prepare_turn(game)
+    assert batcher.stats["weight_restacks"] == 1 and batcher.stats["weight_rows_updated"] == 0
+
+    # 一名玩家训练(原地更新权重)，另一名被整体替换权重：只更新这两行
+    players[1].q_network.fit(rng.normal(size=(8, 6)), rng.normal(size=(8, 3)), batch_size=4)
+    players[3].q_network.set_weights(NumpyMLP([6, 8, 3], ["relu", "linear"], seed=99).get_weights())
+    batcher.prepare_turn(game)
+    assert batcher.stats["weight_restacks"] == 1 and batcher.stats["weight_rows_updated"] == 2
+    assert_matches_predict(players)
+
+    # 玩家死亡后成员变化，重新堆叠；死亡玩家上一回合未取用的结果被清除
+    players[0].alive = False
+    batcher.prepare_turn(game)
+    assert batcher.stats["weight_restacks"] == 2
+    assert not hasattr(players[0], "_batched_q_values") and not hasattr(players[0], STATE_ATTR)
+    assert_matches_predict(players[1:])
+
+
+if __name__ == "__main__":
+    test_batched_forward_matches_predict()
+    test_stacked_weights_follow_weight_versions()
+    print("✅ 自测通过: 回合级批量推理按预期工作")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规律条件倒排索引自测：索引 + 批量更新的验证结果与逐条匹配、逐条更新全部规律的结果一致，
+只匹配候选规律，被拒绝的规律移出索引，其他连接写入的规律在 refresh 时补上
+"""
+
+import json
+import random
+import sqlite3
+import tempfile
+import time
+
+import rule_condition_index
+from five_library_sql import RULE_VALIDATION_FAILURE_UPDATE, RULE_VALIDATION_SUCCESS_UPDATE
+from five_library_system import EOCATRExperience, FiveLibrarySystem
+from testing_utils import close_system, random_library_experience
+
+FIELD_VALUES = {
+    "environment": ["open_field", "forest"],
+    "object": ["rabbit", "berry", "fish"],
+    "action": ["attack", "gather"],
+    "tools": ["none", "spear"],
+}
+RESULTS = ["food_gain", "fail"]
+EXPERIENCE_CHOICES = dict(FIELD_VALUES, result=RESULTS)
+
+
+def random_rules(rng, count):
+    rules = []
+    for i in range(count):
+        fields = rng.sample(sorted(FIELD_VALUES), rng.choice([1, 2, 3]))
+        conditions = {field: rng.choice(FIELD_VALUES[field]) for field in fields}
+        predictions = {"success": rng.random() < 0.5} if rng.random() < 0.5 else {"result": rng.choice(RESULTS)}
+        rules.append({"rule_id": f"R{i}", "rule_type": "CN2", "conditions": conditions, "predictions": predictions,
+                      "confidence": rng.choice([0.25, 0.5, 0.75, 0.9]), "support_count": 1,
+                      "contradiction_count": 0, "created_time": time.time(), "creator_id": "test"})
+    return rules
+
+
+def reference_validate(system, experience):
+    """原实现：读出全部待验证规律逐条匹配，每条结果单独 UPDATE"""
+    normalized = system.validate_eocatr_experience(experience)["normalized_experience"]
+    manager = system.db_managers["direct_rules"]
+    rules = manager.execute_query("""
+        SELECT * FROM direct_rules WHERE validation_status = 'pending' OR validation_status = 'validated'
+        ORDER BY confidence DESC, support_count DESC
+    """)
+    matched = []
+    for rule in rules:
+        match_result = system._match_rule_with_experience(rule, normalized)
+        if match_result["is_match"]:
+            matched.append(rule["rule_id"])
+            verify = system._verify_rule_prediction(rule, normalized, match_result)
+            sql = RULE_VALIDATION_SUCCESS_UPDATE if verify["is_correct"] else RULE_VALIDATION_FAILURE_UPDATE
+            manager.execute_update(sql, (verify["new_confidence"], time.time(), rule["rule_id"]))
+    return matched
+
+
+def rule_states(system):
+    rows = system.db_managers["direct_rules"].execute_query("""
+        SELECT rule_id, confidence, support_count, contradiction_count, validation_count, validation_status
+        FROM direct_rules ORDER BY rule_id
+    """)
+    return [(r[0], round(r[1], 9)) + tuple(r[2:]) for r in rows]
+
+
+def test_matches_full_scan_with_batched_updates():
+    rng = random.Random(4)
+    rules = random_rules(rng, 120)
+    experiences = [random_library_experience(rng, EXPERIENCE_CHOICES, success_rate=0.5) for _ in range(80)]
+    with tempfile.TemporaryDirectory() as tmp_index, tempfile.TemporaryDirectory() as tmp_scan:
+        system, reference = FiveLibrarySystem(tmp_index), FiveLibrarySystem(tmp_scan)
+        added = [target.add_rules_to_direct_library([dict(rule) for rule in rules])["added_count"]
+                 for target in (system, reference)]
+        assert added[0] == added[1] > 60  # 内容重复的规律不会再次加入
+
+        batch = system.batch_validate_rules(experiences[:60])  # 同一批次的结果在一个事务中写入
+        expected = set()
+        for experience in experiences[:60]:
+            expected.update(reference_validate(reference, experience))
+        assert batch["success"] and set(batch["updated_rules"]) == expected
+        assert rule_states(system) == rule_states(reference)
+
+        for experience in experiences[60:]:
+            result = system.validate_rules_against_experience(experience)
+            assert sorted(result["matched_rules"]) == sorted(reference_validate(reference, experience))
+        states = rule_states(system)
+        assert states == rule_states(reference)
+        assert any(state[-1] == "rejected" for state in states)
+
+        rejected = {state[0] for state in states if state[-1] == "rejected"}
+        assert not rejected & set(system.rule_index.rule_keys)  # 被拒绝的规律已移出索引
+        assert system.rule_index.stats["candidates"] < added[0] * len(experiences) / 4  # 只匹配候选规律
+        close_system(system)
+        close_system(reference)
+
+
+def test_refresh_picks_up_rules_from_other_connections():
+    with tempfile.TemporaryDirectory() as tmp:
+        system = FiveLibrarySystem(tmp)
+        path = str(system.db_paths["direct_rules"])
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("""
+                INSERT INTO direct_rules (rule_id, content_hash, rule_type, conditions, predictions, confidence,
+                                          created_time, creator_id)
+                VALUES ('EXT1', 'h1', 'CN1', ?, ?, 0.6, ?, 'other')
+            """, (json.dumps({"object": "Berry"}), json.dumps({"success": True}), time.time()))
+        conn.close()
+
+        experience = EOCATRExperience(environment="forest", object="berry", characteristics="near",
+                                      action="gather", tools="none", result="food_gain", player_id="ILAI1",
+                                      timestamp=time.time(), success=True)
+        result = system.validate_rules_against_experience(experience)
+        assert result["matched_rules"] == ["EXT1"] and result["validated_rules"] == 1  # 取值不区分大小写
+        assert rule_condition_index.get_rule_index(path) is system.rule_index
+        close_system(system)
+
+
+if __name__ == "__main__":
+    test_matches_full_scan_with_batched_updates()
+    test_refresh_picks_up_rules_from_other_connections()
+    print("✅ 自测通过: 规律条件倒排索引按预期工作")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无界面模拟自测：SimulationEngine 不经过 GameUI 运行两天并返回摘要，给出的玩家组合即完整组合，
+实验网格按笛卡尔积生成配置，在当前进程中运行实验后恢复调用方的工作目录，
+实验失败时返回带错误信息的结构化结果
+"""
+
+import os
+import tempfile
+
+from experiment_runner import ExperimentConfig, build_experiment_grid, run_experiment
+
+
+def test_headless_engine_runs_two_days():
+    import main
+    saved_settings = dict(main.settings)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # 五库数据库、模型和日志写入临时目录
+        try:
+            engine = main.SimulationEngine({"seed": 3, "game_duration": 2,
+                                            "agent_mix": {"DQN": 1, "PPO": 1, "ILAI": 1, "RILAI": 1}})
+            days_seen = []
+            engine.on_day_end = lambda game: days_seen.append(game.current_day)
+            summary = engine.run()
+        finally:
+            os.chdir(cwd)
+            main.settings.clear()
+            main.settings.update(saved_settings)
+
+    assert summary["seed"] == 3 and summary["days"] == 2 and summary["game_over"]
+    assert len(engine.day_times) == 2 and summary["avg_day_time"] > 0
+    assert sorted(r["player_type"] for r in summary["rankings"]) == ["DQN", "ILAI", "PPO", "RILAI"]
+    assert days_seen
+
+
+def test_partial_agent_mix_is_the_whole_population():
+    import main
+    saved_settings = dict(main.settings)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            engine = main.SimulationEngine({"seed": 4, "game_duration": 1, "agent_mix": {"ILAI": 2}})
+            players = [player.player_type for player in engine.game.players]
+        finally:
+            os.chdir(cwd)
+            main.settings.clear()
+            main.settings.update(saved_settings)
+    assert players == ["ILAI", "ILAI"]  # 未列出的 DQN/PPO/RILAI 为 0，而不是默认的每类 10 个
+
+
+def test_build_experiment_grid():
+    grid = build_experiment_grid([1, 2], predator_abundances=(10, 50), durations=(5,),
+                                 agent_mixes=[{"ILAI": 2}, {"DQN": 1, "PPO": 1}],
+                                 extra_settings={"bmp_parallel_workers": 2})
+    assert len(grid) == 8
+    assert [(c.seed, c.predator_abundance) for c in grid[::2]] == [(1, 10), (1, 50), (2, 10), (2, 50)]
+    assert len({c.label for c in grid}) == 8
+    overrides = grid[0].to_settings()
+    assert overrides == {"bmp_parallel_workers": 2, "seed": 1, "animal_abundance_predator": 10,
+                         "game_duration": 5, "agent_mix": {"ILAI": 2}}
+    grid[0].extra_settings["x"] = 1  # 每个配置持有独立的覆盖项
+    assert "x" not in grid[1].extra_settings
+    assert build_experiment_grid([7])[0].agent_mix == ExperimentConfig().agent_mix
+
+
+def test_run_experiment_in_process_restores_cwd():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        config = ExperimentConfig(seed=5, game_duration=1, agent_mix={"DQN": 1},
+                                  workdir=os.path.join(tmp, "run"))
+        result = run_experiment(config)
+        assert os.getcwd() == cwd
+    assert result.success, result.error
+    assert [r["player_type"] for r in result.rankings] == ["DQN"]
+
+
+def test_run_experiment_reports_failure():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        blocker = os.path.join(tmp, "file")
+        open(blocker, "w").close()
+        result = run_experiment(ExperimentConfig(seed=1, workdir=os.path.join(blocker, "run")))
+    assert os.getcwd() == cwd
+    assert not result.success and result.days == 0 and result.rankings == []
+    assert "Error" in result.error and result.pid == os.getpid()
+    assert result.to_dict()["config"]["seed"] == 1
+
+
+if __name__ == "__main__":
+    test_headless_engine_runs_two_days()
+    test_partial_agent_mix_is_the_whole_population()
+    test_build_experiment_grid()
+    test_run_experiment_in_process_restores_cwd()
+    test_run_experiment_reports_failure()
+    print("✅ 自测通过: 无界面模拟与实验运行器按预期工作")
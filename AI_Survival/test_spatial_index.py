@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+空间索引自测：随机移动/死亡后，索引查询结果与线性扫描一致
+"""
+
+import random
+
+from spatial_index import SpatialIndex, SpatiallyIndexed
+
+
+class DummyEntity(SpatiallyIndexed):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.alive = True
+
+
+def linear_nearest(entities, x, y, radius):
+    best, best_dist = None, float('inf')
+    for e in entities:
+        if e.alive:
+            dist = abs(e.x - x) + abs(e.y - y)
+            if dist <= radius and dist < best_dist:
+                best, best_dist = e, dist
+    return best
+
+
+def test_index_matches_linear_scan():
+    rng = random.Random(7)
+    entities = [DummyEntity(rng.randint(0, 20), rng.randint(0, 20)) for _ in range(200)]
+    index = SpatialIndex()
+    for e in entities:
+        index.attach(e)
+
+    for _ in range(1000):
+        e = rng.choice(entities)
+        if rng.random() < 0.7:
+            e.x, e.y = rng.randint(0, 20), rng.randint(0, 20)
+        else:
+            e.alive = not e.alive
+
+        x, y, radius = rng.randint(0, 20), rng.randint(0, 20), rng.randint(0, 8)
+        assert index.nearest(x, y, radius) is linear_nearest(entities, x, y, radius)
+        assert index.at(x, y) == [c for c in entities if c.alive and (c.x, c.y) == (x, y)]
+        assert index.in_radius(x, y, radius, metric="chebyshev") == [
+            c for c in entities if c.alive and abs(c.x - x) <= radius and abs(c.y - y) <= radius
+        ]
+
+    assert len(index) == sum(1 for e in entities if e.alive)
+
+
+def test_detach_stops_tracking():
+    index = SpatialIndex()
+    e = DummyEntity(1, 1)
+    index.attach(e)
+    index.detach(e)
+    e.x = 2
+    assert e not in index
+    assert index.at(2, 1) == []
+
+
+if __name__ == "__main__":
+    test_index_matches_linear_scan()
+    test_detach_stops_tracking()
+    print("✅ 自测通过: 空间索引与线性扫描结果一致")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 连接池自测：同一线程复用连接、不同线程各自的连接、WAL 配置、
+DatabaseManager 按列名返回结果、同一文件的管理器共用锁、经验存储库读写
+"""
+
+import os
+import tempfile
+import threading
+
+import sqlite_pool
+from five_library_system import DatabaseManager
+
+
+def test_connections_are_reused_per_thread():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pool.db")
+        conn = sqlite_pool.get_connection(path)
+        assert sqlite_pool.get_connection(path) is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(sqlite_pool.get_connection(path)))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+
+        assert sqlite_pool.close_connections(path) == 2
+        assert sqlite_pool.get_connection(path) is not conn
+        sqlite_pool.close_connections(path)
+
+
+def test_database_manager_uses_pooled_connection():
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager(os.path.join(tmp, "five.db"))
+        manager.execute_update("CREATE TABLE items (name TEXT UNIQUE, count INTEGER)")
+        assert manager.execute_update("INSERT INTO items VALUES (?, ?)", ("apple", 1)) == 1
+        try:
+            manager.execute_update("INSERT INTO items VALUES (?, ?)", ("apple", 2))
+        except Exception:
+            pass  # 失败的更新回滚，不影响后续操作
+        rows = manager.execute_query("SELECT name, count FROM items")
+        assert [(row["name"], row["count"]) for row in rows] == [("apple", 1)]
+        assert manager.get_connection() is sqlite_pool.get_connection(manager.db_path)
+        # 同一文件的管理器共用一把锁(相对路径与绝对路径相同)
+        other = DatabaseManager(os.path.relpath(manager.db_path))
+        assert other.lock is manager.lock is sqlite_pool.path_lock(os.path.abspath(manager.db_path))
+        manager.close()
+
+
+def test_experience_db_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)  # 模块导入时会在当前目录创建默认的 experience_data/
+        try:
+            from experience_storage_system import DirectExperienceDB
+        finally:
+            os.chdir(cwd)
+        db = DirectExperienceDB(os.path.join(tmp, "direct.db"))
+        assert db.store_experience({"id": "exp_1", "context": "near river", "action": "drink",
+                                    "result": "ok", "outcome_quality": 0.5})
+        experience = db.get_experience("exp_1")
+        assert experience.action == {"action_type": "drink"}
+        assert db.get_experience("exp_1").access_count == 1
+        sqlite_pool.close_connections(db.db_path)
+
+
+if __name__ == "__main__":
+    test_connections_are_reused_per_thread()
+    test_database_manager_uses_pooled_connection()
+    test_experience_db_round_trip()
+    print("✅ 自测通过: SQLite 连接池按预期工作")
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回合剖析器自测：按天累计阶段耗时、装饰器计时、未启用时不记录、CSV/JSON 导出
+"""
+
+import csv
+import json
+import os
+import tempfile
+import time
+
+from turn_profiler import TurnProfiler, profiled, turn_profiler
+
+
+@profiled("test.decorated")
+def decorated_work():
+    time.sleep(0.002)
+    return 42
+
+
+def test_phases_are_accumulated_per_day():
+    profiler = TurnProfiler()
+    profiler.enable()
+    for day in (1, 2):
+        profiler.begin_day(day)
+        for _ in range(3):
+            with profiler.phase("take_turn.DQN"):
+                time.sleep(0.001)
+        profiler.end_day()
+
+    assert [row["day"] for row in profiler.rows] == [1, 2]
+    assert profiler.rows[0]["counts"]["take_turn.DQN"] == 3
+    assert profiler.rows[0]["phases"]["take_turn.DQN"] >= 0.003
+    assert profiler.rows[0]["rss_mb"] > 0
+    summary = profiler.summary()
+    assert summary["days"] == 2 and summary["phases"]["take_turn.DQN"]["calls"] == 6
+
+
+def test_decorator_uses_shared_profiler_only_when_enabled():
+    turn_profiler.reset()
+    assert decorated_work() == 42
+    assert not turn_profiler._times
+
+    turn_profiler.enable()
+    try:
+        turn_profiler.begin_day(1)
+        decorated_work()
+        row = turn_profiler.end_day()
+    finally:
+        turn_profiler.enable(False)
+        turn_profiler.reset()
+    assert row["counts"] == {"test.decorated": 1}
+
+
+def test_export_csv_and_json():
+    profiler = TurnProfiler()
+    profiler.enable()
+    profiler.begin_day(1)
+    with profiler.phase("animals"):
+        pass
+    profiler.end_day()
+    with profiler.phase("checkpoint"):  # 回合之外的阶段记为 final
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = profiler.export(tmp, "run")
+        with open(paths["csv"], encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        with open(paths["json"], encoding="utf-8") as f:
+            data = json.load(f)
+        assert os.path.basename(paths["csv"]) == "run.csv"
+    assert [r["day"] for r in rows] == ["1", "final"]
+    assert rows[0]["animals_calls"] == "1" and rows[1]["checkpoint_calls"] == "1"
+    assert set(data["summary"]["phases"]) == {"animals", "checkpoint"}
+
+
+if __name__ == "__main__":
+    test_phases_are_accumulated_per_day()
+    test_decorator_uses_shared_profiler_only_when_enabled()
+    test_export_csv_and_json()
+    print("✅ 自测通过: 回合剖析器按预期工作")
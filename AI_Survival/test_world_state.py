@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数组化动物状态自测：兼容视图读写数组、向量化追击/攻击/随机游走、空间索引同步、
+只在开启 vectorized_animals 时把动物换成视图(默认仍是普通对象)、视图可以序列化
+"""
+
+import pickle
+
+from spatial_index import SpatialIndex, SpatiallyIndexed
+from world_state import AnimalStore, ArrayBackedAnimal
+
+
+class DummyAnimal(SpatiallyIndexed):
+    def __init__(self, x, y, is_predator):
+        self.x = x
+        self.y = y
+        self.alive = True
+        self.chase_steps = 0
+        self.chase_target = None
+        self.vision_range = 5
+        self.type = "Tiger" if is_predator else "Rabbit"
+        self.is_predator = is_predator
+        self.hp = 100
+        self.attacks = []
+
+    def attack_player(self, player):
+        self.attacks.append(player.name)
+
+
+class DummyPlayer:
+    def __init__(self, name, x, y):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_world():
+    tiger = DummyAnimal(0, 0, True)
+    rabbit = DummyAnimal(10, 10, False)
+    store = AnimalStore([tiger, rabbit], width=20, height=20, seed=1)
+    index = SpatialIndex()
+    index.attach(tiger)
+    index.attach(rabbit)
+    return tiger, rabbit, store, index
+
+
+def test_compatibility_view():
+    tiger, rabbit, store, index = make_world()
+    assert isinstance(tiger, DummyAnimal) and isinstance(tiger, ArrayBackedAnimal)
+    assert "hp" not in tiger.__dict__ and tiger.hp == 100
+    tiger.hp -= 30
+    assert store.hp[0] == 70 and tiger.hp == 70
+    rabbit.alive = False
+    assert not store.alive[1] and rabbit not in index
+
+
+def test_vectorized_chase_and_attack():
+    tiger, rabbit, store, index = make_world()
+    far = DummyPlayer("far", 4, 1)
+    near = DummyPlayer("near", 2, 1)
+    players = [far, near]
+
+    store.step(players)
+    assert tiger.chase_target is near and tiger.chase_steps == 1
+    assert (tiger.x, tiger.y) == (1, 1)
+    assert tiger.attacks == ["near"]
+    assert index.at(1, 1) == [tiger]
+    assert abs(rabbit.x - 10) + abs(rabbit.y - 10) == 1  # 猎物随机游走一格
+
+    near.alive = False
+    store.step(players)
+    assert tiger.chase_target is far
+
+
+def test_store_is_created_only_for_vectorized_animals():
+    import main
+    game_map = main.GameMap(40, 40, "forest", 1)
+    assert game_map.animal_store is None and game_map.animals
+    assert not any(isinstance(animal, ArrayBackedAnimal) for animal in game_map.animals)
+    assert all("hp" in animal.__dict__ for animal in game_map.animals)  # 普通属性
+
+    vectorized = main.GameMap(40, 40, "forest", 1, vectorized_animals=True)
+    animals = vectorized.animals
+    assert len(vectorized.animal_store) == len(animals) == len(game_map.animals)
+    assert all(isinstance(animal, ArrayBackedAnimal) and isinstance(animal, main.Animal) for animal in animals)
+    assert [(a.type, a.x, a.y, a.hp) for a in animals] == [(a.type, a.x, a.y, a.hp) for a in game_map.animals]
+
+    restored = pickle.loads(pickle.dumps(vectorized))
+    animal = restored.animals[0]
+    assert type(animal) is type(animals[0]) and animal._store is restored.animal_store
+    animal.hp -= 1
+    assert restored.animal_store.hp[0] == animals[0].hp - 1
+
+
+if __name__ == "__main__":
+    test_compatibility_view()
+    test_vectorized_chase_and_attack()
+    test_store_is_created_only_for_vectorized_animals()
+    print("✅ 自测通过: 数组化动物状态按预期工作")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自测共用的构造与清理函数：五库经验(EOCATRExperience)、BMP 使用的符号化经验(EOCATR_Tuple)
+和随机条件的候选规律、在临时目录中创建的五库系统的关闭
+"""
+
+import copy
+import time
+
+import hash_membership
+import rule_condition_index
+import sqlite_pool
+from blooming_and_pruning_model import CandidateRule, RuleType
+from five_library_system import EOCATRExperience
+from symbolic_core_v3 import AbstractionLevel, EOCATR_Tuple, SymbolicElement, SymbolType
+
+# 随机规律的条件取值：包括简写键、取值为 None 的条件、C 特征条件和阈值条件
+RULE_CONDITION_VALUES = {
+    "object_category": ["tiger", "rabbit", "berry", None], "O": ["tiger", "berry", None],
+    "action": ["attack", "collect"], "A": ["attack", "collect", None],
+    "environment": ["开阔地", "森林"], "E": ["开阔地", "森林"], "T": ["none", "spear", "stone"],
+    "C": [{"distance": 1.0}, {"distance": 3.0, "dangerous": False}, [("distance", 1.0)]],
+    "characteristic_distance": [1.0, 3.0], "distance_threshold": [2.0], "comparison": ["less_than"],
+    "object": ["tiger"], "tool": ["spear"]}
+
+EXPERIENCE_DEFAULTS = {"environment": "forest", "object": "berry", "characteristics": "near",
+                       "action": "gather", "tools": "none"}
+
+
+def make_experience(player_id="ILAI1", success=True, **fields) -> EOCATRExperience:
+    """五库经验；未给出的 EOCATR 字段取 EXPERIENCE_DEFAULTS，结果默认随 success 变化"""
+    values = dict(EXPERIENCE_DEFAULTS, result="food" if success else "nothing")
+    values.update(fields)
+    return EOCATRExperience(player_id=player_id, timestamp=time.time(), success=success, **values)
+
+
+def random_library_experience(rng, choices, success_rate=1.0) -> EOCATRExperience:
+    """按 choices(字段 -> 候选取值，可包含 player_id)随机生成五库经验"""
+    fields = {field: rng.choice(values) for field, values in choices.items()}
+    success = rng.random() < success_rate if success_rate < 1.0 else True
+    return make_experience(success=success, **fields)
+
+
+def close_system(system):
+    """关闭五库系统，并丢弃按数据库路径保存的进程级状态(临时目录随后被删除)"""
+    system.close()
+    for path in map(str, system.db_paths.values()):
+        hash_membership.forget(path)
+        rule_condition_index.forget(path)
+        if sqlite_pool.is_memory(path):
+            sqlite_pool.use_disk(path)
+
+
+def random_candidate_rule(rng, idx) -> CandidateRule:
+    """条件从 RULE_CONDITION_VALUES 中随机选取 0~3 个(偶尔带不可哈希的取值)的 BMP 候选规律"""
+    keys = rng.sample(sorted(RULE_CONDITION_VALUES), rng.randint(0, 3))
+    conditions = {key: copy.deepcopy(rng.choice(RULE_CONDITION_VALUES[key])) for key in keys}
+    if rng.random() < 0.05:
+        conditions["O"] = ["tiger"]  # 不可哈希的取值
+    rule = CandidateRule(rule_id=f"r{idx}", rule_type=RuleType.CAUSAL, pattern=f"rule {idx}",
+                         conditions=conditions, predictions={"success": True})
+    rule.confidence = rng.random()
+    rule.activation_count = rng.randint(0, 5)
+    rule.evidence.supporting_experiences.extend(["e"] * rng.randint(0, 3))
+    return rule
+
+
+def element(symbol_type, content):
+    return SymbolicElement("", symbol_type, content, AbstractionLevel.CONCRETE, [])
+
+
+def random_eocatr_tuple(rng) -> EOCATR_Tuple:
+    """BMP 使用的符号化经验"""
+    return EOCATR_Tuple(environment=element(SymbolType.ENVIRONMENT, rng.choice(["开阔地", "森林"])),
+                        object=element(SymbolType.OBJECT, rng.choice(["berry", "rabbit", "tiger"])),
+                        character=element(SymbolType.CHARACTER, rng.choice(["distance=1", "distance=3"])),
+                        action=element(SymbolType.ACTION, rng.choice(["collect", "attack"])),
+                        tool=element(SymbolType.TOOL, rng.choice(["none", "spear", "stone"])),
+                        result=element(SymbolType.RESULT, rng.choice(["success", "fail"])))
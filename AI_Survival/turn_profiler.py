@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+turn_profiler.py
+回合分阶段性能剖析
+
+PerformanceMonitor 只统计整回合耗时。TurnProfiler 按天记录各阶段的累计耗时和调用次数：
+动物移动、各类玩家的 take_turn、ILAI 子阶段(SSM 符号化、BMP 绽放/剪枝、WBM 规划、
+五库写入)、知识同步和检查点，并在每天结束时采样进程 RSS 和 CPU 占用。
+
+用法:
+    with turn_profiler.phase("animals"):
+        ...
+
+    @profiled("ilai.ssm")
+    def symbolize_scene(self, game, player): ...
+
+未启用时 phase() 返回共享的空计时器，@profiled 只多一次属性判断。
+嵌套阶段各自记录包含子阶段在内的耗时。结果可导出为 CSV / JSON。
+"""
+
+import csv
+import functools
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class ResourceSampler:
+    """进程资源采样：RSS(MB) 和两次采样之间的 CPU 占用率(%)"""
+
+    def __init__(self):
+        self._process = psutil.Process(os.getpid()) if psutil is not None else None
+        self._last_wall = time.perf_counter()
+        self._last_cpu = time.process_time()
+
+    def rss_mb(self) -> float:
+        if self._process is not None:
+            return self._process.memory_info().rss / 1024 / 1024
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+        except (OSError, ValueError, AttributeError):
+            try:
+                import resource
+                # 没有 /proc 时退化为峰值 RSS (Linux 单位 KB，macOS 单位字节)
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                return peak / 1024 / 1024 if peak > 1 << 30 else peak / 1024
+            except ImportError:
+                return 0.0
+
+    def cpu_percent(self) -> float:
+        """自上次调用以来本进程的 CPU 时间 / 墙钟时间(多线程时可超过 100)"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        elapsed = wall - self._last_wall
+        percent = (cpu - self._last_cpu) / elapsed * 100 if elapsed > 0 else 0.0
+        self._last_wall, self._last_cpu = wall, cpu
+        return percent
+
+
+class _PhaseTimer:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class TurnProfiler:
+    """按天累计各阶段耗时的剖析器"""
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def enable(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.rows: List[Dict[str, Any]] = []
+        self._day: Optional[Any] = None
+        self._day_start = 0.0
+        self._times: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._sampler = ResourceSampler()
+
+    # ---------- 计时 ----------
+
+    def phase(self, name: str):
+        return _PhaseTimer(self, name) if self.enabled else _NULL_TIMER
+
+    def add(self, name: str, elapsed: float):
+        self._times[name] = self._times.get(name, 0.0) + elapsed
+        self._counts[name] = self._counts.get(name, 0) + 1
+
+    def begin_day(self, day):
+        if not self.enabled:
+            return
+        self._day = day
+        self._day_start = time.perf_counter()
+
+    def end_day(self) -> Optional[Dict[str, Any]]:
+        """结束当天的统计，记录一行: day, total, rss_mb, cpu_percent, 各阶段耗时与次数"""
+        if not self.enabled:
+            return None
+        total = time.perf_counter() - self._day_start if self._day is not None else 0.0
+        return self._flush(self._day, total)
+
+    def _flush(self, day, total):
+        row = {
+            "day": day,
+            "total": total,
+            "rss_mb": self._sampler.rss_mb(),
+            "cpu_percent": self._sampler.cpu_percent(),
+            "phases": dict(self._times),
+            "counts": dict(self._counts),
+        }
+        self.rows.append(row)
+        self._day = None
+        self._times.clear()
+        self._counts.clear()
+        return row
+
+    # ---------- 汇总与导出 ----------
+
+    def phase_names(self) -> List[str]:
+        names = []
+        for row in self.rows:
+            for name in row["phases"]:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def summary(self) -> Dict[str, Any]:
+        """各阶段的总耗时、调用次数、平均每天耗时及占总耗时的比例"""
+        if self._times:
+            self._flush("final", 0.0)  # 回合之外(例如游戏结束时)记录的阶段
+        total = sum(row["total"] for row in self.rows)
+        days = sum(1 for row in self.rows if row["day"] != "final")
+        phases = {}
+        for name in self.phase_names():
+            seconds = sum(row["phases"].get(name, 0.0) for row in self.rows)
+            phases[name] = {
+                "seconds": seconds,
+                "calls": sum(row["counts"].get(name, 0) for row in self.rows),
+                "per_day": seconds / days if days else 0.0,
+                "share": seconds / total if total else 0.0,
+            }
+        return {
+            "days": days,
+            "total_seconds": total,
+            "peak_rss_mb": max((row["rss_mb"] for row in self.rows), default=0.0),
+            "phases": dict(sorted(phases.items(), key=lambda item: -item[1]["seconds"])),
+        }
+
+    def export_csv(self, path: str) -> str:
+        """每天一行，每个阶段一列耗时(秒)和一列调用次数"""
+        self.summary()  # 收尾未结束的阶段
+        names = self.phase_names()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["day", "total", "rss_mb", "cpu_percent"] +
+                            [f"{n}_seconds" for n in names] + [f"{n}_calls" for n in names])
+            for row in self.rows:
+                writer.writerow([row["day"], f"{row['total']:.6f}", f"{row['rss_mb']:.1f}",
+                                 f"{row['cpu_percent']:.1f}"] +
+                                [f"{row['phases'].get(n, 0.0):.6f}" for n in names] +
+                                [row["counts"].get(n, 0) for n in names])
+        return path
+
+    def export_json(self, path: str) -> str:
+        summary = self.summary()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "days": self.rows}, f, ensure_ascii=False, indent=2)
+        return path
+
+    def export(self, directory: str, label: str) -> Dict[str, str]:
+        """导出 <label>.csv 和 <label>.json 到 directory"""
+        os.makedirs(directory, exist_ok=True)
+        return {
+            "csv": self.export_csv(os.path.join(directory, f"{label}.csv")),
+            "json": self.export_json(os.path.join(directory, f"{label}.json")),
+        }
+
+
+# 进程内共享的剖析器(Game 根据 settings["profile_turns"] 启用)
+turn_profiler = TurnProfiler()
+
+
+def get_turn_profiler() -> TurnProfiler:
+    return turn_profiler
+
+
+def profiled(phase: str):
+    """方法装饰器：剖析器启用时把调用耗时记入 phase"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not turn_profiler.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                turn_profiler.add(phase, time.perf_counter() - start)
+        return wrapper
+    return decorator
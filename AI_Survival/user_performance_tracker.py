@@ -447,19 +447,23 @@ class UserPerformanceTracker:
         print(f"📁 Raw data exported: {filename}")
         return filename
     
+    def _get_process(self):
+        """缓存的当前进程句柄(避免每次采样重新创建)"""
+        if getattr(self, '_process', None) is None:
+            self._process = psutil.Process(os.getpid())
+        return self._process
+    
     def _get_memory_usage(self) -> float:
-        """获取当前内存使用量（MB）"""
+        """获取当前内存使用量（MB，进程RSS）"""
         try:
-            process = psutil.Process(os.getpid())
-            return 50.0  # 修复: 固定值避免系统调用
+            return self._get_process().memory_info().rss / 1024 / 1024
         except:
             return 0.0
     
     def _get_cpu_usage(self) -> float:
-        """获取当前CPU使用率（%）"""
+        """获取当前CPU使用率（%，自上次采样以来，非阻塞）"""
         try:
-            process = psutil.Process(os.getpid())
-            return 0.0  # 修复: 避免阻塞调用
+            return self._get_process().cpu_percent(interval=None)
         except:
             return 0.0
     
@@ -21,6 +21,7 @@
 版本：1.5.0 - 新增规律接头机制
 """
 
+import functools
 import math
 import time
 import random
@@ -31,6 +32,8 @@ from enum import Enum
 from collections import defaultdict, deque
 import json
 
+from turn_profiler import profiled
+
 # 导入符号化系统支持
 try:
     from symbolic_core_v3 import SymbolicElement, SymbolType, AbstractionLevel
@@ -1432,9 +1435,9 @@ class WoodenBridgeModel:
         if self.logger:
             self.logger.log("WBM木桥模型已初始化（支持规律接头机制）")
         
-        # === 绑定EOCATR增强方法 ===
-        self.get_enhanced_rules_with_eocatr = lambda goal, urgency: get_enhanced_rules_with_eocatr(self, goal, urgency)
-        self._calculate_rule_relevance = lambda rule, goal, urgency: _calculate_rule_relevance(self, rule, goal, urgency)
+        # === 绑定EOCATR增强方法 ===(使用partial而非lambda，保证可以随Game快照序列化)
+        self.get_enhanced_rules_with_eocatr = functools.partial(get_enhanced_rules_with_eocatr, self)
+        self._calculate_rule_relevance = functools.partial(_calculate_rule_relevance, self)
     
     def _default_config(self) -> Dict[str, Any]:
         """默认配置参数"""
@@ -1806,6 +1809,7 @@ class WoodenBridgeModel:
         
         return sub_goals
     
+    @profiled("ilai.wbm.build_bridge")
     def build_bridge(self, goal: Goal, available_rules: List[Rule]) -> Optional[BridgePlan]:
         """阶段2：解决方案构建与预期评估（"搭桥"与"风险评估"）"""
         if not available_rules:
@@ -3304,6 +3308,7 @@ class WoodenBridgeModel:
             "worst_recent_quality": min(recent_qualities)
         } 
 
+    @profiled("ilai.wbm.multi_day_plan")
     def generate_multi_day_plan(self, goal: Goal, available_rules: List[Rule], 
                                current_state: Dict[str, Any], 
                                max_days: int = 5) -> Optional[MultiDayPlan]:
@@ -3526,6 +3531,7 @@ class WoodenBridgeModel:
         new_state.update(daily_action.expected_state_change)
         return new_state
     
+    @profiled("ilai.wbm.adjust_plan")
     def check_and_adjust_multi_day_plan(self, multi_day_plan: MultiDayPlan, 
                                       current_state: Dict[str, Any],
                                       new_urgent_goals: List[Goal] = None) -> PlanAdjustmentResult:
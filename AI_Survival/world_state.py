@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+world_state.py
+数组化的动物世界状态
+
+AnimalStore 以结构数组 (structure-of-arrays) 保存所有动物的
+x / y / hp / alive / type / chase_target / chase_steps，
+并用 NumPy 在一次向量化计算中完成全部动物的捕食者追击与随机游走。
+
+加入 AnimalStore 的 Animal 对象换成兼容视图类：animal.x、animal.alive 等属性直接读写数组中的对应槽位，
+现有按对象访问动物的代码无需修改。只在开启 vectorized_animals 时创建 AnimalStore，
+其余情况下动物仍是普通对象，属性读取没有数组索引和类型转换的开销。
+"""
+
+import numpy as np
+
+from spatial_index import SpatiallyIndexed
+
+MAX_CHASE_STEPS = 10  # 追击步数上限(与 Animal.move 一致)
+RANDOM_DIRECTIONS = np.array([(0, 1), (0, -1), (1, 0), (-1, 0)], dtype=np.int32)
+
+
+def _to_python_number(value):
+    value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _array_attribute(field, indexed=False, convert=_to_python_number):
+    """生成读写 AnimalStore 数组槽位的属性"""
+
+    def getter(self):
+        return convert(getattr(self._store, field)[self._slot])
+
+    def setter(self, value):
+        getattr(self._store, field)[self._slot] = value
+        if indexed:
+            index = self.__dict__.get("_spatial_index")
+            if index is not None:
+                index.update(self)
+
+    return property(getter, setter)
+
+
+class ArrayBackedAnimal(SpatiallyIndexed):
+    """动物兼容视图：核心状态保存在 AnimalStore 的数组中(由 array_view_class 与具体动物类组合)"""
+
+    x = _array_attribute("x", indexed=True)
+    y = _array_attribute("y", indexed=True)
+    alive = _array_attribute("alive", indexed=True, convert=lambda v: bool(v))
+    hp = _array_attribute("hp")
+    chase_steps = _array_attribute("chase_steps")
+
+    @property
+    def chase_target(self):
+        return self._store.target_of(self._slot)
+
+    @chase_target.setter
+    def chase_target(self, player):
+        self._store.set_target(self._slot, player)
+
+    def is_spatially_active(self):
+        return self.alive
+
+    def __reduce_ex__(self, protocol):
+        # 视图类是运行时生成的，按原动物类序列化，恢复时重新生成视图类
+        return _new_view, (self._plain_class,), self.__dict__
+
+
+_VIEW_CLASSES = {}
+
+
+def array_view_class(cls):
+    """动物类 cls 的数组视图子类(按类缓存)"""
+    view = _VIEW_CLASSES.get(cls)
+    if view is None:
+        view = type(cls.__name__, (ArrayBackedAnimal, cls),
+                    {"__module__": cls.__module__, "__qualname__": cls.__qualname__, "_plain_class": cls})
+        _VIEW_CLASSES[cls] = view
+    return view
+
+
+def _new_view(cls):
+    return object.__new__(array_view_class(cls))
+
+
+class AnimalStore:
+    """所有动物的结构数组存储与向量化移动"""
+
+    def __init__(self, animals, width, height, seed=None):
+        self.width = width
+        self.height = height
+        self.animals = list(animals)
+        self.rng = np.random.default_rng(seed)
+        self.players = []          # chase_target 槽位 -> 玩家对象
+        self._player_slots = {}    # id(player) -> 槽位
+
+        self.type_names = sorted({a.type for a in self.animals})
+        type_codes = {name: code for code, name in enumerate(self.type_names)}
+
+        self.x = np.array([a.x for a in self.animals], dtype=np.int32)
+        self.y = np.array([a.y for a in self.animals], dtype=np.int32)
+        self.hp = np.array([a.hp for a in self.animals], dtype=np.float64)
+        self.alive = np.array([a.alive for a in self.animals], dtype=bool)
+        self.type = np.array([type_codes[a.type] for a in self.animals], dtype=np.int16)
+        self.is_predator = np.array([bool(getattr(a, 'is_predator', False)) for a in self.animals], dtype=bool)
+        self.vision_range = np.array([a.vision_range for a in self.animals], dtype=np.int32)
+        self.chase_steps = np.array([a.chase_steps for a in self.animals], dtype=np.int32)
+        self.chase_target = np.full(len(self.animals), -1, dtype=np.int32)
+
+        # 动物对象换成数组视图类，原先保存在实例字典中的状态移入数组
+        for slot, animal in enumerate(self.animals):
+            target = animal.chase_target
+            for field in ("_x", "_y", "_alive", "hp", "chase_steps", "chase_target"):
+                animal.__dict__.pop(field, None)
+            animal.__class__ = array_view_class(getattr(animal, "_plain_class", type(animal)))
+            animal._store = self
+            animal._slot = slot
+            if target is not None:
+                self.set_target(slot, target)
+
+    def __len__(self):
+        return len(self.animals)
+
+    def __setstate__(self, state):
+        # 玩家槽位以 id(player) 为键，反序列化后按 players 列表重建
+        self.__dict__.update(state)
+        self._player_slots = {id(player): slot for slot, player in enumerate(self.players)}
+
+    # ---------- 追击目标 ----------
+
+    def _player_slot(self, player):
+        slot = self._player_slots.get(id(player))
+        if slot is None:
+            slot = len(self.players)
+            self.players.append(player)
+            self._player_slots[id(player)] = slot
+        return slot
+
+    def target_of(self, slot):
+        target = self.chase_target[slot]
+        return self.players[target] if target >= 0 else None
+
+    def set_target(self, slot, player):
+        self.chase_target[slot] = -1 if player is None else self._player_slot(player)
+
+    # ---------- 向量化移动 ----------
+
+    def step(self, players, logger=None):
+        """
+        一次性推进所有存活动物一步。
+
+        规则与 Animal.move 相同(视野内最近玩家、最多追击10步、相邻即攻击、否则随机游走)，
+        区别在于所有动物基于回合开始时的位置同时决策。
+        """
+        player_slots = np.array([self._player_slot(p) for p in players], dtype=np.int32)
+        player_x = np.array([p.x for p in self.players], dtype=np.int32)
+        player_y = np.array([p.y for p in self.players], dtype=np.int32)
+        player_alive = np.array([p.is_alive() for p in self.players], dtype=bool)
+        player_alive_slots = player_slots[player_alive[player_slots]] if len(player_slots) else player_slots
+
+        start_x, start_y = self.x.copy(), self.y.copy()
+        moving = self.alive.copy()
+        hunters = np.flatnonzero(self.alive & self.is_predator) if len(player_slots) else np.empty(0, dtype=np.intp)
+
+        attackers = []
+        if len(hunters) and len(player_alive_slots):
+            # 视野内最近的玩家(距离相同取玩家列表中靠前者)
+            dist = (np.abs(self.x[hunters, None] - player_x[None, player_alive_slots]) +
+                    np.abs(self.y[hunters, None] - player_y[None, player_alive_slots]))
+            dist = np.where(dist <= self.vision_range[hunters, None], dist, np.iinfo(np.int32).max)
+            nearest_col = np.argmin(dist, axis=1)
+            has_nearest = dist[np.arange(len(hunters)), nearest_col] != np.iinfo(np.int32).max
+            nearest = np.where(has_nearest, player_alive_slots[nearest_col], -1)
+        else:
+            nearest = np.full(len(hunters), -1, dtype=np.int32)
+
+        if len(hunters):
+            target = self.chase_target[hunters]
+            steps = self.chase_steps[hunters]
+
+            # 发现新目标：切换目标并重置追击计数
+            spotted = (nearest >= 0) & (nearest != target)
+            target = np.where(spotted, nearest, target)
+            steps = np.where(spotted, 0, steps)
+
+            chasing = (target >= 0) & (steps < MAX_CHASE_STEPS)
+            target_alive = np.zeros(len(hunters), dtype=bool)
+            target_alive[chasing] = player_alive[target[chasing]]
+            pursue = chasing & target_alive
+            lost = chasing & ~target_alive
+            restart = ~chasing & (nearest >= 0)
+
+            target = np.where(lost, -1, np.where(restart, nearest, target))
+            steps = np.where(lost | restart, 0, steps)
+
+            # 追击：向目标移动一格(越界则原地不动)
+            chase_idx = hunters[pursue]
+            tx, ty = player_x[target[pursue]], player_y[target[pursue]]
+            new_x = self.x[chase_idx] + np.sign(tx - self.x[chase_idx])
+            new_y = self.y[chase_idx] + np.sign(ty - self.y[chase_idx])
+            inside = (new_x >= 0) & (new_x < self.width) & (new_y >= 0) & (new_y < self.height)
+            self.x[chase_idx[inside]] = new_x[inside]
+            self.y[chase_idx[inside]] = new_y[inside]
+            pursue_steps = steps[pursue] + inside
+            steps[pursue] = pursue_steps
+
+            adjacent = inside & (np.abs(new_x - tx) <= 1) & (np.abs(new_y - ty) <= 1)
+            attackers = list(zip(chase_idx[adjacent], target[pursue][adjacent]))
+
+            self.chase_target[hunters] = target
+            self.chase_steps[hunters] = steps
+            moving[hunters[pursue | restart]] = False
+
+            if logger:
+                for slot in hunters[spotted]:
+                    animal = self.animals[slot]
+                    logger.log(f"{animal.type} spots new target: {self.players[self.chase_target[slot]].name}")
+                for slot in hunters[restart]:
+                    animal = self.animals[slot]
+                    logger.log(f"{animal.type} starts chasing {self.players[self.chase_target[slot]].name}")
+                for slot, target_slot, step_count in zip(chase_idx, target[pursue], pursue_steps):
+                    if step_count >= MAX_CHASE_STEPS:
+                        logger.log(f"{self.animals[slot].type} gives up chasing {self.players[target_slot].name}")
+
+        # 其余存活动物随机游走
+        walkers = np.flatnonzero(moving)
+        if len(walkers):
+            direction = RANDOM_DIRECTIONS[self.rng.integers(0, len(RANDOM_DIRECTIONS), len(walkers))]
+            new_x = self.x[walkers] + direction[:, 0]
+            new_y = self.y[walkers] + direction[:, 1]
+            inside = (new_x >= 0) & (new_x < self.width) & (new_y >= 0) & (new_y < self.height)
+            self.x[walkers[inside]] = new_x[inside]
+            self.y[walkers[inside]] = new_y[inside]
+
+        # 同步空间索引(只处理位置发生变化的动物)
+        moved = np.flatnonzero((self.x != start_x) | (self.y != start_y))
+        for slot, x, y in zip(moved.tolist(), self.x[moved].tolist(), self.y[moved].tolist()):
+            animal = self.animals[slot]
+            index = animal.__dict__.get("_spatial_index")
+            if index is not None:
+                index.move_to(animal, (x, y))
+
+        # 攻击按动物顺序依次结算(可能导致玩家死亡)
+        for slot, target_slot in attackers:
+            self.animals[slot].attack_player(self.players[target_slot])